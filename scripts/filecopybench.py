@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+This file benchmarks the file copies of the file:// storage provider
+(torchx.runtime.storage.FileProvider) against a copy through python (reading
+into bytes and writing them out) for a large file and a directory of many
+small files.
+
+By default the files are created in a temp dir. To benchmark a specific
+filesystem (e.g. an NFS/EFS mount) pass a directory on it:
+
+```
+scripts/filecopybench.py --dir /mnt/efs/bench --size-mb 2048 --num-files 10000
+```
+
+Note that the page cache serves the reads after the first run, drop it
+(``echo 3 > /proc/sys/vm/drop_caches``) between the runs to measure cold copies.
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, List
+
+from torchx.runtime.storage import copy_tree, copyfile
+
+
+MB: int = 1024 * 1024
+
+
+def python_copyfile(src: str, dst: str) -> None:
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fdst.write(fsrc.read())
+
+
+def python_copy_tree(src: str, dst: str) -> None:
+    for root, _, names in os.walk(src):
+        dst_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(dst_root, exist_ok=True)
+        for name in names:
+            python_copyfile(os.path.join(root, name), os.path.join(dst_root, name))
+
+
+def timeit(fn: Callable[[], object], cleanup: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    cleanup()
+    return elapsed
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="file:// storage benchmark")
+    parser.add_argument("--dir", type=str, default=None)
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--num-files", type=int, default=2000)
+    parser.add_argument("--file-kb", type=int, default=16)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args(argv)
+
+    tmpdir = tempfile.mkdtemp(prefix="torchx_filecopybench_", dir=args.dir)
+    try:
+        big = os.path.join(tmpdir, "big")
+        with open(big, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(MB))
+
+        small = os.path.join(tmpdir, "small")
+        for i in range(args.num_files):
+            subdir = os.path.join(small, str(i % 100))
+            os.makedirs(subdir, exist_ok=True)
+            with open(os.path.join(subdir, str(i)), "wb") as f:
+                f.write(os.urandom(args.file_kb * 1024))
+
+        dst = os.path.join(tmpdir, "dst")
+
+        def rm_dst() -> None:
+            if os.path.isdir(dst):
+                shutil.rmtree(dst)
+            elif os.path.exists(dst):
+                os.remove(dst)
+
+        print(f"large file ({args.size_mb} MB):")
+        for name, fn in [("python", python_copyfile), ("copyfile", copyfile)]:
+            t = timeit(lambda: fn(big, dst), rm_dst)
+            print(f"  {name:>20}: {t:8.3f}s {args.size_mb / t:10.1f} MB/s")
+
+        print(f"many small files ({args.num_files} x {args.file_kb} KB):")
+        t = timeit(lambda: python_copy_tree(small, dst), rm_dst)
+        print(f"  {'python':>20}: {t:8.3f}s {args.num_files / t:10.1f} files/s")
+        for workers in args.workers:
+            t = timeit(lambda: copy_tree(small, dst, workers), rm_dst)
+            name = f"copy_tree({workers})"
+            print(f"  {name:>20}: {t:8.3f}s {args.num_files / t:10.1f} files/s")
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1:])
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+This file benchmarks the blob and file transfers of the S3 storage provider
+(torchx.aws.s3) with different transfer settings.
+
+By default it runs against an in-process moto stand-in, which measures the
+client side overhead of the transfers. To measure the throughput over the
+network point it to an S3 compatible store, e.g. MinIO or moto_server:
+
+```
+moto_server -p 5000 &
+export AWS_ACCESS_KEY_ID=testing AWS_SECRET_ACCESS_KEY=testing
+scripts/s3bench.py --endpoint-url http://localhost:5000 --size-mb 512
+```
+
+Each setting is given as ``max_concurrency:multipart_chunksize_mb``.
+"""
+
+import argparse
+import contextlib
+import os
+import tempfile
+import time
+from typing import Callable, Iterator, List, Tuple
+
+import boto3
+from torchx.aws.s3 import S3, S3Config
+
+
+MB: int = 1024 * 1024
+
+
+@contextlib.contextmanager
+def stand_in(endpoint_url: str) -> Iterator[None]:
+    if endpoint_url:
+        yield
+        return
+
+    from moto import mock_s3
+
+    # moto does not decode the (aws-chunked) checksummed parts that newer
+    # botocore versions upload by default
+    os.environ.setdefault("AWS_REQUEST_CHECKSUM_CALCULATION", "when_required")
+    with mock_s3():
+        yield
+
+
+def timeit(fn: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def parse_setting(setting: str) -> Tuple[int, int]:
+    concurrency, chunksize = setting.split(":")
+    return int(concurrency), int(chunksize) * MB
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description="S3 storage provider benchmark")
+    parser.add_argument("--endpoint-url", type=str, default="")
+    parser.add_argument("--region", type=str, default="us-west-2")
+    parser.add_argument("--bucket", type=str, default="torchx-s3bench")
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument(
+        "--settings", type=str, nargs="+", default=["1:8", "4:8", "10:8", "16:16"]
+    )
+    args = parser.parse_args(argv)
+
+    data = os.urandom(args.size_mb * MB)
+    with stand_in(args.endpoint_url), tempfile.TemporaryDirectory() as tmpdir:
+        session = boto3.Session(region_name=args.region)
+        client = session.client("s3", endpoint_url=args.endpoint_url or None)
+        with contextlib.suppress(client.exceptions.BucketAlreadyOwnedByYou):
+            client.create_bucket(
+                Bucket=args.bucket,
+                CreateBucketConfiguration={"LocationConstraint": args.region},
+            )
+        src = os.path.join(tmpdir, "src")
+        dst = os.path.join(tmpdir, "dst")
+        with open(src, "wb") as f:
+            f.write(data)
+
+        print(
+            f"{'setting':>10} {'upload_blob':>12} {'download_blob':>14}"
+            f" {'upload_file':>12} {'download_file':>14}  (MB/s)"
+        )
+        for setting in args.settings:
+            concurrency, chunksize = parse_setting(setting)
+            s3 = S3(
+                session,
+                S3Config(
+                    multipart_chunksize=chunksize,
+                    max_concurrency=concurrency,
+                    endpoint_url=args.endpoint_url or None,
+                ),
+            )
+            url = f"s3://{args.bucket}/s3bench/{concurrency}_{chunksize}"
+            times = [
+                timeit(lambda: s3.upload_blob(url, data)),
+                timeit(lambda: s3.download_blob(url)),
+                timeit(lambda: s3.upload_file(src, url)),
+                timeit(lambda: s3.download_file(url, dst)),
+            ]
+            rates = [args.size_mb / t for t in times]
+            print(
+                f"{setting:>10} {rates[0]:>12.1f} {rates[1]:>14.1f}"
+                f" {rates[2]:>12.1f} {rates[3]:>14.1f}"
+            )
+            client.delete_object(Bucket=args.bucket, Key=url.split("/", 3)[3])
+
+
+if __name__ == "__main__":
+    import sys
+
+    main(sys.argv[1:])
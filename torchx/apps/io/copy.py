@@ -8,7 +8,7 @@
 from typing import TypedDict
 
 from torchx.runtime.component import Component
-from torchx.runtime.storage import upload_blob, download_blob
+from torchx.runtime.storage import copy_stream
 
 
 class Config(TypedDict):
@@ -27,4 +27,4 @@ class Copy(Component[Config, Inputs, Outputs]):
     Version: str = "0.1"
 
     def run(self, inputs: Inputs, outputs: Outputs) -> None:
-        upload_blob(outputs["output_path"], download_blob(inputs["input_path"]))
+        copy_stream(inputs["input_path"], outputs["output_path"])
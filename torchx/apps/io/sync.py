@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from typing import Optional, TypedDict
+
+from torchx.runtime.component import Component
+from torchx.runtime.storage import DEFAULT_COPY_WORKERS, sync
+
+
+class Config(TypedDict):
+    max_workers: Optional[int]
+
+
+class Inputs(TypedDict):
+    input_path: str
+
+
+class Outputs(TypedDict):
+    output_path: str
+
+
+class Sync(Component[Config, Inputs, Outputs]):
+    """
+    Syncs the objects under the input path (prefix or directory) to the output
+    path copying only the ones that are missing or changed.
+    """
+
+    Version: str = "0.1"
+
+    def run(self, inputs: Inputs, outputs: Outputs) -> None:
+        stats = sync(
+            inputs["input_path"],
+            outputs["output_path"],
+            self.config["max_workers"] or DEFAULT_COPY_WORKERS,
+        )
+        print(
+            f"copied {stats.copied} objects ({stats.bytes} bytes),"
+            f" skipped {stats.skipped} unchanged objects"
+        )
@@ -6,9 +6,17 @@
 # LICENSE file in the root directory of this source tree.
 
 import unittest
+import unittest.mock as mock
 
 from torchx.apps.io.copy import Copy
-from torchx.runtime.storage import upload_blob, download_blob, temppath
+from torchx.runtime import storage
+from torchx.runtime.storage import (
+    FileProvider,
+    download_blob,
+    get_storage_provider,
+    temppath,
+    upload_blob,
+)
 
 
 class CopyTest(unittest.TestCase):
@@ -20,3 +28,18 @@ class CopyTest(unittest.TestCase):
             c.run(c.inputs, c.outputs)
             out = download_blob(output_path)
             self.assertEqual(out, data)
+
+    def test_copy_unchanged(self) -> None:
+        provider = FileProvider(checksum="md5")
+        with mock.patch.dict(storage._PROVIDERS, {"file": provider}):
+            with temppath() as input_path, temppath() as output_path:
+                upload_blob(input_path, b"banana")
+                if get_storage_provider(input_path).stored_checksum(input_path) is None:
+                    self.skipTest("extended attributes are not supported")
+                for _ in range(2):
+                    c = Copy(input_path=input_path, output_path=output_path)
+                    c.run(c.inputs, c.outputs)
+                self.assertEqual(download_blob(output_path), b"banana")
+        # the output of the first run is checksummed, the second is skipped
+        self.assertEqual(provider.stats.uploads_skipped, 1)
+        self.assertEqual(provider.stats.bytes_skipped, 6)
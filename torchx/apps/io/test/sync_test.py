@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import tempfile
+import unittest
+
+from torchx.apps.io.sync import Sync
+from torchx.runtime.storage import download_blob, upload_blob
+
+
+class SyncTest(unittest.TestCase):
+    def test_sync(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            input_path = f"file://{tmpdir}/input"
+            output_path = f"file://{tmpdir}/output"
+            os.makedirs(os.path.join(tmpdir, "input", "sub"))
+            upload_blob(f"{input_path}/foo", b"foo")
+            upload_blob(f"{input_path}/sub/bar", b"bar")
+
+            c = Sync(input_path=input_path, output_path=output_path, max_workers=2)
+            c.run(c.inputs, c.outputs)
+            self.assertEqual(download_blob(f"{output_path}/foo"), b"foo")
+            self.assertEqual(download_blob(f"{output_path}/sub/bar"), b"bar")
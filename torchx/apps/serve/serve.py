@@ -56,6 +56,14 @@ def parse_args(argv: List[str]) -> argparse.Namespace:
         help="timeout for requests to management api",
         default=60,
     )
+    parser.add_argument(
+        "--port",
+        type=int,
+        help="port to serve the model file (to torchserve) on, defaults to the"
+        " model-download port allocated by the local scheduler (if any) or 8222",
+        # exported by the local scheduler when it allocates the role's port_map
+        default=int(os.getenv("TORCHX_PORT_MODEL_DOWNLOAD", "8222")),
+    )
 
     # arguments from https://pytorch.org/serve/management_api.html#register-a-model
     for param in TORCHSERVE_PARAMS:
@@ -98,7 +106,7 @@ def main(argv: List[str]) -> None:
         assert len(rpaths) == 1, "must have single path"
         fs.get(rpaths[0], model_path)
 
-        addr = ("", 8222)
+        addr = ("", args.port)
         print(f"starting HTTP server at {addr}...")
 
         handler_class = partial(SimpleHTTPRequestHandler, directory=tmpdir)
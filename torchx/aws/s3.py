@@ -5,30 +5,491 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+import asyncio
+import contextlib
+import gzip
+import importlib.util
+import io
 import logging
 import os
+import re
 import shutil
 import tarfile as tar
 import tempfile
-from typing import Tuple
+import weakref
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, fields
+from types import ModuleType
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    IO,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
 from urllib.parse import urlparse
 
 import boto3
 import botocore
-from torchx.runtime.storage import register_storage_provider, StorageProvider
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as ClientConfig
+from botocore.exceptions import ClientError
+from torchx.runtime import checksum as checksums
+from torchx.runtime.async_storage import (
+    AsyncReader,
+    AsyncStorageProvider,
+    register_async_storage_provider,
+)
+from torchx.runtime.storage import (
+    ObjectInfo,
+    register_storage_provider,
+    StorageProvider,
+    TransferStats,
+)
 
 
 log: logging.Logger = logging.getLogger(__name__)
 
+# default size of the parts of the multipart transfers
+# (S3 requires all but the last part of an upload to be at least 5 MiB)
+DEFAULT_PART_SIZE: int = 8 * 1024 * 1024
+MIN_PART_SIZE: int = 5 * 1024 * 1024
+
+# compression codec of the directory tarballs uploaded by ``S3.cp`` -> suffix
+TAR_SUFFIXES: Dict[str, str] = {"none": ".tar", "gzip": ".tar.gz", "zstd": ".tar.zst"}
+
+# size of the blocks that are gzip compressed in parallel by ``S3.cp``
+GZIP_BLOCK_SIZE: int = 4 * 1024 * 1024
+
+# user metadata key (``x-amz-meta-torchx-checksum``) of the object checksums
+CHECKSUM_METADATA: str = "torchx-checksum"
+
+# Content-Range: bytes <start>-<end>/<size>
+_CONTENT_RANGE: "re.Pattern[str]" = re.compile(r"bytes \d+-\d+/(\d+)")
+
+
+@dataclass
+class S3Config:
+    """
+    Transfer settings of the ``S3`` storage provider. They are set from the
+    args of the plugin in the torchx config (see ``torchx.runtime.plugins``):
+
+    .. code:: yaml
+
+        plugins:
+          torchx.aws.s3:
+            multipart_chunksize: 16777216
+            max_concurrency: 32
+
+    Objects larger than ``multipart_threshold`` bytes are transferred in
+    ``multipart_chunksize`` parts (multipart uploads and ranged GETs) with up to
+    ``max_concurrency`` threads over a connection pool (shared by all the
+    transfers of the provider) of ``max_pool_connections`` connections
+    (``max_concurrency`` if unset). ``endpoint_url`` points the provider to an
+    S3 compatible store (e.g. MinIO).
+
+    If ``checksum`` (an algorithm of ``torchx.runtime.checksum``) is set the
+    uploaded objects are checksummed, the checksum is stored in the metadata
+    of the object and uploads of identical contents are skipped. Downloads of
+    objects with a checksum are always verified.
+    """
+
+    multipart_threshold: int = DEFAULT_PART_SIZE
+    multipart_chunksize: int = DEFAULT_PART_SIZE
+    max_concurrency: int = 10
+    max_pool_connections: Optional[int] = None
+    endpoint_url: Optional[str] = None
+    checksum: Optional[str] = None
+
+    def __post_init__(self) -> None:
+        checksums.check_algorithm(self.checksum)
+        if self.multipart_chunksize < MIN_PART_SIZE:
+            raise ValueError(
+                f"multipart_chunksize: {self.multipart_chunksize}"
+                f" is less than the S3 minimum: {MIN_PART_SIZE}"
+            )
+        if self.multipart_threshold < 1:
+            raise ValueError(
+                f"multipart_threshold: {self.multipart_threshold} must be positive"
+            )
+        if self.max_concurrency < 1:
+            raise ValueError(
+                f"max_concurrency: {self.max_concurrency} must be positive"
+            )
+
+    @property
+    def pool_size(self) -> int:
+        return self.max_pool_connections or self.max_concurrency
+
+    def transfer_config(self) -> TransferConfig:
+        return TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_chunksize,
+            max_concurrency=self.max_concurrency,
+            use_threads=self.max_concurrency > 1,
+        )
+
+    @classmethod
+    def from_args(cls, args: Optional[Dict[str, object]]) -> "S3Config":
+        """
+        Parses the (yaml) args of the plugin, ``None`` is the default config.
+        """
+        if args is None:
+            return cls()
+        if not isinstance(args, dict):
+            raise TypeError(f"torchx.aws.s3 args must be a dict: {args}")
+        names = {f.name for f in fields(cls)}
+        unknown = args.keys() - names
+        if unknown:
+            raise ValueError(
+                f"unknown torchx.aws.s3 args: {sorted(unknown)}, valid: {sorted(names)}"
+            )
+        # pyre-ignore [6]: types are checked by __post_init__
+        return cls(**args)
+
+
+# forward seeks up to this many bytes read (and discard) the open body
+# instead of issuing a new ranged GET
+_SEEK_READAHEAD: int = 64 * 1024
+
+
+class _S3Reader(io.RawIOBase):
+    """
+    Reads the body of an S3 object as it is streamed from ``get_object``.
+    Seeking (other than short forward seeks) re-opens the body at the new
+    position with a ranged GET pinned to the ETag of the object when opened.
+    """
+
+    def __init__(self, s3: botocore.client.BaseClient, bucket: str, key: str) -> None:
+        super().__init__()
+        self._s3 = s3
+        self._bucket = bucket
+        self._key = key
+        self._pos = 0
+        # pyre-ignore [4]: botocore StreamingBody
+        self._body = None
+        self._body_pos = 0
+        resp = s3.get_object(Bucket=bucket, Key=key)
+        self._body = resp["Body"]
+        self._size: int = resp["ContentLength"]
+        self._etag: str = resp["ETag"]
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._size + offset
+        else:
+            raise ValueError(f"invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"negative seek position: {pos}")
+        self._pos = pos
+        return pos
+
+    def _open(self) -> None:
+        if self._body is not None:
+            self._body.close()
+        self._body = self._s3.get_object(
+            Bucket=self._bucket,
+            Key=self._key,
+            Range=f"bytes={self._pos}-",
+            IfMatch=self._etag,
+        )["Body"]
+        self._body_pos = self._pos
+
+    # pyre-ignore [14]: buffer is a writable bytes-like object
+    def readinto(self, b: Any) -> int:
+        if self._pos >= self._size:
+            return 0
+        skip = self._pos - self._body_pos
+        if self._body is None or not 0 <= skip <= _SEEK_READAHEAD:
+            self._open()
+        elif skip:
+            self._body.read(skip)
+            self._body_pos = self._pos
+
+        data = self._body.read(len(b))
+        n = len(data)
+        b[:n] = data
+        self._pos += n
+        self._body_pos += n
+        return n
+
+    def close(self) -> None:
+        if not self.closed and self._body is not None:
+            self._body.close()
+        super().close()
+
+
+class _S3Writer(io.RawIOBase):
+    """
+    Uploads the writes to an S3 object as the parts of a multipart upload
+    of ``part_size`` bytes. The parts are uploaded on ``max_concurrency``
+    threads while the next ones are written, at most ``max_concurrency``
+    parts are in flight (hence in memory) besides the one being buffered.
+    The upload is completed with the parts in order on close and aborted
+    once a part fails. Objects smaller than a part are uploaded with
+    a single ``put_object`` on close.
+    """
+
+    def __init__(
+        self,
+        s3: botocore.client.BaseClient,
+        bucket: str,
+        key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        max_concurrency: int = 1,
+    ) -> None:
+        super().__init__()
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(
+                f"part_size: {part_size} is less than the S3 minimum: {MIN_PART_SIZE}"
+            )
+        self._s3 = s3
+        self._bucket = bucket
+        self._key = key
+        self._part_size = part_size
+        self._max_concurrency: int = max(1, max_concurrency)
+        self._buf = bytearray()
+        self._upload_id: Optional[str] = None
+        # the parts in order and the ones in flight
+        self._parts: List["Future[Dict[str, Any]]"] = []
+        self._pending: Set["Future[Dict[str, Any]]"] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def writable(self) -> bool:
+        return True
+
+    # pyre-ignore [14]: b is a bytes-like object
+    def write(self, b: Any) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buf += b
+        try:
+            while len(self._buf) >= self._part_size:
+                self._upload_part(bytes(self._buf[: self._part_size]))
+                del self._buf[: self._part_size]
+        except Exception:
+            self.abort()
+            raise
+        return len(b)
+
+    def _upload_part(self, data: bytes) -> None:
+        if self._upload_id is None:
+            self._upload_id = self._s3.create_multipart_upload(
+                Bucket=self._bucket, Key=self._key
+            )["UploadId"]
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_concurrency, thread_name_prefix="s3_part"
+            )
+        self._wait(self._max_concurrency - 1)
+        part_number = len(self._parts) + 1
+        executor = self._executor
+        assert executor is not None
+        future = executor.submit(self._put_part, part_number, data)
+        self._parts.append(future)
+        self._pending.add(future)
+
+    def _put_part(self, part_number: int, data: bytes) -> Dict[str, Any]:
+        resp = self._s3.upload_part(
+            Bucket=self._bucket,
+            Key=self._key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=data,
+        )
+        return {"ETag": resp["ETag"], "PartNumber": part_number}
+
+    def _wait(self, max_pending: int) -> None:
+        """
+        Waits until at most ``max_pending`` parts are in flight, raises the
+        error of the first part that failed.
+        """
+        while True:
+            done = {future for future in self._pending if future.done()}
+            self._pending -= done
+            for future in done:
+                future.result()
+            if len(self._pending) <= max_pending:
+                return
+            wait(self._pending, return_when=FIRST_COMPLETED)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self._s3.put_object(
+                    Bucket=self._bucket, Key=self._key, Body=bytes(self._buf)
+                )
+            else:
+                if self._buf:
+                    self._upload_part(bytes(self._buf))
+                self._wait(0)
+                self._s3.complete_multipart_upload(
+                    Bucket=self._bucket,
+                    Key=self._key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": [f.result() for f in self._parts]},
+                )
+        except Exception:
+            self.abort()
+            raise
+        finally:
+            self._shutdown()
+            self._buf = bytearray()
+            super().close()
+
+    def _shutdown(self) -> None:
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            # waits for the parts being uploaded
+            self._executor.shutdown()
+            self._executor = None
+
+    def abort(self) -> None:
+        """
+        Discards the writes, nothing is uploaded to the object.
+        """
+        # the parts uploaded after the abort would be left behind
+        self._shutdown()
+        if self._upload_id is not None:
+            self._s3.abort_multipart_upload(
+                Bucket=self._bucket, Key=self._key, UploadId=self._upload_id
+            )
+            self._upload_id = None
+        self._buf = bytearray()
+        super().close()
+
+    # pyre-ignore [2]: same as IOBase.__exit__
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
+
+
+def _zstd() -> ModuleType:
+    try:
+        return importlib.import_module("zstandard")
+    except ModuleNotFoundError:
+        raise ValueError(
+            "zstd compression requires the `zstandard` package."
+            " `pip install zstandard` or use gzip compression"
+        )
+
+
+class _ParallelGzipWriter(io.RawIOBase):
+    """
+    Gzip compresses the writes in blocks of ``block_size`` bytes on
+    ``max_workers`` threads (zlib releases the GIL) and writes the compressed
+    blocks in order to ``raw`` as consecutive gzip members, which ``gzip`` and
+    ``tar xzf`` read as a single stream. At most ``2 * max_workers`` blocks
+    are in flight so memory stays bounded regardless of the size of the stream.
+    ``raw`` is not closed.
+    """
+
+    def __init__(
+        self,
+        raw: IO[bytes],
+        max_workers: int,
+        block_size: int = GZIP_BLOCK_SIZE,
+        compresslevel: int = 6,
+    ) -> None:
+        super().__init__()
+        self._raw = raw
+        self._max_pending: int = 2 * max_workers
+        self._block_size = block_size
+        self._compresslevel = compresslevel
+        self._buf = bytearray()
+        self._pending: Deque["Future[bytes]"] = deque()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="gzip"
+        )
+
+    def writable(self) -> bool:
+        return True
+
+    # pyre-ignore [14]: b is a bytes-like object
+    def write(self, b: Any) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        self._buf += b
+        while len(self._buf) >= self._block_size:
+            self._submit(bytes(self._buf[: self._block_size]))
+            del self._buf[: self._block_size]
+        return len(b)
+
+    def _submit(self, block: bytes) -> None:
+        self._pending.append(
+            self._executor.submit(
+                gzip.compress, block, compresslevel=self._compresslevel, mtime=0
+            )
+        )
+        while len(self._pending) > self._max_pending:
+            self._raw.write(self._pending.popleft().result())
+
+    def close(self) -> None:
+        if self.closed:
+            return
+        try:
+            if self._buf:
+                self._submit(bytes(self._buf))
+            while self._pending:
+                self._raw.write(self._pending.popleft().result())
+        finally:
+            for future in self._pending:
+                future.cancel()
+            self._pending.clear()
+            self._buf = bytearray()
+            self._executor.shutdown()
+            super().close()
+
 
 class S3(StorageProvider):
     SCHEME: str = "s3"
 
-    def __init__(self, session: boto3.Session) -> None:
+    def __init__(
+        self, session: boto3.Session, config: Optional[S3Config] = None
+    ) -> None:
         self._session = session
-        self._s3: botocore.client.BaseClient = session.client("s3")
+        self._config: S3Config = config or S3Config()
+        self._transfer_config: TransferConfig = self._config.transfer_config()
+        self._s3: botocore.client.BaseClient = session.client(
+            "s3",
+            endpoint_url=self._config.endpoint_url,
+            config=ClientConfig(max_pool_connections=self._config.pool_size),
+        )
+        self.stats = TransferStats()
 
-    def cp(self, target_path: str, bucket: str, key: str) -> str:
+    def cp(
+        self,
+        target_path: str,
+        bucket: str,
+        key: str,
+        codec: str = "gzip",
+        stream: bool = True,
+    ) -> str:
         """
         Uploads target_path to s3://bucket/key. If the target_path is a file
         then uploads to s3://bucket/key/file_name, if the target_path is a
@@ -38,20 +499,44 @@ class S3(StorageProvider):
 
         cd target_path && tar xzf /tmp/$(basename target_path).tar.gz *
 
+        The tarball is compressed with ``codec`` (one of ``TAR_SUFFIXES``,
+        which also determines the suffix of the tarball). ``gzip`` compresses
+        blocks in parallel and ``zstd`` (requires ``zstandard``) uses its
+        multi-threaded compressor. If ``stream`` is set the compressed tarball
+        is uploaded (multipart) as it is created, otherwise it is written to
+        a temp file first.
+
         Returns the destination s3 url
         """
 
         target_basename = os.path.basename(target_path)
 
         if os.path.isdir(target_path):
+            if codec not in TAR_SUFFIXES:
+                raise ValueError(
+                    f"Unknown compression: {codec}."
+                    f" Must be one of: {list(TAR_SUFFIXES.keys())}"
+                )
+            tar_basename = f"{target_basename}{TAR_SUFFIXES[codec]}"
+            dest_key = f"{key}/{tar_basename}"
+
+            if stream:
+                log.info(f"Compressing {target_path} into s3://{bucket}/{dest_key}")
+                with _S3Writer(
+                    self._s3,
+                    bucket,
+                    dest_key,
+                    self._config.multipart_chunksize,
+                    self._config.max_concurrency,
+                ) as f:
+                    self._write_tar(target_path, f, codec)
+                return f"s3://{bucket}/{dest_key}"
+
             tmpdir = tempfile.mkdtemp(prefix="torchx_aws_")
-            tar_basename = f"{target_basename}.tar.gz"
             tar_file = os.path.join(tmpdir, tar_basename)
             log.info(f"Compressing {target_path} into {tar_basename}")
-            with tar.open(tar_file, "x:gz") as f:
-                f.add(target_path, arcname="", recursive=True)
-
-            dest_key = f"{key}/{tar_basename}"
+            with open(tar_file, "xb") as f:
+                self._write_tar(target_path, f, codec)
             target_file = tar_file
         else:
             tmpdir = None
@@ -59,33 +544,447 @@ class S3(StorageProvider):
             target_file = target_path
 
         log.info(f"Uploading {target_file} to s3://{bucket}/{dest_key}")
-        self._s3.upload_file(target_file, bucket, dest_key)
+        self._s3.upload_file(
+            target_file, bucket, dest_key, Config=self._transfer_config
+        )
 
         if tmpdir:
             log.info(f"Deleting tmp dir: {tmpdir}")
             shutil.rmtree(tmpdir)
         return f"s3://{bucket}/{dest_key}"
 
+    def _write_tar(self, target_path: str, f: IO[bytes], codec: str) -> None:
+        compressor: ContextManager[IO[bytes]]
+        if codec == "gzip":
+            # pyre-ignore [9]: _ParallelGzipWriter is a (raw) binary file object
+            compressor = _ParallelGzipWriter(f, self._config.max_concurrency)
+        elif codec == "zstd":
+            compressor = (
+                _zstd().ZstdCompressor(threads=-1).stream_writer(f, closefd=False)
+            )
+        else:
+            compressor = contextlib.nullcontext(f)
+
+        with compressor as out, tar.open(fileobj=out, mode="w|") as t:
+            t.add(target_path, arcname="", recursive=True)
+
     def _parse_url(self, url: str) -> Tuple[str, str]:
         parsed = urlparse(url)
         return parsed.netloc, parsed.path[1:]
 
+    def _get_checksum(self, bucket: str, key: str) -> Optional[str]:
+        try:
+            resp = self._s3.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return None
+            raise
+        return resp.get("Metadata", {}).get(CHECKSUM_METADATA)
+
+    def _unchanged(
+        self, bucket: str, key: str, checksum: Optional[str], size: int
+    ) -> bool:
+        if checksum is not None and self._get_checksum(bucket, key) == checksum:
+            self.stats.record_skip(size)
+            return True
+        return False
+
+    def _extra_args(self, checksum: Optional[str]) -> Dict[str, Any]:
+        return {"Metadata": {CHECKSUM_METADATA: checksum}} if checksum else {}
+
     def download_blob(self, url: str) -> bytes:
+        """
+        Downloads objects larger than ``multipart_threshold`` with parallel
+        ranged GETs of ``multipart_chunksize`` bytes. The first GET fetches
+        the first ``multipart_threshold`` bytes hence small objects take a
+        single request.
+        """
+        data, metadata = self._download_blob(url)
+        checksums.verify_bytes(url, metadata.get(CHECKSUM_METADATA), data)
+        self.stats.record_download(len(data))
+        return data
+
+    def _download_blob(self, url: str) -> Tuple[bytes, Dict[str, str]]:
         bucket, path = self._parse_url(url)
-        return self._s3.get_object(Bucket=bucket, Key=path)["Body"].read()
+        config = self._config
+        if config.max_concurrency == 1:
+            resp = self._s3.get_object(Bucket=bucket, Key=path)
+            return resp["Body"].read(), resp.get("Metadata", {})
+
+        try:
+            resp = self._s3.get_object(
+                Bucket=bucket,
+                Key=path,
+                Range=f"bytes=0-{config.multipart_threshold - 1}",
+            )
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "InvalidRange":
+                raise
+            # no range is satisfiable for an empty object
+            resp = self._s3.get_object(Bucket=bucket, Key=path)
+            return resp["Body"].read(), resp.get("Metadata", {})
+
+        head = resp["Body"].read()
+        metadata = resp.get("Metadata", {})
+        match = _CONTENT_RANGE.fullmatch(resp.get("ContentRange", ""))
+        if not match or int(match.group(1)) <= len(head):
+            # the whole object (the store may also ignore the range)
+            return head, metadata
+
+        size = int(match.group(1))
+        etag = resp["ETag"]
+        buf = bytearray(size)
+        buf[: len(head)] = head
+        view = memoryview(buf)
+
+        def fetch(start: int) -> None:
+            end = min(start + config.multipart_chunksize, size)
+            body = self._s3.get_object(
+                Bucket=bucket,
+                Key=path,
+                Range=f"bytes={start}-{end - 1}",
+                # fail (instead of mixing versions) if the object is overwritten
+                IfMatch=etag,
+            )["Body"].read()
+            if len(body) != end - start:
+                raise IOError(
+                    f"{url}: expected {end - start} bytes at {start}, got {len(body)}"
+                )
+            view[start:end] = body
+
+        starts = range(len(head), size, config.multipart_chunksize)
+        with ThreadPoolExecutor(
+            max_workers=min(config.max_concurrency, len(starts))
+        ) as executor:
+            # consume the results to raise the errors of the fetches
+            list(executor.map(fetch, starts))
+        return bytes(buf), metadata
 
     def upload_blob(self, url: str, body: bytes) -> None:
         bucket, path = self._parse_url(url)
-        self._s3.put_object(Bucket=bucket, Key=path, Body=body)
+        algorithm = self._config.checksum
+        checksum = algorithm and checksums.checksum_bytes(algorithm, body)
+        if self._unchanged(bucket, path, checksum, len(body)):
+            return
+        extra_args = self._extra_args(checksum)
+        if len(body) > self._config.multipart_threshold:
+            self._s3.upload_fileobj(
+                io.BytesIO(body),
+                bucket,
+                path,
+                ExtraArgs=extra_args,
+                Config=self._transfer_config,
+            )
+        else:
+            self._s3.put_object(Bucket=bucket, Key=path, Body=body, **extra_args)
+        self.stats.record_upload(len(body))
 
     def download_file(self, url: str, path: str) -> None:
         bucket, remote_path = self._parse_url(url)
-        self._s3.download_file(bucket, remote_path, path)
+        expected = self._get_checksum(bucket, remote_path)
+        self._s3.download_file(bucket, remote_path, path, Config=self._transfer_config)
+        checksums.verify_file(url, expected, path)
+        self.stats.record_download(os.path.getsize(path))
 
     def upload_file(self, path: str, url: str) -> None:
         bucket, remote_path = self._parse_url(url)
-        self._s3.upload_file(path, bucket, remote_path)
+        size = os.path.getsize(path)
+        algorithm = self._config.checksum
+        checksum = algorithm and checksums.checksum_file(algorithm, path)
+        if self._unchanged(bucket, remote_path, checksum, size):
+            return
+        self._s3.upload_file(
+            path,
+            bucket,
+            remote_path,
+            ExtraArgs=self._extra_args(checksum),
+            Config=self._transfer_config,
+        )
+        self.stats.record_upload(size)
+
+    def version(self, url: str) -> Optional[str]:
+        bucket, path = self._parse_url(url)
+        return self._s3.head_object(Bucket=bucket, Key=path)["ETag"]
+
+    def stored_checksum(self, url: str) -> Optional[str]:
+        return self._get_checksum(*self._parse_url(url))
+
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        bucket, path = self._parse_url(prefix)
+        key_prefix = f"{path.rstrip('/')}/" if path else ""
+        paginator = self._s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=key_prefix):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if key.endswith("/"):
+                    continue  # "directory" marker
+                yield ObjectInfo(
+                    path=key[len(key_prefix) :],
+                    size=obj["Size"],
+                    mtime=obj["LastModified"].timestamp(),
+                    etag=obj["ETag"],
+                )
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        """
+        Copies the object on the server side (multipart for large objects).
+        """
+        src_bucket, src_path = self._parse_url(src_url)
+        bucket, path = self._parse_url(dst_url)
+        self._s3.copy(
+            {"Bucket": src_bucket, "Key": src_path},
+            bucket,
+            path,
+            Config=self._transfer_config,
+        )
+
+    def download_range(self, url: str, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        bucket, path = self._parse_url(url)
+        try:
+            return self._s3.get_object(
+                Bucket=bucket, Key=path, Range=f"bytes={offset}-{offset + length - 1}"
+            )["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "InvalidRange":
+                raise
+            # the offset is past the end of the object
+            return b""
+
+    def open_read(self, url: str) -> IO[bytes]:
+        """
+        Returns a seekable file object that streams the object.
+        """
+        bucket, path = self._parse_url(url)
+        return io.BufferedReader(_S3Reader(self._s3, bucket, path))
+
+    def open_write(self, url: str, part_size: Optional[int] = None) -> IO[bytes]:
+        bucket, path = self._parse_url(url)
+        # pyre-ignore [7]: _S3Writer is a (raw) binary file object
+        return _S3Writer(
+            self._s3,
+            bucket,
+            path,
+            part_size or self._config.multipart_chunksize,
+            self._config.max_concurrency,
+        )
+
+
+def _aiobotocore(module: str) -> ModuleType:
+    try:
+        return importlib.import_module(f"aiobotocore.{module}")
+    except ModuleNotFoundError:
+        raise ValueError(
+            "AsyncS3 requires the `aiobotocore` package. `pip install aiobotocore`"
+            " or use the (adapted) blocking S3 provider"
+        )
+
+
+def _read_range(path: str, offset: int, size: int) -> bytes:
+    with open(path, "rb") as f:
+        return os.pread(f.fileno(), size, offset)
+
+
+class _AsyncS3Reader(AsyncReader):
+    # pyre-ignore [2]: aiobotocore StreamingBody
+    def __init__(self, body) -> None:
+        # pyre-ignore [4]
+        self._body = body
+
+    async def read(self, size: int = -1) -> bytes:
+        return await self._body.read(size if size >= 0 else None)
+
+    async def close(self) -> None:
+        self._body.close()
+
+
+class AsyncS3(AsyncStorageProvider):
+    """
+    Native asyncio S3 provider (requires ``aiobotocore``) with the transfer
+    settings of ``S3Config``. Files larger than ``multipart_threshold`` are
+    uploaded with up to ``max_concurrency`` concurrent part uploads. A client
+    is created per event loop, ``close()`` the provider to close the client
+    of the running loop. Checksums are handled the same as by ``S3`` (the
+    transfers are recorded in ``stats``, e.g. shared with the ``S3`` provider).
+    """
+
+    SCHEME: str = "s3"
+
+    def __init__(
+        self, config: Optional[S3Config] = None, stats: Optional[TransferStats] = None
+    ) -> None:
+        self._config: S3Config = config or S3Config()
+        self.stats: TransferStats = stats or TransferStats()
+        # pyre-ignore [4]: aiobotocore session
+        self._session = _aiobotocore("session").get_session()
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[Any, Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    async def _client(self) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop not in self._clients:
+            ctx = self._session.create_client(
+                "s3",
+                endpoint_url=self._config.endpoint_url,
+                config=_aiobotocore("config").AioConfig(
+                    max_pool_connections=self._config.pool_size
+                ),
+            )
+            self._clients[loop] = (ctx, await ctx.__aenter__())
+        return self._clients[loop][1]
+
+    async def close(self) -> None:
+        loop = asyncio.get_running_loop()
+        if loop in self._clients:
+            ctx, _ = self._clients.pop(loop)
+            await ctx.__aexit__(None, None, None)
+
+    def _parse_url(self, url: str) -> Tuple[str, str]:
+        parsed = urlparse(url)
+        return parsed.netloc, parsed.path[1:]
+
+    async def _get_checksum(self, bucket: str, key: str) -> Optional[str]:
+        client = await self._client()
+        try:
+            resp = await client.head_object(Bucket=bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey"):
+                return None
+            raise
+        return resp.get("Metadata", {}).get(CHECKSUM_METADATA)
+
+    async def _checksum(
+        self, fn: Callable[[str, Any], str], data: object
+    ) -> Optional[str]:
+        algorithm = self._config.checksum
+        if not algorithm:
+            return None
+        # hashing is CPU bound, keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, fn, algorithm, data
+        )
+
+    async def _unchanged(
+        self, bucket: str, key: str, checksum: Optional[str], size: int
+    ) -> bool:
+        if checksum is not None and await self._get_checksum(bucket, key) == checksum:
+            self.stats.record_skip(size)
+            return True
+        return False
+
+    def _extra_args(self, checksum: Optional[str]) -> Dict[str, Any]:
+        return {"Metadata": {CHECKSUM_METADATA: checksum}} if checksum else {}
+
+    async def download_blob(self, url: str) -> bytes:
+        bucket, path = self._parse_url(url)
+        client = await self._client()
+        resp = await client.get_object(Bucket=bucket, Key=path)
+        async with _AsyncS3Reader(resp["Body"]) as f:
+            data = await f.read()
+        expected = resp.get("Metadata", {}).get(CHECKSUM_METADATA)
+        await asyncio.get_running_loop().run_in_executor(
+            None, checksums.verify_bytes, url, expected, data
+        )
+        self.stats.record_download(len(data))
+        return data
+
+    async def upload_blob(self, url: str, body: bytes) -> None:
+        bucket, path = self._parse_url(url)
+        checksum = await self._checksum(checksums.checksum_bytes, body)
+        if await self._unchanged(bucket, path, checksum, len(body)):
+            return
+        await self._put(bucket, path, body, checksum)
+
+    async def _put(
+        self, bucket: str, key: str, body: bytes, checksum: Optional[str]
+    ) -> None:
+        client = await self._client()
+        await client.put_object(
+            Bucket=bucket, Key=key, Body=body, **self._extra_args(checksum)
+        )
+        self.stats.record_upload(len(body))
+
+    async def download_file(self, url: str, path: str) -> None:
+        loop = asyncio.get_running_loop()
+        bucket, key = self._parse_url(url)
+        client = await self._client()
+        resp = await client.get_object(Bucket=bucket, Key=key)
+        with open(path, "wb") as out:
+            async with _AsyncS3Reader(resp["Body"]) as f:
+                async for chunk in f:
+                    await loop.run_in_executor(None, out.write, chunk)
+        expected = resp.get("Metadata", {}).get(CHECKSUM_METADATA)
+        await loop.run_in_executor(None, checksums.verify_file, url, expected, path)
+        self.stats.record_download(os.path.getsize(path))
+
+    async def upload_file(self, path: str, url: str) -> None:
+        loop = asyncio.get_running_loop()
+        size = os.path.getsize(path)
+        bucket, key = self._parse_url(url)
+        checksum = await self._checksum(checksums.checksum_file, path)
+        if await self._unchanged(bucket, key, checksum, size):
+            return
+        if size <= self._config.multipart_threshold:
+            body = await loop.run_in_executor(None, _read_range, path, 0, size)
+            await self._put(bucket, key, body, checksum)
+            return
+
+        client = await self._client()
+        upload_id = (
+            await client.create_multipart_upload(
+                Bucket=bucket, Key=key, **self._extra_args(checksum)
+            )
+        )["UploadId"]
+        part_size = self._config.multipart_chunksize
+        semaphore = asyncio.Semaphore(self._config.max_concurrency)
+
+        async def upload_part(part_number: int) -> Dict[str, Any]:
+            async with semaphore:
+                offset = (part_number - 1) * part_size
+                data = await loop.run_in_executor(
+                    None, _read_range, path, offset, part_size
+                )
+                resp = await client.upload_part(
+                    Bucket=bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    PartNumber=part_number,
+                    Body=data,
+                )
+                return {"ETag": resp["ETag"], "PartNumber": part_number}
+
+        num_parts = (size + part_size - 1) // part_size
+        tasks = [asyncio.ensure_future(upload_part(i)) for i in range(1, num_parts + 1)]
+        try:
+            parts = await asyncio.gather(*tasks)
+            await client.complete_multipart_upload(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await client.abort_multipart_upload(
+                Bucket=bucket, Key=key, UploadId=upload_id
+            )
+            raise
+        self.stats.record_upload(size)
+
+    async def open_read(self, url: str) -> AsyncReader:
+        bucket, path = self._parse_url(url)
+        client = await self._client()
+        resp = await client.get_object(Bucket=bucket, Key=path)
+        return _AsyncS3Reader(resp["Body"])
 
 
-def init_plugin(args: None) -> None:
-    register_storage_provider(S3(boto3.Session()))
+def init_plugin(args: Optional[Dict[str, object]]) -> None:
+    config = S3Config.from_args(args)
+    s3 = S3(boto3.Session(), config)
+    register_storage_provider(s3)
+    if importlib.util.find_spec("aiobotocore"):
+        # shares the stats so that transfer_stats() covers the async transfers
+        register_async_storage_provider(AsyncS3(config, s3.stats))
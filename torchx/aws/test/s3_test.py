@@ -4,26 +4,57 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+import gzip
+import importlib.util
+import io
 import os.path
+import tarfile
 import tempfile
+import threading
+import time
 import unittest
 import unittest.mock as mock
 from typing import Dict
 
 import boto3
 from moto import mock_s3
-from torchx.aws.s3 import init_plugin
+from torchx.aws.s3 import (
+    AsyncS3,
+    MIN_PART_SIZE,
+    S3,
+    S3Config,
+    _ParallelGzipWriter,
+    _S3Writer,
+    init_plugin,
+)
+from torchx.runtime.async_storage import (
+    _ASYNC_PROVIDERS,
+    AsyncStorageProvider,
+    fetch_blobs,
+)
+from torchx.runtime.checksum import ChecksumMismatchError, checksum_bytes
 from torchx.runtime.storage import (
     _PROVIDERS,
     StorageProvider,
     download_blob,
     download_file,
+    list_objects,
+    open_read,
+    open_write,
+    sync,
     upload_blob,
     upload_file,
 )
 
 
 _EMPTY_MAP: Dict[str, StorageProvider] = {}
+_EMPTY_ASYNC_MAP: Dict[str, AsyncStorageProvider] = {}
+
+# moto does not decode the (aws-chunked) checksummed uploads that newer
+# botocore versions send by default
+_no_chunked_checksums = mock.patch.dict(
+    os.environ, {"AWS_REQUEST_CHECKSUM_CALCULATION": "when_required"}
+)
 
 
 class S3Test(unittest.TestCase):
@@ -65,3 +96,402 @@ class S3Test(unittest.TestCase):
                 out_data = f.read()
 
         self.assertEqual(out_data, data)
+
+    @mock.patch.dict(_PROVIDERS, _EMPTY_MAP)
+    @mock_s3
+    def test_storage_provider_stream(self) -> None:
+        self._create_bucket()
+        init_plugin(None)
+        path = "s3://bucket/path"
+
+        with open_write(path) as f:
+            f.write(b"foo")
+        with open_read(path) as f:
+            self.assertEqual(f.read(), b"foo")
+
+    @mock.patch.dict(_PROVIDERS, _EMPTY_MAP)
+    @_no_chunked_checksums
+    @mock_s3
+    def test_storage_provider_stream_multipart(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        path = "s3://bucket/path"
+        # two full parts and a partial one
+        data = os.urandom(2 * MIN_PART_SIZE + 1024)
+
+        with s3.open_write(path, part_size=MIN_PART_SIZE) as f:
+            for i in range(0, len(data), 1024 * 1024):
+                f.write(data[i : i + 1024 * 1024])
+
+        self.assertEqual(b"".join(s3.iter_chunks(path)), data)
+        with s3.open_read(path) as f:
+            self.assertEqual(f.read(10), data[:10])
+            self.assertEqual(f.read(), data[10:])
+
+    @mock.patch.dict(_PROVIDERS, _EMPTY_MAP)
+    @mock_s3
+    def test_storage_provider_stream_abort(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        path = "s3://bucket/path"
+
+        with self.assertRaises(RuntimeError):
+            with s3.open_write(path, part_size=MIN_PART_SIZE) as f:
+                f.write(os.urandom(MIN_PART_SIZE + 1))
+                raise RuntimeError("failed")
+
+        client = boto3.Session().client("s3", region_name="us-west-2")
+        self.assertNotIn("Contents", client.list_objects_v2(Bucket="bucket"))
+        self.assertNotIn("Uploads", client.list_multipart_uploads(Bucket="bucket"))
+
+        with self.assertRaises(ValueError):
+            s3.open_write(path, part_size=1024)
+
+    def test_s3_writer_parallel(self) -> None:
+        client = mock.MagicMock()
+        client.create_multipart_upload.return_value = {"UploadId": "id"}
+        lock = threading.Lock()
+        in_flight = []
+        max_in_flight = []
+
+        def upload_part(PartNumber: int, **kwargs: object) -> Dict[str, str]:
+            with lock:
+                in_flight.append(PartNumber)
+                max_in_flight.append(len(in_flight))
+            # the later parts finish first
+            time.sleep(0.05 / PartNumber)
+            with lock:
+                in_flight.remove(PartNumber)
+            return {"ETag": f"etag{PartNumber}"}
+
+        client.upload_part.side_effect = upload_part
+        with _S3Writer(client, "bucket", "key", MIN_PART_SIZE, max_concurrency=3) as f:
+            for _ in range(8):
+                f.write(b"a" * MIN_PART_SIZE)
+
+        self.assertEqual(3, max(max_in_flight))
+        client.complete_multipart_upload.assert_called_once_with(
+            Bucket="bucket",
+            Key="key",
+            UploadId="id",
+            MultipartUpload={
+                "Parts": [{"ETag": f"etag{i}", "PartNumber": i} for i in range(1, 9)]
+            },
+        )
+        client.abort_multipart_upload.assert_not_called()
+
+    def test_s3_writer_part_failed(self) -> None:
+        client = mock.MagicMock()
+        client.create_multipart_upload.return_value = {"UploadId": "id"}
+
+        def upload_part(PartNumber: int, **kwargs: object) -> Dict[str, str]:
+            if PartNumber == 2:
+                raise IOError("part failed")
+            return {"ETag": f"etag{PartNumber}"}
+
+        client.upload_part.side_effect = upload_part
+        with self.assertRaisesRegex(IOError, "part failed"):
+            with _S3Writer(
+                client, "bucket", "key", MIN_PART_SIZE, max_concurrency=2
+            ) as f:
+                for _ in range(8):
+                    f.write(b"a" * MIN_PART_SIZE)
+
+        # the writes stop at the first failed part
+        self.assertLess(client.upload_part.call_count, 8)
+        client.complete_multipart_upload.assert_not_called()
+        client.abort_multipart_upload.assert_called_once_with(
+            Bucket="bucket", Key="key", UploadId="id"
+        )
+
+    def test_config_from_args(self) -> None:
+        self.assertEqual(S3Config.from_args(None), S3Config())
+        config = S3Config.from_args(
+            {"multipart_chunksize": MIN_PART_SIZE, "max_concurrency": 4}
+        )
+        self.assertEqual(config.multipart_chunksize, MIN_PART_SIZE)
+        self.assertEqual(config.pool_size, 4)
+        self.assertEqual(config.transfer_config().max_request_concurrency, 4)
+
+        with self.assertRaisesRegex(ValueError, "unknown"):
+            S3Config.from_args({"chunksize": MIN_PART_SIZE})
+        with self.assertRaises(TypeError):
+            S3Config.from_args(["max_concurrency"])  # pyre-ignore [6]
+        with self.assertRaises(ValueError):
+            S3Config.from_args({"multipart_chunksize": 1024})
+        with self.assertRaises(ValueError):
+            S3Config.from_args({"max_concurrency": 0})
+
+    @mock.patch.dict(_PROVIDERS, _EMPTY_MAP)
+    @_no_chunked_checksums
+    @mock_s3
+    def test_storage_provider_ranged_download(self) -> None:
+        self._create_bucket()
+        init_plugin(
+            {
+                "multipart_threshold": 1024,
+                "multipart_chunksize": MIN_PART_SIZE,
+                "max_concurrency": 4,
+            }
+        )
+        provider = _PROVIDERS["s3"]
+        assert isinstance(provider, S3)
+        path = "s3://bucket/path"
+        data = os.urandom(2 * MIN_PART_SIZE + 2048)
+
+        for body in [b"", b"foo", data]:
+            upload_blob(path, body)
+            with mock.patch.object(
+                provider._s3, "get_object", wraps=provider._s3.get_object
+            ) as get_object:
+                self.assertEqual(download_blob(path), body)
+            if len(body) > 1024:
+                # the first 1024 bytes then the parts
+                self.assertEqual(get_object.call_count, 4)
+            else:
+                self.assertLessEqual(get_object.call_count, 2)
+
+    def test_parallel_gzip_writer(self) -> None:
+        data = os.urandom(1024) * 100
+        out = io.BytesIO()
+        with _ParallelGzipWriter(out, max_workers=2, block_size=1000) as f:
+            for i in range(0, len(data), 700):
+                f.write(data[i : i + 700])
+        self.assertEqual(gzip.decompress(out.getvalue()), data)
+
+    def _cp_dir(self, codec: str, stream: bool) -> None:
+        s3 = S3(boto3.Session())
+        # incompressible so that the tarball takes a multipart upload
+        data = os.urandom(MIN_PART_SIZE + 1024)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            target = os.path.join(tmpdir, "app")
+            os.makedirs(os.path.join(target, "sub"))
+            with open(os.path.join(target, "big"), "wb") as f:
+                f.write(data)
+            with open(os.path.join(target, "sub", "small"), "wb") as f:
+                f.write(b"foo")
+
+            url = s3.cp(target, "bucket", "key", codec=codec, stream=stream)
+
+        suffix = {"none": ".tar", "gzip": ".tar.gz", "zstd": ".tar.zst"}[codec]
+        self.assertEqual(url, f"s3://bucket/key/app{suffix}")
+        body = s3.download_blob(url)
+        if codec == "zstd":
+            import zstandard
+
+            body = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(body)).read()
+        with tarfile.open(fileobj=io.BytesIO(body), mode="r:*") as t:
+            self.assertEqual(t.extractfile("big").read(), data)
+            self.assertEqual(t.extractfile("sub/small").read(), b"foo")
+
+    @_no_chunked_checksums
+    @mock_s3
+    def test_cp_dir(self) -> None:
+        self._create_bucket()
+        for codec in ["none", "gzip"]:
+            for stream in [True, False]:
+                with self.subTest(codec=codec, stream=stream):
+                    self._cp_dir(codec, stream)
+
+        with self.assertRaisesRegex(ValueError, "Unknown compression"):
+            S3(boto3.Session()).cp(os.path.dirname(__file__), "bucket", "key", "lz4")
+
+    @unittest.skipUnless(importlib.util.find_spec("zstandard"), "requires zstandard")
+    @_no_chunked_checksums
+    @mock_s3
+    def test_cp_dir_zstd(self) -> None:
+        self._create_bucket()
+        self._cp_dir("zstd", stream=True)
+
+    @mock_s3
+    def test_cp_dir_aborted(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with mock.patch("tarfile.TarFile.add", side_effect=OSError("failed")):
+                with self.assertRaises(OSError):
+                    s3.cp(tmpdir, "bucket", "key")
+
+        client = boto3.Session().client("s3", region_name="us-west-2")
+        self.assertNotIn("Contents", client.list_objects_v2(Bucket="bucket"))
+
+    @mock_s3
+    def test_version(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        path = "s3://bucket/path"
+        s3.upload_blob(path, b"foo")
+        version = s3.version(path)
+        self.assertEqual(s3.version(path), version)
+        s3.upload_blob(path, b"bar")
+        self.assertNotEqual(s3.version(path), version)
+
+    @mock.patch.dict(_PROVIDERS, _EMPTY_MAP)
+    @mock_s3
+    def test_sync(self) -> None:
+        self._create_bucket()
+        init_plugin(None)
+        files = {"foo": b"foo", "a/bar": b"bar", "a/b/baz": b"baz"}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "src", "a", "b"))
+            for name, data in files.items():
+                upload_blob(f"file://{tmpdir}/src/{name}", data)
+            upload_blob("s3://bucket/ckpt/stale", b"stale")
+            upload_blob("s3://bucket/ckpt_other/foo", b"other")
+
+            # file -> s3
+            stats = sync(f"file://{tmpdir}/src", "s3://bucket/ckpt")
+            self.assertEqual((stats.copied, stats.skipped), (3, 0))
+            self.assertEqual(
+                sorted(o.path for o in list_objects("s3://bucket/ckpt/")),
+                ["a/b/baz", "a/bar", "foo", "stale"],
+            )
+            stats = sync(f"file://{tmpdir}/src", "s3://bucket/ckpt")
+            self.assertEqual((stats.copied, stats.skipped), (0, 3))
+
+            # s3 -> s3 (server side) compares the etags
+            stats = sync("s3://bucket/ckpt", "s3://bucket/backup")
+            self.assertEqual((stats.copied, stats.skipped), (4, 0))
+            upload_blob("s3://bucket/ckpt/foo", b"FOO")
+            stats = sync("s3://bucket/ckpt", "s3://bucket/backup")
+            self.assertEqual((stats.copied, stats.skipped), (1, 3))
+            self.assertEqual(download_blob("s3://bucket/backup/foo"), b"FOO")
+
+            # s3 -> file
+            stats = sync("s3://bucket/backup", f"file://{tmpdir}/dst")
+            self.assertEqual((stats.copied, stats.skipped), (4, 0))
+            self.assertEqual(download_blob(f"file://{tmpdir}/dst/a/b/baz"), b"baz")
+            self.assertEqual(download_blob(f"file://{tmpdir}/dst/foo"), b"FOO")
+
+    @mock.patch.dict(_PROVIDERS, _EMPTY_MAP)
+    @mock_s3
+    def test_fetch_blobs(self) -> None:
+        self._create_bucket()
+        init_plugin(None)
+        urls = [f"s3://bucket/shard/{i}" for i in range(10)]
+        for i, url in enumerate(urls):
+            upload_blob(url, str(i).encode())
+        self.assertEqual(
+            fetch_blobs(urls, max_concurrency=4), [str(i).encode() for i in range(10)]
+        )
+
+    @unittest.skipUnless(
+        importlib.util.find_spec("aiobotocore"), "requires aiobotocore"
+    )
+    @mock.patch.dict(_PROVIDERS, _EMPTY_MAP)
+    @mock.patch.dict(_ASYNC_PROVIDERS, _EMPTY_ASYNC_MAP)
+    def test_init_plugin_async_stats(self) -> None:
+        init_plugin({"checksum": "md5"})
+        async_s3 = _ASYNC_PROVIDERS["s3"]
+        assert isinstance(async_s3, AsyncS3)
+        # the async transfers are reported along with the blocking ones
+        self.assertIs(async_s3.stats, getattr(_PROVIDERS["s3"], "stats"))
+
+    @mock_s3
+    def test_download_range(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        path = "s3://bucket/path"
+        data = bytes(range(256))
+        s3.upload_blob(path, data)
+
+        self.assertEqual(s3.download_range(path, 10, 5), data[10:15])
+        self.assertEqual(s3.download_range(path, 250, 10), data[250:])
+        self.assertEqual(s3.download_range(path, 300, 10), b"")
+        self.assertEqual(s3.download_range(path, 0, 0), b"")
+
+    @_no_chunked_checksums
+    @mock_s3
+    def test_open_read_seek(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        path = "s3://bucket/path"
+        data = os.urandom(1024 * 1024)
+        s3.upload_blob(path, data)
+
+        with s3.open_read(path) as f:
+            self.assertTrue(f.seekable())
+            self.assertEqual(f.read(10), data[:10])
+            f.seek(512 * 1024)
+            self.assertEqual(f.read(10), data[512 * 1024 : 512 * 1024 + 10])
+            # short forward seek (reads through the open body)
+            f.seek(1000, io.SEEK_CUR)
+            self.assertEqual(f.tell(), 512 * 1024 + 1010)
+            self.assertEqual(f.read(10), data[512 * 1024 + 1010 : 512 * 1024 + 1020])
+            f.seek(-10, io.SEEK_END)
+            self.assertEqual(f.read(), data[-10:])
+            self.assertEqual(f.read(), b"")
+            f.seek(5)
+            self.assertEqual(f.read(5), data[5:10])
+
+    @_no_chunked_checksums
+    @mock_s3
+    def test_open_read_tar_member(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        path = "s3://bucket/archive.tar"
+        members = {"a": os.urandom(1024 * 1024), "b": b"foo"}
+        buf = io.BytesIO()
+        with tarfile.open(fileobj=buf, mode="w") as t:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                t.addfile(info, io.BytesIO(data))
+        s3.upload_blob(path, buf.getvalue())
+
+        with mock.patch.object(s3._s3, "get_object", wraps=s3._s3.get_object) as get:
+            with s3.open_read(path) as f, tarfile.open(fileobj=f, mode="r:") as t:
+                self.assertEqual(t.extractfile("b").read(), b"foo")
+            # the member "a" was skipped with a ranged GET
+            self.assertTrue(any("Range" in c.kwargs for c in get.call_args_list))
+
+    @_no_chunked_checksums
+    @mock_s3
+    def test_checksum(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session(), S3Config(checksum="crc32"))
+        path = "s3://bucket/foo"
+        data = os.urandom(1024)
+
+        s3.upload_blob(path, data)
+        s3.upload_blob(path, data)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "src")
+            with open(src, "wb") as f:
+                f.write(data)
+            s3.upload_file(src, path)
+            self.assertEqual(s3.download_blob(path), data)
+            s3.download_file(path, os.path.join(tmpdir, "dst"))
+
+        stats = s3.stats
+        self.assertEqual((stats.uploads, stats.uploads_skipped), (1, 2))
+        self.assertEqual((stats.bytes_uploaded, stats.bytes_skipped), (1024, 2048))
+        self.assertEqual((stats.downloads, stats.bytes_downloaded), (2, 2048))
+
+        s3.upload_blob(path, b"bar")
+        self.assertEqual(s3.download_blob(path), b"bar")
+        self.assertEqual(stats.uploads, 2)
+        self.assertEqual(s3.stored_checksum(path), checksum_bytes("crc32", b"bar"))
+        self.assertIsNone(s3.stored_checksum("s3://bucket/missing"))
+
+    @_no_chunked_checksums
+    @mock_s3
+    def test_checksum_mismatch(self) -> None:
+        self._create_bucket()
+        s3 = S3(boto3.Session())
+        s3._s3.put_object(
+            Bucket="bucket",
+            Key="foo",
+            Body=b"foo",
+            Metadata={"torchx-checksum": "crc32:00000000"},
+        )
+        with self.assertRaises(ChecksumMismatchError):
+            s3.download_blob("s3://bucket/foo")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaises(ChecksumMismatchError):
+                s3.download_file("s3://bucket/foo", os.path.join(tmpdir, "foo"))
+
+    def test_checksum_config(self) -> None:
+        with self.assertRaises(ValueError):
+            S3Config(checksum="sha0")
@@ -10,8 +10,9 @@ import logging
 import re
 import sys
 import threading
-from queue import Queue
-from typing import Optional
+import time
+from queue import Empty, Queue
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
 from urllib.parse import urlparse
 
 from pyre_extensions import none_throws
@@ -26,9 +27,235 @@ ENDC = "\033[0m"
 
 logger: logging.Logger = logging.getLogger(__name__)
 
+# max number of lines a replica reader pushes to the console writer at a time
+BATCH_LINES: int = 256
 
-def validate(job_identifier: str) -> None:
-    if not re.match(r"^\w+://[^/.]*/[^/.]+/[^/.]+(/(\d+,?)+)?$", job_identifier):
+# the console writer writes (and flushes) once this many chars are buffered
+# or when it runs out of lines to write
+CHUNK_SIZE: int = 256 * 1024
+
+# max number of batches queued up for the console writer
+MAX_QUEUED_BATCHES: int = 1024
+
+# max seconds the lines of a partial batch wait for the console writer
+FLUSH_INTERVAL: float = 0.1
+
+
+def prefix(role_name: str, replica_id: int) -> str:
+    return f"{GREEN}{role_name}/{replica_id}{ENDC} "
+
+
+class LineBatcher:
+    """
+    Batches the lines of a replica for the ``ConsoleWriter``. A batch is pushed
+    once it holds ``batch_lines`` lines, the lines of a partial batch are
+    picked up by the writer every ``flush_interval`` (once the writer is done
+    with the batches queued before it) so that sparse logs (e.g. of a running
+    app) show up promptly.
+    """
+
+    def __init__(self, writer: "ConsoleWriter", prefix: str, batch_lines: int) -> None:
+        self._writer = writer
+        self.prefix = prefix
+        self._batch_lines = batch_lines
+        self._lines: List[str] = []
+        self._lock = threading.Lock()
+        # number of batches queued but not yet taken by the writer
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+    def add(self, line: str) -> None:
+        # held while queueing the batch so that the writer cannot take
+        # (and write) the following lines before it
+        with self._lock:
+            self._lines.append(line)
+            if len(self._lines) >= self._batch_lines:
+                batch, self._lines = self._lines, []
+                self._push(batch)
+
+    def _push(self, batch: List[str]) -> None:
+        if not batch:
+            return
+        with self._queued_lock:
+            self._queued += 1
+        self._writer.write(self.prefix, batch, self)
+
+    def dequeued(self) -> None:
+        """
+        Called by the writer once it took a queued batch of this batcher.
+        """
+        with self._queued_lock:
+            self._queued -= 1
+
+    def take(self) -> List[str]:
+        """
+        Returns (and removes) the lines of the partial batch, none if a batch
+        is being queued (the writer must not block on a full queue) or
+        earlier batches are still queued (they are written first).
+        """
+        if not self._lock.acquire(blocking=False):
+            return []
+        try:
+            with self._queued_lock:
+                if self._queued:
+                    return []
+            batch, self._lines = self._lines, []
+        finally:
+            self._lock.release()
+        return batch
+
+    def close(self) -> None:
+        with self._lock:
+            batch, self._lines = self._lines, []
+            self._push(batch)
+        self._writer._remove_batcher(self)
+
+
+class ConsoleWriter:
+    """
+    Writes the log lines of (possibly) many replicas to the console from a
+    single thread. The replica readers push batches of ``(prefix, lines)``
+    onto a (bounded) queue that the writer drains, coalescing the batches
+    into chunks of up to ``chunk_size`` chars that are written with a single
+    ``write()``. The output is flushed whenever the queue runs empty so that
+    tailed logs show up promptly. The partial batches of the ``LineBatcher`` s
+    are written every ``flush_interval`` seconds.
+
+    Errors raised when writing (e.g. ``BrokenPipeError`` when piped into ``head``)
+    are re-raised to the readers by ``write()`` and by ``close()``.
+    """
+
+    def __init__(
+        self,
+        out: Optional[TextIO] = None,
+        chunk_size: int = CHUNK_SIZE,
+        flush_interval: float = FLUSH_INTERVAL,
+    ) -> None:
+        self._out: TextIO = out or sys.stdout
+        self._chunk_size = chunk_size
+        self._flush_interval = flush_interval
+        self._batchers: List[LineBatcher] = []
+        self._batchers_lock = threading.Lock()
+        # (prefix, lines, batcher), None signals the writer to stop
+        self._batches: "Queue[Optional[Tuple[str, List[str], Optional[LineBatcher]]]]" = Queue(
+            maxsize=MAX_QUEUED_BATCHES
+        )
+        self._error: Optional[Exception] = None
+        self._thread = threading.Thread(
+            target=self._run, name="torchx_log_writer", daemon=True
+        )
+        self._thread.start()
+
+    def write(
+        self, prefix: str, lines: List[str], batcher: Optional[LineBatcher] = None
+    ) -> None:
+        """
+        Queues ``lines`` to be written, each prefixed with ``prefix``
+        (``batcher`` is notified once they are taken off the queue).
+        """
+        if self._error:
+            raise self._error
+        if lines:
+            self._batches.put((prefix, lines, batcher))
+
+    def batcher(self, prefix: str, batch_lines: int) -> LineBatcher:
+        """
+        Returns a ``LineBatcher`` (``close()`` it once done) of the lines
+        to prefix with ``prefix``.
+        """
+        batcher = LineBatcher(self, prefix, batch_lines)
+        with self._batchers_lock:
+            self._batchers.append(batcher)
+        return batcher
+
+    def _remove_batcher(self, batcher: LineBatcher) -> None:
+        with self._batchers_lock:
+            self._batchers.remove(batcher)
+
+    def _take_partial_batches(self) -> List[Tuple[str, List[str]]]:
+        with self._batchers_lock:
+            batchers = list(self._batchers)
+        return [(b.prefix, lines) for b in batchers if (lines := b.take())]
+
+    def close(self) -> None:
+        """
+        Writes the queued lines and stops the writer.
+        """
+        self._batches.put(None)
+        self._thread.join()
+        if self._error:
+            raise self._error
+
+    def _run(self) -> None:
+        done = False
+        last_take = time.monotonic()
+        while not done:
+            chunk = []
+            size = 0
+            try:
+                batches = [self._batches.get(timeout=self._flush_interval)]
+            except Empty:
+                batches = []
+            while batches:
+                batch = batches.pop(0)
+                if batch is None:
+                    done = True
+                    break
+                prefix, lines, batcher = batch
+                if batcher:
+                    batcher.dequeued()
+                text = prefix + ("\n" + prefix).join(lines) + "\n"
+                chunk.append(text)
+                size += len(text)
+                if size >= self._chunk_size:
+                    break
+                try:
+                    batches.append(self._batches.get_nowait())
+                except Empty:
+                    break
+
+            if time.monotonic() - last_take >= self._flush_interval:
+                # the partial batches of the (sparse) replicas
+                last_take = time.monotonic()
+                for prefix, lines in self._take_partial_batches():
+                    chunk.append(prefix + ("\n" + prefix).join(lines) + "\n")
+
+            if self._error:
+                continue  # keep draining so that the readers do not block
+            try:
+                if chunk:
+                    self._out.write("".join(chunk))
+                if done or self._batches.empty():
+                    self._out.flush()
+            except Exception as e:
+                self._error = e
+
+
+def write_batched(
+    writer: ConsoleWriter, prefix: str, lines: Iterator[str], batch_lines: int
+) -> None:
+    """
+    Pushes ``lines`` to ``writer`` in batches of up to ``batch_lines`` lines
+    (partial batches are written after ``FLUSH_INTERVAL``, see ``LineBatcher``).
+    """
+    batcher = writer.batcher(prefix, batch_lines)
+    try:
+        for line in lines:
+            batcher.add(line)
+    finally:
+        batcher.close()
+
+
+def validate(job_identifier: str, merge: bool = False) -> None:
+    if merge:
+        # role name is optional (all roles) when merging
+        if not re.match(r"^\w+://[^/.]*/[^/.]+(/[^/.]+(/(\d+,?)+)?)?$", job_identifier):
+            print(
+                f"{job_identifier} is not of the form SCHEDULER://[SESSION_NAME]/APP_ID/[ROLE_NAME]/[REPLICA_IDS,...]",
+                file=sys.stderr,
+            )
+            sys.exit(1)
+    elif not re.match(r"^\w+://[^/.]*/[^/.]+/[^/.]+(/(\d+,?)+)?$", job_identifier):
         print(
             f"{job_identifier} is not of the form SCHEDULER://[SESSION_NAME]/APP_ID/ROLE_NAME/[REPLICA_IDS,...]",
             file=sys.stderr,
@@ -44,19 +271,46 @@ def print_log_lines(
     regex: str,
     should_tail: bool,
     exceptions: "Queue[Exception]",
+    writer: ConsoleWriter,
 ) -> None:
     try:
-        for line in runner.log_lines(
+        lines = runner.log_lines(
             app_handle, role_name, replica_id, regex, should_tail=should_tail
-        ):
-            print(f"{GREEN}{role_name}/{replica_id}{ENDC} {line}")
+        )
+        write_batched(writer, prefix(role_name, replica_id), lines, BATCH_LINES)
     except Exception as e:
         exceptions.put(e)
         raise
 
 
-def get_logs(identifier: str, regex: Optional[str], should_tail: bool = False) -> None:
-    validate(identifier)
+def print_merged_log_lines(
+    runner: Runner,
+    app_handle: str,
+    replicas: Optional[Dict[str, List[int]]],
+    regex: Optional[str],
+    should_tail: bool,
+) -> None:
+    writer = ConsoleWriter()
+    prefixes: Dict[Tuple[str, int], str] = {}
+    try:
+        for role_name, replica_id, line in runner.merged_log_lines(
+            app_handle, replicas, regex, should_tail=should_tail
+        ):
+            key = (role_name, replica_id)
+            if key not in prefixes:
+                prefixes[key] = prefix(role_name, replica_id)
+            writer.write(prefixes[key], [line])
+    finally:
+        writer.close()
+
+
+def get_logs(
+    identifier: str,
+    regex: Optional[str],
+    should_tail: bool = False,
+    merge: bool = False,
+) -> None:
+    validate(identifier, merge)
     url = urlparse(identifier)
     scheduler_backend = url.scheme
     session_name = url.netloc or "default"
@@ -64,11 +318,16 @@ def get_logs(identifier: str, regex: Optional[str], should_tail: bool = False) -
     # path is of the form ["", "app_id", "master", "0"]
     path = url.path.split("/")
     app_id = path[1]
-    role_name = path[2]
 
     runner = get_runner(name=session_name)
     app_handle = make_app_handle(scheduler_backend, session_name, app_id)
 
+    if merge and len(path) == 2:
+        # all replicas of all roles
+        print_merged_log_lines(runner, app_handle, None, regex, should_tail)
+        return
+
+    role_name = path[2]
     app = none_throws(runner.describe(app_handle))
 
     if len(path) == 4:
@@ -94,8 +353,15 @@ def get_logs(identifier: str, regex: Optional[str], should_tail: bool = False) -
 
         replica_ids = list(range(0, num_replicas))
 
+    if merge:
+        print_merged_log_lines(
+            runner, app_handle, {role_name: replica_ids}, regex, should_tail
+        )
+        return
+
     threads = []
     exceptions = Queue()
+    writer = ConsoleWriter()
     for replica_id in replica_ids:
         thread = threading.Thread(
             target=print_log_lines,
@@ -107,6 +373,7 @@ def get_logs(identifier: str, regex: Optional[str], should_tail: bool = False) -
                 regex,
                 should_tail,
                 exceptions,
+                writer,
             ),
         )
         thread.daemon = True
@@ -116,6 +383,13 @@ def get_logs(identifier: str, regex: Optional[str], should_tail: bool = False) -
     for thread in threads:
         thread.join()
 
+    try:
+        writer.close()
+    except Exception as e:
+        # the readers have already raised the write errors they ran into
+        if exceptions.empty():
+            exceptions.put(e)
+
     # Retrieve all exceptions, print all except one and raise the first recorded exception
     threads_exceptions = []
     while not exceptions.empty():
@@ -128,6 +402,20 @@ def get_logs(identifier: str, regex: Optional[str], should_tail: bool = False) -
         raise threads_exceptions[0]
 
 
+def search_logs(
+    regex: str,
+    log_dir: str,
+    session_name: Optional[str] = None,
+    app_ids: Optional[List[str]] = None,
+) -> None:
+    runner = get_runner(name=session_name)
+    for m in runner.search_logs(regex, log_dir, session_name, app_ids):
+        print(
+            f"{GREEN}{m.app_id}/{m.role_name}/{m.replica_id}{ENDC}"
+            f" {m.path}:{m.line_no}: {m.line}"
+        )
+
+
 def find_role_replicas(app: specs.AppDef, role_name: str) -> Optional[int]:
     for role in app.roles:
         if role_name == role.name:
@@ -150,6 +438,13 @@ class CmdLog(SubCommand):
             help="Tail logs",
         )
 
+        subparser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Merge the logs of the replicas (of all the roles if ROLE_NAME is"
+            " not specified) into a single stream ordered by the log line timestamps",
+        )
+
         subparser.add_argument(
             "identifier",
             type=str,
@@ -157,4 +452,36 @@ class CmdLog(SubCommand):
         )
 
     def run(self, args: argparse.Namespace) -> None:
-        get_logs(args.identifier, args.regex, args.tail)
+        get_logs(args.identifier, args.regex, args.tail, args.merge)
+
+
+class CmdLogSearch(SubCommand):
+    def add_arguments(self, subparser: argparse.ArgumentParser) -> None:
+        subparser.add_argument(
+            "--log_dir",
+            type=str,
+            required=True,
+            help="the log_dir the local apps were run with",
+        )
+
+        subparser.add_argument(
+            "--session",
+            type=str,
+            help="session whose apps to search, defaults to the default session",
+        )
+
+        subparser.add_argument(
+            "--app_ids",
+            type=str,
+            help="comma separated app ids to search, defaults to all apps",
+        )
+
+        subparser.add_argument(
+            "pattern",
+            type=str,
+            help="regex to search the log files for",
+        )
+
+    def run(self, args: argparse.Namespace) -> None:
+        app_ids = args.app_ids.split(",") if args.app_ids else None
+        search_logs(args.pattern, args.log_dir, args.session, app_ids)
@@ -73,6 +73,23 @@ def format_error_message(msg: str, header: str, width: int = 80) -> str:
     return "\n".join(lines)
 
 
+def format_bytes(num_bytes: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if num_bytes < 1024:
+            return f"{num_bytes:.1f}{unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}TB"
+
+
+def format_resource_usage(usage: api.ResourceUsage) -> str:
+    return (
+        f"rss: {format_bytes(usage.rss_bytes)},"
+        f" cpu: {usage.cpu_percent:.1f}%,"
+        f" io(r/w): {format_bytes(usage.io_read_bytes)}/{format_bytes(usage.io_write_bytes)},"
+        f" threads: {usage.num_threads}"
+    )
+
+
 def format_replica_status(replica_status: api.ReplicaStatus) -> str:
     if replica_status.structured_error_msg != NONE:
         error_data = json.loads(replica_status.structured_error_msg)
@@ -95,6 +112,11 @@ def format_replica_status(replica_status: api.ReplicaStatus) -> str:
         ]:
             data += " (no reply file)"
 
+    if replica_status.usage:
+        data += f"\n    usage: {format_resource_usage(replica_status.usage)}"
+    if replica_status.peak_usage:
+        data += f"\n    peak:  {format_resource_usage(replica_status.peak_usage)}"
+
     # mark index 0 for each role with a "*" for a visual queue on role boundaries
     header = " "
     if replica_status.id == 0:
@@ -9,7 +9,7 @@ from argparse import ArgumentParser
 from typing import List
 
 from torchx.cli.cmd_describe import CmdDescribe
-from torchx.cli.cmd_log import CmdLog
+from torchx.cli.cmd_log import CmdLog, CmdLogSearch
 from torchx.cli.cmd_run import CmdBuiltins, CmdRun
 from torchx.cli.cmd_runopts import CmdRunopts
 from torchx.cli.cmd_status import CmdStatus
@@ -34,6 +34,7 @@ def create_parser() -> ArgumentParser:
     subcmds = {
         "describe": CmdDescribe(),
         "log": CmdLog(),
+        "log-search": CmdLogSearch(),
         "run": CmdRun(),
         "builtins": CmdBuiltins(),
         "runopts": CmdRunopts(),
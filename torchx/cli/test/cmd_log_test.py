@@ -5,12 +5,25 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+import argparse
 import io
+import threading
+import time
 import unittest
-from typing import Iterator, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 from unittest.mock import MagicMock, patch
 
-from torchx.cli.cmd_log import ENDC, GREEN, get_logs
+from torchx.cli.cmd_log import (
+    ENDC,
+    GREEN,
+    CmdLog,
+    CmdLogSearch,
+    ConsoleWriter,
+    get_logs,
+    search_logs,
+    write_batched,
+)
+from torchx.schedulers.log_search import LogMatch
 from torchx.specs.api import AppDef, Role, parse_app_handle
 
 
@@ -25,6 +38,21 @@ class SentinelError(Exception):
 RUNNER = "torchx.cli.cmd_log.get_runner"
 
 
+class CountingStringIO(io.StringIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.num_writes = 0
+
+    def write(self, s: str) -> int:
+        self.num_writes += 1
+        return super().write(s)
+
+
+class BrokenPipe(io.StringIO):
+    def write(self, s: str) -> int:
+        raise BrokenPipeError()
+
+
 class MockRunner:
     def __call__(self, name: Optional[str] = None) -> "MockRunner":
         return self
@@ -54,6 +82,36 @@ class MockRunner:
         log_lines = ["INFO foo", "ERROR bar", "WARN baz"]
         return iter([line for line in log_lines if re.match(regex, line)])
 
+    def merged_log_lines(
+        self,
+        app_handle: str,
+        replicas: Optional[Dict[str, List[int]]] = None,
+        regex: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+        should_tail: bool = False,
+    ) -> Iterator[Tuple[str, int, str]]:
+        if not replicas:
+            replicas = {
+                role.name: list(range(role.num_replicas))
+                for role in self.describe(app_handle).roles
+            }
+        for role_name, replica_ids in replicas.items():
+            for k in replica_ids:
+                for line in self.log_lines(app_handle, role_name, k, regex):
+                    yield role_name, k, line
+
+    def search_logs(
+        self,
+        regex: str,
+        log_dir: str,
+        session_name: Optional[str] = None,
+        app_ids: Optional[List[str]] = None,
+    ) -> Iterator[LogMatch]:
+        for app_id in app_ids or ["app_1", "app_2"]:
+            path = f"{log_dir}/{session_name}/{app_id}/trainer/0/stderr.log"
+            yield LogMatch(app_id, "trainer", 0, path, 2, f"{regex} in {app_id}")
+
 
 class CmdLogTest(unittest.TestCase):
     @patch("sys.exit", side_effect=SentinelError)
@@ -136,3 +194,186 @@ class CmdLogTest(unittest.TestCase):
             log_lines_mock.side_effect = RuntimeError
             with self.assertRaises(RuntimeError):
                 get_logs("local://test-session/SparseNNAppDef/trainer/0,1", regex=None)
+
+    @patch(RUNNER, new_callable=MockRunner)
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_cmd_log_merge(
+        self, stdout_mock: MagicMock, mock_runner: MagicMock
+    ) -> None:
+        get_logs(
+            "local://test-session/SparseNNAppDef/trainer/0,2", regex="WARN", merge=True
+        )
+        self.assertEqual(
+            f"{GREEN}trainer/0{ENDC} WARN baz\n{GREEN}trainer/2{ENDC} WARN baz\n",
+            stdout_mock.getvalue(),
+        )
+
+    @patch(RUNNER, new_callable=MockRunner)
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_cmd_log_merge_all_roles(
+        self, stdout_mock: MagicMock, mock_runner: MagicMock
+    ) -> None:
+        get_logs("local://test-session/SparseNNAppDef", regex="ERROR", merge=True)
+        self.assertEqual(
+            f"{GREEN}master/0{ENDC} ERROR bar\n"
+            f"{GREEN}trainer/0{ENDC} ERROR bar\n"
+            f"{GREEN}trainer/1{ENDC} ERROR bar\n"
+            f"{GREEN}trainer/2{ENDC} ERROR bar\n",
+            stdout_mock.getvalue(),
+        )
+
+    @patch("sys.exit", side_effect=SentinelError)
+    def test_cmd_log_no_role_without_merge(self, exit_mock: MagicMock) -> None:
+        with self.assertRaises(SentinelError):
+            get_logs("local://test-session/SparseNNAppDef", regex=None)
+        exit_mock.assert_called_once_with(1)
+
+    @patch(RUNNER, new_callable=MockRunner)
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_search_logs(self, stdout_mock: MagicMock, mock_runner: MagicMock) -> None:
+        search_logs("timeout", "/logs", "test-session", ["app_2"])
+        self.assertEqual(
+            f"{GREEN}app_2/trainer/0{ENDC}"
+            " /logs/test-session/app_2/trainer/0/stderr.log:2: timeout in app_2\n",
+            stdout_mock.getvalue(),
+        )
+
+    @patch(RUNNER, new_callable=MockRunner)
+    @patch("sys.stdout", new_callable=io.StringIO)
+    def test_cmd_log_search(
+        self, stdout_mock: MagicMock, mock_runner: MagicMock
+    ) -> None:
+        parser = argparse.ArgumentParser()
+        cmd = CmdLogSearch()
+        cmd.add_arguments(parser)
+        args = parser.parse_args(
+            [
+                "--log_dir",
+                "/logs",
+                "--session",
+                "test-session",
+                "--app_ids",
+                "app_2",
+                "timeout",
+            ]
+        )
+        cmd.run(args)
+        self.assertIn("timeout in app_2", stdout_mock.getvalue())
+
+    @patch("sys.stderr", new_callable=io.StringIO)
+    def test_cmd_log_search_no_log_dir(self, stderr_mock: MagicMock) -> None:
+        parser = argparse.ArgumentParser()
+        CmdLogSearch().add_arguments(parser)
+        with self.assertRaises(SystemExit):
+            parser.parse_args(["timeout"])
+
+    def test_cmd_log_app_named_search(self) -> None:
+        parser = argparse.ArgumentParser()
+        CmdLog().add_arguments(parser)
+        args = parser.parse_args(["search"])
+        self.assertEqual("search", args.identifier)
+        with self.assertRaises(SystemExit):
+            parser.parse_args(["local://s/app/role", "extra"])
+
+
+class ConsoleWriterTest(unittest.TestCase):
+    def test_write_coalesced(self) -> None:
+        out = CountingStringIO()
+        unblock = threading.Event()
+        write = out.write
+
+        def blocking_write(s: str) -> int:
+            unblock.wait()
+            return write(s)
+
+        with patch.object(out, "write", side_effect=blocking_write) as write_mock:
+            writer = ConsoleWriter(out)
+            writer.write("p ", ["first"])
+            # the batches queue up while the writer is blocked on the first write
+            for i in range(10):
+                writer.write(f"r/{i} ", ["a", "b"])
+            unblock.set()
+            writer.close()
+
+        self.assertEqual(
+            "p first\n" + "".join(f"r/{i} a\nr/{i} b\n" for i in range(10)),
+            out.getvalue(),
+        )
+        self.assertLessEqual(write_mock.call_count, 2)
+
+    def test_write_chunked(self) -> None:
+        out = CountingStringIO()
+        writer = ConsoleWriter(out, chunk_size=4)
+        write_batched(writer, "p ", iter(["a", "b", "c"]), batch_lines=2)
+        writer.close()
+        self.assertEqual("p a\np b\np c\n", out.getvalue())
+        # every batch exceeds the chunk size hence is written on its own
+        self.assertEqual(2, out.num_writes)
+
+    def test_write_batched_idle_flush(self) -> None:
+        out = CountingStringIO()
+        writer = ConsoleWriter(out, flush_interval=0.01)
+        unblock = threading.Event()
+
+        def lines() -> Iterator[str]:
+            yield "a"
+            # blocks like a followed log of a running app with sparse output
+            unblock.wait(10)
+            yield "b"
+
+        reader = threading.Thread(
+            target=write_batched, args=(writer, "p ", lines(), 256)
+        )
+        reader.start()
+        for _ in range(1000):
+            if out.getvalue():
+                break
+            time.sleep(0.01)
+        # the partial batch is written while the reader is blocked
+        self.assertEqual("p a\n", out.getvalue())
+        unblock.set()
+        reader.join()
+        writer.close()
+        self.assertEqual("p a\np b\n", out.getvalue())
+
+    def test_write_batched_order(self) -> None:
+        out = CountingStringIO()
+        write = out.write
+        release = threading.Event()
+
+        def slow_write(s: str) -> int:
+            # the writer is stuck on the first batch while more are queued
+            release.wait()
+            return write(s)
+
+        with patch.object(out, "write", side_effect=slow_write):
+            writer = ConsoleWriter(out, chunk_size=1, flush_interval=0.01)
+            batcher = writer.batcher("r ", 2)
+            # two full batches queued behind the one being written
+            for i in range(7):
+                batcher.add(str(i))
+            # the partial batch ("6") is due to be taken
+            time.sleep(0.05)
+            release.set()
+            time.sleep(0.05)
+            batcher.close()
+            writer.close()
+
+        self.assertEqual(
+            [f"r {i}" for i in range(7)],
+            out.getvalue().splitlines(),
+        )
+
+    def test_write_error(self) -> None:
+        writer = ConsoleWriter(BrokenPipe())
+        writer.write("p ", ["a"])
+        with self.assertRaises(BrokenPipeError):
+            writer.close()
+        with self.assertRaises(BrokenPipeError):
+            writer.write("p ", ["b"])
+
+    @patch(RUNNER, new_callable=MockRunner)
+    def test_get_logs_write_error(self, mock_runner: MagicMock) -> None:
+        with patch("sys.stdout", new_callable=BrokenPipe):
+            with self.assertRaises(BrokenPipeError):
+                get_logs("local://test-session/SparseNNAppDef/trainer/0,1", regex=None)
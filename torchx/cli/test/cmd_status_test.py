@@ -11,8 +11,20 @@ import time
 import unittest
 from unittest.mock import patch
 
-from torchx.cli.cmd_status import CmdStatus, format_app_status, format_error_message
-from torchx.specs.api import AppState, AppStatus, ReplicaStatus, RoleStatus
+from torchx.cli.cmd_status import (
+    CmdStatus,
+    format_app_status,
+    format_bytes,
+    format_error_message,
+    format_replica_status,
+)
+from torchx.specs.api import (
+    AppState,
+    AppStatus,
+    ReplicaStatus,
+    ResourceUsage,
+    RoleStatus,
+)
 
 
 class CmdStatusTest(unittest.TestCase):
@@ -85,3 +97,36 @@ Roles:
     error_msg: error
   worker[1]:RUNNING"""
         self.assertEqual(expected_message, actual_message)
+
+    def test_format_bytes(self) -> None:
+        self.assertEqual("512.0B", format_bytes(512))
+        self.assertEqual("1.5KB", format_bytes(1536))
+        self.assertEqual("2.0GB", format_bytes(2 * 1024**3))
+        self.assertEqual("4.0TB", format_bytes(4 * 1024**4))
+
+    def test_format_replica_status_usage(self) -> None:
+        replica = ReplicaStatus(
+            id=1,
+            state=AppState.RUNNING,
+            role="worker",
+            hostname="localhost",
+            usage=ResourceUsage(
+                rss_bytes=1024**2,
+                cpu_percent=150.0,
+                io_read_bytes=1024,
+                io_write_bytes=2048,
+                num_threads=12,
+            ),
+            peak_usage=ResourceUsage(
+                rss_bytes=2 * 1024**2,
+                cpu_percent=200.0,
+                io_read_bytes=1024,
+                io_write_bytes=2048,
+                num_threads=16,
+            ),
+        )
+        expected_message = """
+  worker[1]:RUNNING
+    usage: rss: 1.0MB, cpu: 150.0%, io(r/w): 1.0KB/2.0KB, threads: 12
+    peak:  rss: 2.0MB, cpu: 200.0%, io(r/w): 1.0KB/2.0KB, threads: 16"""
+        self.assertEqual(expected_message, format_replica_status(replica))
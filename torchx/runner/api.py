@@ -8,16 +8,17 @@
 import getpass
 import importlib
 import json
-import time
+import os
 from dataclasses import asdict
 from datetime import datetime
 from pprint import pformat
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 from pyre_extensions import none_throws
 from torchx.runner.events import log_event
 from torchx.schedulers import get_schedulers
 from torchx.schedulers.api import Scheduler
+from torchx.schedulers.log_search import LogMatch, search_logs
 from torchx.specs.api import (
     AppDef,
     AppDryRunInfo,
@@ -34,6 +35,7 @@ from torchx.specs.api import (
     runopts,
 )
 from torchx.util import entrypoints
+from torchx.util.log_merge import merge_logs
 
 
 NONE: str = "<NONE>"
@@ -341,7 +343,7 @@ class Runner:
                 if app_status.is_terminal():
                     return app_status
                 else:
-                    time.sleep(self._wait_interval)
+                    scheduler.wait_for_update(app_id, self._wait_interval)
 
     def list(self) -> Dict[AppHandle, AppDef]:
         """
@@ -474,6 +476,95 @@ class Runner:
             )
             return log_iter
 
+    def merged_log_lines(
+        self,
+        app_handle: AppHandle,
+        replicas: Optional[Dict[str, List[int]]] = None,
+        regex: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        should_tail: bool = False,
+    ) -> Iterator[Tuple[str, int, str]]:
+        """
+        Returns an iterator over the ``(role_name, k, line)`` of the log lines of
+        several replicas of the app merged into a single stream ordered by
+        the timestamps of the log lines (see ``torchx.util.log_merge.merge_logs``).
+        The same caveats as ``log_lines`` apply.
+
+        Usage:
+
+        ::
+
+         for role_name, k, line in session.merged_log_lines(app_handle):
+            print(f"{role_name}/{k} {line}")
+
+        Args:
+            app_handle: application handle
+            replicas: role name -> replica ids to fetch the logs for,
+                      all the replicas of all the roles if left empty
+            regex: optional regex filter, returns all lines if left empty
+            since: datetime based start cursor (see ``log_lines``)
+            until: datetime based end cursor (see ``log_lines``)
+
+        Raise:
+            UnknownAppException: if the app does not exist in the scheduler
+        """
+        if not replicas:
+            app = self.describe(app_handle)
+            if not app:
+                raise UnknownAppException(app_handle)
+            replicas = {role.name: list(range(role.num_replicas)) for role in app.roles}
+
+        sources = [
+            (
+                (role_name, k),
+                self.log_lines(
+                    app_handle, role_name, k, regex, since, until, should_tail
+                ),
+            )
+            for role_name, replica_ids in replicas.items()
+            for k in replica_ids
+        ]
+        for (role_name, k), line in merge_logs(sources):
+            yield role_name, k, line
+
+    def search_logs(
+        self,
+        regex: str,
+        log_dir: str,
+        session_name: Optional[str] = None,
+        app_ids: Optional[List[str]] = None,
+        max_workers: Optional[int] = None,
+        use_index: bool = True,
+    ) -> Iterator[LogMatch]:
+        """
+        Searches the log files of the apps that the ``local`` scheduler wrote
+        under ``log_dir`` (the ``log_dir`` run option) for the lines that match
+        ``regex`` (``re.search``). The log files are searched in parallel on
+        a process pool, see ``torchx.schedulers.log_search``.
+
+        Usage:
+
+        ::
+
+         for m in session.search_logs("NCCL.*timeout", log_dir="/tmp/logs"):
+            print(f"{m.app_id}/{m.role_name}/{m.replica_id}: {m.line}")
+
+        Args:
+            regex: regex to search for
+            log_dir: the ``log_dir`` the apps were run with
+            session_name: session whose apps to search, defaults to this session
+            app_ids: apps to search, all the apps of the session if left empty
+            max_workers: number of processes to search with (defaults to the number of cpus)
+            use_index: whether to skip the log files whose trigram index
+                       proves they do not match
+
+        Returns:
+            An iterator over the matching lines (with their app, role and replica)
+        """
+        session_log_dir = os.path.join(log_dir, session_name or self._name)
+        return search_logs(session_log_dir, regex, app_ids, max_workers, use_index)
+
     def _scheduler(self, scheduler: SchedulerBackend) -> Scheduler:
         sched = self._schedulers.get(scheduler)
         if not sched:
@@ -25,6 +25,7 @@ from torchx.specs.api import (
     Role,
     RunConfig,
     UnknownAppException,
+    parse_app_handle,
 )
 
 
@@ -293,6 +294,91 @@ class RunnerTest(unittest.TestCase):
             app_id, role_name, replica_id, regex, since, until, False
         )
 
+    def test_merged_log_lines(self, _) -> None:
+        app_id = "mock_app"
+
+        scheduler_mock = MagicMock()
+        scheduler_mock.describe.return_value = DescribeAppResponse(
+            app_id,
+            AppState.RUNNING,
+            roles=[
+                Role("master", image="test_image").replicas(1),
+                Role("trainer", image="test_image").replicas(2),
+            ],
+        )
+        logs = {
+            ("master", 0): ["2021-06-01 12:00:00 m0", "2021-06-01 12:00:03 m3"],
+            ("trainer", 0): ["2021-06-01 12:00:01 t1"],
+            ("trainer", 1): ["2021-06-01 12:00:02 t2", "2021-06-01 12:00:04 t4"],
+        }
+        scheduler_mock.log_iter.side_effect = lambda app_id, role, k, *_: iter(
+            logs[(role, k)]
+        )
+        session = Runner(
+            name=SESSION_NAME, schedulers={"default": scheduler_mock}, wait_interval=1
+        )
+
+        lines = list(session.merged_log_lines(f"default://test_session/{app_id}"))
+        self.assertEqual(
+            [
+                ("master", 0, "2021-06-01 12:00:00 m0"),
+                ("trainer", 0, "2021-06-01 12:00:01 t1"),
+                ("trainer", 1, "2021-06-01 12:00:02 t2"),
+                ("master", 0, "2021-06-01 12:00:03 m3"),
+                ("trainer", 1, "2021-06-01 12:00:04 t4"),
+            ],
+            lines,
+        )
+
+        lines = list(
+            session.merged_log_lines(
+                f"default://test_session/{app_id}", {"trainer": [1]}
+            )
+        )
+        self.assertEqual(
+            [
+                ("trainer", 1, "2021-06-01 12:00:02 t2"),
+                ("trainer", 1, "2021-06-01 12:00:04 t4"),
+            ],
+            lines,
+        )
+
+    def test_merged_log_lines_unknown_app(self, _) -> None:
+        session = Runner(
+            name=SESSION_NAME, schedulers={"default": self.scheduler}, wait_interval=1
+        )
+        with self.assertRaises(UnknownAppException):
+            list(session.merged_log_lines("default://test_session/unknown"))
+
+    def test_search_logs(self, _) -> None:
+        write_shell_script(self.test_dir, "echo_stderr.sh", ["echo $1 1>&2"])
+        log_dir = os.path.join(self.test_dir, "logs")
+        session = Runner(
+            name=SESSION_NAME, schedulers={"default": self.scheduler}, wait_interval=1
+        )
+        role = Role(name="echo", image=self.test_dir, resource=resource.SMALL).runs(
+            "echo_stderr.sh", "NCCL_timeout"
+        )
+        app_handle = session.run(
+            AppDef("name").of(role), cfg=RunConfig({"log_dir": log_dir})
+        )
+        none_throws(session.wait(app_handle))
+        _, _, app_id = parse_app_handle(app_handle)
+
+        matches = list(session.search_logs("NCCL.*timeout", log_dir, max_workers=1))
+        self.assertEqual(1, len(matches))
+        self.assertEqual(
+            (app_id, "echo", 0, 1, "NCCL_timeout"),
+            (
+                matches[0].app_id,
+                matches[0].role_name,
+                matches[0].replica_id,
+                matches[0].line_no,
+                matches[0].line,
+            ),
+        )
+        self.assertEqual([], list(session.search_logs("foo", log_dir, "other")))
+
     def test_no_default_scheduler(self, _) -> None:
         with self.assertRaises(ValueError):
             Runner(name=SESSION_NAME, schedulers={"local": self.scheduler})
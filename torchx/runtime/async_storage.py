@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+asyncio flavor of ``torchx.runtime.storage`` for components that fetch
+(or upload) many objects concurrently.
+
+The async providers are looked up by the scheme of the URL like the blocking
+ones. Schemes without a registered ``AsyncStorageProvider`` (e.g. ``file``,
+asyncio has no async file I/O) are served by adapting the blocking provider
+with ``SyncToAsyncProvider``, which runs its calls on a thread pool.
+
+Since ``Component.run`` is not a coroutine, ``fetch_blobs`` runs an event loop
+to download a batch of blobs with bounded concurrency:
+
+.. code:: python
+
+    from torchx.runtime.async_storage import fetch_blobs
+
+    class Eval(Component[Config, Inputs, Outputs]):
+        def run(self, inputs: Inputs, outputs: Outputs) -> None:
+            urls = [f"{inputs['samples']}/{i}" for i in range(10000)]
+            samples = fetch_blobs(urls, max_concurrency=64)
+"""
+
+import abc
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    IO,
+    Iterable,
+    List,
+    Optional,
+    TypeVar,
+)
+from urllib.parse import urlparse
+
+from torchx.runtime.storage import (
+    DEFAULT_CHUNK_SIZE,
+    get_storage_provider,
+    StorageProvider,
+)
+
+
+T = TypeVar("T")
+
+# max number of concurrent requests of ``fetch_all`` and ``fetch_blobs``
+DEFAULT_CONCURRENCY: int = 32
+
+
+class AsyncReader(abc.ABC):
+    """
+    A readable (binary) async file object returned by ``open_read``. Use as
+    an async context manager (or ``close()`` it) and iterate over it to read
+    the contents in chunks.
+    """
+
+    @abc.abstractmethod
+    async def read(self, size: int = -1) -> bytes:
+        """
+        Reads up to ``size`` bytes (all the remaining if negative), returns
+        an empty bytes at EOF.
+        """
+        ...
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        ...
+
+    async def __aenter__(self) -> "AsyncReader":
+        return self
+
+    # pyre-ignore [2]: same as the other __aexit__
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._chunks()
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        while chunk := await self.read(DEFAULT_CHUNK_SIZE):
+            yield chunk
+
+
+class AsyncStorageProvider(abc.ABC):
+    """
+    asyncio flavor of ``StorageProvider``, see its docs for the semantics
+    of the methods.
+    """
+
+    SCHEME: str
+
+    @abc.abstractmethod
+    async def download_blob(self, url: str) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    async def upload_blob(self, url: str, body: bytes) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def download_file(self, url: str, path: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def upload_file(self, path: str, url: str) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def open_read(self, url: str) -> AsyncReader:
+        ...
+
+
+class _ThreadedReader(AsyncReader):
+    def __init__(self, f: IO[bytes], run: Callable[..., Awaitable[T]]) -> None:
+        self._f = f
+        self._run = run
+
+    async def read(self, size: int = -1) -> bytes:
+        return await self._run(self._f.read, size)
+
+    async def close(self) -> None:
+        await self._run(self._f.close)
+
+
+class SyncToAsyncProvider(AsyncStorageProvider):
+    """
+    Adapts a (blocking) ``StorageProvider`` by running its calls on
+    ``executor`` (the default executor of the event loop if ``None``).
+    """
+
+    def __init__(
+        self, provider: StorageProvider, executor: Optional[Executor] = None
+    ) -> None:
+        self.SCHEME: str = provider.SCHEME
+        self.provider = provider
+        self._executor = executor
+
+    # pyre-ignore [2]: args of fn
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    async def download_blob(self, url: str) -> bytes:
+        return await self._run(self.provider.download_blob, url)
+
+    async def upload_blob(self, url: str, body: bytes) -> None:
+        await self._run(self.provider.upload_blob, url, body)
+
+    async def download_file(self, url: str, path: str) -> None:
+        await self._run(self.provider.download_file, url, path)
+
+    async def upload_file(self, path: str, url: str) -> None:
+        await self._run(self.provider.upload_file, path, url)
+
+    async def open_read(self, url: str) -> AsyncReader:
+        f = await self._run(self.provider.open_read, url)
+        return _ThreadedReader(f, self._run)
+
+
+_ASYNC_PROVIDERS: Dict[str, AsyncStorageProvider] = {}
+
+
+def register_async_storage_provider(provider: AsyncStorageProvider) -> None:
+    assert provider.SCHEME not in _ASYNC_PROVIDERS
+    _ASYNC_PROVIDERS[provider.SCHEME] = provider
+
+
+def get_async_storage_provider(url: str) -> AsyncStorageProvider:
+    """
+    Returns the async provider registered for the scheme of the URL or
+    adapts the blocking provider of the scheme (see ``SyncToAsyncProvider``).
+    """
+    scheme = urlparse(url).scheme
+    if provider := _ASYNC_PROVIDERS.get(scheme):
+        return provider
+    # loads the plugin of the scheme (if lazy) which may register an async one
+    sync_provider = get_storage_provider(url)
+    if provider := _ASYNC_PROVIDERS.get(scheme):
+        return provider
+    return SyncToAsyncProvider(sync_provider)
+
+
+async def download_blob(url: str) -> bytes:
+    return await get_async_storage_provider(url).download_blob(url)
+
+
+async def upload_blob(url: str, body: bytes) -> None:
+    await get_async_storage_provider(url).upload_blob(url, body)
+
+
+async def download_file(url: str, path: str) -> None:
+    await get_async_storage_provider(url).download_file(url, path)
+
+
+async def upload_file(path: str, url: str) -> None:
+    await get_async_storage_provider(url).upload_file(path, url)
+
+
+async def open_read(url: str) -> AsyncReader:
+    return await get_async_storage_provider(url).open_read(url)
+
+
+async def fetch_all(
+    urls: Iterable[str], max_concurrency: int = DEFAULT_CONCURRENCY
+) -> List[bytes]:
+    """
+    Downloads the blobs located at the URLs with at most ``max_concurrency``
+    downloads in flight. Returns the blobs in the order of the URLs and raises
+    the first error (the other downloads are cancelled).
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(url: str) -> bytes:
+        async with semaphore:
+            return await download_blob(url)
+
+    tasks = [asyncio.ensure_future(fetch(url)) for url in urls]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def fetch_blobs(
+    urls: Iterable[str], max_concurrency: int = DEFAULT_CONCURRENCY
+) -> List[bytes]:
+    """
+    Blocking flavor of ``fetch_all`` to use from code that is not async (e.g.
+    ``Component.run``). Runs the downloads on a new event loop whose blocking
+    (adapted) providers get a thread per concurrent download. Must not be
+    called from a running event loop, ``await fetch_all()`` instead.
+    """
+
+    async def run() -> List[bytes]:
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=max_concurrency, thread_name_prefix="fetch_blobs"
+            )
+        )
+        return await fetch_all(urls, max_concurrency)
+
+    return asyncio.run(run())
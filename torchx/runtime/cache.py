@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Content addressed local disk cache of the downloads of storage providers.
+
+``CachingStorageProvider`` wraps a provider and keeps the downloaded objects
+in ``cache_dir`` keyed by the URL and the version of the remote object (see
+``StorageProvider.version``, e.g. the S3 ETag) so that a changed object is
+never served stale. The cache is bounded to ``max_bytes`` by evicting the least
+recently used objects. Cached files are placed at the destination of
+``download_file`` by hardlinking them (falling back to a reflink and then to
+a copy). A file lock per object (shared while the object is used, exclusive
+to download or evict it) makes the replicas on a host that download the same
+object concurrently share a single download and keeps the objects in use from
+being evicted.
+
+The cache can be enabled for the registered providers through the plugin config
+(after the plugins of the providers):
+
+.. code:: yaml
+
+    plugins:
+      torchx.aws.s3: null
+      torchx.runtime.cache:
+        cache_dir: /tmp/torchx_cache
+        max_bytes: 10737418240
+        schemes: [s3]
+
+.. note:: A hardlinked file shares its contents with the cache hence must not
+          be modified in place (the cached files are read-only). Set
+          ``hardlink: false`` to reflink or copy instead.
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Callable, Dict, Generator, IO, Iterator, List, Optional, Tuple
+
+from torchx.runtime.storage import (
+    _LAZY_PROVIDERS,
+    _PROVIDERS,
+    copyfile,
+    ObjectInfo,
+    StorageProvider,
+    TransferStats,
+)
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES: int = 10 * 1024 * 1024 * 1024
+
+_LOCK_SUFFIX = ".lock"
+
+
+@contextmanager
+def _locked(
+    path: str, shared: bool = False, blocking: bool = True
+) -> Generator[bool, None, None]:
+    """
+    Holds a ``flock`` (exclusive unless ``shared``) on ``path`` (created if
+    missing). Yields ``False`` if ``blocking=False`` and the lock is held by
+    someone else.
+    """
+    operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, operation | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            # the lock file is unlinked by ``_evict`` (with the lock held), the
+            # lock is only valid if it is still the file at ``path``
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            fst = os.fstat(fd)
+            if (st.st_dev, st.st_ino) != (fst.st_dev, fst.st_ino):
+                continue
+            yield True
+            return
+        finally:
+            os.close(fd)
+
+
+class CachingStorageProvider(StorageProvider):
+    """
+    Caches the downloads of ``provider`` in ``cache_dir``. Objects whose
+    version is unknown (``provider.version()`` returns ``None``) are not cached.
+    Uploads are passed through.
+    """
+
+    def __init__(
+        self,
+        provider: StorageProvider,
+        cache_dir: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        hardlink: bool = True,
+    ) -> None:
+        self.SCHEME: str = provider.SCHEME
+        self.provider = provider
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hardlink = hardlink
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _key(self, url: str, version: str) -> str:
+        return hashlib.sha256(f"{url}\0{version}".encode()).hexdigest()
+
+    def _path(self, url: str) -> Optional[str]:
+        """
+        Returns the path of the (possibly missing) cached object or ``None``
+        if the object is not cacheable.
+        """
+        version = self.provider.version(url)
+        if version is None:
+            return None
+        return os.path.join(self.cache_dir, self._key(url, version))
+
+    @contextmanager
+    def _fetch(self, url: str) -> Generator[Optional[str], None, None]:
+        """
+        Yields the path of the cached object (downloading it on a miss)
+        or ``None`` if the object is not cacheable. The object is not evicted
+        (a shared lock is held on it) until the context exits.
+        """
+        path = self._path(url)
+        if path is None:
+            yield None
+            return
+
+        lock = path + _LOCK_SUFFIX
+        while True:
+            with _locked(lock, shared=True):
+                if os.path.exists(path):
+                    log.debug(f"cache hit: {url}")
+                    # mtime tracks the last use of the object for the LRU eviction
+                    os.utime(path)
+                    yield path
+                    return
+
+            with _locked(lock):
+                if os.path.exists(path):
+                    continue  # downloaded concurrently
+                log.info(f"cache miss: {url}, downloading")
+                fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+                os.close(fd)
+                try:
+                    self.provider.download_file(url, tmp)
+                    os.chmod(tmp, 0o444)
+                    os.replace(tmp, path)
+                except BaseException:
+                    os.remove(tmp)
+                    raise
+            self._evict(keep=path)
+            # then used under a shared lock (downloaded again if evicted meanwhile)
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((_LOCK_SUFFIX, ".tmp")):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue  # evicted concurrently
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def _evict(self, keep: str) -> None:
+        """
+        Removes the least recently used objects (other than ``keep``) until
+        the cache fits in ``max_bytes``. Objects that are being used (locked)
+        are skipped.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                return
+            if path == keep:
+                continue
+            with _locked(path + _LOCK_SUFFIX, blocking=False) as acquired:
+                if not acquired:
+                    continue
+                log.info(f"evicting {path} ({size} bytes) from the cache")
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    pass
+                # while locked, the waiters for the unlinked lock file retry
+                os.remove(path + _LOCK_SUFFIX)
+
+    def _place(self, src: str, dst: str) -> None:
+        """
+        Atomically places (a hardlink, reflink or copy of) ``src`` at ``dst``.
+        """
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        try:
+            if self.hardlink:
+                try:
+                    os.link(src, tmp)
+                    os.replace(tmp, dst)
+                    return
+                except OSError:
+                    pass  # e.g. different filesystems
+            # reflinks (if supported) or copies
+            copyfile(src, tmp)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+
+    @property
+    def stats(self) -> Optional[TransferStats]:
+        # the transfers of the wrapped provider (cache hits are not transfers)
+        return getattr(self.provider, "stats", None)
+
+    def version(self, url: str) -> Optional[str]:
+        return self.provider.version(url)
+
+    def stored_checksum(self, url: str) -> Optional[str]:
+        return self.provider.stored_checksum(url)
+
+    def download_blob(self, url: str) -> bytes:
+        with self._fetch(url) as path:
+            if path is None:
+                return self.provider.download_blob(url)
+            with open(path, "rb") as f:
+                return f.read()
+
+    def upload_blob(self, url: str, body: bytes) -> None:
+        self.provider.upload_blob(url, body)
+
+    def download_file(self, url: str, path: str) -> None:
+        with self._fetch(url) as cached:
+            if cached is None:
+                self.provider.download_file(url, path)
+            else:
+                self._place(cached, path)
+
+    def upload_file(self, path: str, url: str) -> None:
+        self.provider.upload_file(path, url)
+
+    def download_range(self, url: str, offset: int, length: int) -> bytes:
+        # a range is served from the cache if cached, but does not populate it
+        path = self._path(url)
+        if path is not None:
+            try:
+                # the open file outlives the eviction of the object
+                with open(path, "rb") as f:
+                    return os.pread(f.fileno(), max(length, 0), offset)
+            except FileNotFoundError:
+                pass
+        return self.provider.download_range(url, offset, length)
+
+    def open_read(self, url: str) -> IO[bytes]:
+        # the open file outlives the eviction of the object
+        with self._fetch(url) as path:
+            if path is None:
+                return self.provider.open_read(url)
+            return open(path, "rb")
+
+    def open_write(self, url: str) -> IO[bytes]:
+        return self.provider.open_write(url)
+
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        return self.provider.list_objects(prefix)
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        self.provider.copy(src_url, dst_url)
+
+
+def init_plugin(args: Optional[Dict[str, object]]) -> None:
+    """
+    Wraps the registered providers of ``args["schemes"]`` (all if unset) with
+    a ``CachingStorageProvider`` configured by the rest of the ``args``.
+    """
+    args = dict(args or {})
+    schemes = args.pop("schemes", None) or [*_PROVIDERS, *_LAZY_PROVIDERS]
+    cache_dir = args.pop(
+        "cache_dir", os.path.join(tempfile.gettempdir(), "torchx_cache")
+    )
+
+    def wrap(scheme: str) -> None:
+        provider = _PROVIDERS[scheme]
+        if not isinstance(provider, CachingStorageProvider):
+            # pyre-ignore [6]: the args are checked by the constructor
+            _PROVIDERS[scheme] = CachingStorageProvider(provider, cache_dir, **args)
+
+    def wrap_lazy(scheme: str, load: Callable[[], None]) -> Callable[[], None]:
+        def load_and_wrap() -> None:
+            load()
+            wrap(scheme)
+
+        return load_and_wrap
+
+    for scheme in schemes:  # pyre-ignore [16]
+        if scheme in _PROVIDERS:
+            wrap(scheme)
+        else:
+            # wrapped once the plugin of the scheme is loaded
+            _LAZY_PROVIDERS[scheme] = wrap_lazy(scheme, _LAZY_PROVIDERS[scheme])
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+End-to-end checksums of the objects transferred by the storage providers.
+
+A checksum is stored along with the object (S3 user metadata, an extended
+attribute for files) as ``<algorithm>:<hexdigest>`` when uploading with
+a checksum algorithm configured. Uploads are skipped if the destination
+already holds an object with the same checksum and downloads are verified
+against the stored checksum (if any).
+
+Supported algorithms are ``md5`` and ``crc32`` (python standard library),
+``crc32c`` (requires the ``crc32c`` package) and ``xxh64`` (requires the
+``xxhash`` package).
+"""
+
+import hashlib
+import importlib
+import zlib
+from types import ModuleType
+from typing import Callable, Dict, Optional, Protocol, Tuple
+
+# size of the chunks that files are read in to compute their checksums
+CHUNK_SIZE: int = 1024 * 1024
+
+
+class ChecksumMismatchError(IOError):
+    """
+    Raised when the contents of a downloaded object do not match its
+    stored checksum.
+    """
+
+    pass
+
+
+class Hasher(Protocol):
+    def update(self, data: bytes) -> None:
+        ...
+
+    def hexdigest(self) -> str:
+        ...
+
+
+def _module(name: str, package: str) -> ModuleType:
+    try:
+        return importlib.import_module(name)
+    except ModuleNotFoundError:
+        raise ValueError(
+            f"{name} checksums require the `{package}` package."
+            f" `pip install {package}` or use md5 or crc32 checksums"
+        )
+
+
+class _CRC32:
+    def __init__(self) -> None:
+        self._value = 0
+
+    def update(self, data: bytes) -> None:
+        self._value = zlib.crc32(data, self._value)
+
+    def hexdigest(self) -> str:
+        return f"{self._value:08x}"
+
+
+class _CRC32C(_CRC32):
+    def __init__(self) -> None:
+        super().__init__()
+        self._crc32c: Callable[[bytes, int], int] = _module("crc32c", "crc32c").crc32c
+
+    def update(self, data: bytes) -> None:
+        self._value = self._crc32c(data, self._value)
+
+
+ALGORITHMS: Dict[str, Callable[[], Hasher]] = {
+    "md5": hashlib.md5,
+    "crc32": _CRC32,
+    "crc32c": _CRC32C,
+    "xxh64": lambda: _module("xxhash", "xxhash").xxh64(),
+}
+
+
+def new_hasher(algorithm: str) -> Hasher:
+    """
+    Raises:
+        ValueError - if the algorithm is unknown or not available
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(
+            f"Unknown checksum algorithm: {algorithm}."
+            f" Must be one of: {list(ALGORITHMS.keys())}"
+        )
+    return ALGORITHMS[algorithm]()
+
+
+def check_algorithm(algorithm: Optional[str]) -> None:
+    """
+    Raises:
+        ValueError - if the algorithm is unknown or not available
+    """
+    if algorithm is not None:
+        new_hasher(algorithm)
+
+
+def parse(checksum: str) -> Tuple[str, str]:
+    """
+    Returns the ``(algorithm, hexdigest)`` of a checksum.
+    """
+    algorithm, _, digest = checksum.partition(":")
+    return algorithm, digest
+
+
+def checksum_bytes(algorithm: str, data: bytes) -> str:
+    hasher = new_hasher(algorithm)
+    hasher.update(data)
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+def checksum_file(algorithm: str, path: str) -> str:
+    """
+    Computes the checksum of the file at ``path`` reading it in chunks.
+    """
+    hasher = new_hasher(algorithm)
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return f"{algorithm}:{hasher.hexdigest()}"
+
+
+def verify_bytes(url: str, expected: Optional[str], data: bytes) -> None:
+    """
+    Verifies that ``data`` (downloaded from ``url``) matches the ``expected``
+    checksum (nothing to verify if ``None``).
+
+    Raises:
+        ChecksumMismatchError - if it does not
+    """
+    if expected is None:
+        return
+    actual = checksum_bytes(parse(expected)[0], data)
+    if actual != expected:
+        raise ChecksumMismatchError(
+            f"{url}: checksum mismatch, expected {expected}, got {actual}"
+        )
+
+
+def verify_file(url: str, expected: Optional[str], path: str) -> None:
+    """
+    Same as ``verify_bytes`` for a file downloaded to ``path``.
+    """
+    if expected is None:
+        return
+    actual = checksum_file(parse(expected)[0], path)
+    if actual != expected:
+        raise ChecksumMismatchError(
+            f"{url}: checksum mismatch, expected {expected}, got {actual}"
+        )
@@ -41,17 +41,44 @@ The init_plugin method of the module will be called with the parsed yaml options
     def init_plugin(args):
         register_storage_provider(<your provider>)
 
+**plugin_schemes**
+
+The URL schemes that the storage plugins serve. A plugin with schemes is not
+imported by ``init_plugins`` but on the first use of one of its schemes (see
+``torchx.runtime.storage.get_storage_provider``) so that components that do
+not use it do not pay for importing it (and its dependencies). The plugins of
+torchx (``DEFAULT_PLUGIN_SCHEMES``) are loaded lazily by default, set the
+schemes of a plugin to an empty list to load it eagerly.
+
+.. code:: yaml
+
+    plugins:
+      torchx.aws.s3:
+        max_concurrency: 16
+      your_plugin: null
+    plugin_schemes:
+      your_plugin: [foo, foos]
+
+.. note:: Plugins that wrap the providers of other plugins (e.g.
+          ``torchx.runtime.cache``) must be listed after them.
 """
 
 import importlib
 import os
-from typing import Optional, Dict
+import threading
+from typing import Callable, Dict, List, Optional
 
 import yaml
+from torchx.runtime.storage import register_lazy_storage_provider
 
 TORCHX_CONFIG_ENV: str = "TORCHX_CONFIG"
 DEFAULT_TORCHX_CONFIG_PATH = "/etc/torchx/config.yaml"
 
+# URL schemes of the storage plugins of torchx (loaded on first use)
+DEFAULT_PLUGIN_SCHEMES: Dict[str, List[str]] = {
+    "torchx.aws.s3": ["s3"],
+}
+
 
 def init_plugins(config_path: Optional[str] = None) -> None:
     """
@@ -72,16 +99,49 @@ def init_plugins(config_path: Optional[str] = None) -> None:
     init_plugins_from_config(config)
 
 
+def load_plugin(name: str, args: object) -> None:
+    """
+    load_plugin imports the plugin module and calls its init_plugin with args.
+    """
+    print(f"loading plugin: {name}")
+    module = importlib.import_module(name)
+    # pyre-fixme[16]: `ModuleType` has no attribute `init_plugin`.
+    module.init_plugin(args)
+
+
+def _lazy_loader(name: str, args: object) -> Callable[[], None]:
+    lock = threading.Lock()
+    loaded = False
+
+    def load() -> None:
+        nonlocal loaded
+        with lock:
+            if not loaded:
+                load_plugin(name, args)
+                loaded = True
+
+    return load
+
+
 def init_plugins_from_config(config: Dict[str, object]) -> None:
     """
-    init_plugins_from_config imports all of the plugins listed in provided config.
+    init_plugins_from_config imports all of the plugins listed in provided config
+    (the ones with ``plugin_schemes`` are registered to be imported on first use).
     """
+    plugin_schemes = config.get("plugin_schemes") or {}
+    if not isinstance(plugin_schemes, dict):
+        raise TypeError(f"plugin_schemes must be a dict: {plugin_schemes}")
+    plugin_schemes = {**DEFAULT_PLUGIN_SCHEMES, **plugin_schemes}
+
     if plugins := config.get("plugins"):
         if not isinstance(plugins, dict):
             raise TypeError(f"plugins must be a dict: {plugins}")
 
         for provider, args in plugins.items():
-            print(f"loading plugin: {provider}")
-            module = importlib.import_module(provider)
-            # pyre-fixme[16]: `ModuleType` has no attribute `init_plugin`.
-            module.init_plugin(args)
+            if schemes := plugin_schemes.get(provider):
+                print(f"registering plugin: {provider} for schemes: {schemes}")
+                load = _lazy_loader(provider, args)
+                for scheme in schemes:
+                    register_lazy_storage_provider(scheme, load)
+            else:
+                load_plugin(provider, args)
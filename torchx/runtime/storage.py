@@ -6,14 +6,105 @@
 # LICENSE file in the root directory of this source tree.
 
 import abc
+import errno
+import fcntl
+import io
 import os
 import shutil
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, IO, Iterator, List, Optional, Set, Tuple
 from typing import Generator
 from urllib.parse import urlparse
 
+from torchx.runtime import checksum as checksums
+
+# size of the chunks that the streaming APIs read and write
+DEFAULT_CHUNK_SIZE: int = 1024 * 1024
+
+# number of files that ``copy_tree`` copies concurrently
+DEFAULT_COPY_WORKERS: int = 8
+
+# ioctl that clones (reflinks) a file on copy-on-write filesystems (btrfs, xfs)
+_FICLONE: int = 0x40049409
+
+# max bytes per copy_file_range/sendfile call
+_COPY_CHUNK_SIZE: int = 1024 * 1024 * 1024
+
+# errors of copy_file_range/sendfile (on the first call) for unsupported files
+_COPY_UNSUPPORTED = (
+    errno.EXDEV,
+    errno.ENOSYS,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+    errno.EBADF,
+    errno.ENOTSOCK,
+)
+
+
+@dataclass
+class ObjectInfo:
+    """
+    An object listed under a prefix (see ``StorageProvider.list_objects``).
+    ``path`` is relative to the prefix (``/`` separated), ``mtime`` is the last
+    modification time (seconds since the epoch) and ``etag`` identifies the
+    contents if the provider has one (e.g. S3).
+    """
+
+    path: str
+    size: int
+    mtime: float
+    etag: Optional[str] = None
+
+
+@dataclass
+class SyncStats:
+    """
+    The number of objects (and bytes) that ``sync`` copied and skipped.
+    """
+
+    copied: int = 0
+    skipped: int = 0
+    bytes: int = 0
+
+
+@dataclass
+class TransferStats:
+    """
+    Bytes (and objects) transferred by a provider and the ones whose upload
+    was skipped since the destination already held them (same checksum).
+    Updated concurrently by the transfers of the provider.
+    """
+
+    bytes_uploaded: int = 0
+    bytes_downloaded: int = 0
+    bytes_skipped: int = 0
+    uploads: int = 0
+    downloads: int = 0
+    uploads_skipped: int = 0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def record_upload(self, size: int) -> None:
+        with self._lock:
+            self.bytes_uploaded += size
+            self.uploads += 1
+
+    def record_download(self, size: int) -> None:
+        with self._lock:
+            self.bytes_downloaded += size
+            self.downloads += 1
+
+    def record_skip(self, size: int) -> None:
+        with self._lock:
+            self.bytes_skipped += size
+            self.uploads_skipped += 1
+
 
 def download_blob(url: str) -> bytes:
     return get_storage_provider(url).download_blob(url)
@@ -31,6 +122,245 @@ def upload_file(path: str, url: str) -> None:
     get_storage_provider(url).upload_file(path, url)
 
 
+def download_range(url: str, offset: int, length: int) -> bytes:
+    return get_storage_provider(url).download_range(url, offset, length)
+
+
+def open_read(url: str) -> IO[bytes]:
+    return get_storage_provider(url).open_read(url)
+
+
+def open_write(url: str) -> IO[bytes]:
+    return get_storage_provider(url).open_write(url)
+
+
+def iter_chunks(url: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    return get_storage_provider(url).iter_chunks(url, chunk_size)
+
+
+def copy_stream(
+    src_url: str, dst_url: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> None:
+    """
+    copy_stream copies the object at ``src_url`` to ``dst_url`` (possibly of
+    a different provider) one chunk at a time hence in constant memory.
+    A local file is uploaded with ``upload_file`` (hence checksummed and
+    skipped if unchanged), otherwise the copy is skipped if ``dst_url``
+    holds the checksum of ``src_url``. The streamed bytes are recorded in
+    the stats of both providers.
+    """
+    if src_path := _local_path(src_url):
+        upload_file(src_path, dst_url)
+        return
+
+    src_provider = get_storage_provider(src_url)
+    dst_provider = get_storage_provider(dst_url)
+    src_stats = _stats(src_provider)
+    dst_stats = _stats(dst_provider)
+    checksum = src_provider.stored_checksum(src_url)
+    with src_provider.open_read(src_url) as src:
+        if checksum is not None and dst_provider.stored_checksum(dst_url) == checksum:
+            if dst_stats:
+                dst_stats.record_skip(src.seek(0, io.SEEK_END))
+            return
+        with dst_provider.open_write(dst_url) as dst:
+            shutil.copyfileobj(src, dst, chunk_size)
+        size = src.tell()
+    if src_stats:
+        src_stats.record_download(size)
+    if dst_stats:
+        dst_stats.record_upload(size)
+
+
+def list_objects(prefix: str) -> Iterator[ObjectInfo]:
+    return get_storage_provider(prefix).list_objects(prefix)
+
+
+def _stats(provider: "StorageProvider") -> Optional[TransferStats]:
+    stats = getattr(provider, "stats", None)
+    return stats if isinstance(stats, TransferStats) else None
+
+
+def _join(prefix: str, path: str) -> str:
+    return f"{prefix.rstrip('/')}/{path}"
+
+
+def _local_path(url: str) -> Optional[str]:
+    parsed = urlparse(url)
+    return parsed.path if parsed.scheme == FileProvider.SCHEME else None
+
+
+def _unchanged(src: ObjectInfo, dst: Optional[ObjectInfo]) -> bool:
+    if dst is None or src.size != dst.size:
+        return False
+    if src.etag is not None and dst.etag is not None:
+        return src.etag == dst.etag
+    # the copy is at least as new as the source (to the second since that's
+    # the resolution of S3's LastModified)
+    return int(dst.mtime) >= int(src.mtime)
+
+
+def _transfer(src_url: str, dst_url: str) -> None:
+    src_provider = get_storage_provider(src_url)
+    dst_provider = get_storage_provider(dst_url)
+    if src_provider is dst_provider:
+        src_provider.copy(src_url, dst_url)
+    elif src_path := _local_path(src_url):
+        dst_provider.upload_file(src_path, dst_url)
+    elif dst_path := _local_path(dst_url):
+        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+        src_provider.download_file(src_url, dst_path)
+    else:
+        copy_stream(src_url, dst_url)
+
+
+def sync(
+    src_prefix: str, dst_prefix: str, max_workers: int = DEFAULT_COPY_WORKERS
+) -> SyncStats:
+    """
+    sync copies the objects under ``src_prefix`` to the same (relative) paths
+    under ``dst_prefix`` (possibly of a different provider), e.g. a checkpoint
+    directory to S3. Objects whose copy has the same size and ETag (if both
+    providers have ETags) or is at least as new as the source are skipped, the
+    rest are copied ``max_workers`` at a time. Objects under ``dst_prefix``
+    that are not under ``src_prefix`` are left as is.
+    """
+    src_objects = list_objects(src_prefix)
+    dst_objects = {obj.path: obj for obj in list_objects(dst_prefix)}
+
+    stats = SyncStats()
+    pending: List[ObjectInfo] = []
+    for obj in src_objects:
+        if _unchanged(obj, dst_objects.get(obj.path)):
+            stats.skipped += 1
+        else:
+            pending.append(obj)
+
+    def transfer(obj: ObjectInfo) -> None:
+        _transfer(_join(src_prefix, obj.path), _join(dst_prefix, obj.path))
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, max_workers), thread_name_prefix="sync"
+    ) as executor:
+        # consume the results to raise the errors of the transfers
+        list(executor.map(transfer, pending))
+
+    stats.copied = len(pending)
+    stats.bytes = sum(obj.size for obj in pending)
+    return stats
+
+
+def _copy_file_range(infd: int, outfd: int, offset: int) -> int:
+    return os.copy_file_range(infd, outfd, _COPY_CHUNK_SIZE, offset, offset)
+
+
+def _sendfile(infd: int, outfd: int, offset: int) -> int:
+    return os.sendfile(outfd, infd, offset, _COPY_CHUNK_SIZE)
+
+
+def _pread_write(infd: int, outfd: int, offset: int) -> int:
+    data = os.pread(infd, DEFAULT_CHUNK_SIZE, offset)
+    view = memoryview(data)
+    while view:
+        view = view[os.pwrite(outfd, view, offset + len(data) - len(view)) :]
+    return len(data)
+
+
+def _copy_fns() -> List[Callable[[int, int, int], int]]:
+    fns = []
+    if hasattr(os, "copy_file_range"):
+        fns.append(_copy_file_range)
+    if hasattr(os, "sendfile"):
+        fns.append(_sendfile)
+    fns.append(_pread_write)
+    return fns
+
+
+def copyfile(src: str, dst: str) -> None:
+    """
+    Copies the file ``src`` to ``dst`` without copying the data through python.
+    The file is reflinked if the filesystem supports it, otherwise the data is
+    copied in the kernel with ``copy_file_range`` (which NFS 4.2 offloads to
+    the server) falling back to ``sendfile`` and lastly to a userspace copy.
+
+    Raises:
+        shutil.SameFileError - if src and dst are the same file
+    """
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        raise shutil.SameFileError(f"{src} and {dst} are the same file")
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        try:
+            fcntl.ioctl(outfd, _FICLONE, infd)
+            return
+        except OSError:
+            pass
+
+        offset = 0
+        for copy in _copy_fns():
+            try:
+                while n := copy(infd, outfd, offset):
+                    offset += n
+                return
+            except OSError as e:
+                # fallback to the next method unless the copy has started
+                if offset or e.errno not in _COPY_UNSUPPORTED:
+                    raise
+
+
+def copy_tree(src: str, dst: str, max_workers: int = DEFAULT_COPY_WORKERS) -> int:
+    """
+    Copies the directory ``src`` into ``dst`` (created if missing), copying
+    up to ``max_workers`` files concurrently with ``copyfile``.
+
+    Returns:
+        the number of copied files
+    """
+    files: List[Tuple[str, str]] = []
+    for root, dirs, names in os.walk(src):
+        dst_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(dst_root, exist_ok=True)
+        for name in names:
+            files.append((os.path.join(root, name), os.path.join(dst_root, name)))
+
+    if max_workers <= 1 or len(files) <= 1:
+        for f in files:
+            copyfile(*f)
+    else:
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="copy_tree"
+        ) as executor:
+            # consume the results to raise the errors of the copies
+            list(executor.map(lambda f: copyfile(*f), files))
+    return len(files)
+
+
+class _BlobWriter(io.BytesIO):
+    """
+    Buffers the writes in memory and uploads them as a blob on close
+    (unless closed because of an exception).
+    """
+
+    def __init__(self, provider: "StorageProvider", url: str) -> None:
+        super().__init__()
+        self._provider = provider
+        self._url = url
+
+    def close(self) -> None:
+        if not self.closed:
+            self._provider.upload_blob(self._url, self.getvalue())
+        super().close()
+
+    # pyre-ignore [2]: same as IOBase.__exit__
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type:
+            # do not upload a partially written blob
+            super().close()
+        else:
+            self.close()
+
+
 class StorageProvider(abc.ABC):
     SCHEME: str
 
@@ -50,56 +380,316 @@ class StorageProvider(abc.ABC):
     def upload_file(self, path: str, url: str) -> None:
         ...
 
+    def version(self, url: str) -> Optional[str]:
+        """
+        version returns an identifier of the current contents of the object
+        located at the URL (e.g. an ETag) that changes whenever the object
+        does or ``None`` if the provider can't tell (the default). Used to
+        cache the downloads (see ``torchx.runtime.cache``).
+        """
+        return None
+
+    def stored_checksum(self, url: str) -> Optional[str]:
+        """
+        stored_checksum returns the checksum (``<algorithm>:<hexdigest>``, see
+        ``torchx.runtime.checksum``) stored along with the object located at
+        the URL or ``None`` if it has none, is missing or the provider does
+        not store checksums (the default). Used to skip copies.
+        """
+        return None
+
+    def download_range(self, url: str, offset: int, length: int) -> bytes:
+        """
+        download_range fetches (up to) ``length`` bytes at ``offset`` of the
+        contents located at the URL, fewer if the end of the contents is
+        reached. Providers should fetch just the range, the default
+        implementation seeks ``open_read()``.
+        """
+        with self.open_read(url) as f:
+            f.seek(offset)
+            return f.read(max(length, 0))
+
+    def open_read(self, url: str) -> IO[bytes]:
+        """
+        open_read returns a readable and seekable (binary) file object of the
+        contents located at the URL. Providers should stream the contents (and
+        fetch just what is read after seeking), the default implementation
+        downloads the whole blob.
+        """
+        return io.BytesIO(self.download_blob(url))
+
+    def open_write(self, url: str) -> IO[bytes]:
+        """
+        open_write returns a writable (binary) file object whose contents are
+        uploaded to the location specified by the URL once closed. If the file
+        object is used as a context manager and an exception is raised nothing
+        is uploaded. Providers should stream the contents, the default
+        implementation buffers the whole blob in memory.
+        """
+        return _BlobWriter(self, url)
+
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        """
+        list_objects lists the objects (recursively) under the prefix URL
+        (a directory for filesystems). Required by ``sync``.
+        """
+        raise NotImplementedError(
+            f"{self.__class__.__name__} does not support listing objects"
+        )
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        """
+        copy copies the object located at ``src_url`` to ``dst_url`` (both of
+        this provider). Providers should copy on the server side, the default
+        implementation streams the object through this process.
+        """
+        with self.open_read(src_url) as src, self.open_write(dst_url) as dst:
+            shutil.copyfileobj(src, dst, DEFAULT_CHUNK_SIZE)
+
+    def iter_chunks(
+        self, url: str, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[bytes]:
+        """
+        iter_chunks iterates over the contents located at the URL in chunks
+        of (at most) ``chunk_size`` bytes.
+        """
+        with self.open_read(url) as f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
 
 _PROVIDERS: Dict[str, StorageProvider] = {}
 
+# loaders of the providers that are registered on the first use of their scheme
+_LAZY_PROVIDERS: Dict[str, Callable[[], None]] = {}
+# reentrant since a loader may look up other providers
+_LAZY_LOCK = threading.RLock()
+_LOADING: Set[str] = set()
+
 
 def register_storage_provider(provider: StorageProvider) -> None:
     assert provider.SCHEME not in _PROVIDERS
     _PROVIDERS[provider.SCHEME] = provider
 
 
+def register_lazy_storage_provider(scheme: str, loader: Callable[[], None]) -> None:
+    """
+    Registers ``loader`` to be called on the first ``get_storage_provider``
+    of a URL with ``scheme``. The loader must register the provider of the
+    scheme (e.g. import and init a plugin). A loader shared by several schemes
+    is called for each of them hence must be idempotent.
+    """
+    assert scheme not in _PROVIDERS and scheme not in _LAZY_PROVIDERS
+    _LAZY_PROVIDERS[scheme] = loader
+
+
+def _load_lazy_provider(scheme: str) -> None:
+    with _LAZY_LOCK:
+        loader = _LAZY_PROVIDERS.get(scheme)
+        if loader is None or scheme in _LOADING:
+            # loaded by another thread or looked up by its own loader
+            return
+        _LOADING.add(scheme)
+        try:
+            loader()
+            # only removed once loaded so that the other threads wait for it
+            del _LAZY_PROVIDERS[scheme]
+        finally:
+            _LOADING.remove(scheme)
+
+
 def get_storage_provider(url: str) -> StorageProvider:
     parsed = urlparse(url)
     scheme = parsed.scheme
+    if scheme in _LAZY_PROVIDERS:
+        _load_lazy_provider(scheme)
     assert (
         scheme in _PROVIDERS
     ), f"failed to find provider {scheme} for URL {url} - must be one of {list(_PROVIDERS.keys())}"
     return _PROVIDERS[scheme]
 
 
+# extended attribute that holds the checksum of a file (see ``FileProvider``)
+CHECKSUM_XATTR = "user.torchx.checksum"
+
+
 class FileProvider(StorageProvider):
+    """
+    Stores the objects as files. If ``checksum`` (an algorithm of
+    ``torchx.runtime.checksum``) is set the uploaded files are checksummed, the
+    checksum is stored in the ``CHECKSUM_XATTR`` extended attribute of the file
+    (along with its size and modification time so that it is ignored once the
+    file is modified by other means) and uploads of identical contents are
+    skipped. Downloads of files with a checksum are always verified.
+    """
+
     SCHEME: str = "file"
 
+    def __init__(self, checksum: Optional[str] = None) -> None:
+        checksums.check_algorithm(checksum)
+        self.checksum = checksum
+        self.stats = TransferStats()
+
+    def _get_checksum(self, path: str) -> Optional[str]:
+        try:
+            value = os.getxattr(path, CHECKSUM_XATTR).decode()
+            st = os.stat(path)
+        except (OSError, AttributeError):
+            # missing file/attribute, xattrs not supported (by the fs or os)
+            return None
+        checksum, _, stamp = value.rpartition("@")
+        return checksum if stamp == f"{st.st_size}-{st.st_mtime_ns}" else None
+
+    def _set_checksum(self, path: str, checksum: str) -> None:
+        st = os.stat(path)
+        value = f"{checksum}@{st.st_size}-{st.st_mtime_ns}"
+        try:
+            os.setxattr(path, CHECKSUM_XATTR, value.encode())
+        except (OSError, AttributeError):
+            pass  # xattrs not supported, uploads won't be skipped
+
+    def _unchanged(self, path: str, checksum: Optional[str], size: int) -> bool:
+        if checksum is not None and self._get_checksum(path) == checksum:
+            self.stats.record_skip(size)
+            return True
+        return False
+
     def download_blob(self, url: str) -> bytes:
         """
         download_blob fetches the contents of the file located at the URL.
         """
         parsed = urlparse(url)
         with open(parsed.path, "rb") as f:
-            return f.read()
+            data = f.read()
+        checksums.verify_bytes(url, self._get_checksum(parsed.path), data)
+        self.stats.record_download(len(data))
+        return data
 
     def upload_blob(self, url: str, body: bytes) -> None:
         """
         upload_blob uploads the body to the location specified by the URL.
         """
         parsed = urlparse(url)
+        checksum = self.checksum and checksums.checksum_bytes(self.checksum, body)
+        if self._unchanged(parsed.path, checksum, len(body)):
+            return
         with open(parsed.path, "wb") as f:
             f.write(body)
+        if checksum:
+            self._set_checksum(parsed.path, checksum)
+        self.stats.record_upload(len(body))
 
     def download_file(self, url: str, path: str) -> None:
         """
         download_file downloads the file located at the URL to a location on disk.
         """
         parsed = urlparse(url)
-        shutil.copyfile(parsed.path, path)
+        expected = self._get_checksum(parsed.path)
+        copyfile(parsed.path, path)
+        checksums.verify_file(url, expected, path)
+        self.stats.record_download(os.path.getsize(path))
 
     def upload_file(self, path: str, url: str) -> None:
         """
         upload_file uploads a file on disk to the location specified by the URL.
         """
         parsed = urlparse(url)
-        shutil.copyfile(path, parsed.path)
+        size = os.path.getsize(path)
+        checksum = self.checksum and checksums.checksum_file(self.checksum, path)
+        if self._unchanged(parsed.path, checksum, size):
+            return
+        copyfile(path, parsed.path)
+        if checksum:
+            self._set_checksum(parsed.path, checksum)
+        self.stats.record_upload(size)
+
+    def download_dir(
+        self, url: str, path: str, max_workers: int = DEFAULT_COPY_WORKERS
+    ) -> int:
+        """
+        download_dir copies the directory located at the URL into the
+        directory at ``path`` copying ``max_workers`` files concurrently.
+        Returns the number of copied files.
+        """
+        parsed = urlparse(url)
+        return copy_tree(parsed.path, path, max_workers)
+
+    def upload_dir(
+        self, path: str, url: str, max_workers: int = DEFAULT_COPY_WORKERS
+    ) -> int:
+        """
+        upload_dir copies the directory at ``path`` into the directory located
+        at the URL copying ``max_workers`` files concurrently. Returns the
+        number of copied files.
+        """
+        parsed = urlparse(url)
+        return copy_tree(path, parsed.path, max_workers)
+
+    def version(self, url: str) -> Optional[str]:
+        """
+        version identifies the file located at the URL by its inode, size
+        and modification time.
+        """
+        parsed = urlparse(url)
+        st = os.stat(parsed.path)
+        return f"{st.st_ino}-{st.st_size}-{st.st_mtime_ns}"
+
+    def stored_checksum(self, url: str) -> Optional[str]:
+        """
+        stored_checksum returns the (up to date) checksum of the file located at
+        the URL.
+        """
+        return self._get_checksum(urlparse(url).path)
+
+    def download_range(self, url: str, offset: int, length: int) -> bytes:
+        """
+        download_range reads the range of the file located at the URL.
+        """
+        with open(urlparse(url).path, "rb") as f:
+            return os.pread(f.fileno(), max(length, 0), offset)
+
+    def open_read(self, url: str) -> IO[bytes]:
+        """
+        open_read opens the file located at the URL for reading.
+        """
+        parsed = urlparse(url)
+        return open(parsed.path, "rb")
+
+    def open_write(self, url: str) -> IO[bytes]:
+        """
+        open_write opens the file located at the URL for writing (creating
+        the missing parent directories).
+        """
+        parsed = urlparse(url)
+        os.makedirs(os.path.dirname(parsed.path), exist_ok=True)
+        return open(parsed.path, "wb")
+
+    def list_objects(self, prefix: str) -> Iterator[ObjectInfo]:
+        """
+        list_objects lists the files under the directory located at the URL.
+        """
+        root = urlparse(prefix).path
+        for dirpath, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(dirpath, name)
+                st = os.stat(path)
+                yield ObjectInfo(
+                    path=os.path.relpath(path, root).replace(os.sep, "/"),
+                    size=st.st_size,
+                    mtime=st.st_mtime,
+                )
+
+    def copy(self, src_url: str, dst_url: str) -> None:
+        """
+        copy copies the file with ``copyfile`` (creating the missing parent
+        directories).
+        """
+        src = urlparse(src_url).path
+        dst = urlparse(dst_url).path
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        copyfile(src, dst)
+        if checksum := self._get_checksum(src):
+            self._set_checksum(dst, checksum)
 
 
 @contextmanager
@@ -112,4 +702,31 @@ def temppath() -> Generator[str, None, None]:
         os.remove(tf.name)
 
 
+def transfer_stats() -> Dict[str, TransferStats]:
+    """
+    Returns the transfer stats of the registered providers (that keep them)
+    by scheme.
+    """
+    stats = {}
+    for scheme, provider in _PROVIDERS.items():
+        if provider_stats := _stats(provider):
+            stats[scheme] = provider_stats
+    return stats
+
+
+def init_plugin(args: Optional[Dict[str, object]]) -> None:
+    """
+    Re-registers the file provider with the plugin args, e.g. to checksum
+    the uploaded files:
+
+    .. code:: yaml
+
+        plugins:
+          torchx.runtime.storage:
+            checksum: crc32
+    """
+    # pyre-ignore [6]: the args are checked by the constructor
+    _PROVIDERS[FileProvider.SCHEME] = FileProvider(**(args or {}))
+
+
 register_storage_provider(FileProvider())
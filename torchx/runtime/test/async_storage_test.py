@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock as mock
+from typing import Dict
+
+from torchx.runtime import async_storage
+from torchx.runtime.async_storage import (
+    _ASYNC_PROVIDERS,
+    AsyncReader,
+    AsyncStorageProvider,
+    SyncToAsyncProvider,
+    fetch_all,
+    fetch_blobs,
+    get_async_storage_provider,
+    register_async_storage_provider,
+)
+from torchx.runtime.storage import (
+    _PROVIDERS,
+    FileProvider,
+    StorageProvider,
+    download_blob,
+    upload_blob,
+)
+
+
+class SlowFileProvider(FileProvider):
+    SCHEME: str = "slow"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def download_blob(self, url: str) -> bytes:
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.01)
+        with self.lock:
+            self.in_flight -= 1
+        return super().download_blob(url)
+
+
+class AsyncStorageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.urls = []
+        for i in range(20):
+            url = f"file://{self.tmpdir.name}/{i}"
+            upload_blob(url, str(i).encode())
+            self.urls.append(url)
+
+    def tearDown(self) -> None:
+        self.tmpdir.cleanup()
+
+    def test_adapter(self) -> None:
+        async def run() -> None:
+            url = f"file://{self.tmpdir.name}/foo"
+            await async_storage.upload_blob(url, b"foo" * 1024 * 1024)
+            self.assertEqual(
+                await async_storage.download_blob(url), b"foo" * 1024 * 1024
+            )
+
+            path = os.path.join(self.tmpdir.name, "path")
+            await async_storage.download_file(url, path)
+            await async_storage.upload_file(path, f"{url}2")
+            self.assertEqual(download_blob(f"{url}2"), b"foo" * 1024 * 1024)
+
+            async with await async_storage.open_read(url) as f:
+                self.assertEqual(await f.read(3), b"foo")
+                chunks = [chunk async for chunk in f]
+            self.assertEqual(len(chunks), 3)
+            self.assertEqual(b"".join(chunks), b"foo" * (1024 * 1024 - 1))
+
+        asyncio.run(run())
+
+    def test_get_async_storage_provider(self) -> None:
+        provider = get_async_storage_provider("file:///foo")
+        assert isinstance(provider, SyncToAsyncProvider)
+        self.assertIs(provider.provider, _PROVIDERS["file"])
+
+        class NativeProvider(AsyncStorageProvider):
+            SCHEME: str = "file"
+
+            async def download_blob(self, url: str) -> bytes:
+                return b"native"
+
+            async def upload_blob(self, url: str, body: bytes) -> None:
+                pass
+
+            async def download_file(self, url: str, path: str) -> None:
+                pass
+
+            async def upload_file(self, path: str, url: str) -> None:
+                pass
+
+            async def open_read(self, url: str) -> AsyncReader:
+                raise NotImplementedError()
+
+        with mock.patch.dict(_ASYNC_PROVIDERS):
+            register_async_storage_provider(NativeProvider())
+            self.assertEqual(fetch_blobs(["file:///foo"]), [b"native"])
+
+    def test_fetch_blobs(self) -> None:
+        self.assertEqual(fetch_blobs(self.urls), [str(i).encode() for i in range(20)])
+
+    def test_fetch_blobs_bounded(self) -> None:
+        provider = SlowFileProvider()
+        providers: Dict[str, StorageProvider] = {"slow": provider}
+        urls = [url.replace("file://", "slow://") for url in self.urls]
+        with mock.patch.dict(_PROVIDERS, providers):
+            self.assertEqual(
+                fetch_blobs(urls, max_concurrency=4),
+                [str(i).encode() for i in range(20)],
+            )
+        self.assertGreater(provider.max_in_flight, 1)
+        self.assertLessEqual(provider.max_in_flight, 4)
+
+    def test_fetch_all_error(self) -> None:
+        urls = self.urls + [f"file://{self.tmpdir.name}/missing"]
+        with self.assertRaises(FileNotFoundError):
+            asyncio.run(fetch_all(urls, max_concurrency=2))
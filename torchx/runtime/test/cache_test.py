@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock as mock
+from typing import Dict, Optional
+
+from torchx.runtime import cache
+from torchx.runtime.cache import CachingStorageProvider
+from torchx.runtime.storage import (
+    _LAZY_PROVIDERS,
+    _PROVIDERS,
+    FileProvider,
+    get_storage_provider,
+    register_lazy_storage_provider,
+    StorageProvider,
+    transfer_stats,
+)
+
+
+class CountingFileProvider(FileProvider):
+    def __init__(self) -> None:
+        super().__init__()
+        self.downloads = 0
+
+    def download_file(self, url: str, path: str) -> None:
+        self.downloads += 1
+        # widen the window for concurrent downloads
+        time.sleep(0.1)
+        super().download_file(url, path)
+
+
+class CacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmpdir = tempfile.mkdtemp(prefix="torchx_cache_test")
+        self.cache_dir = os.path.join(self.tmpdir, "cache")
+        self.provider = CountingFileProvider()
+        self.cached = CachingStorageProvider(self.provider, self.cache_dir)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.tmpdir)
+
+    def _remote(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return f"file://{path}"
+
+    def test_download_file_cached(self) -> None:
+        url = self._remote("remote", b"foo")
+        dst1 = os.path.join(self.tmpdir, "dst1")
+        dst2 = os.path.join(self.tmpdir, "dst2")
+
+        self.cached.download_file(url, dst1)
+        self.cached.download_file(url, dst2)
+        self.cached.download_file(url, dst2)
+
+        self.assertEqual(self.provider.downloads, 1)
+        self.assertEqual(self.cached.download_blob(url), b"foo")
+        with self.cached.open_read(url) as f:
+            self.assertEqual(f.read(), b"foo")
+        self.assertEqual(self.provider.downloads, 1)
+        for dst in [dst1, dst2]:
+            with open(dst, "rb") as f:
+                self.assertEqual(f.read(), b"foo")
+        # hardlinked to the cached object
+        self.assertEqual(os.stat(dst1).st_ino, os.stat(dst2).st_ino)
+
+    def test_download_file_copy(self) -> None:
+        url = self._remote("remote", b"foo")
+        cached = CachingStorageProvider(self.provider, self.cache_dir, hardlink=False)
+        dst1 = os.path.join(self.tmpdir, "dst1")
+        dst2 = os.path.join(self.tmpdir, "dst2")
+        cached.download_file(url, dst1)
+        cached.download_file(url, dst2)
+
+        self.assertEqual(self.provider.downloads, 1)
+        self.assertNotEqual(os.stat(dst1).st_ino, os.stat(dst2).st_ino)
+        with open(dst2, "ab") as f:
+            f.write(b"bar")
+        self.assertEqual(cached.download_blob(url), b"foo")
+
+    def test_changed_object(self) -> None:
+        url = self._remote("remote", b"foo")
+        self.assertEqual(self.cached.download_blob(url), b"foo")
+        self._remote("remote", b"foobar")
+        self.assertEqual(self.cached.download_blob(url), b"foobar")
+        self.assertEqual(self.provider.downloads, 2)
+
+    def test_concurrent_downloads(self) -> None:
+        url = self._remote("remote", b"foo")
+
+        def download(i: int) -> None:
+            self.cached.download_file(url, os.path.join(self.tmpdir, f"dst{i}"))
+
+        threads = [threading.Thread(target=download, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.provider.downloads, 1)
+        for i in range(4):
+            with open(os.path.join(self.tmpdir, f"dst{i}"), "rb") as f:
+                self.assertEqual(f.read(), b"foo")
+
+    def test_lru_eviction(self) -> None:
+        cached = CachingStorageProvider(self.provider, self.cache_dir, max_bytes=250)
+        urls = [self._remote(f"remote{i}", bytes(100)) for i in range(3)]
+
+        for i, url in enumerate(urls[:2]):
+            cached.download_blob(url)
+            # mtime resolution
+            os.utime(cached._path(url) or "", (i, i))
+        # uses (hence keeps) urls[0]
+        cached.download_blob(urls[0])
+        cached.download_blob(urls[2])
+        self.assertEqual(self.provider.downloads, 3)
+
+        cached.download_blob(urls[0])
+        cached.download_blob(urls[2])
+        self.assertEqual(self.provider.downloads, 3)
+        cached.download_blob(urls[1])
+        self.assertEqual(self.provider.downloads, 4)
+
+        size = sum(size for _, size, _ in cached._entries())
+        self.assertLessEqual(size, 250)
+
+    def test_eviction_skips_used(self) -> None:
+        url = self._remote("remote", bytes(100))
+        cached = CachingStorageProvider(self.provider, self.cache_dir, max_bytes=0)
+        with cached._fetch(url) as path:
+            assert path is not None
+            # e.g. by another replica
+            cached._evict(keep="")
+            self.assertTrue(os.path.exists(path))
+        cached._evict(keep="")
+        self.assertFalse(os.path.exists(path))
+
+    def test_locked_unlinked(self) -> None:
+        lock = os.path.join(self.tmpdir, "lock")
+        acquired = threading.Event()
+
+        def wait_for_lock() -> None:
+            with cache._locked(lock):
+                acquired.set()
+
+        with cache._locked(lock):
+            waiter = threading.Thread(target=wait_for_lock)
+            waiter.start()
+            time.sleep(0.1)
+            # unlinked by an eviction while held
+            os.remove(lock)
+        waiter.join(timeout=10)
+        self.assertTrue(acquired.is_set())
+        # the waiter retried on the lock file at the path
+        self.assertTrue(os.path.exists(lock))
+
+    def test_not_cacheable(self) -> None:
+        class Unversioned(CountingFileProvider):
+            def version(self, url: str) -> Optional[str]:
+                return None
+
+        provider = Unversioned()
+        cached = CachingStorageProvider(provider, self.cache_dir)
+        url = self._remote("remote", b"foo")
+        dst = os.path.join(self.tmpdir, "dst")
+        cached.download_file(url, dst)
+        cached.download_file(url, dst)
+        self.assertEqual(provider.downloads, 2)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_init_plugin(self) -> None:
+        providers: Dict[str, StorageProvider] = {"file": self.provider}
+        with mock.patch.dict(_PROVIDERS, providers, clear=True):
+            cache.init_plugin({"cache_dir": self.cache_dir, "max_bytes": 100})
+            provider = _PROVIDERS["file"]
+            assert isinstance(provider, CachingStorageProvider)
+            self.assertIs(provider.provider, self.provider)
+            self.assertEqual(provider.max_bytes, 100)
+            # idempotent
+            cache.init_plugin({"cache_dir": self.cache_dir})
+            self.assertIs(_PROVIDERS["file"], provider)
+
+    def test_transfer_stats(self) -> None:
+        url = self._remote("remote", b"foo")
+        self.cached.download_blob(url)
+        self.cached.download_blob(url)
+        with mock.patch.dict(_PROVIDERS, {"file": self.cached}):
+            stats = transfer_stats()
+        self.assertIs(stats["file"], self.provider.stats)
+        # only the cache miss is transferred
+        self.assertEqual(stats["file"].bytes_downloaded, 3)
+
+    def test_init_plugin_lazy(self) -> None:
+        def load() -> None:
+            _PROVIDERS["file"] = self.provider
+
+        with mock.patch.dict(_PROVIDERS, clear=True), mock.patch.dict(
+            _LAZY_PROVIDERS, clear=True
+        ):
+            register_lazy_storage_provider("file", load)
+            cache.init_plugin({"cache_dir": self.cache_dir})
+            self.assertNotIn("file", _PROVIDERS)
+            # wrapped once loaded
+            provider = get_storage_provider("file:///foo")
+            assert isinstance(provider, CachingStorageProvider)
+            self.assertIs(provider.provider, self.provider)
+
+    def test_download_range(self) -> None:
+        url = self._remote("remote", b"foobar")
+        # not cached, served by the provider
+        self.assertEqual(self.cached.download_range(url, 3, 3), b"bar")
+        self.assertEqual(self.provider.downloads, 0)
+
+        self.cached.download_blob(url)
+        with mock.patch.object(
+            self.provider, "download_range", side_effect=AssertionError
+        ):
+            self.assertEqual(self.cached.download_range(url, 1, 2), b"oo")
+        self.assertEqual(self.provider.downloads, 1)
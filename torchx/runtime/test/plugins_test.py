@@ -8,9 +8,18 @@ import importlib
 import os
 import tempfile
 import unittest
+import unittest.mock as mock
+from typing import Callable, Dict
 
 import yaml
-from torchx.runtime.plugins import init_plugins, TORCHX_CONFIG_ENV
+from torchx.runtime.plugins import (
+    init_plugins,
+    init_plugins_from_config,
+    TORCHX_CONFIG_ENV,
+)
+from torchx.runtime.storage import _LAZY_PROVIDERS, get_storage_provider
+
+_EMPTY_LOADERS: Dict[str, Callable[[], None]] = {}
 
 
 class ContainerTest(unittest.TestCase):
@@ -38,3 +47,45 @@ class ContainerTest(unittest.TestCase):
             self.assertEqual(dummy_module.INIT_COUNT, 0)
             init_plugins()
             self.assertEqual(dummy_module.INIT_COUNT, 1)
+
+    @mock.patch.dict(_LAZY_PROVIDERS, _EMPTY_LOADERS)
+    def test_lazy_plugins(self) -> None:
+        """
+        Tests that plugins with schemes are loaded on the first use of them.
+        """
+        from torchx.runtime.test import dummy_module
+
+        importlib.reload(dummy_module)
+
+        module = "torchx.runtime.test.dummy_module"
+        config = {
+            "plugins": {module: {"foo": "bar"}},
+            "plugin_schemes": {module: ["dummy", "dummys"]},
+        }
+        init_plugins_from_config(config)
+        self.assertEqual(dummy_module.INIT_COUNT, 0)
+
+        # the dummy plugin does not register a provider
+        with self.assertRaisesRegex(AssertionError, "failed to find provider"):
+            get_storage_provider("dummy://foo")
+        self.assertEqual(dummy_module.INIT_COUNT, 1)
+        with self.assertRaisesRegex(AssertionError, "failed to find provider"):
+            get_storage_provider("dummys://foo")
+        self.assertEqual(dummy_module.INIT_COUNT, 1)
+        self.assertNotIn("dummy", _LAZY_PROVIDERS)
+
+    @mock.patch.dict(_LAZY_PROVIDERS, _EMPTY_LOADERS)
+    def test_eager_plugins(self) -> None:
+        from torchx.runtime.test import dummy_module
+
+        importlib.reload(dummy_module)
+
+        module = "torchx.runtime.test.dummy_module"
+        init_plugins_from_config(
+            {"plugins": {module: {"foo": "bar"}}, "plugin_schemes": {module: []}}
+        )
+        self.assertEqual(dummy_module.INIT_COUNT, 1)
+
+    def test_plugin_schemes_type(self) -> None:
+        with self.assertRaisesRegex(TypeError, "plugin_schemes must be a dict"):
+            init_plugins_from_config({"plugin_schemes": ["s3"]})
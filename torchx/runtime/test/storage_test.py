@@ -5,19 +5,83 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+import errno
 import os.path
+import shutil
 import tempfile
 import unittest
+import unittest.mock as mock
+from typing import Dict, Optional
 
+from torchx.runtime import storage
+from torchx.runtime.checksum import ChecksumMismatchError, checksum_bytes
 from torchx.runtime.storage import (
-    upload_blob,
+    FileProvider,
+    StorageProvider,
+    TransferStats,
+    copy_stream,
+    copy_tree,
+    copyfile,
     download_blob,
-    upload_file,
     download_file,
+    download_range,
+    get_storage_provider,
+    iter_chunks,
+    list_objects,
+    open_read,
+    open_write,
+    register_lazy_storage_provider,
+    register_storage_provider,
+    sync,
     temppath,
+    transfer_stats,
+    upload_blob,
+    upload_file,
 )
 
 
+class BlobProvider(StorageProvider):
+    """
+    Implements only the (abstract) blob and file methods.
+    """
+
+    SCHEME: str = "blob"
+
+    def __init__(self) -> None:
+        self.blobs: Dict[str, bytes] = {}
+
+    def download_blob(self, url: str) -> bytes:
+        return self.blobs[url]
+
+    def upload_blob(self, url: str, body: bytes) -> None:
+        self.blobs[url] = body
+
+    def download_file(self, url: str, path: str) -> None:
+        raise NotImplementedError()
+
+    def upload_file(self, path: str, url: str) -> None:
+        raise NotImplementedError()
+
+
+class ChecksumBlobProvider(BlobProvider):
+    """
+    Stores the md5 checksums of the uploaded blobs. The (default) streams
+    are not recorded in the stats by the provider.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.checksums: Dict[str, str] = {}
+        self.stats = TransferStats()
+
+    def upload_blob(self, url: str, body: bytes) -> None:
+        super().upload_blob(url, body)
+        self.checksums[url] = checksum_bytes("md5", body)
+
+    def stored_checksum(self, url: str) -> Optional[str]:
+        return self.checksums.get(url)
+
+
 class StorageTest(unittest.TestCase):
     def test_file_provider_blob(self) -> None:
         data = bytes(range(256))
@@ -44,3 +108,294 @@ class StorageTest(unittest.TestCase):
                 out_data = f.read()
 
         self.assertEqual(out_data, data)
+
+    def test_file_provider_stream(self) -> None:
+        data = bytes(range(256)) * 100
+
+        with temppath() as path:
+            with open_write(path) as f:
+                f.write(data[:100])
+                f.write(data[100:])
+            with open_read(path) as f:
+                self.assertEqual(f.read(), data)
+            chunks = list(iter_chunks(path, chunk_size=1000))
+
+        self.assertEqual([len(c) for c in chunks[:-1]], [1000] * 25)
+        self.assertEqual(len(chunks[-1]), 600)
+        self.assertEqual(b"".join(chunks), data)
+
+    def test_copy_stream(self) -> None:
+        data = bytes(range(256)) * 100
+
+        with temppath() as src, temppath() as dst:
+            upload_blob(src, data)
+            copy_stream(src, dst, chunk_size=1000)
+            self.assertEqual(download_blob(dst), data)
+
+    def test_copy_stream_checksum(self) -> None:
+        provider = ChecksumBlobProvider()
+        src, dst = "blob://src", "blob://dst"
+        provider.upload_blob(src, b"foo")
+
+        with mock.patch.dict(storage._PROVIDERS, {"blob": provider}):
+            copy_stream(src, dst)
+            self.assertEqual(provider.blobs[dst], b"foo")
+            self.assertEqual((provider.stats.uploads, provider.stats.downloads), (1, 1))
+
+            # dst holds the checksum of src (not written through upload_blob)
+            provider.checksums[dst] = provider.checksums[src]
+            copy_stream(src, dst)
+            self.assertEqual(provider.stats.uploads_skipped, 1)
+            self.assertEqual(provider.stats.bytes_skipped, 3)
+
+            provider.upload_blob(src, b"bar")
+            copy_stream(src, dst)
+            self.assertEqual(provider.blobs[dst], b"bar")
+            self.assertEqual(provider.stats.uploads_skipped, 1)
+
+    def test_copy_stream_local(self) -> None:
+        provider = FileProvider(checksum="md5")
+        with mock.patch.dict(storage._PROVIDERS, {"file": provider}):
+            with temppath() as src, temppath() as dst:
+                upload_blob(src, b"foo")
+                if provider.stored_checksum(src) is None:
+                    self.skipTest("extended attributes are not supported")
+                copy_stream(src, dst)
+                copy_stream(src, dst)
+                self.assertEqual(download_blob(dst), b"foo")
+        # checksummed by upload_file hence skipped the second time
+        self.assertEqual(
+            (provider.stats.uploads, provider.stats.uploads_skipped), (2, 1)
+        )
+
+    def test_default_stream(self) -> None:
+        provider = BlobProvider()
+        url = "blob://foo"
+
+        with provider.open_write(url) as f:
+            f.write(b"foo")
+            f.write(b"bar")
+            self.assertEqual(provider.blobs, {})
+        self.assertEqual(provider.blobs[url], b"foobar")
+
+        with provider.open_read(url) as f:
+            self.assertEqual(f.read(), b"foobar")
+        self.assertEqual(list(provider.iter_chunks(url, 4)), [b"foob", b"ar"])
+
+        with self.assertRaises(RuntimeError):
+            with provider.open_write("blob://bar") as f:
+                f.write(b"partial")
+                raise RuntimeError("failed")
+        self.assertNotIn("blob://bar", provider.blobs)
+
+    def test_copyfile(self) -> None:
+        data = os.urandom(3 * 1024 * 1024 + 7)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "src")
+            dst = os.path.join(tmpdir, "dst")
+            with open(src, "wb") as f:
+                f.write(data)
+
+            for fns in [
+                storage._copy_fns(),
+                [storage._sendfile, storage._pread_write],
+                [storage._pread_write],
+            ]:
+                with self.subTest(fns=fns):
+                    with mock.patch.object(storage, "_copy_fns", return_value=fns):
+                        copyfile(src, dst)
+                    with open(dst, "rb") as f:
+                        self.assertEqual(f.read(), data)
+                    os.remove(dst)
+
+            with self.assertRaises(shutil.SameFileError):
+                copyfile(src, src)
+
+    def test_copyfile_fallback(self) -> None:
+        unsupported = OSError(errno.EXDEV, "cross device")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "src")
+            dst = os.path.join(tmpdir, "dst")
+            with open(src, "wb") as f:
+                f.write(b"foo")
+
+            fns = [mock.Mock(side_effect=unsupported), storage._pread_write]
+            with mock.patch.object(storage, "_copy_fns", return_value=fns):
+                copyfile(src, dst)
+            with open(dst, "rb") as f:
+                self.assertEqual(f.read(), b"foo")
+
+            # errors other than unsupported files are raised
+            fns = [mock.Mock(side_effect=OSError(errno.EIO, "io error"))]
+            with mock.patch.object(storage, "_copy_fns", return_value=fns):
+                with self.assertRaises(OSError):
+                    copyfile(src, dst)
+
+    def test_copy_tree(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "src")
+            os.makedirs(os.path.join(src, "a", "b"))
+            os.makedirs(os.path.join(src, "empty"))
+            files = {"foo": b"foo", "a/bar": b"bar", "a/b/baz": os.urandom(1024)}
+            for name, data in files.items():
+                with open(os.path.join(src, name), "wb") as f:
+                    f.write(data)
+
+            provider = FileProvider()
+            for max_workers in [1, 4]:
+                dst = os.path.join(tmpdir, f"dst{max_workers}")
+                self.assertEqual(
+                    provider.upload_dir(src, f"file://{dst}", max_workers), 3
+                )
+                for name, data in files.items():
+                    with open(os.path.join(dst, name), "rb") as f:
+                        self.assertEqual(f.read(), data)
+                self.assertTrue(os.path.isdir(os.path.join(dst, "empty")))
+
+            self.assertEqual(copy_tree(os.path.join(src, "empty"), dst), 0)
+            self.assertEqual(provider.download_dir(f"file://{src}/a", dst), 2)
+            with open(os.path.join(dst, "b", "baz"), "rb") as f:
+                self.assertEqual(f.read(), files["a/b/baz"])
+
+    def test_sync(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "src")
+            dst = os.path.join(tmpdir, "dst")
+            os.makedirs(os.path.join(src, "a", "b"))
+            files = {"foo": b"foo", "a/bar": b"bar", "a/b/baz": b"baz"}
+            for name, data in files.items():
+                upload_blob(f"file://{src}/{name}", data)
+
+            self.assertEqual(
+                sorted((o.path, o.size) for o in list_objects(f"file://{src}")),
+                [("a/b/baz", 3), ("a/bar", 3), ("foo", 3)],
+            )
+
+            stats = sync(f"file://{src}", f"file://{dst}/")
+            self.assertEqual((stats.copied, stats.skipped, stats.bytes), (3, 0, 9))
+            for name, data in files.items():
+                self.assertEqual(download_blob(f"file://{dst}/{name}"), data)
+
+            stats = sync(f"file://{src}", f"file://{dst}")
+            self.assertEqual((stats.copied, stats.skipped), (0, 3))
+
+            # changed size
+            upload_blob(f"file://{src}/foo", b"foobar")
+            # same size but newer
+            upload_blob(f"file://{src}/a/bar", b"BAR")
+            mtime = os.stat(os.path.join(dst, "a", "bar")).st_mtime
+            os.utime(os.path.join(src, "a", "bar"), (mtime + 10, mtime + 10))
+            stats = sync(f"file://{src}", f"file://{dst}", max_workers=1)
+            self.assertEqual((stats.copied, stats.skipped, stats.bytes), (2, 1, 9))
+            self.assertEqual(download_blob(f"file://{dst}/foo"), b"foobar")
+            self.assertEqual(download_blob(f"file://{dst}/a/bar"), b"BAR")
+
+    def test_list_objects_unsupported(self) -> None:
+        with self.assertRaises(NotImplementedError):
+            list(BlobProvider().list_objects("blob://foo"))
+
+    def test_download_range(self) -> None:
+        data = bytes(range(256))
+
+        with temppath() as path:
+            upload_blob(path, data)
+            self.assertEqual(download_range(path, 10, 5), data[10:15])
+            self.assertEqual(download_range(path, 250, 10), data[250:])
+            self.assertEqual(download_range(path, 300, 10), b"")
+            self.assertEqual(download_range(path, 0, 0), b"")
+
+        provider = BlobProvider()
+        provider.upload_blob("blob://foo", data)
+        self.assertEqual(provider.download_range("blob://foo", 10, 5), data[10:15])
+        self.assertEqual(provider.download_range("blob://foo", 250, 10), data[250:])
+        self.assertEqual(provider.download_range("blob://foo", 300, 10), b"")
+
+    def test_file_provider_checksum(self) -> None:
+        provider = FileProvider(checksum="md5")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "foo")
+            url = f"file://{path}"
+            provider.upload_blob(url, b"foo")
+            try:
+                os.getxattr(path, storage.CHECKSUM_XATTR)
+            except OSError:
+                self.skipTest("extended attributes are not supported")
+
+            # identical contents are skipped
+            provider.upload_blob(url, b"foo")
+            src = os.path.join(tmpdir, "src")
+            with open(src, "wb") as f:
+                f.write(b"foo")
+            provider.upload_file(src, url)
+            stats = provider.stats
+            self.assertEqual((stats.uploads, stats.uploads_skipped), (1, 2))
+            self.assertEqual((stats.bytes_uploaded, stats.bytes_skipped), (3, 6))
+
+            provider.upload_blob(url, b"bar")
+            self.assertEqual(provider.download_blob(url), b"bar")
+            self.assertEqual(stats.uploads, 2)
+
+            # written by other means, the stale checksum is ignored
+            with open(path, "wb") as f:
+                f.write(b"foobar")
+            self.assertEqual(provider.download_blob(url), b"foobar")
+            provider.upload_blob(url, b"foobar")
+            self.assertEqual(stats.uploads, 3)
+
+            # corrupted in place (same size and mtime)
+            st = os.stat(path)
+            with open(path, "r+b") as f:
+                f.write(b"F")
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+            with self.assertRaises(ChecksumMismatchError):
+                provider.download_blob(url)
+            with self.assertRaises(ChecksumMismatchError):
+                provider.download_file(url, os.path.join(tmpdir, "dst"))
+
+    def test_file_provider_checksum_unknown(self) -> None:
+        with self.assertRaisesRegex(ValueError, "Unknown checksum algorithm"):
+            FileProvider(checksum="sha0")
+
+    def test_checksum_bytes(self) -> None:
+        self.assertEqual(checksum_bytes("crc32", b"foo"), "crc32:8c736521")
+        self.assertEqual(
+            checksum_bytes("md5", b"foo"), "md5:acbd18db4cc2f85cedef654fccc4a4d8"
+        )
+
+    def test_transfer_stats(self) -> None:
+        provider = FileProvider()
+        with mock.patch.dict(storage._PROVIDERS, {"file": provider}):
+            with temppath() as path:
+                upload_blob(path, b"foo")
+                download_blob(path)
+            stats = transfer_stats()
+        self.assertEqual(list(stats.keys()), ["file"])
+        self.assertEqual(stats["file"].bytes_uploaded, 3)
+        self.assertEqual(stats["file"].bytes_downloaded, 3)
+
+    def test_lazy_provider(self) -> None:
+        loads = []
+        provider = BlobProvider()
+
+        def load() -> None:
+            loads.append(1)
+            if len(loads) == 1:
+                raise ImportError("flaky")
+            # a lookup by the loader itself does not recurse
+            with self.assertRaises(AssertionError):
+                get_storage_provider("blob://foo")
+            register_storage_provider(provider)
+
+        with mock.patch.dict(storage._PROVIDERS), mock.patch.dict(
+            storage._LAZY_PROVIDERS
+        ):
+            register_lazy_storage_provider("blob", load)
+            self.assertEqual(loads, [])
+            # failed loads are retried
+            with self.assertRaises(ImportError):
+                get_storage_provider("blob://foo")
+            self.assertIs(get_storage_provider("blob://foo"), provider)
+            self.assertIs(get_storage_provider("blob://bar"), provider)
+            self.assertEqual(len(loads), 2)
@@ -7,6 +7,7 @@
 
 from typing import Dict
 
+import torchx.schedulers.inline_scheduler as inline_scheduler
 import torchx.schedulers.local_scheduler as local_scheduler
 from torchx.schedulers.api import Scheduler
 from torchx.specs.api import SchedulerBackend
@@ -24,6 +25,7 @@ def get_schedulers(
         default={
             "local": local_scheduler.create_scheduler,
             "default": local_scheduler.create_scheduler,
+            "inline": inline_scheduler.create_scheduler,
         },
         ignore_missing=True,
     )
@@ -6,6 +6,7 @@
 # LICENSE file in the root directory of this source tree.
 
 import abc
+import time
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Iterable, List, Optional
@@ -140,6 +141,14 @@ class Scheduler(abc.ABC):
         desc = self.describe(app_id)
         return desc is not None
 
+    def wait_for_update(self, app_id: str, timeout: float) -> None:
+        """
+        Blocks until the state of the app may have changed or ``timeout``
+        seconds have elapsed (used by the runner to poll the app's state).
+        Schedulers that are not notified of state changes sleep ``timeout`` seconds.
+        """
+        time.sleep(timeout)
+
     @abc.abstractmethod
     def _cancel_existing(self, app_id: str) -> None:
         """
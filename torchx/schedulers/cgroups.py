@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Minimal helpers to place locally launched processes into cgroup v2 subtrees
+and to read back their resource accounting. Used by ``LocalScheduler`` when
+the ``use_cgroups`` run option is set.
+
+Only the unified (v2) hierarchy is supported. The parent cgroup (``cgroup_root``)
+must be writable by the current user, which typically means running as root or
+under a systemd unit/scope with ``Delegate=yes``.
+"""
+
+import logging
+import os
+from typing import Dict, List, Optional
+
+from torchx.specs.api import Resource
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+CGROUP2_MOUNT: str = "/sys/fs/cgroup"
+
+# default parent cgroup under which the per-app subtrees are created
+DEFAULT_CGROUP_ROOT: str = os.path.join(CGROUP2_MOUNT, "torchx")
+
+# cpu.max period (in microseconds) used when translating ``Resource.cpu``
+CPU_PERIOD_USEC: int = 100000
+
+# controllers enabled on each level of the subtree so that the leaves can set limits
+_CONTROLLERS: List[str] = ["cpu", "memory"]
+
+
+def is_cgroup2_available(mount: str = CGROUP2_MOUNT) -> bool:
+    """
+    Returns ``True`` if ``mount`` is the root of a cgroup v2 (unified) hierarchy.
+    """
+    return os.path.isfile(os.path.join(mount, "cgroup.controllers"))
+
+
+def limits_from_resource(resource: Resource) -> Dict[str, str]:
+    """
+    Translates the role's ``Resource`` into cgroup v2 interface file values.
+    Non-positive (e.g. ``NULL_RESOURCE``) values are left unlimited.
+
+    1. ``cpu`` -> ``cpu.max`` (``cpu`` cores worth of quota per period)
+    2. ``memMB`` -> ``memory.max`` (in bytes)
+    """
+    limits = {}
+    if resource.cpu > 0:
+        limits["cpu.max"] = f"{resource.cpu * CPU_PERIOD_USEC} {CPU_PERIOD_USEC}"
+    if resource.memMB > 0:
+        limits["memory.max"] = str(resource.memMB * 1024 * 1024)
+    return limits
+
+
+def _read_kv(path: str) -> Dict[str, int]:
+    """
+    Reads a flat-keyed cgroup file (e.g. ``cpu.stat``, ``memory.events``).
+    Returns an empty dict if the file does not exist.
+    """
+    kv = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                key, _, value = line.partition(" ")
+                if value.strip().isdigit():
+                    kv[key] = int(value)
+    except FileNotFoundError:
+        pass
+    return kv
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path, "r") as f:
+            value = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+class Cgroup:
+    """
+    A leaf cgroup v2 directory holding the processes of a single replica.
+    ``path`` must be a descendant of the (pre-existing) parent cgroup ``root``.
+    """
+
+    def __init__(self, root: str, path: str) -> None:
+        self.root = root
+        self.path = path
+
+    def create(self, limits: Dict[str, str]) -> None:
+        """
+        Creates this cgroup (and any missing ancestors up to ``root``),
+        enables the cpu and memory controllers along the way and writes
+        the given ``limits`` into the leaf.
+
+        Raises:
+            OSError - if the hierarchy is not writable
+        """
+        os.makedirs(self.path, exist_ok=True)
+
+        # enable controllers top-down so that the leaf gets cpu.max/memory.max
+        rel = os.path.relpath(os.path.dirname(self.path), self.root)
+        parts = [] if rel == os.curdir else rel.split(os.sep)
+        parent = self.root
+        self._enable_controllers(parent)
+        for part in parts:
+            parent = os.path.join(parent, part)
+            self._enable_controllers(parent)
+
+        for name, value in limits.items():
+            self._write(name, value)
+
+    def _enable_controllers(self, path: str) -> None:
+        controllers_file = os.path.join(path, "cgroup.controllers")
+        if not os.path.isfile(controllers_file):
+            return
+        with open(controllers_file, "r") as f:
+            available = f.read().split()
+        to_enable = " ".join(f"+{c}" for c in _CONTROLLERS if c in available)
+        if to_enable:
+            with open(os.path.join(path, "cgroup.subtree_control"), "w") as f:
+                f.write(to_enable)
+
+    def _write(self, name: str, value: str) -> None:
+        with open(os.path.join(self.path, name), "w") as f:
+            f.write(value)
+
+    def attach_self(self) -> None:
+        """
+        Moves the calling process into this cgroup. Intended to be called
+        from ``preexec_fn`` so that the replica (and all its children) are
+        accounted for from the start, hence only uses low level ``os`` calls.
+        """
+        fd = os.open(os.path.join(self.path, "cgroup.procs"), os.O_WRONLY)
+        try:
+            os.write(fd, str(os.getpid()).encode())
+        finally:
+            os.close(fd)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Reads back the resource accounting of this cgroup. Keys are omitted
+        when the kernel does not expose the corresponding file
+        (e.g. ``memory.peak`` requires Linux 5.19+).
+
+        1. ``memory_current_bytes``, ``memory_peak_bytes``
+        2. ``cpu_usage_usec``, ``cpu_user_usec``, ``cpu_system_usec``
+        3. ``cpu_nr_throttled``, ``cpu_throttled_usec``
+        4. ``oom``, ``oom_kill``
+        """
+        stats = {}
+        for key, filename in [
+            ("memory_current_bytes", "memory.current"),
+            ("memory_peak_bytes", "memory.peak"),
+        ]:
+            value = _read_int(os.path.join(self.path, filename))
+            if value is not None:
+                stats[key] = value
+
+        cpu_stat = _read_kv(os.path.join(self.path, "cpu.stat"))
+        for key in [
+            "usage_usec",
+            "user_usec",
+            "system_usec",
+            "nr_throttled",
+            "throttled_usec",
+        ]:
+            if key in cpu_stat:
+                stats[f"cpu_{key}"] = cpu_stat[key]
+
+        memory_events = _read_kv(os.path.join(self.path, "memory.events"))
+        for key in ["oom", "oom_kill"]:
+            if key in memory_events:
+                stats[key] = memory_events[key]
+        return stats
+
+    def remove(self) -> None:
+        """
+        Removes this cgroup and any ancestors (up to but excluding ``root``)
+        that became empty. Best effort; cgroups that still have live
+        processes (or children) are left in place.
+        """
+        path = self.path
+        while os.path.abspath(path) != os.path.abspath(self.root):
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                log.debug(f"cannot remove cgroup: {path}: {e}")
+                return
+            path = os.path.dirname(path)
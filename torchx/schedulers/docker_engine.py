@@ -0,0 +1,628 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Minimal client of the Docker Engine (HTTP) API over the local unix socket
+used by ``LocalScheduler`` (``image_type=docker_api``) to run the replicas as
+containers without spawning a ``docker`` CLI process per replica.
+
+1. ``DockerClient``: pooled keep-alive connections to the engine
+2. ``ContainerProcess``: ``subprocess.Popen`` look-alike of a container
+3. ``ContainerEventWatcher``: sets the exit codes of the ``ContainerProcess`` es
+   from the ``die`` events streamed from the engine
+4. ``ContainerLogStreamer``: streams the (demultiplexed) stdout and stderr of a container
+"""
+
+import http.client
+import json
+import logging
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, LifoQueue
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote, urlencode
+
+from pyre_extensions import none_throws
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+API_VERSION = "v1.41"
+
+# max number of idle connections kept (and of concurrent batched requests)
+DEFAULT_MAX_CONNECTIONS: int = 8
+DEFAULT_TIMEOUT: float = 60.0
+
+# backoff (in seconds) before reconnecting a broken event stream
+EVENTS_RECONNECT_DELAY: float = 1.0
+
+# labels put on the containers created by torchx
+LABEL_SESSION = "torchx.session_name"
+LABEL_APP_ID = "torchx.app_id"
+LABEL_ROLE_NAME = "torchx.role_name"
+LABEL_REPLICA_ID = "torchx.replica_id"
+
+# stream types of the multiplexed container logs
+STDOUT = 1
+STDERR = 2
+
+
+def default_socket_path() -> str:
+    """
+    Returns the engine socket from ``DOCKER_HOST`` (if it is a ``unix://`` url)
+    or the default ``/var/run/docker.sock``.
+    """
+    host = os.environ.get("DOCKER_HOST", "")
+    if host.startswith("unix://"):
+        return host[len("unix://") :]
+    return DOCKER_SOCKET
+
+
+class DockerEngineError(Exception):
+    """
+    Raised when the engine replies with an error status.
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(f"docker engine error ({status}): {message}")
+        self.status = status
+        self.message = message
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: Optional[float]) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self._socket_path)
+        self.sock = sock
+
+
+class _Stream:
+    """
+    Response of a streaming request. Its connection is closed (not pooled)
+    once the stream is closed.
+    """
+
+    def __init__(
+        self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse
+    ) -> None:
+        self._conn = conn
+        self.resp = resp
+
+    def close(self) -> None:
+        # shutdown (rather than just close) unblocks a reader blocked on the socket
+        sock = self._conn.sock
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._conn.close()
+
+    def __enter__(self) -> "_Stream":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+class DockerClient:
+    """
+    Talks to the Docker Engine API over the unix socket ``socket_path``.
+    Up to ``max_connections`` idle keep-alive connections are pooled and reused
+    across requests. Streaming requests (logs, events, pulls) use dedicated
+    connections. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        api_version: str = API_VERSION,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.socket_path: str = socket_path or default_socket_path()
+        self.api_version = api_version
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._pool: "LifoQueue[http.client.HTTPConnection]" = LifoQueue()
+
+    def _url(self, path: str, params: Optional[Dict[str, Any]] = None) -> str:
+        url = f"/{self.api_version}{path}"
+        if params:
+            url += "?" + urlencode(params)
+        return url
+
+    def _connect(self, timeout: Optional[float]) -> http.client.HTTPConnection:
+        return _UnixHTTPConnection(self.socket_path, timeout)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Returns ``(connection, pooled)``.
+        """
+        try:
+            return self._pool.get_nowait(), True
+        except Empty:
+            return self._connect(self.timeout), False
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        if self._pool.qsize() < self.max_connections:
+            self._pool.put(conn)
+        else:
+            conn.close()
+
+    def _send(
+        self,
+        conn: http.client.HTTPConnection,
+        method: str,
+        url: str,
+        body: Optional[Dict[str, Any]],
+    ) -> http.client.HTTPResponse:
+        headers = {}
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        conn.request(method, url, body=data, headers=headers)
+        return conn.getresponse()
+
+    def _check(self, resp: http.client.HTTPResponse, data: bytes) -> None:
+        if resp.status >= 400:
+            try:
+                message = json.loads(data)["message"]
+            except (ValueError, KeyError, TypeError):
+                message = data.decode("utf-8", errors="replace")
+            raise DockerEngineError(resp.status, message)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        """
+        Sends the request on a pooled connection and returns the parsed
+        json reply (``None`` if the reply is empty).
+
+        Raises:
+            DockerEngineError: if the engine replied with an error status
+        """
+        url = self._url(path, params)
+        conn, pooled = self._acquire()
+        try:
+            resp = self._send(conn, method, url, body)
+        except (ConnectionError, http.client.HTTPException):
+            conn.close()
+            if not pooled:
+                raise
+            # the engine closed the idle (pooled) connection, retry on a new one
+            conn = self._connect(self.timeout)
+            try:
+                resp = self._send(conn, method, url, body)
+            except Exception:
+                conn.close()
+                raise
+
+        try:
+            data = resp.read()
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+
+        self._check(resp, data)
+        return json.loads(data) if data else None
+
+    def stream(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None,
+    ) -> _Stream:
+        """
+        Sends the request on a dedicated (not timing out) connection and returns
+        the streamed reply once its headers are received.
+        """
+        conn = self._connect(None)
+        try:
+            resp = self._send(conn, method, self._url(path, params), body)
+            if resp.status >= 400:
+                self._check(resp, resp.read())
+        except Exception:
+            conn.close()
+            raise
+        return _Stream(conn, resp)
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections.
+        """
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                return
+
+    def ping(self) -> bool:
+        try:
+            self.request("GET", "/_ping")
+            return True
+        except (OSError, DockerEngineError, http.client.HTTPException):
+            return False
+
+    def pull(self, image: str) -> None:
+        """
+        Pulls ``image`` (``repo[:tag]``, defaults to the ``latest`` tag).
+        """
+        repo, tag = image, "latest"
+        if ":" in image.rsplit("/", 1)[-1]:
+            repo, tag = image.rsplit(":", 1)
+        with self.stream(
+            "POST", "/images/create", {"fromImage": repo, "tag": tag}
+        ) as stream:
+            # progress is streamed as json lines, errors included
+            for line in stream.resp:
+                if not line.strip():
+                    continue
+                progress = json.loads(line)
+                if "error" in progress:
+                    raise DockerEngineError(200, progress["error"])
+
+    def create_container(
+        self, config: Dict[str, Any], name: Optional[str] = None
+    ) -> str:
+        """
+        Creates a container (not started) and returns its id.
+        """
+        params = {"name": name} if name else None
+        return self.request("POST", "/containers/create", params, config)["Id"]
+
+    def create_containers(self, configs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Creates the containers concurrently (on up to ``max_connections``
+        connections) and returns their ids (in the order of ``configs``).
+        The containers that were created are removed if any creation fails.
+        """
+        if not configs:
+            return []
+        workers = min(self.max_connections, len(configs))
+        with ThreadPoolExecutor(workers, thread_name_prefix="torchx_docker") as pool:
+            futures = [pool.submit(self.create_container, c) for c in configs]
+        errors = [f.exception() for f in futures if f.exception()]
+        if errors:
+            for f in futures:
+                if not f.exception():
+                    self.remove(f.result())
+            raise none_throws(errors[0])
+        return [f.result() for f in futures]
+
+    def start(self, container_id: str) -> None:
+        self.request("POST", f"/containers/{quote(container_id)}/start")
+
+    def kill(self, container_id: str, signal: str = "SIGTERM") -> None:
+        """
+        Signals the container. No-op if the container is not running (anymore).
+        """
+        try:
+            self.request(
+                "POST", f"/containers/{quote(container_id)}/kill", {"signal": signal}
+            )
+        except DockerEngineError as e:
+            if e.status not in (404, 409):
+                raise
+
+    def remove(self, container_id: str) -> None:
+        """
+        Removes the container (killing it if it is still running).
+        No-op if the container does not exist (anymore).
+        """
+        try:
+            self.request(
+                "DELETE",
+                f"/containers/{quote(container_id)}",
+                {"force": "true", "v": "true"},
+            )
+        except DockerEngineError as e:
+            if e.status != 404:
+                raise
+
+    def inspect(self, container_id: str) -> Dict[str, Any]:
+        return self.request("GET", f"/containers/{quote(container_id)}/json")
+
+    def logs(
+        self, container_id: str, follow: bool = True
+    ) -> Iterator[Tuple[int, bytes]]:
+        """
+        Returns the ``(stream, data)`` (``stream`` is ``STDOUT`` or ``STDERR``)
+        of the container's output demultiplexed from the engine's log stream.
+        The iterator ends once the container exits if ``follow=True``.
+        """
+        with self.stream(
+            "GET",
+            f"/containers/{quote(container_id)}/logs",
+            {"follow": str(follow).lower(), "stdout": "true", "stderr": "true"},
+        ) as stream:
+            resp = stream.resp
+            while True:
+                header = resp.read(8)
+                if len(header) < 8:
+                    return
+                stream_type, size = struct.unpack(">BxxxL", header)
+                data = resp.read(size)
+                if data:
+                    yield stream_type, data
+
+    def events(self, filters: Dict[str, List[str]]) -> _Stream:
+        """
+        Subscribes to the engine events that match ``filters``.
+        The events are streamed as json lines.
+        """
+        return self.stream("GET", "/events", {"filters": json.dumps(filters)})
+
+
+class ContainerProcess:
+    """
+    Quacks like (the parts of ``subprocess.Popen`` that ``LocalScheduler`` uses)
+    a process for a container. ``returncode`` is set by the ``ContainerEventWatcher``
+    that the process is registered with once the container exits.
+    """
+
+    def __init__(self, client: DockerClient, container_id: str) -> None:
+        self.client = client
+        self.container_id = container_id
+        # host pid of the container's init process (set once started)
+        self.pid: int = -1
+        self.returncode: Optional[int] = None
+        self._exited = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        self.client.start(self.container_id)
+        try:
+            self.pid = self.client.inspect(self.container_id)["State"]["Pid"]
+        except DockerEngineError:
+            pass  # already exited (and removed)
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if not self._exited.wait(timeout):
+            # pyre-ignore [6]: args is the container id rather than the command
+            raise subprocess.TimeoutExpired(self.container_id, timeout)
+        return none_throws(self.returncode)
+
+    def terminate(self) -> None:
+        if self.returncode is None:
+            self.client.kill(self.container_id, "SIGTERM")
+
+    def kill(self) -> None:
+        if self.returncode is None:
+            self.client.kill(self.container_id, "SIGKILL")
+
+    def add_exit_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Invokes ``callback()`` (on the event watcher thread) once the container
+        exits (right away if it already has).
+        """
+        with self._lock:
+            if self.returncode is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set_exited(self, returncode: int) -> None:
+        with self._lock:
+            if self.returncode is not None:
+                return
+            self.returncode = returncode
+            self._exited.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                log.exception("container exit callback failed")
+
+
+class ContainerEventWatcher:
+    """
+    Streams the ``die`` events of the containers labeled with ``session_name``
+    (on a single background thread) and sets the exit codes of the watched
+    ``ContainerProcess`` es. Should the event stream break, it is reconnected
+    and the watched containers are inspected for exits that were missed.
+    """
+
+    def __init__(self, client: DockerClient, session_name: str) -> None:
+        self._client = client
+        self._filters: Dict[str, List[str]] = {
+            "type": ["container"],
+            "event": ["die"],
+            "label": [f"{LABEL_SESSION}={session_name}"],
+        }
+        self._procs: Dict[str, ContainerProcess] = {}
+        self._lock = threading.Lock()
+        self._connected = threading.Event()
+        self._stream: Optional[_Stream] = None
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, timeout: float = DEFAULT_TIMEOUT) -> None:
+        """
+        Starts streaming the events (if not already) and waits until subscribed
+        so that no exit of a container started afterwards is missed.
+        """
+        with self._lock:
+            if not self._thread:
+                self._thread = threading.Thread(
+                    target=self._run, name="torchx_docker_events", daemon=True
+                )
+                self._thread.start()
+        if not self._connected.wait(timeout):
+            raise TimeoutError(
+                f"timed out subscribing to the events of {self._client.socket_path}"
+            )
+
+    def watch(self, proc: ContainerProcess) -> None:
+        with self._lock:
+            self._procs[proc.container_id] = proc
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped = True
+            stream = self._stream
+        if stream:
+            stream.close()
+
+    def _exited(self, container_id: str, returncode: int) -> None:
+        with self._lock:
+            proc = self._procs.pop(container_id, None)
+        if proc:
+            proc.set_exited(returncode)
+
+    def _reconcile(self) -> None:
+        """
+        Inspects the watched containers for exits missed while disconnected.
+        """
+        with self._lock:
+            procs = list(self._procs.values())
+        for proc in procs:
+            try:
+                state = self._client.inspect(proc.container_id)["State"]
+            except DockerEngineError as e:
+                if e.status == 404:
+                    self._exited(proc.container_id, -1)
+                continue
+            if not state.get("Running") and state.get("Status") != "created":
+                self._exited(proc.container_id, int(state.get("ExitCode", -1)))
+
+    def _run(self) -> None:
+        reconnect = False
+        while not self._stopped:
+            try:
+                stream = self._client.events(self._filters)
+            except Exception as e:
+                log.warning(f"failed to subscribe to the docker events: {e}")
+                time.sleep(EVENTS_RECONNECT_DELAY)
+                continue
+
+            with self._lock:
+                if self._stopped:
+                    stream.close()
+                    return
+                self._stream = stream
+            if reconnect:
+                self._reconcile()
+            self._connected.set()
+
+            try:
+                for line in stream.resp:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    actor = event.get("Actor", {})
+                    exit_code = actor.get("Attributes", {}).get("exitCode", "-1")
+                    self._exited(actor.get("ID", event.get("id")), int(exit_code))
+            except Exception as e:
+                if not self._stopped:
+                    log.warning(f"docker event stream broke: {e}")
+            finally:
+                stream.close()
+            reconnect = True
+            if not self._stopped:
+                time.sleep(EVENTS_RECONNECT_DELAY)
+
+
+class ContainerLogStreamer:
+    """
+    Streams the stdout and stderr of the container to ``write_stdout`` and
+    ``write_stderr`` on a background thread until the container exits, then
+    removes the container (once the ``ContainerProcess`` has its exit code).
+    """
+
+    def __init__(
+        self,
+        proc: ContainerProcess,
+        write_stdout: Callable[[bytes], None],
+        write_stderr: Callable[[bytes], None],
+    ) -> None:
+        self._proc = proc
+        self._writes: Dict[int, Callable[[bytes], None]] = {
+            STDOUT: write_stdout,
+            STDERR: write_stderr,
+        }
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"torchx_docker_logs_{proc.container_id[:12]}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        proc = self._proc
+        try:
+            for stream_type, data in proc.client.logs(proc.container_id):
+                self._writes.get(stream_type, self._writes[STDOUT])(data)
+        except Exception as e:
+            log.warning(f"failed to stream the logs of {proc.container_id}: {e}")
+
+        try:
+            proc.wait(DEFAULT_TIMEOUT)
+            proc.client.remove(proc.container_id)
+        except Exception as e:
+            log.warning(f"failed to remove container {proc.container_id}: {e}")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Returns ``False`` if the logs are still streaming after ``timeout`` seconds.
+        """
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+
+class StreamedLog:
+    """
+    ``_LocalReplica.stdout`` (or ``stderr``) of a container replica.
+    ``close()`` waits for the streamed logs to be drained before closing the sink.
+    """
+
+    def __init__(
+        self,
+        streamer: ContainerLogStreamer,
+        close: Callable[[], None],
+        name: str,
+        drain_timeout: float,
+    ) -> None:
+        self._streamer = streamer
+        self._close = close
+        self._closed = False
+        self._drain_timeout = drain_timeout
+        self.name = name
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if not self._streamer.wait(self._drain_timeout):
+            log.warning(f"timed out draining the logs of {self.name}")
+        self._close()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Dispatches process exit events (and delayed calls) from a single background
+thread. On Linux 5.3+ (python 3.9+) process exits are observed via ``pidfd``
+so there is no polling; otherwise the watched processes are polled.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import selectors
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# how often to poll processes that cannot be watched with a pidfd
+POLL_INTERVAL: float = 0.1
+
+
+class ExitWatcher:
+    """
+    Invokes ``callback()`` on the watcher thread once the watched process exits.
+    Callbacks are invoked serially hence should be short (or schedule work
+    via ``call_later``). Exceptions raised by callbacks are logged and swallowed.
+    """
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+
+        self._lock = threading.Lock()
+        # processes that could not be watched with a pidfd, polled instead
+        # pyre-fixme[24]: Generic type `subprocess.Popen` expects 1 type parameter.
+        self._polled: Dict[int, Tuple[subprocess.Popen, Callable[[], None]]] = {}
+        # heap of (due time, seq, fn) for call_later
+        self._timers: List[Tuple[float, int, Callable[[], None]]] = []
+        self._seq: Iterator[int] = itertools.count()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    # pyre-fixme[24]: Generic type `subprocess.Popen` expects 1 type parameter.
+    def watch(self, proc: subprocess.Popen, callback: Callable[[], None]) -> None:
+        with self._lock:
+            try:
+                # pyre-ignore [16]: pidfd_open is only available on python 3.9+
+                pidfd = os.pidfd_open(proc.pid)
+                self._selector.register(pidfd, selectors.EVENT_READ, callback)
+            except (AttributeError, OSError):
+                # no pidfd support or the process was already reaped
+                self._polled[proc.pid] = (proc, callback)
+            self._start()
+        self._wakeup()
+
+    def call_later(self, delay: float, fn: Callable[[], None]) -> None:
+        with self._lock:
+            heapq.heappush(
+                self._timers, (time.monotonic() + delay, next(self._seq), fn)
+            )
+            self._start()
+        self._wakeup()
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+            if not self._thread:
+                self._close()
+                return
+        self._wakeup()
+
+    def _close(self) -> None:
+        self._selector.close()
+        os.close(self._wakeup_r)
+        os.close(self._wakeup_w)
+
+    def _start(self) -> None:
+        if not self._thread:
+            self._thread = threading.Thread(
+                target=self._run, name="torchx_exit_watcher", daemon=True
+            )
+            self._thread.start()
+
+    def _wakeup(self) -> None:
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            pass  # a wakeup is already pending
+
+    def _timeout(self) -> Optional[float]:
+        with self._lock:
+            timeout = POLL_INTERVAL if self._polled else None
+            if self._timers:
+                due = max(self._timers[0][0] - time.monotonic(), 0)
+                timeout = due if timeout is None else min(timeout, due)
+            return timeout
+
+    def _run(self) -> None:
+        while not self._stopped:
+            callbacks = []
+            for key, _ in self._selector.select(self._timeout()):
+                if key.fd == self._wakeup_r:
+                    os.read(self._wakeup_r, 4096)
+                    continue
+                with self._lock:
+                    self._selector.unregister(key.fd)
+                os.close(key.fd)
+                callbacks.append(key.data)
+
+            with self._lock:
+                for pid, (proc, callback) in list(self._polled.items()):
+                    if proc.poll() is not None:
+                        del self._polled[pid]
+                        callbacks.append(callback)
+
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, _, fn = heapq.heappop(self._timers)
+                    callbacks.append(fn)
+
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception:
+                    log.exception("exit watcher callback failed")
+
+        self._close()
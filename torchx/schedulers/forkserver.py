@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+A forkserver that the python replicas of ``LocalScheduler`` are forked from
+so that they skip the interpreter startup and the imports of the (preloaded)
+heavy modules (e.g. ``torch``).
+
+The server is a python process (of the replicas' interpreter) that imports
+the preload modules once and then forks a child for each replica. The child
+applies the replica's env, cwd and stdio (the file descriptors are passed
+over a unix socket) and runs the replica's script (``python script.py ...``)
+or module (``python -m module ...``) as ``__main__``. The exit code (or the
+negative signal number) of the child is reported back like ``Popen.returncode``.
+
+.. note:: The interpreter options (e.g. ``python -u``) and the env vars that
+          are read at interpreter startup (other than ``PYTHONPATH`` and
+          ``PYTHONUNBUFFERED``) are not applied to the forked replicas.
+
+This file only depends on the standard library since it is run (as a script)
+with the replicas' interpreter.
+"""
+
+import atexit
+import ctypes
+import io
+import json
+import logging
+import os
+import runpy
+import selectors
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import traceback
+from multiprocessing.reduction import recvfds, sendfds
+from typing import Any, Callable, Dict, IO, List, Optional, Sequence
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+READY = "ready"
+# seconds to wait for the server to preload the modules and start listening
+START_TIMEOUT: float = 300
+
+
+def can_fork(args: Sequence[str]) -> bool:
+    """
+    Returns ``True`` if the command runs a python script or module without
+    interpreter options (hence can be forked from a forkserver).
+    """
+    if len(args) < 2 or not os.path.basename(args[0]).startswith("python"):
+        return False
+    if args[1] == "-m":
+        return len(args) > 2
+    return not args[1].startswith("-")
+
+
+def _pr_set_pdeathsig() -> None:
+    # same as local_scheduler._pr_set_pdeathsig (this file is stdlib only)
+    libc = ctypes.CDLL("libc.so.6")
+    PR_SET_PDEATHSIG = 1
+    libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
+
+
+def _returncode(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+def _exit_code(code: Any) -> int:
+    # same conversion of SystemExit.code as the interpreter's
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+class ForkedProcess:
+    """
+    Quacks like (the parts of ``subprocess.Popen`` that ``LocalScheduler`` uses)
+    a process forked from a ``ForkServer``. ``returncode`` is set (on a background
+    thread) once the forkserver reports (on ``reader``, the reader of ``conn``
+    that the pid was read from) that the process exited.
+    """
+
+    def __init__(
+        self,
+        conn: socket.socket,
+        reader: IO[bytes],
+        pid: int,
+        stdout: Optional[IO[bytes]] = None,
+        stderr: Optional[IO[bytes]] = None,
+    ) -> None:
+        self.pid = pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+        self._conn = conn
+        self._reader = reader
+        self._exited = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._wait_exit, name=f"forked-{pid}", daemon=True
+        )
+        self._thread.start()
+
+    def _wait_exit(self) -> None:
+        returncode = -signal.SIGKILL
+        try:
+            line = _readline(self._reader)
+            if line:
+                returncode = json.loads(line)["returncode"]
+            else:
+                log.warning(f"forkserver exited before forked pid: {self.pid}")
+        finally:
+            self._reader.close()
+            self._conn.close()
+            self.set_exited(returncode)
+
+    def poll(self) -> Optional[int]:
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        if not self._exited.wait(timeout):
+            # pyre-ignore [6]: args is the pid rather than the command
+            raise subprocess.TimeoutExpired(self.pid, timeout)
+        returncode = self.returncode
+        assert returncode is not None
+        return returncode
+
+    def send_signal(self, sig: int) -> None:
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, sig)
+            except ProcessLookupError:
+                pass  # exited but not yet reported
+
+    def terminate(self) -> None:
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self) -> None:
+        self.send_signal(signal.SIGKILL)
+
+    def add_exit_callback(self, callback: Callable[[], None]) -> None:
+        """
+        Invokes ``callback()`` (on a background thread) once the process
+        exits (right away if it already has).
+        """
+        with self._lock:
+            if self.returncode is None:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def set_exited(self, returncode: int) -> None:
+        with self._lock:
+            if self.returncode is not None:
+                return
+            self.returncode = returncode
+            self._exited.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                log.exception("forked process exit callback failed")
+
+
+class ForkServer:
+    """
+    Client of a forkserver run with the ``python`` interpreter that has
+    imported the ``preload`` modules. The server is started on the first
+    ``spawn()`` and exits once ``stop()`` is called (or this process exits),
+    terminating the processes forked from it (like ``PR_SET_PDEATHSIG`` would).
+    """
+
+    def __init__(self, python: str, preload: Sequence[str] = ()) -> None:
+        self.python = python
+        self.preload: List[str] = list(preload)
+        self._lock = threading.Lock()
+        # pyre-fixme[24]: Generic type `subprocess.Popen` expects 1 type parameter.
+        self._proc: Optional[subprocess.Popen] = None
+        self._tmp_dir: Optional[str] = None
+        self.socket_path: Optional[str] = None
+
+    def start(self, timeout: float = START_TIMEOUT) -> None:
+        """
+        Starts the server (if not already) and waits until it has preloaded
+        the modules and is listening.
+        """
+        with self._lock:
+            if self._proc:
+                return
+            self._tmp_dir = tempfile.mkdtemp(prefix="torchx_forkserver_")
+            self.socket_path = os.path.join(self._tmp_dir, "sock")
+            args = [self.python, os.path.abspath(__file__), self.socket_path]
+            args += self.preload
+            proc = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            ready = threading.Timer(timeout, proc.kill)
+            ready.start()
+            try:
+                line = _readline(proc.stdout)
+            finally:
+                ready.cancel()
+            if line != READY:
+                proc.kill()
+                proc.communicate()
+                shutil.rmtree(self._tmp_dir, ignore_errors=True)
+                self._tmp_dir = None
+                raise RuntimeError(
+                    f"forkserver ({' '.join(args)}) failed to start"
+                    f" (exitcode: {proc.returncode}), see its stderr for details"
+                )
+            self._proc = proc
+
+    def spawn(
+        self,
+        args: Sequence[str],
+        env: Dict[str, str],
+        stdout: Optional[int] = None,
+        stderr: Optional[int] = None,
+        cwd: Optional[str] = None,
+    ) -> ForkedProcess:
+        """
+        Forks a process that runs ``args`` (see ``can_fork()``) with ``env``
+        (the whole environment) and ``cwd`` (defaults to the current dir).
+        ``stdout`` and ``stderr`` are file descriptors or ``subprocess.PIPE``
+        (``None`` to inherit the ones of this process), same as ``Popen``.
+        """
+        if not can_fork(args):
+            raise ValueError(f"cannot fork: {args} (not a python script or module)")
+        self.start()
+
+        pipes: List[Optional[IO[bytes]]] = []
+        send_fds = []
+        close_fds = []
+        for fd, default_fd in [(stdout, 1), (stderr, 2)]:
+            if fd == subprocess.PIPE:
+                r, w = os.pipe()
+                pipes.append(os.fdopen(r, "rb"))
+                send_fds.append(w)
+                close_fds.append(w)
+            else:
+                pipes.append(None)
+                send_fds.append(default_fd if fd is None else fd)
+
+        request = {"args": list(args), "env": env, "cwd": cwd or os.getcwd()}
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # the exit of a short-lived process may be reported along with its pid,
+        # keep reading from the same (buffered) reader
+        reader = conn.makefile("rb")
+        try:
+            conn.connect(self.socket_path)
+            sendfds(conn, send_fds)
+            conn.sendall(json.dumps(request).encode() + b"\n")
+            line = _readline(reader)
+            if not line:
+                raise RuntimeError(f"forkserver failed to fork: {args}")
+            pid = json.loads(line)["pid"]
+        except BaseException:
+            reader.close()
+            conn.close()
+            for pipe in pipes:
+                if pipe:
+                    pipe.close()
+            raise
+        finally:
+            for fd in close_fds:
+                os.close(fd)
+        return ForkedProcess(conn, reader, pid, pipes[0], pipes[1])
+
+    def stop(self) -> None:
+        with self._lock:
+            proc, self._proc = self._proc, None
+            if proc:
+                # the server exits (terminating its children) once its stdin is closed
+                for pipe in [proc.stdin, proc.stdout]:
+                    if pipe:
+                        pipe.close()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            if self._tmp_dir:
+                shutil.rmtree(self._tmp_dir, ignore_errors=True)
+                self._tmp_dir = None
+
+
+def _readline(fp: Optional[IO[bytes]]) -> Optional[str]:
+    if not fp:
+        return None
+    return fp.readline().decode().strip() or None
+
+
+def find_python(args: Sequence[str], env: Dict[str, str]) -> Optional[str]:
+    """
+    Returns the path of the interpreter that ``Popen(args, env=env)`` would run.
+    """
+    return shutil.which(args[0], path=env.get("PATH", os.defpath))
+
+
+# ---- server (runs in the forkserver process) ----
+
+
+def _stdio(fd: int, mode: str, unbuffered: bool) -> io.TextIOWrapper:
+    buffered = io.open(fd, mode + "b", buffering=0 if unbuffered else -1, closefd=False)
+    return io.TextIOWrapper(
+        buffered,  # pyre-ignore [6]: raw or buffered io
+        line_buffering=not unbuffered and os.isatty(fd),
+        write_through=unbuffered,
+    )
+
+
+def _run_child(
+    request: Dict[str, Any], fds: List[int], close: Callable[[], None]
+) -> None:
+    """
+    Runs (in the forked child) the replica's script or module as ``__main__``
+    and exits the process with its exit code. ``close()`` closes the
+    server's file descriptors.
+    """
+    code = 0
+    try:
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        _pr_set_pdeathsig()
+        close()
+
+        devnull = os.open(os.devnull, os.O_RDONLY)
+        os.dup2(devnull, 0)
+        os.dup2(fds[0], 1)
+        os.dup2(fds[1], 2)
+        for fd in {devnull, *fds} - {0, 1, 2}:
+            os.close(fd)
+
+        env = request["env"]
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(env)
+        unbuffered = bool(env.get("PYTHONUNBUFFERED"))
+        sys.stdin = _stdio(0, "r", False)
+        sys.stdout = _stdio(1, "w", unbuffered)
+        sys.stderr = _stdio(2, "w", True)
+
+        args = request["args"]
+        python_path = [p for p in env.get("PYTHONPATH", "").split(os.pathsep) if p]
+        if args[1] == "-m":
+            sys.argv = [args[2], *args[3:]]
+            sys.path[:0] = [os.getcwd(), *python_path]
+            runpy.run_module(args[2], run_name="__main__", alter_sys=True)
+        else:
+            sys.argv = list(args[1:])
+            sys.path[:0] = [os.path.dirname(os.path.abspath(args[1])), *python_path]
+            runpy.run_path(args[1], run_name="__main__")
+    except SystemExit as e:
+        code = _exit_code(e.code)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        try:
+            # same as the interpreter's shutdown
+            # pyre-ignore [16]: private api
+            threading._shutdown()
+            # pyre-ignore [16]: private api
+            atexit._run_exitfuncs()
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            os._exit(code)
+
+
+def serve(socket_path: str, preload: Sequence[str]) -> None:
+    """
+    Imports the ``preload`` modules, listens on ``socket_path`` and forks a child
+    for each request until stdin is closed.
+    """
+    for module in preload:
+        __import__(module)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    sigchld_r, sigchld_w = os.pipe()
+    os.set_blocking(sigchld_w, False)
+    signal.signal(signal.SIGCHLD, lambda *_: None)
+    signal.set_wakeup_fd(sigchld_w)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ, "accept")
+    selector.register(sigchld_r, selectors.EVENT_READ, "sigchld")
+    selector.register(sys.stdin, selectors.EVENT_READ, "stop")
+
+    print(READY, flush=True)
+    # the replicas' stdio are their own, nothing else is written to the pipe
+    os.dup2(os.open(os.devnull, os.O_WRONLY), 1)
+
+    children: Dict[int, socket.socket] = {}
+    stopped = False
+    while not stopped:
+        for key, _ in selector.select():
+            if key.data == "accept":
+                conn, _ = listener.accept()
+                try:
+                    fds = recvfds(conn, 2)
+                    with conn.makefile("rb") as reader:
+                        request = json.loads(reader.readline())
+                except Exception:
+                    traceback.print_exc()
+                    conn.close()
+                    continue
+                sys.stdout.flush()
+                sys.stderr.flush()
+
+                def close_server_fds() -> None:
+                    selector.close()
+                    listener.close()
+                    for c in [conn, *children.values()]:
+                        c.close()
+                    os.close(sigchld_r)
+                    os.close(sigchld_w)
+
+                pid = os.fork()
+                if pid == 0:
+                    _run_child(request, fds, close_server_fds)
+                for fd in fds:
+                    os.close(fd)
+                children[pid] = conn
+                conn.sendall(json.dumps({"pid": pid}).encode() + b"\n")
+            elif key.data == "sigchld":
+                try:
+                    os.read(sigchld_r, 4096)
+                except BlockingIOError:
+                    pass
+                while children:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                    if pid == 0:
+                        break
+                    conn = children.pop(pid, None)
+                    if conn:
+                        msg = {"returncode": _returncode(status)}
+                        try:
+                            conn.sendall(json.dumps(msg).encode() + b"\n")
+                        except OSError:
+                            pass  # the client is gone
+                        conn.close()
+            elif key.data == "stop":
+                stopped = not os.read(sys.stdin.fileno(), 4096)
+
+    # the children exit along with the server (PR_SET_PDEATHSIG)
+    listener.close()
+
+
+if __name__ == "__main__":
+    # run as a script, do not let the children import from this file's dir
+    del sys.path[0]
+    serve(sys.argv[1], sys.argv[2:])
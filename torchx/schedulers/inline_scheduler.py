@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Runs the python replicas of an app inside the calling process (or in a reused
+forkserver process) and captures their output in memory. Meant for the fast
+end-to-end tests of components: no processes are spawned (with ``mode=thread``)
+and nothing is written to disk.
+"""
+
+import io
+import os
+import pprint
+import re
+import runpy
+import subprocess
+import sys
+import threading
+import traceback
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, IO, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from pyre_extensions import none_throws
+from torchx.schedulers.api import AppDryRunInfo, DescribeAppResponse, Scheduler
+from torchx.schedulers.forkserver import ForkServer, ForkedProcess, can_fork
+from torchx.schedulers.local_scheduler import make_unique
+from torchx.specs.api import (
+    AppDef,
+    AppState,
+    InvalidRunConfigException,
+    ReplicaState,
+    ReplicaStatus,
+    Role,
+    RoleStatus,
+    RunConfig,
+    SchedulerBackend,
+    is_terminal,
+    macros,
+    runopts,
+)
+
+
+MODES = ("thread", "fork")
+
+# serializes the replicas run on threads (they share sys.argv and os.environ)
+_RUN_LOCK = threading.Lock()
+
+
+@dataclass
+class InlineReplicaParam:
+    """
+    Holds the command (without the interpreter, e.g. ``["main.py", "--foo"]`` or
+    ``["-m", "module"]``) and the env vars of a replica.
+    """
+
+    args: List[str]
+    env: Dict[str, str]
+
+
+@dataclass
+class InlineRequest:
+    """
+    Holds the parameters of each replica of each role of an application.
+    """
+
+    app_id: str
+    # one of MODES
+    mode: str
+    role_params: Dict[str, List[InlineReplicaParam]]
+    # modules preloaded by the forkserver (used only if mode=fork)
+    preload: List[str] = field(default_factory=list)
+
+
+def python_args(role: Role) -> Optional[List[str]]:
+    """
+    Returns the command of the role without the interpreter if the role runs
+    a python script or module (``None`` otherwise).
+    """
+    entrypoint = role.entrypoint
+    if entrypoint.endswith(".py"):
+        return [entrypoint, *role.args]
+    if can_fork([entrypoint, *role.args]):
+        return list(role.args)
+    return None
+
+
+class _Output:
+    """
+    The in-memory stdout (or stderr) of a replica.
+    """
+
+    def __init__(self, cond: threading.Condition) -> None:
+        self._cond = cond
+        self.lines: List[str] = []
+        self._partial = ""
+
+    def write(self, data: str) -> int:
+        with self._cond:
+            lines = (self._partial + data).split("\n")
+            self._partial = lines.pop()
+            if lines:
+                self.lines.extend(lines)
+                self._cond.notify_all()
+        return len(data)
+
+    def flush(self) -> None:
+        with self._cond:
+            if self._partial:
+                self.lines.append(self._partial)
+                self._partial = ""
+                self._cond.notify_all()
+
+
+class _StreamProxy(io.TextIOBase):
+    """
+    Writes to the output of the replica that runs on the current thread
+    (to ``default`` on the other threads).
+    """
+
+    def __init__(self, default: TextIO) -> None:
+        self.default = default
+        self.outputs: Dict[int, _Output] = {}
+
+    def _out(self) -> Any:
+        return self.outputs.get(threading.get_ident(), self.default)
+
+    def write(self, data: str) -> int:
+        return self._out().write(data)
+
+    def flush(self) -> None:
+        self._out().flush()
+
+
+class _InlineReplica:
+    def __init__(self, role: str, replica_id: int, cond: threading.Condition) -> None:
+        self.role = role
+        self.replica_id = replica_id
+        self.stdout = _Output(cond)
+        self.stderr = _Output(cond)
+        self.returncode: Optional[int] = None
+        self.proc: Optional[ForkedProcess] = None
+
+    def state(self) -> ReplicaState:
+        if self.returncode is None:
+            return ReplicaState.RUNNING
+        return ReplicaState.SUCCEEDED if self.returncode == 0 else ReplicaState.FAILED
+
+
+class _InlineApp:
+    def __init__(self, app_id: str) -> None:
+        self.id = app_id
+        # notified on output and state changes
+        self.cond = threading.Condition()
+        self.role_replicas: Dict[str, List[_InlineReplica]] = {}
+        self.cancelled = False
+
+    def replicas(self) -> Iterator[_InlineReplica]:
+        for replicas in self.role_replicas.values():
+            yield from replicas
+
+    def state(self) -> AppState:
+        if self.cancelled:
+            return AppState.CANCELLED
+        states = [r.state() for r in self.replicas()]
+        if ReplicaState.RUNNING in states:
+            return AppState.RUNNING
+        if ReplicaState.FAILED in states:
+            return AppState.FAILED
+        return AppState.SUCCEEDED
+
+
+def _exit_code(code: Any) -> int:
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+class InlineScheduler(Scheduler):
+    """
+    Runs the python replicas (``python script.py ...``, ``python -m module ...``
+    or a ``script.py`` entrypoint) of an app as ``__main__`` inside this process
+    and captures their stdout and stderr in memory. ``log_iter`` reads the
+    stderr of the replicas. The ``image`` of a role is its ``img_root``.
+
+    With ``mode=thread`` (default) each replica runs on its own thread but the
+    replicas run one at a time since ``sys.argv`` and ``os.environ`` (which are
+    set to the replica's for the duration of the replica) are process-wide.
+    Hence the replicas must not wait for each other (e.g. rendezvous).
+    A cancelled app is reported as ``CANCELLED`` right away and its pending
+    replicas are not run, but a replica that is already running on a thread
+    cannot be interrupted and runs to completion.
+
+    With ``mode=fork`` the replicas are forked from a forkserver (see
+    ``torchx.schedulers.forkserver``) that preloads the ``preload`` modules,
+    hence they run concurrently and can be killed.
+
+    ..note:: The replicas share this process (or the forkserver) hence the
+             state of the imported modules can leak across replicas.
+    """
+
+    def __init__(self, session_name: str) -> None:
+        super().__init__("inline", session_name)
+        self._apps: Dict[str, _InlineApp] = {}
+        # preload modules -> forkserver (started on first use by mode=fork)
+        self._forkservers: Dict[Tuple[str, ...], ForkServer] = {}
+
+    def run_opts(self) -> runopts:
+        opts = runopts()
+        opts.add(
+            "mode",
+            type_=str,
+            default="thread",
+            help=f"how to run the replicas. One of {list(MODES)}",
+        )
+        opts.add(
+            "preload",
+            type_=str,
+            default=None,
+            help="comma-separated modules imported by the forkserver (mode=fork only)",
+        )
+        return opts
+
+    def _validate(self, app: AppDef, scheduler: SchedulerBackend) -> None:
+        # resources are not relevant for in-process replicas
+        pass
+
+    def _submit_dryrun(
+        self, app: AppDef, cfg: RunConfig
+    ) -> AppDryRunInfo[InlineRequest]:
+        mode = str(cfg.get("mode"))
+        if mode not in MODES:
+            raise InvalidRunConfigException(
+                f"Unsupported mode: {mode}. Must be one of: {MODES}",
+                cfg,
+                self.run_opts(),
+            )
+
+        app_id = make_unique(app.name)
+        role_params: Dict[str, List[InlineReplicaParam]] = {}
+        for role in app.roles:
+            if python_args(role) is None:
+                raise ValueError(
+                    f"role: {role.name} does not run a python script or module"
+                    f" ({role.entrypoint} {' '.join(role.args)}),"
+                    f" the inline scheduler only runs python entrypoints"
+                )
+            replica_params = role_params.setdefault(role.name, [])
+            for replica_id in range(role.num_replicas):
+                values = macros.Values(
+                    img_root=role.image, app_id=app_id, replica_id=str(replica_id)
+                )
+                replica_role = values.apply(role)
+                args = none_throws(python_args(replica_role))
+                if role.entrypoint.endswith(".py"):
+                    # same as the local scheduler's dir images
+                    args[0] = os.path.join(
+                        role.image, values.substitute(role.entrypoint)
+                    )
+                replica_params.append(InlineReplicaParam(args, replica_role.env))
+        preload = str(cfg.get("preload") or "")
+        request = InlineRequest(
+            app_id,
+            mode,
+            role_params,
+            preload=[m.strip() for m in preload.split(",") if m.strip()],
+        )
+        return AppDryRunInfo(request, lambda r: pprint.pformat(r, indent=2, width=80))
+
+    def schedule(self, dryrun_info: AppDryRunInfo[InlineRequest]) -> str:
+        request = dryrun_info.request
+        app = _InlineApp(request.app_id)
+        for role_name, role_params in request.role_params.items():
+            app.role_replicas[role_name] = [
+                _InlineReplica(role_name, replica_id, app.cond)
+                for replica_id in range(len(role_params))
+            ]
+        self._apps[app.id] = app
+
+        for role_name, role_params in request.role_params.items():
+            for replica, params in zip(app.role_replicas[role_name], role_params):
+                if request.mode == "fork":
+                    self._fork(app, replica, params, request.preload)
+                else:
+                    threading.Thread(
+                        target=self._run,
+                        args=(app, replica, params),
+                        name=f"{app.id}/{role_name}/{replica.replica_id}",
+                        daemon=True,
+                    ).start()
+        return app.id
+
+    def _run(
+        self, app: _InlineApp, replica: _InlineReplica, params: InlineReplicaParam
+    ) -> None:
+        """
+        Runs the replica on the current thread (one replica at a time).
+        """
+        with _RUN_LOCK:
+            code = 0
+            argv, environ = sys.argv, os.environ.copy()
+            stdout, stderr = sys.stdout, sys.stderr
+            proxies = []
+            for name in ["stdout", "stderr"]:
+                stream = getattr(sys, name)
+                if not isinstance(stream, _StreamProxy):
+                    stream = _StreamProxy(stream)
+                    setattr(sys, name, stream)
+                proxies.append(stream)
+
+            thread_id = threading.get_ident()
+            proxies[0].outputs[thread_id] = replica.stdout
+            proxies[1].outputs[thread_id] = replica.stderr
+            try:
+                if app.cancelled:
+                    raise SystemExit(-15)
+                os.environ.update(params.env)
+                args = params.args
+                if args[0] == "-m":
+                    sys.argv = [args[1], *args[2:]]
+                    runpy.run_module(args[1], run_name="__main__", alter_sys=True)
+                else:
+                    sys.argv = list(args)
+                    runpy.run_path(args[0], run_name="__main__")
+            except SystemExit as e:
+                code = _exit_code(e.code)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                replica.stdout.flush()
+                replica.stderr.flush()
+                for proxy in proxies:
+                    proxy.outputs.pop(thread_id, None)
+                sys.stdout, sys.stderr = stdout, stderr
+                sys.argv = argv
+                os.environ.clear()
+                os.environ.update(environ)
+                with app.cond:
+                    replica.returncode = code
+                    app.cond.notify_all()
+
+    def _fork(
+        self,
+        app: _InlineApp,
+        replica: _InlineReplica,
+        params: InlineReplicaParam,
+        preload: List[str],
+    ) -> None:
+        """
+        Forks the replica from the forkserver and pumps its output (on threads).
+        """
+        server = self._forkservers.get(tuple(preload))
+        if not server:
+            server = ForkServer(sys.executable, preload)
+            self._forkservers[tuple(preload)] = server
+        env = os.environ.copy()
+        env.update(params.env)
+        proc = server.spawn(
+            [sys.executable, *params.args],
+            env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        replica.proc = proc
+
+        pumps = [
+            threading.Thread(target=self._pump, args=(pipe, out), daemon=True)
+            for pipe, out in [
+                (proc.stdout, replica.stdout),
+                (proc.stderr, replica.stderr),
+            ]
+        ]
+        for pump in pumps:
+            pump.start()
+
+        def on_exit() -> None:
+            for pump in pumps:
+                pump.join()
+            with app.cond:
+                replica.returncode = proc.returncode
+                app.cond.notify_all()
+
+        proc.add_exit_callback(
+            lambda: threading.Thread(target=on_exit, daemon=True).start()
+        )
+
+    def _pump(self, pipe: Optional[IO[bytes]], out: _Output) -> None:
+        if not pipe:
+            return
+        with pipe:
+            for line in pipe:
+                out.write(line.decode(errors="replace"))
+        out.flush()
+
+    def describe(self, app_id: str) -> Optional[DescribeAppResponse]:
+        app = self._apps.get(app_id)
+        if not app:
+            return None
+        with app.cond:
+            state = app.state()
+            roles_statuses = [
+                RoleStatus(
+                    role_name,
+                    [
+                        ReplicaStatus(
+                            id=r.replica_id,
+                            state=AppState.CANCELLED if app.cancelled else r.state(),
+                            role=role_name,
+                            hostname="localhost",
+                        )
+                        for r in replicas
+                    ],
+                )
+                for role_name, replicas in app.role_replicas.items()
+            ]
+        return DescribeAppResponse(
+            app_id=app_id,
+            state=state,
+            num_restarts=0,
+            roles_statuses=roles_statuses,
+        )
+
+    def wait_for_update(self, app_id: str, timeout: float) -> None:
+        app = self._apps.get(app_id)
+        if not app:
+            return
+        with app.cond:
+            if not is_terminal(app.state()):
+                app.cond.wait(timeout)
+
+    def _cancel_existing(self, app_id: str) -> None:
+        app = self._apps[app_id]
+        with app.cond:
+            app.cancelled = True
+            app.cond.notify_all()
+        for replica in app.replicas():
+            if replica.proc:
+                replica.proc.kill()
+
+    def log_iter(
+        self,
+        app_id: str,
+        role_name: str,
+        k: int = 0,
+        regex: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        should_tail: bool = False,
+    ) -> Iterable[str]:
+        app = self._apps[app_id]
+        replica = app.role_replicas[role_name][k]
+        pattern = re.compile(regex or ".*")
+        return self._iter_lines(app, replica.stderr, pattern, should_tail)
+
+    def _iter_lines(
+        self,
+        app: _InlineApp,
+        out: _Output,
+        pattern: "re.Pattern[str]",
+        should_tail: bool,
+    ) -> Iterator[str]:
+        i = 0
+        while True:
+            with app.cond:
+                while (
+                    should_tail and i == len(out.lines) and not is_terminal(app.state())
+                ):
+                    app.cond.wait()
+                lines = out.lines[i:]
+            i += len(lines)
+            for line in lines:
+                if pattern.match(line):
+                    yield line
+            if not lines:
+                return
+
+    def stdout(self, app_id: str, role_name: str, k: int = 0) -> List[str]:
+        """
+        Returns the lines written (so far) to the stdout of the ``k``th replica
+        of the role.
+        """
+        with self._apps[app_id].cond:
+            return list(self._apps[app_id].role_replicas[role_name][k].stdout.lines)
+
+    def __del__(self) -> None:
+        for server in self._forkservers.values():
+            server.stop()
+
+
+def create_scheduler(session_name: str, **kwargs: Any) -> InlineScheduler:
+    return InlineScheduler(session_name=session_name)
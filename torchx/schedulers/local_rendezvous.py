@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Rendezvous hosted by ``LocalScheduler`` for the torchelastic roles
+(see ``torchx.components.base.roles.create_torch_dist_role``) so that
+multi-replica elastic apps can run on localhost without an external etcd.
+
+The roles that run ``torch.distributed.launch`` (or ``torch.distributed.run``)
+without an ``--rdzv_endpoint`` are rewritten to rendezvous with the ``c10d``
+backend against a ``TCPStore`` that the scheduler hosts (in-process) on a free
+port for the lifetime of the app. All the agents connect to the store as clients
+(``--rdzv_conf is_host=0``).
+"""
+
+import importlib.util
+import logging
+from dataclasses import replace
+from typing import Any, List, Optional, Tuple
+
+from pyre_extensions import none_throws
+from torchx.specs.api import Role
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+DIST_MODULES = ("torch.distributed.launch", "torch.distributed.run")
+
+# env var that holds the endpoint (host:port) of the rendezvous hosted by the scheduler
+RDZV_ENDPOINT_ENV = "TORCHX_RDZV_ENDPOINT"
+
+RDZV_HOST = "localhost"
+
+# launcher args that are replaced when rewritten to use the hosted rendezvous
+_RDZV_ARGS = ("--rdzv_backend", "--rdzv_endpoint", "--rdzv_conf")
+
+
+def is_available() -> bool:
+    """
+    Returns ``True`` if torch (hence ``TCPStore``) can be imported.
+    """
+    return importlib.util.find_spec("torch") is not None
+
+
+def _launcher_args(args: List[str]) -> Optional[Tuple[int, int]]:
+    """
+    Returns the ``[start, end)`` indices of the launcher options in the args
+    of a role that runs a torch distributed launcher module (``None`` otherwise).
+    """
+    for i in range(len(args) - 1):
+        if args[i] == "-m" and args[i + 1] in DIST_MODULES:
+            start = end = i + 2
+            while end < len(args) and args[end].startswith("--"):
+                if "=" in args[end] or end + 1 == len(args):
+                    end += 1
+                elif args[end + 1].startswith("-"):
+                    end += 1  # flag
+                else:
+                    end += 2  # option and its value
+            return start, end
+    return None
+
+
+def _get_option(args: List[str], name: str) -> Optional[str]:
+    for i, arg in enumerate(args):
+        if arg == name and i + 1 < len(args):
+            return args[i + 1]
+        if arg.startswith(f"{name}="):
+            return arg[len(name) + 1 :]
+    return None
+
+
+def needs_rendezvous(role: Role) -> bool:
+    """
+    Returns ``True`` if the role runs a torch distributed launcher without
+    a rendezvous endpoint (e.g. the default ``etcd`` backend of
+    ``create_torch_dist_role``).
+    """
+    if role.entrypoint != "python":
+        return False
+    bounds = _launcher_args(role.args)
+    if not bounds:
+        return False
+    start, end = bounds
+    launcher_args = role.args[start:end]
+    if "--standalone" in launcher_args or _get_option(launcher_args, "--rdzv_endpoint"):
+        return False
+    backend = _get_option(launcher_args, "--rdzv_backend")
+    return backend in (None, "etcd", "etcd-v2", "c10d")
+
+
+def use_rendezvous(role: Role, endpoint: str) -> Role:
+    """
+    Returns a copy of the (``needs_rendezvous()``) role whose launcher
+    rendezvous with the ``c10d`` backend at ``endpoint`` as a client.
+    """
+    start, end = none_throws(_launcher_args(role.args))
+    launcher_args = role.args[start:end]
+
+    rdzv_conf = _get_option(launcher_args, "--rdzv_conf")
+    conf = [
+        kv
+        for kv in (rdzv_conf or "").split(",")
+        if kv and not kv.startswith("is_host=")
+    ]
+    conf.append("is_host=0")
+
+    kept = []
+    skip_value = False
+    for arg in launcher_args:
+        if skip_value:
+            skip_value = False
+            continue
+        if arg in _RDZV_ARGS:
+            skip_value = True
+            continue
+        if arg.startswith(tuple(f"{name}=" for name in _RDZV_ARGS)):
+            continue
+        kept.append(arg)
+
+    rdzv_args = [
+        "--rdzv_backend",
+        "c10d",
+        "--rdzv_endpoint",
+        endpoint,
+        "--rdzv_conf",
+        ",".join(conf),
+    ]
+    return replace(role, args=role.args[:start] + rdzv_args + kept + role.args[end:])
+
+
+class RendezvousStore:
+    """
+    A c10d ``TCPStore`` hosted (in this process) on ``port`` that the
+    agents of an app rendezvous through. The store is shut down on ``close()``.
+    """
+
+    def __init__(self, port: int, host: str = RDZV_HOST) -> None:
+        from torch.distributed import TCPStore
+
+        self.host = host
+        self.port = port
+        self._store: Optional[Any] = TCPStore(
+            host, port, is_master=True, wait_for_workers=False
+        )
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def close(self) -> None:
+        # the store's server is stopped once the store is destroyed
+        self._store = None
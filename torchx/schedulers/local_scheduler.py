@@ -12,23 +12,91 @@ import logging
 import os
 import pprint
 import re
+import shutil
 import signal
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import warnings
-from dataclasses import asdict, dataclass
+from concurrent.futures import Executor
+from dataclasses import asdict, dataclass, field, replace
 from datetime import datetime
-from typing import Any, Dict, Iterable, List, Optional, Pattern, TextIO, Tuple
+from functools import partial
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    TextIO,
+    Tuple,
+    Union,
+)
 from uuid import uuid4
 
+from pyre_extensions import none_throws
+from torchx.schedulers import local_rendezvous
 from torchx.schedulers.api import AppDryRunInfo, DescribeAppResponse, Scheduler
+from torchx.schedulers.cgroups import (
+    CGROUP2_MOUNT,
+    DEFAULT_CGROUP_ROOT,
+    Cgroup,
+    is_cgroup2_available,
+    limits_from_resource,
+)
+from torchx.schedulers.docker_engine import (
+    LABEL_APP_ID,
+    LABEL_REPLICA_ID,
+    LABEL_ROLE_NAME,
+    LABEL_SESSION,
+    ContainerEventWatcher,
+    ContainerLogStreamer,
+    ContainerProcess,
+    DockerClient,
+    StreamedLog,
+)
+from torchx.schedulers.exit_watcher import ExitWatcher
+from torchx.schedulers.forkserver import (
+    ForkServer,
+    ForkedProcess,
+    can_fork,
+    find_python,
+)
+from torchx.schedulers.log_buffer import (
+    ConsoleEcho,
+    DEFAULT_MAX_LINES,
+    LogBuffer,
+    echo,
+)
+from torchx.schedulers.log_rotation import (
+    DRAIN_TIMEOUT,
+    SUCCESS_FILE,
+    LogPump,
+    PumpedPipe,
+    RotatingLogWriter,
+    check_compression,
+    gc_app_log_dirs,
+    open_segment,
+    rotated_segments,
+)
+from torchx.schedulers.log_search import build_trigram_index, replica_log_files
+from torchx.schedulers.ports import PortAllocator, port_env_var
+from torchx.schedulers.resource_sampler import ResourceSampler, UsageHistory
 from torchx.specs.api import (
     NONE,
     AppDef,
     AppState,
     InvalidRunConfigException,
+    ReplicaState,
+    ReplicaStatus,
+    RetryPolicy,
+    Role,
+    RoleStatus,
     RunConfig,
     SchedulerBackend,
     is_terminal,
@@ -46,6 +114,12 @@ def make_unique(app_name: str) -> str:
 
 NA: str = "<N/A>"
 
+# upper bound (in seconds) of the exponential backoff between restarts
+MAX_RESTART_BACKOFF: float = 60
+
+# seconds that the ports allocated by a dryrun stay reserved unless it is scheduled
+DRYRUN_PORTS_TTL: float = 600
+
 
 class ImageProvider(abc.ABC):
     """
@@ -64,10 +138,15 @@ class ImageProvider(abc.ABC):
 
     @abc.abstractmethod
     def get_command(
-        self, image: str, args: List[str], env_vars: Dict[str, str]
+        self,
+        image: str,
+        args: List[str],
+        env_vars: Dict[str, str],
+        options: Optional["ContainerOptions"] = None,
     ) -> List[str]:
         """
-        Returns the command line required to run the specified image.
+        Returns the command line required to run the specified image
+        (in a container created with ``options`` for container based images).
         """
         raise NotImplementedError()
 
@@ -111,7 +190,11 @@ class LocalDirectoryImageProvider(ImageProvider):
         return image
 
     def get_command(
-        self, image: str, args: List[str], env_vars: Dict[str, str]
+        self,
+        image: str,
+        args: List[str],
+        env_vars: Dict[str, str],
+        options: Optional["ContainerOptions"] = None,
     ) -> List[str]:
         return args
 
@@ -136,12 +219,51 @@ class DockerImageProvider(ImageProvider):
         return ""
 
     def get_command(
-        self, image: str, args: List[str], env_vars: Dict[str, str]
+        self,
+        image: str,
+        args: List[str],
+        env_vars: Dict[str, str],
+        options: Optional["ContainerOptions"] = None,
     ) -> List[str]:
         env = []
         for k, v in env_vars.items():
             env += ["--env", f"{k}={v}"]
-        return ["docker", "run", "-i", "--rm"] + env + [image] + args
+        flags = options.docker_flags() if options else []
+        return ["docker", "run", "-i", "--rm"] + flags + env + [image] + args
+
+
+class DockerEngineImageProvider(ImageProvider):
+    """
+    Pulls and runs the specified image through the Docker Engine API (over the
+    local unix socket, see ``torchx.schedulers.docker_engine``) rather than
+    the docker CLI. The replicas are run as containers (created in a batch per app)
+    whose logs and exit codes are streamed from the engine, hence no ``docker``
+    process is spawned per replica.
+
+    Example:
+
+    1. ``fetch(Image(name="pytorch/pytorch:latest"))`` returns ``""``
+    2. ``get_command(...)`` returns the command run in the container
+    """
+
+    def __init__(self, cfg: RunConfig, client: Callable[[], DockerClient]) -> None:
+        self._client = client
+
+    def fetch(self, image: str) -> str:
+        try:
+            self._client().pull(image)
+        except Exception as e:
+            print(f"failed to fetch image {image}, falling back to local: {e}")
+        return ""
+
+    def get_command(
+        self,
+        image: str,
+        args: List[str],
+        env_vars: Dict[str, str],
+        options: Optional["ContainerOptions"] = None,
+    ) -> List[str]:
+        return args
 
 
 # aliases to make clear what the mappings are
@@ -150,6 +272,31 @@ AppName = str
 RoleName = str
 
 
+@dataclass
+class _ReplicaError:
+    """
+    The error that a replica wrote to its error file (``TORCHELASTIC_ERROR_FILE``).
+    """
+
+    error_file: str
+    # mtime of the error file (the earliest error is reported as the app's error)
+    timestamp: float
+    # the parsed contents of the error file
+    payload: Dict[str, Any]
+    # ``payload`` serialized as json (the ``structured_error_msg``)
+    message: str
+
+
+def _read_error_file(error_file: str) -> Optional[_ReplicaError]:
+    try:
+        with open(error_file, "r") as f:
+            timestamp = os.fstat(f.fileno()).st_mtime
+            payload = json.load(f)
+    except FileNotFoundError:
+        return None
+    return _ReplicaError(error_file, timestamp, payload, json.dumps(payload))
+
+
 @dataclass
 class _LocalReplica:
     """
@@ -160,9 +307,30 @@ class _LocalReplica:
     replica_id: int
     # pyre-fixme[24]: Generic type `subprocess.Popen` expects 1 type parameter.
     proc: subprocess.Popen
-    stdout: Optional[TextIO]  # None means no log_dir (out to console)
-    stderr: Optional[TextIO]  # None means no log_dir (out to console)
+    # None means no log_dir (out to console)
+    stdout: Optional[Union[TextIO, PumpedPipe]]
+    stderr: Optional[Union[TextIO, PumpedPipe]]
     error_file: str
+    # None means the replica is not placed into its own cgroup
+    cgroup: Optional[Cgroup] = None
+    # last read cgroup accounting (kept around after the cgroup is removed)
+    _resource_usage: Dict[str, int] = field(default_factory=dict)
+    # None means the resource usage of the replica is not sampled
+    usage_history: Optional[UsageHistory] = None
+    # parameters used to relaunch the replica upon restarts
+    params: Optional["ReplicaParam"] = None
+    retry_policy: RetryPolicy = RetryPolicy.APPLICATION
+    max_retries: int = 0
+    num_restarts: int = 0
+    # True while the (failed) replica is waiting to be restarted
+    restart_pending: bool = False
+    # in-memory stdout/stderr of the replica (None if the logs are not captured)
+    stdout_buffer: Optional[LogBuffer] = None
+    stderr_buffer: Optional[LogBuffer] = None
+    # the (exited) process whose error file was read into ``_error``
+    # pyre-fixme[24]: Generic type `subprocess.Popen` expects 1 type parameter.
+    _error_proc: Optional[subprocess.Popen] = None
+    _error: Optional[_ReplicaError] = None
 
     def terminate(self) -> None:
         """
@@ -174,7 +342,7 @@ class _LocalReplica:
         self.proc.terminate()
         self.proc.wait()
 
-        # close stdout and stderr log file handles
+        # close stdout and stderr log file handles (waits for pumped logs to be drained)
         if self.stdout:
             # pyre-ignore [16] already null checked
             self.stdout.close()
@@ -190,6 +358,66 @@ class _LocalReplica:
         else:
             return self.proc.returncode != 0
 
+    def state(self) -> ReplicaState:
+        if self.is_alive():
+            return ReplicaState.RUNNING
+        elif self.failed():
+            return ReplicaState.FAILED
+        else:
+            return ReplicaState.SUCCEEDED
+
+    def error(self) -> Optional[_ReplicaError]:
+        """
+        Returns the error that the replica wrote to its error file (``None`` if
+        it did not or is still running). The error file is read once, after
+        the replica exits (and again after each restart of the replica exits).
+        """
+        if self._error_proc is not self.proc and not self.is_alive():
+            self._error = _read_error_file(self.error_file)
+            self._error_proc = self.proc
+        return self._error if self._error_proc is self.proc else None
+
+    def resource_usage(self) -> Dict[str, int]:
+        """
+        Returns the cgroup resource accounting of this replica
+        (empty if the replica does not run in its own cgroup).
+        """
+        if self.cgroup:
+            self._resource_usage = self.cgroup.stats()
+        return self._resource_usage
+
+    def remove_cgroup(self) -> None:
+        """
+        Records the final resource usage and removes the replica's cgroup.
+        Safe to call multiple times.
+        """
+        if self.cgroup:
+            self.resource_usage()
+            self.cgroup.remove()
+            self.cgroup = None
+
+    def rotate_logs(self) -> None:
+        """
+        Moves the stdout, stderr and error files of the (exited) replica
+        into ``<replica_log_dir>/attempt_<num_restarts>/`` so that the restarted
+        replica writes to fresh files under the same replica log dir.
+        """
+        params = self.params
+        files = [self.error_file]
+        if params:
+            for log_file in [params.stdout, params.stderr]:
+                if log_file:
+                    files.append(log_file)
+                    files += [path for _, path in rotated_segments(log_file)]
+
+        attempt_dir = os.path.join(
+            os.path.dirname(self.error_file), f"attempt_{self.num_restarts}"
+        )
+        for file in files:
+            if file and os.path.isfile(file):
+                os.makedirs(attempt_dir, exist_ok=True)
+                os.rename(file, os.path.join(attempt_dir, os.path.basename(file)))
+
 
 class _LocalAppDef:
     """
@@ -198,15 +426,36 @@ class _LocalAppDef:
     process and has a pid.
     """
 
-    def __init__(self, id: str, log_dir: str) -> None:
+    def __init__(
+        self,
+        id: str,
+        log_dir: str,
+        request: Optional["PopenRequest"] = None,
+        log_executor: Optional[Executor] = None,
+    ) -> None:
         self.id = id
         # cfg.get("log_dir")/<session_name>/<app_id> or /tmp/torchx/<session_name>/<app_id>
         self.log_dir = log_dir
+        # the request this app was scheduled with (used to restart replicas)
+        self.request = request
         # role name -> [replicas, ...]
         self.role_replicas: Dict[RoleName, List[_LocalReplica]] = {}
         self.state: AppState = AppState.PENDING
         # time (in seconds since epoch) when the last set_state method() was called
         self.last_updated: float = -1
+        # total number of restarts (of either replicas or the whole app)
+        self.num_restarts: int = 0
+        # number of restarts of the whole app (RetryPolicy.APPLICATION)
+        self.num_app_restarts: int = 0
+        # True while the whole app is waiting to be restarted
+        self.restart_pending: bool = False
+        # runs the post-processing (e.g. indexing) of the closed log files
+        self._log_executor = log_executor
+        self._logs_indexed: bool = False
+        # rendezvous store hosted for the app's torch dist roles (if any)
+        self.rdzv_store: Optional[local_rendezvous.RendezvousStore] = None
+        # holds the ports allocated to the app (released on close)
+        self.port_allocator: Optional[PortAllocator] = None
 
     def add_replica(self, role_name: str, replica: _LocalReplica) -> None:
         procs = self.role_replicas.setdefault(role_name, [])
@@ -216,6 +465,20 @@ class _LocalAppDef:
         self.last_updated = time.time()
         self.state = state
 
+    def will_restart(self, replica: _LocalReplica) -> bool:
+        """
+        Returns ``True`` if the replica is waiting to be (or, if it just failed,
+        is about to be) restarted as per its role's retry policy.
+        """
+        if self.restart_pending or replica.restart_pending:
+            return True
+        if is_terminal(self.state) or not replica.failed():
+            return False
+        if replica.retry_policy == RetryPolicy.REPLICA:
+            return replica.num_restarts < replica.max_retries
+        else:
+            return self.num_app_restarts < replica.max_retries
+
     def terminate(self) -> None:
         """
         terminates all procs associated with this app,
@@ -227,26 +490,24 @@ class _LocalAppDef:
             for r in replicas:
                 r.terminate()
 
-    def _get_error_file(self) -> Optional[str]:
-        error_file = None
-        min_timestamp = sys.maxsize
+    def get_structured_error(self) -> Optional[_ReplicaError]:
+        """
+        Returns the earliest error written by the (exited) replicas of the app.
+        Running replicas incur no filesystem calls (see ``_LocalReplica.error()``).
+        """
+        first_error = None
         for replicas in self.role_replicas.values():
             for replica in replicas:
-                if not os.path.exists(replica.error_file):
-                    continue
-                mtime = os.path.getmtime(replica.error_file)
-                if mtime < min_timestamp:
-                    min_timestamp = mtime
-                    error_file = replica.error_file
-        return error_file
+                error = replica.error()
+                if error and (
+                    not first_error or error.timestamp < first_error.timestamp
+                ):
+                    first_error = error
+        return first_error
 
     def get_structured_error_msg(self) -> str:
-        error_file = self._get_error_file()
-        if not error_file:
-            return NONE
-
-        with open(error_file, "r") as f:
-            return json.dumps(json.load(f))
+        error = self.get_structured_error()
+        return error.message if error else NONE
 
     def close(self) -> None:
         """
@@ -259,7 +520,7 @@ class _LocalAppDef:
         """
         self.terminate()
 
-        def _fmt_io_filename(std_io: Optional[TextIO]) -> str:
+        def _fmt_io_filename(std_io: Optional[Union[TextIO, PumpedPipe]]) -> str:
             if std_io:
                 return std_io.name
             else:
@@ -279,7 +540,10 @@ class _LocalAppDef:
                     "stdout": _fmt_io_filename(replica.stdout),
                     "stderr": _fmt_io_filename(replica.stderr),
                     "error_file": replica.error_file,
+                    "num_restarts": replica.num_restarts,
+                    "resource_usage": replica.resource_usage(),
                 }
+                replica.remove_cgroup()
                 replicas_info.append(replica_info)
             roles_info[role_name] = replicas_info
         app_info = {
@@ -287,14 +551,45 @@ class _LocalAppDef:
             "log_dir": self.log_dir,
             "final_state": self.state.name,
             "last_updated": self.last_updated,
+            "num_restarts": self.num_restarts,
             "roles": roles_info,
         }
 
-        info_str = json.dumps(app_info, indent=2)
-        with open(os.path.join(self.log_dir, "SUCCESS"), "w") as fp:
-            fp.write(info_str)
-
-        log.info(f"Successfully closed app_id: {self.id}.\n{info_str}")
+        # written once: describe closes terminal apps on every call and the
+        # log dir GC orders the finished apps by the time they were closed
+        success_file = os.path.join(self.log_dir, SUCCESS_FILE)
+        if not os.path.exists(success_file):
+            app_info["finished_at"] = time.time()
+            info_str = json.dumps(app_info, indent=2)
+            with open(success_file, "w") as fp:
+                fp.write(info_str)
+
+            log.info(f"Successfully closed app_id: {self.id}.\n{info_str}")
+
+        if self.rdzv_store:
+            self.rdzv_store.close()
+            self.rdzv_store = None
+        if self.port_allocator:
+            self.port_allocator.release(self.id)
+
+        request = self.request
+        if request and request.index_logs and not self._logs_indexed:
+            self._logs_indexed = True
+            self._index_logs()
+
+    def _index_logs(self) -> None:
+        """
+        Builds the trigram index (see ``torchx.schedulers.log_search``)
+        of the (closed) log files of the replicas in the background.
+        """
+        for replicas in self.role_replicas.values():
+            for replica in replicas:
+                replica_log_dir = os.path.dirname(replica.error_file)
+                for log_file in replica_log_files(replica_log_dir):
+                    if self._log_executor:
+                        self._log_executor.submit(build_trigram_index, log_file)
+                    else:
+                        build_trigram_index(log_file)
 
     def __repr__(self) -> str:
         role_to_pid = {}
@@ -319,6 +614,125 @@ def _pr_set_pdeathsig() -> None:
     libc.prctl(PR_SET_PDEATHSIG, signal.SIGTERM)
 
 
+def parse_bytes(size: str) -> int:
+    """
+    Parses a docker style size (e.g. ``1073741824``, ``512m``, ``8g``) into bytes.
+
+    Raises:
+        ValueError: if ``size`` is not a valid size
+    """
+    m = re.match(r"^(\d+)([bkmg]?)$", size.strip().lower())
+    if not m:
+        raise ValueError(f"invalid size: `{size}`, expected e.g. 1073741824, 512m, 8g")
+    number, unit = m.groups()
+    return int(number) * 1024 ** "bkmg".index(unit or "b")
+
+
+def parse_mounts(mounts: str) -> List[Tuple[str, str, bool]]:
+    """
+    Parses comma separated ``HOST_PATH:CONTAINER_PATH[:ro]`` bind mounts into
+    ``(host_path, container_path, read_only)`` tuples.
+
+    Raises:
+        ValueError: if a mount is malformed or its host path is not absolute
+    """
+    parsed = []
+    for mount in mounts.split(","):
+        if not mount.strip():
+            continue
+        parts = mount.strip().split(":")
+        if len(parts) not in (2, 3) or (
+            len(parts) == 3 and parts[2] not in ("ro", "rw")
+        ):
+            raise ValueError(
+                f"invalid mount: `{mount}`, expected HOST_PATH:CONTAINER_PATH[:ro]"
+            )
+        if not os.path.isabs(parts[0]) or not os.path.isabs(parts[1]):
+            raise ValueError(f"invalid mount: `{mount}`, paths must be absolute")
+        parsed.append((parts[0], parts[1], len(parts) == 3 and parts[2] == "ro"))
+    return parsed
+
+
+@dataclass
+class ContainerOptions:
+    """
+    Options of the containers that the replicas are run in by the docker based
+    image providers (``image_type=docker`` and ``image_type=docker_api``).
+    ``None`` (or empty) options are left to the docker defaults.
+    """
+
+    # size (in bytes) of /dev/shm
+    shm_size: Optional[int] = None
+    # network mode (e.g. ``host``)
+    network: Optional[str] = None
+    # ipc mode (e.g. ``host``)
+    ipc: Optional[str] = None
+    # (host_path, container_path, read_only) bind mounts
+    mounts: List[Tuple[str, str, bool]] = field(default_factory=list)
+    # container ports (``Role.port_map``) published on ephemeral host ports
+    # (not published with ``network=host`` since the ports are the host's)
+    ports: List[int] = field(default_factory=list)
+    # limits derived from the role's ``Resource``
+    cpus: Optional[float] = None
+    memory: Optional[int] = None
+    gpus: Optional[int] = None
+
+    def docker_flags(self) -> List[str]:
+        """
+        Returns the ``docker run`` flags for the options.
+        """
+        flags = []
+        if self.shm_size is not None:
+            flags += ["--shm-size", str(self.shm_size)]
+        if self.network:
+            flags += ["--network", self.network]
+        if self.ipc:
+            flags += ["--ipc", self.ipc]
+        for host_path, container_path, read_only in self.mounts:
+            ro = ":ro" if read_only else ""
+            flags += ["--volume", f"{host_path}:{container_path}{ro}"]
+        if self.network != "host":
+            for port in self.ports:
+                flags += ["--publish", str(port)]
+        if self.cpus is not None:
+            flags += ["--cpus", str(self.cpus)]
+        if self.memory is not None:
+            flags += ["--memory", str(self.memory)]
+        if self.gpus:
+            flags += ["--gpus", str(self.gpus)]
+        return flags
+
+    def host_config(self) -> Dict[str, Any]:
+        """
+        Returns the docker engine API ``HostConfig`` for the options.
+        """
+        config: Dict[str, Any] = {}
+        if self.shm_size is not None:
+            config["ShmSize"] = self.shm_size
+        if self.network:
+            config["NetworkMode"] = self.network
+        if self.ipc:
+            config["IpcMode"] = self.ipc
+        if self.mounts:
+            config["Binds"] = [
+                f"{host_path}:{container_path}{':ro' if read_only else ''}"
+                for host_path, container_path, read_only in self.mounts
+            ]
+        if self.ports and self.network != "host":
+            config["PortBindings"] = {
+                f"{port}/tcp": [{"HostPort": ""}] for port in self.ports
+            }
+        if self.cpus is not None:
+            config["NanoCpus"] = int(self.cpus * 1e9)
+        if self.memory is not None:
+            config["Memory"] = self.memory
+        if self.gpus:
+            config["DeviceRequests"] = [
+                {"Driver": "", "Count": self.gpus, "Capabilities": [["gpu"]]}
+            ]
+        return config
+
+
 @dataclass
 class ReplicaParam:
     """
@@ -329,6 +743,27 @@ class ReplicaParam:
     env: Dict[str, str]
     stdout: Optional[str]
     stderr: Optional[str]
+    # path of the replica's cgroup (None if cgroups are not used)
+    cgroup: Optional[str] = None
+    # cgroup interface file name -> value (e.g. "memory.max" -> "1073741824")
+    cgroup_limits: Dict[str, str] = field(default_factory=dict)
+    # size (in bytes) at which stdout and stderr are rotated (None to not rotate)
+    log_max_bytes: Optional[int] = None
+    # compression of the rotated log segments (one of none, gzip, zstd)
+    log_compression: str = "gzip"
+    # number of stdout/stderr lines to keep in memory when not logging to files
+    # (None to not capture the logs)
+    log_buffer_lines: Optional[int] = None
+    # whether to also write the captured logs to the console
+    echo_logs: bool = True
+    # image to run the replica in as a container (created through the docker
+    # engine API), None to run the replica as a subprocess
+    container_image: Optional[str] = None
+    # options of the container (None if the replica is not run in a container)
+    container_options: Optional[ContainerOptions] = None
+    # modules preloaded by the forkserver that the replica is forked from
+    # (None to run the replica as a subprocess)
+    forkserver_preload: Optional[List[str]] = None
 
 
 @dataclass
@@ -346,6 +781,22 @@ class PopenRequest:
     # maps role_name -> List[replica_log_dir]
     # role_log_dirs["trainer"][0] -> holds trainer's 0^th replica's log directory path
     role_log_dirs: Dict[RoleName, List[str]]
+    # parent cgroup of the replica cgroups (None if cgroups are not used)
+    cgroup_root: Optional[str] = None
+    # interval (in seconds) to sample replica resource usage (None to not sample)
+    sample_interval: Optional[float] = None
+    # role_name -> (retry_policy, max_retries)
+    role_retries: Dict[RoleName, Tuple[RetryPolicy, int]] = field(default_factory=dict)
+    # initial backoff (in seconds) before restarting failed replicas
+    restart_backoff: float = 1.0
+    # max total size (in bytes) of the session's log dirs (None for no quota)
+    log_quota_bytes: Optional[int] = None
+    # whether to build the trigram index of the log files once the app finishes
+    index_logs: bool = False
+    # port of the rendezvous store to host for the torch dist roles (None to not host)
+    rdzv_port: Optional[int] = None
+    # host ports allocated for the app (reserved until the app is closed)
+    ports: List[int] = field(default_factory=list)
 
 
 class LocalScheduler(Scheduler):
@@ -356,10 +807,89 @@ class LocalScheduler(Scheduler):
     runs are ignored. Properties that are ignored:
 
     1. Resource requirements
-    2. Resource limit enforcements
-    3. Retry policies
-    4. Retry counts (no retries supported)
-    5. Deployment preferences
+    2. Resource limit enforcements (unless ``use_cgroups=True``)
+    3. Deployment preferences
+
+    Failed replicas are restarted as per the role's ``retry_policy``
+    up to ``max_retries`` times:
+
+    1. ``RetryPolicy.REPLICA``: only the failed replica is restarted
+       (each replica can be restarted ``max_retries`` times)
+    2. ``RetryPolicy.APPLICATION``: all replicas of the app are restarted
+       (the app can be restarted ``max_retries`` times)
+
+    Restarts are triggered by process exit events (not by ``describe()``) and
+    are delayed by an exponential backoff starting at ``restart_backoff`` seconds.
+    A restarted replica keeps its ``replica_id`` and log dir; the logs and error file
+    of the previous attempt are moved to ``<replica_log_dir>/attempt_<n>/``.
+
+    When the ``use_cgroups`` run option is set, each replica is placed
+    into its own cgroup v2 (``cgroup_root/session_name/app_id/role_name/replica_id``)
+    whose ``cpu.max`` and ``memory.max`` are derived from the role's ``Resource``.
+    The cgroup accounting (peak memory, cpu usage and throttling, oom kills) is
+    reported in the ``resource_usage`` of each ``ReplicaStatus`` and in the ``SUCCESS``
+    file. This is only supported for ``image_type=dir`` since docker containers
+    are parented by the docker daemon rather than by this scheduler.
+
+    When the ``sample_interval`` run option is set, the rss, cpu utilization,
+    io bytes and thread count of each replica's process tree are periodically
+    sampled (from ``/proc``) by a single background thread. The latest and the
+    peak samples are reported in the ``usage`` and ``peak_usage`` of each ``ReplicaStatus``.
+
+    When the ``log_max_bytes`` run option is set, the ``stdout.log`` and ``stderr.log``
+    of each replica are rotated once they grow over ``log_max_bytes`` into
+    ``stdout.log.<n>`` segments compressed with ``log_compression``. ``log_iter``
+    reads across the rotated segments transparently. When the ``log_quota_bytes``
+    run option is set, the log dirs of the finished apps in the session are
+    deleted (oldest first) upon scheduling a new app until the session's log dirs
+    fit in the quota. When ``log_dir`` is not set, the (temporary) log dirs
+    are deleted once the app is evicted from the cache or the scheduler is deleted.
+
+    When ``log_dir`` is not set, the replicas log to the console. If the
+    ``capture_logs`` run option is set, the last ``log_buffer_lines`` lines of
+    the stdout and stderr of each replica are also kept in memory (and echoed to the
+    console unless ``echo_logs=False``) so that ``log_iter`` can serve them.
+    The logs of all the replicas are read by a single background thread.
+
+    The log files of the apps in a ``log_dir`` can be searched with
+    ``torchx.schedulers.log_search`` (``torchx log-search``). When the
+    ``index_logs`` run option is set, a trigram index of each log file is built
+    (in the background) once the app finishes to speed up the searches.
+
+    Roles that run ``torch.distributed.launch`` (or ``torch.distributed.run``,
+    see ``create_torch_dist_role``) without an ``--rdzv_endpoint`` are rewritten
+    to rendezvous (``c10d`` backend) through a ``TCPStore`` that the scheduler
+    hosts on a free localhost port until the app finishes, hence no etcd server
+    is needed. The endpoint is passed to the replicas in ``TORCHX_RDZV_ENDPOINT``.
+    This is turned off with ``local_rdzv=False`` and is skipped (with a warning)
+    if torch is not installed or if the containers do not share the host's network.
+
+    When the ``forkserver`` run option is set, the python replicas
+    (``python script.py ...`` or ``python -m module ...`` with ``image_type=dir``
+    and no cgroups) are forked from a warm forkserver (one per interpreter and
+    ``forkserver_preload`` modules, e.g. ``torch``) rather than started as
+    new interpreters. See ``torchx.schedulers.forkserver`` for the caveats.
+
+    When the replicas share the host's network (``image_type=dir`` or
+    ``network=host``) each replica is allocated free ports (unless
+    ``allocate_ports=False``) for the ports in its role's ``port_map``,
+    hence the apps that use the same ports can run concurrently. The allocated
+    ports are substituted for the ``${port:<name>}`` macros (see ``macros.port()``)
+    and are passed in the ``TORCHX_PORT_<NAME>`` env vars. The ports are not
+    handed out to other apps of this scheduler until the app finishes.
+
+    The containers of the docker images (``image_type=docker`` or ``docker_api``)
+    can be given a larger ``/dev/shm`` (``shm_size``), the host's network and ipc
+    namespaces (``network=host``, ``ipc=host``, e.g. for NCCL/gloo) and bind
+    mounts (``mounts``, e.g. of data caches). The app's log dir is always
+    mounted. The role's ``port_map`` ports are published (unless ``network=host``)
+    and its ``Resource`` is enforced if ``container_resources=True``.
+
+    With ``image_type=docker_api`` the replicas are run as docker containers
+    through the Docker Engine API (over the unix socket in ``DOCKER_HOST``
+    or ``/var/run/docker.sock``) rather than through a ``docker run`` process each.
+    The containers of an app are created in a batch, their logs are streamed
+    from the engine and their exit codes are taken from the engine's events.
 
     ..note:: Use this scheduler sparingly since an application
              that runs successfully on a session backed by this
@@ -372,6 +902,22 @@ class LocalScheduler(Scheduler):
 
         # TODO T72035686 replace dict with a proper LRUCache data structure
         self._apps: Dict[AppId, _LocalAppDef] = {}
+        # initialized before validating the args since __del__ uses them
+        self._sampler = ResourceSampler()
+        self._exit_watcher = ExitWatcher()
+        # guards the apps' state against concurrent restarts (on the exit watcher thread)
+        self._lock = threading.RLock()
+        self._log_pump = LogPump()
+        # echoes the captured logs to the console (by fd) without blocking the pump
+        self._echoes: Dict[int, ConsoleEcho] = {}
+        # base log dir of the apps submitted without a log_dir (created on first use)
+        self._tmp_log_dir: Optional[str] = None
+        # created on first use by image_type=docker_api
+        self._docker: Optional[DockerClient] = None
+        self._container_events: Optional[ContainerEventWatcher] = None
+        self._ports = PortAllocator()
+        # (python, preload modules) -> forkserver (started on first use)
+        self._forkservers: Dict[Tuple[str, Tuple[str, ...]], ForkServer] = {}
 
         if cache_size <= 0:
             raise ValueError("cache size must be greater than zero")
@@ -382,7 +928,7 @@ class LocalScheduler(Scheduler):
         opts.add(
             "image_type",
             type_=str,
-            help="image type. One of [dir, docker]",
+            help="image type. One of [dir, docker, docker_api]",
             default="dir",
         )
         opts.add(
@@ -391,6 +937,142 @@ class LocalScheduler(Scheduler):
             default=None,
             help="dir to write stdout/stderr log files of replicas",
         )
+        opts.add(
+            "shm_size",
+            type_=str,
+            default=None,
+            help="(docker images only) size of /dev/shm of the containers"
+            " (e.g. 8g). Docker's default (64m) if not set",
+        )
+        opts.add(
+            "network",
+            type_=str,
+            default=None,
+            help="(docker images only) network mode of the containers (e.g. host)",
+        )
+        opts.add(
+            "ipc",
+            type_=str,
+            default=None,
+            help="(docker images only) ipc mode of the containers (e.g. host)",
+        )
+        opts.add(
+            "mounts",
+            type_=str,
+            default=None,
+            help="(docker images only) comma separated HOST_PATH:CONTAINER_PATH[:ro]"
+            " bind mounts (e.g. of data caches). The app's log dir is always mounted",
+        )
+        opts.add(
+            "container_resources",
+            type_=bool,
+            default=False,
+            help="(docker images only) limit the cpus, memory and gpus of the"
+            " containers to the role's resource",
+        )
+        opts.add(
+            "use_cgroups",
+            type_=bool,
+            default=False,
+            help="enforce role resource limits (and do resource accounting)"
+            " by running each replica in its own cgroup v2",
+        )
+        opts.add(
+            "cgroup_root",
+            type_=str,
+            default=DEFAULT_CGROUP_ROOT,
+            help="writable (delegated) cgroup v2 dir under which the replica"
+            " cgroups are created (used only if use_cgroups=True)",
+        )
+        opts.add(
+            "sample_interval",
+            type_=float,
+            default=None,
+            help="interval (in seconds) at which the rss, cpu, io and threads"
+            " of each replica are sampled. Not sampled if not set",
+        )
+        opts.add(
+            "restart_backoff",
+            type_=float,
+            default=1.0,
+            help="initial backoff (in seconds, doubled on each restart)"
+            " before a failed replica is restarted",
+        )
+        opts.add(
+            "log_max_bytes",
+            type_=int,
+            default=None,
+            help="size (in bytes) at which the stdout/stderr log files of"
+            " the replicas are rotated. Not rotated if not set",
+        )
+        opts.add(
+            "log_compression",
+            type_=str,
+            default="gzip",
+            help="compression of the rotated log files. One of [none, gzip, zstd]",
+        )
+        opts.add(
+            "capture_logs",
+            type_=bool,
+            default=False,
+            help="when log_dir is not set, keep the last log_buffer_lines lines"
+            " of stdout/stderr of each replica in memory (for log_iter)",
+        )
+        opts.add(
+            "echo_logs",
+            type_=bool,
+            default=True,
+            help="whether to write the captured logs (capture_logs=True) to the console",
+        )
+        opts.add(
+            "log_buffer_lines",
+            type_=int,
+            default=DEFAULT_MAX_LINES,
+            help="number of log lines of each replica's stdout/stderr kept in memory"
+            " (used only if capture_logs=True)",
+        )
+        opts.add(
+            "index_logs",
+            type_=bool,
+            default=False,
+            help="build a trigram index of the log files once the app finishes"
+            " to speed up `torchx log-search`",
+        )
+        opts.add(
+            "forkserver",
+            type_=bool,
+            default=False,
+            help="fork the python replicas from a warm forkserver (image_type=dir only)"
+            " rather than starting a new interpreter for each replica",
+        )
+        opts.add(
+            "forkserver_preload",
+            type_=str,
+            default=None,
+            help="comma-separated modules imported by the forkserver"
+            " (used only if forkserver=True), e.g. torch,pytorch_lightning",
+        )
+        opts.add(
+            "allocate_ports",
+            type_=bool,
+            default=True,
+            help="allocate free ports (per replica) for the role's port_map when"
+            " the replicas share the host's network (see macros.port())",
+        )
+        opts.add(
+            "local_rdzv",
+            type_=bool,
+            default=True,
+            help="host a c10d rendezvous for the torch dist roles that have no"
+            " rdzv_endpoint (so that no etcd server is needed)",
+        )
+        opts.add(
+            "log_quota_bytes",
+            type_=int,
+            default=None,
+            help="max total size (in bytes) of the log dirs of the session."
+            " The log dirs of the oldest finished apps are deleted to fit the quota",
+        )
         return opts
 
     def _validate(self, app: AppDef, scheduler: SchedulerBackend) -> None:
@@ -401,8 +1083,25 @@ class LocalScheduler(Scheduler):
         return {
             "dir": LocalDirectoryImageProvider(cfg),
             "docker": DockerImageProvider(cfg),
+            "docker_api": DockerEngineImageProvider(cfg, self._get_docker_client),
         }
 
+    def _get_docker_client(self) -> DockerClient:
+        if not self._docker:
+            self._docker = DockerClient()
+        return self._docker
+
+    def _get_container_events(self) -> ContainerEventWatcher:
+        """
+        Returns the (started) watcher of the exits of the session's containers.
+        """
+        if not self._container_events:
+            self._container_events = ContainerEventWatcher(
+                self._get_docker_client(), self.session_name
+            )
+        self._container_events.start()
+        return self._container_events
+
     def _get_img_provider(self, cfg: RunConfig) -> ImageProvider:
         img_type = cfg.get("image_type")
         providers = self._img_providers(cfg)
@@ -434,7 +1133,8 @@ class LocalScheduler(Scheduler):
 
         if lru_app_id:
             # evict LRU finished app from the apps cache
-            del self._apps[lru_app_id]
+            lru_app = self._apps.pop(lru_app_id)
+            self._remove_tmp_log_dir(lru_app)
 
             log.debug(f"evicting app: {lru_app_id}, from local scheduler cache")
             return True
@@ -462,15 +1162,38 @@ class LocalScheduler(Scheduler):
         return open(file, mode="w")
 
     def _popen(
-        self, role_name: RoleName, replica_id: int, replica_params: ReplicaParam
+        self,
+        role_name: RoleName,
+        replica_id: int,
+        replica_params: ReplicaParam,
+        cgroup_root: Optional[str] = None,
     ) -> _LocalReplica:
         """
         Same as ``subprocess.Popen(**popen_kwargs)`` but is able to take ``stdout`` and ``stderr``
         as file name ``str`` rather than a file-like obj.
         """
 
-        stdout_ = self._get_file_io(replica_params.stdout)
-        stderr_ = self._get_file_io(replica_params.stderr)
+        stdout_ = self._get_log_sink(replica_params.stdout, replica_params)
+        stderr_ = self._get_log_sink(replica_params.stderr, replica_params)
+
+        cgroup = None
+        preexec_fn = _pr_set_pdeathsig
+        if replica_params.cgroup:
+            replica_cgroup = Cgroup(none_throws(cgroup_root), replica_params.cgroup)
+            try:
+                replica_cgroup.create(replica_params.cgroup_limits)
+            except OSError as e:
+                raise RuntimeError(
+                    f"failed to create cgroup: {replica_cgroup.path}."
+                    f" Make sure that {replica_cgroup.root} is a writable cgroup v2 dir"
+                    f" or run without the `use_cgroups` run option"
+                ) from e
+
+            def preexec_fn() -> None:
+                _pr_set_pdeathsig()
+                replica_cgroup.attach_self()
+
+            cgroup = replica_cgroup
 
         # inherit parent's env vars since 99.9% of the time we want this behavior
         # just make sure we override the parent's env vars with the user_defined ones
@@ -485,19 +1208,306 @@ class LocalScheduler(Scheduler):
         proc = subprocess.Popen(
             args=replica_params.args,
             env=env,
-            stdout=stdout_,
-            stderr=stderr_,
-            preexec_fn=_pr_set_pdeathsig,
+            stdout=self._popen_io(stdout_),
+            stderr=self._popen_io(stderr_),
+            preexec_fn=preexec_fn,
         )
+        echo_logs = replica_params.echo_logs
         return _LocalReplica(
             role_name,
             replica_id,
             proc,
-            stdout=stdout_,
-            stderr=stderr_,
+            stdout=self._pump(proc.stdout, stdout_, 1 if echo_logs else None),
+            stderr=self._pump(proc.stderr, stderr_, 2 if echo_logs else None),
             error_file=error_file,
+            cgroup=cgroup,
+            params=replica_params,
+            stdout_buffer=stdout_ if isinstance(stdout_, LogBuffer) else None,
+            stderr_buffer=stderr_ if isinstance(stderr_, LogBuffer) else None,
+        )
+
+    def _start_replica(
+        self,
+        app_id: AppId,
+        role_name: RoleName,
+        replica_id: int,
+        replica_params: ReplicaParam,
+        cgroup_root: Optional[str] = None,
+        container_id: Optional[str] = None,
+    ) -> _LocalReplica:
+        """
+        Starts the replica as a container if it has a ``container_image``
+        (``container_id`` is the already created container, if any),
+        otherwise as a subprocess.
+        """
+        if replica_params.container_image:
+            return self._run_container(
+                app_id, role_name, replica_id, replica_params, container_id
+            )
+        if replica_params.forkserver_preload is not None:
+            return self._fork(role_name, replica_id, replica_params)
+        return self._popen(role_name, replica_id, replica_params, cgroup_root)
+
+    def _fork(
+        self,
+        role_name: RoleName,
+        replica_id: int,
+        replica_params: ReplicaParam,
+    ) -> _LocalReplica:
+        """
+        Same as ``_popen()`` but forks the replica from the forkserver
+        (started on first use) of the replica's interpreter.
+        """
+        env = os.environ.copy()
+        env.update(replica_params.env)
+
+        python = find_python(replica_params.args, env)
+        if not python:
+            # let Popen raise the same error as without a forkserver
+            return self._popen(role_name, replica_id, replica_params)
+        preload = tuple(none_throws(replica_params.forkserver_preload))
+        server = self._forkservers.get((python, preload))
+        if not server:
+            server = ForkServer(python, preload)
+            self._forkservers[(python, preload)] = server
+
+        stdout_ = self._get_log_sink(replica_params.stdout, replica_params)
+        stderr_ = self._get_log_sink(replica_params.stderr, replica_params)
+
+        args_pfmt = pprint.pformat(asdict(replica_params), indent=2, width=80)
+        log.info(f"Forking {role_name} (replica {replica_id}):\n {args_pfmt}")
+
+        proc = server.spawn(
+            replica_params.args,
+            env,
+            stdout=self._fork_io(stdout_),
+            stderr=self._fork_io(stderr_),
+        )
+        echo_logs = replica_params.echo_logs
+        return _LocalReplica(
+            role_name,
+            replica_id,
+            # pyre-ignore [6]: ForkedProcess quacks like a Popen
+            proc,
+            stdout=self._pump(proc.stdout, stdout_, 1 if echo_logs else None),
+            stderr=self._pump(proc.stderr, stderr_, 2 if echo_logs else None),
+            error_file=env["TORCHELASTIC_ERROR_FILE"],
+            params=replica_params,
+            stdout_buffer=stdout_ if isinstance(stdout_, LogBuffer) else None,
+            stderr_buffer=stderr_ if isinstance(stderr_, LogBuffer) else None,
+        )
+
+    def _fork_io(
+        self, sink: Optional[Union[TextIO, RotatingLogWriter, LogBuffer]]
+    ) -> Optional[int]:
+        """
+        Same as ``_popen_io()`` but returns the file descriptor of the sink's file.
+        """
+        io = self._popen_io(sink)
+        if io is None or isinstance(io, int):
+            return io
+        return io.fileno()
+
+    def _container_config(
+        self,
+        app_id: AppId,
+        role_name: RoleName,
+        replica_id: int,
+        replica_params: ReplicaParam,
+    ) -> Dict[str, Any]:
+        """
+        Returns the docker engine ``/containers/create`` request body of the replica.
+        """
+        options = replica_params.container_options
+        config = {
+            "Image": replica_params.container_image,
+            "Cmd": replica_params.args,
+            "Env": [f"{k}={v}" for k, v in replica_params.env.items()],
+            "Labels": {
+                LABEL_SESSION: self.session_name,
+                LABEL_APP_ID: app_id,
+                LABEL_ROLE_NAME: role_name,
+                LABEL_REPLICA_ID: str(replica_id),
+            },
+            "HostConfig": options.host_config() if options else {},
+        }
+        if options and options.ports and options.network != "host":
+            config["ExposedPorts"] = {f"{port}/tcp": {} for port in options.ports}
+        return config
+
+    def _create_containers(self, request: PopenRequest) -> Dict[Tuple[str, int], str]:
+        """
+        Creates the containers of all the (container) replicas of the app in a
+        batch and returns their ids keyed by ``(role_name, replica_id)``.
+        """
+        keys = []
+        configs = []
+        for role_name, role_params in request.role_params.items():
+            for replica_id, replica_params in enumerate(role_params):
+                if replica_params.container_image:
+                    keys.append((role_name, replica_id))
+                    configs.append(
+                        self._container_config(
+                            request.app_id, role_name, replica_id, replica_params
+                        )
+                    )
+        if not configs:
+            return {}
+        container_ids = self._get_docker_client().create_containers(configs)
+        return dict(zip(keys, container_ids))
+
+    def _run_container(
+        self,
+        app_id: AppId,
+        role_name: RoleName,
+        replica_id: int,
+        replica_params: ReplicaParam,
+        container_id: Optional[str] = None,
+    ) -> _LocalReplica:
+        """
+        Same as ``_popen()`` but runs the replica as a container through the
+        docker engine API (creating the container unless ``container_id`` is given).
+        """
+        client = self._get_docker_client()
+        # subscribe to the exit events before the container is started
+        events = self._get_container_events()
+        if not container_id:
+            container_id = client.create_container(
+                self._container_config(app_id, role_name, replica_id, replica_params)
+            )
+
+        stdout_ = self._get_log_sink(replica_params.stdout, replica_params)
+        stderr_ = self._get_log_sink(replica_params.stderr, replica_params)
+        echo_logs = replica_params.echo_logs
+        write_stdout, close_stdout, stdout_name = self._sink_writer(
+            stdout_, 1, echo_logs
+        )
+        write_stderr, close_stderr, stderr_name = self._sink_writer(
+            stderr_, 2, echo_logs
+        )
+
+        args_pfmt = pprint.pformat(asdict(replica_params), indent=2, width=80)
+        log.info(
+            f"Running {role_name} (replica {replica_id})"
+            f" in container {container_id}:\n {args_pfmt}"
+        )
+
+        proc = ContainerProcess(client, container_id)
+        events.watch(proc)
+        proc.start()
+        streamer = ContainerLogStreamer(proc, write_stdout, write_stderr)
+        return _LocalReplica(
+            role_name,
+            replica_id,
+            # pyre-ignore [6]: ContainerProcess quacks like a Popen
+            proc,
+            stdout=StreamedLog(streamer, close_stdout, stdout_name, DRAIN_TIMEOUT),
+            stderr=StreamedLog(streamer, close_stderr, stderr_name, DRAIN_TIMEOUT),
+            error_file=replica_params.env["TORCHELASTIC_ERROR_FILE"],
+            params=replica_params,
+            stdout_buffer=stdout_ if isinstance(stdout_, LogBuffer) else None,
+            stderr_buffer=stderr_ if isinstance(stderr_, LogBuffer) else None,
         )
 
+    def _sink_writer(
+        self,
+        sink: Optional[Union[TextIO, RotatingLogWriter, LogBuffer]],
+        console_fd: int,
+        echo_logs: bool,
+    ) -> Tuple[Callable[[bytes], None], Callable[[], None], str]:
+        """
+        Returns the ``(write, close, name)`` of the sink that the (streamed)
+        output of a container is written to (the console if there is no sink).
+        """
+        if isinstance(sink, RotatingLogWriter):
+            return sink.write, sink.close, sink.name
+        elif isinstance(sink, LogBuffer):
+            buffer = sink
+
+            console = self._console_echo(console_fd) if echo_logs else None
+
+            def write_buffer(data: bytes) -> None:
+                buffer.write(data)
+                if console:
+                    console.write(data)
+
+            return write_buffer, buffer.flush, "<MEMORY>"
+        elif sink:
+            file = sink
+
+            def write_file(data: bytes) -> None:
+                # flushed as it comes so that the log file can be followed
+                file.buffer.write(data)
+                file.buffer.flush()
+
+            return write_file, file.close, file.name
+        else:
+            return partial(echo, console_fd), lambda: None, "<CONSOLE>"
+
+    def _get_log_sink(
+        self, file: Optional[str], replica_params: ReplicaParam
+    ) -> Optional[Union[TextIO, RotatingLogWriter, LogBuffer]]:
+        """
+        Returns a rotating log writer for ``file`` if log rotation is enabled,
+        a log buffer if there is no ``file`` and the logs are captured,
+        otherwise the same as ``_get_file_io()``.
+        """
+        if file and replica_params.log_max_bytes:
+            return RotatingLogWriter(
+                file,
+                replica_params.log_max_bytes,
+                replica_params.log_compression,
+                self._log_pump.executor,
+            )
+        if not file and replica_params.log_buffer_lines:
+            return LogBuffer(replica_params.log_buffer_lines)
+        return self._get_file_io(file)
+
+    def _popen_io(
+        self, sink: Optional[Union[TextIO, RotatingLogWriter, LogBuffer]]
+    ) -> Optional[Union[TextIO, int]]:
+        """
+        Returns the ``stdout``/``stderr`` arg to ``Popen`` for the sink
+        (a pipe if the sink is pumped).
+        """
+        if isinstance(sink, (RotatingLogWriter, LogBuffer)):
+            return subprocess.PIPE
+        return sink
+
+    def _pump(
+        self,
+        pipe: Optional[IO[bytes]],
+        sink: Optional[Union[TextIO, RotatingLogWriter, LogBuffer]],
+        echo_fd: Optional[int] = None,
+    ) -> Optional[Union[TextIO, PumpedPipe]]:
+        """
+        Pumps ``pipe`` into ``sink`` if ``sink`` is a rotating log writer
+        or a log buffer (echoing the logs to ``echo_fd`` if specified).
+        """
+        if isinstance(sink, RotatingLogWriter):
+            return self._log_pump.add(
+                none_throws(pipe), sink.write, sink.close, sink.name
+            )
+        elif isinstance(sink, LogBuffer):
+            buffer = sink
+            console = self._console_echo(echo_fd) if echo_fd is not None else None
+
+            def write(data: bytes) -> None:
+                buffer.write(data)
+                if console:
+                    console.write(data)
+
+            return self._log_pump.add(
+                none_throws(pipe), write, buffer.flush, "<MEMORY>"
+            )
+        return sink
+
+    def _console_echo(self, fd: int) -> ConsoleEcho:
+        with self._lock:
+            if fd not in self._echoes:
+                self._echoes[fd] = ConsoleEcho(fd)
+            return self._echoes[fd]
+
     def _get_app_log_dir(self, app_id: str, cfg: RunConfig) -> Tuple[str, bool]:
         """
         Returns the log dir and a bool (should_redirect_std). We redirect stdout/err
@@ -510,7 +1520,9 @@ class LocalScheduler(Scheduler):
         base_log_dir = cfg.get("log_dir")
         redirect_std = True
         if not base_log_dir:
-            base_log_dir = tempfile.mkdtemp(prefix="torchx_")
+            if not self._tmp_log_dir:
+                self._tmp_log_dir = tempfile.mkdtemp(prefix="torchx_")
+            base_log_dir = self._tmp_log_dir
             redirect_std = False
 
         return os.path.join(str(base_log_dir), self.session_name, app_id), redirect_std
@@ -529,22 +1541,181 @@ class LocalScheduler(Scheduler):
             app_id not in self._apps
         ), "no app_id collisions expected since uuid4 suffix is used"
 
+        if request.log_quota_bytes is not None:
+            self._gc_log_dirs(os.path.dirname(app_log_dir), request.log_quota_bytes)
+
+        # reserved until the app is closed
+        self._ports.claim(app_id, request.ports)
+        try:
+            return self._schedule(request)
+        except BaseException:
+            self._ports.release(app_id)
+            raise
+
+    def _schedule(self, request: PopenRequest) -> str:
+        app_id = request.app_id
+        app_log_dir = request.log_dir
         os.makedirs(app_log_dir)
-        local_app = _LocalAppDef(app_id, app_log_dir)
-
-        for role_name in request.role_params.keys():
-            role_params = request.role_params[role_name]
-            role_log_dirs = request.role_log_dirs[role_name]
-            for replica_id in range(len(role_params)):
-                replica_params = role_params[replica_id]
-                replica_log_dir = role_log_dirs[replica_id]
-
-                os.makedirs(replica_log_dir)
-                replica = self._popen(role_name, replica_id, replica_params)
-                local_app.add_replica(role_name, replica)
-        self._apps[app_id] = local_app
+        local_app = _LocalAppDef(app_id, app_log_dir, request, self._log_pump.executor)
+        local_app.port_allocator = self._ports
+        if request.rdzv_port is not None:
+            local_app.rdzv_store = local_rendezvous.RendezvousStore(request.rdzv_port)
+
+        with self._lock:
+            container_ids = self._create_containers(request)
+            for role_name in request.role_params.keys():
+                role_params = request.role_params[role_name]
+                role_log_dirs = request.role_log_dirs[role_name]
+                retry_policy, max_retries = request.role_retries.get(
+                    role_name, (RetryPolicy.APPLICATION, 0)
+                )
+                for replica_id in range(len(role_params)):
+                    replica_params = role_params[replica_id]
+                    replica_log_dir = role_log_dirs[replica_id]
+
+                    os.makedirs(replica_log_dir)
+                    replica = self._start_replica(
+                        app_id,
+                        role_name,
+                        replica_id,
+                        replica_params,
+                        request.cgroup_root,
+                        container_ids.get((role_name, replica_id)),
+                    )
+                    replica.retry_policy = retry_policy
+                    replica.max_retries = max_retries
+                    self._on_replica_started(local_app, replica)
+                    local_app.add_replica(role_name, replica)
+            self._apps[app_id] = local_app
         return app_id
 
+    def _gc_log_dirs(self, session_log_dir: str, quota_bytes: int) -> None:
+        """
+        Deletes the log dirs of the oldest finished apps in the session to fit
+        ``quota_bytes`` and evicts the deleted apps from the apps cache.
+        """
+        with self._lock:
+            deleted = set(gc_app_log_dirs(session_log_dir, quota_bytes))
+            for app_id, app in list(self._apps.items()):
+                if app.log_dir in deleted:
+                    del self._apps[app_id]
+
+    def _remove_tmp_log_dir(self, local_app: _LocalAppDef) -> None:
+        """
+        Deletes the log dir of the (finished) app if it was auto-generated
+        (e.g. the app was submitted without a ``log_dir``).
+        """
+        tmp_log_dir = self._tmp_log_dir
+        if tmp_log_dir and local_app.log_dir.startswith(tmp_log_dir + os.sep):
+            shutil.rmtree(local_app.log_dir, ignore_errors=True)
+
+    def _on_replica_started(
+        self, local_app: _LocalAppDef, replica: _LocalReplica
+    ) -> None:
+        """
+        Sets up the resource sampling and the exit watching
+        of a newly started (or restarted) replica.
+        """
+        request = none_throws(local_app.request)
+        if request.sample_interval:
+            if not replica.usage_history:
+                replica.usage_history = UsageHistory()
+            self._sampler.track(
+                replica.proc.pid,
+                request.sample_interval,
+                none_throws(replica.usage_history),
+            )
+
+        if replica.max_retries > 0:
+            on_exit = partial(self._on_replica_exit, local_app.id, replica)
+            if isinstance(replica.proc, (ContainerProcess, ForkedProcess)):
+                replica.proc.add_exit_callback(on_exit)
+            else:
+                self._exit_watcher.watch(replica.proc, on_exit)
+
+    def _restart_backoff(self, backoff: float, num_restarts: int) -> float:
+        return min(backoff * (2**num_restarts), MAX_RESTART_BACKOFF)
+
+    def _on_replica_exit(self, app_id: str, replica: _LocalReplica) -> None:
+        """
+        Invoked (on the exit watcher thread) when a replica that has retries exits.
+        Schedules the restart of the replica (or the whole app) if it failed.
+        """
+        with self._lock:
+            local_app = self._apps.get(app_id)
+            if not local_app or local_app.restart_pending or replica.restart_pending:
+                return
+            if not local_app.will_restart(replica):
+                return
+
+            request = none_throws(local_app.request)
+            app_restart = replica.retry_policy == RetryPolicy.APPLICATION
+            if not app_restart:
+                replica.restart_pending = True
+                replicas = [replica]
+                delay = self._restart_backoff(
+                    request.restart_backoff, replica.num_restarts
+                )
+            else:
+                local_app.restart_pending = True
+                replicas = [r for rs in local_app.role_replicas.values() for r in rs]
+                # signal the surviving replicas now, they are waited on restart
+                for r in replicas:
+                    if r.is_alive():
+                        r.proc.terminate()
+                delay = self._restart_backoff(
+                    request.restart_backoff, local_app.num_app_restarts
+                )
+
+            log.info(
+                f"{replica.role_name}/{replica.replica_id} of app: {app_id} failed"
+                f" (exitcode: {replica.proc.returncode}),"
+                f" restarting {len(replicas)} replica(s) in {delay}s"
+            )
+            self._exit_watcher.call_later(
+                delay, partial(self._restart, app_id, replicas, app_restart)
+            )
+
+    def _restart(
+        self, app_id: str, replicas: List[_LocalReplica], app_restart: bool
+    ) -> None:
+        with self._lock:
+            local_app = self._apps.get(app_id)
+            if not local_app or is_terminal(local_app.state):
+                # app was cancelled (or evicted) while waiting to be restarted
+                return
+
+            try:
+                for r in replicas:
+                    r.terminate()
+                    r.rotate_logs()
+                    restarted = self._start_replica(
+                        app_id,
+                        r.role_name,
+                        r.replica_id,
+                        none_throws(r.params),
+                        none_throws(local_app.request).cgroup_root,
+                    )
+                    r.proc = restarted.proc
+                    r.stdout = restarted.stdout
+                    r.stderr = restarted.stderr
+                    r.cgroup = restarted.cgroup
+                    r.stdout_buffer = restarted.stdout_buffer
+                    r.stderr_buffer = restarted.stderr_buffer
+                    r.num_restarts += 1
+                    r.restart_pending = False
+                    self._on_replica_started(local_app, r)
+            except Exception:
+                log.exception(f"failed to restart app: {app_id}, marking it as FAILED")
+                local_app.set_state(AppState.FAILED)
+                return
+            finally:
+                local_app.restart_pending = False
+
+            local_app.num_restarts += 1
+            if app_restart:
+                local_app.num_app_restarts += 1
+
     def _submit_dryrun(
         self, app: AppDef, cfg: RunConfig
     ) -> AppDryRunInfo[PopenRequest]:
@@ -563,10 +1734,32 @@ class LocalScheduler(Scheduler):
         app_id = make_unique(app.name)
         image_provider = self._get_img_provider(cfg)
         app_log_dir, redirect_std = self._get_app_log_dir(app_id, cfg)
+        cgroup_root = self._get_cgroup_root(cfg)
+        log_buffer_lines = None
+        if not redirect_std and cfg.get("capture_logs"):
+            log_buffer_lines = cfg.get("log_buffer_lines")
+        # pyre-ignore [6]: type check already done by runopt.resolve
+        log_compression: str = cfg.get("log_compression")
+        try:
+            check_compression(log_compression)
+        except ValueError as e:
+            raise InvalidRunConfigException(str(e), cfg, self.run_opts())
 
+        allocate_ports = cfg.get("allocate_ports") and self._on_host_network(
+            image_provider, cfg
+        )
+        ports: List[int] = []
+        rdzv_port = None
         role_params: Dict[str, List[ReplicaParam]] = {}
         role_log_dirs: Dict[str, List[str]] = {}
         for role in app.roles:
+            if self._use_local_rdzv(role, image_provider, cfg):
+                if rdzv_port is None:
+                    rdzv_port = self._ports.allocate(app_id)
+                    ports.append(rdzv_port)
+                role = local_rendezvous.use_rendezvous(
+                    role, f"{local_rendezvous.RDZV_HOST}:{rdzv_port}"
+                )
             replica_params = role_params.setdefault(role.name, [])
             replica_log_dirs = role_log_dirs.setdefault(role.name, [])
 
@@ -579,7 +1772,16 @@ class LocalScheduler(Scheduler):
                     app_id=app_id,
                     replica_id=str(replica_id),
                 )
-                replica_role = values.apply(role)
+                replica_role = role
+                if allocate_ports and role.port_map:
+                    replica_role = replace(
+                        role,
+                        port_map={
+                            name: self._ports.allocate(app_id) for name in role.port_map
+                        },
+                    )
+                    ports.extend(replica_role.port_map.values())
+                replica_role = values.apply(replica_role)
                 args = [cmd] + replica_role.args
                 replica_log_dir = os.path.join(app_log_dir, role.name, str(replica_id))
 
@@ -591,21 +1793,190 @@ class LocalScheduler(Scheduler):
                     ),
                     **replica_role.env,
                 }
+                for name, port in replica_role.port_map.items():
+                    env_vars[port_env_var(name)] = str(port)
+                if rdzv_port is not None:
+                    env_vars[
+                        local_rendezvous.RDZV_ENDPOINT_ENV
+                    ] = f"{local_rendezvous.RDZV_HOST}:{rdzv_port}"
                 stdout = None
                 stderr = None
                 if redirect_std:
                     stdout = os.path.join(replica_log_dir, "stdout.log")
                     stderr = os.path.join(replica_log_dir, "stderr.log")
 
-                provider_cmd = image_provider.get_command(role.image, args, env_vars)
+                cgroup = None
+                cgroup_limits = {}
+                if cgroup_root:
+                    cgroup = os.path.join(
+                        cgroup_root,
+                        self.session_name,
+                        app_id,
+                        role.name,
+                        str(replica_id),
+                    )
+                    cgroup_limits = limits_from_resource(role.resource)
+
+                container_options = None
+                if isinstance(
+                    image_provider, (DockerImageProvider, DockerEngineImageProvider)
+                ):
+                    container_options = self._get_container_options(
+                        role, app_log_dir, cfg
+                    )
+                provider_cmd = image_provider.get_command(
+                    role.image, args, env_vars, container_options
+                )
+                forkserver_preload = None
+                if (
+                    cfg.get("forkserver")
+                    and isinstance(image_provider, LocalDirectoryImageProvider)
+                    and not cgroup
+                    and can_fork(provider_cmd)
+                ):
+                    preload = str(cfg.get("forkserver_preload") or "")
+                    forkserver_preload = [
+                        m.strip() for m in preload.split(",") if m.strip()
+                    ]
+                container_image = None
+                if isinstance(image_provider, DockerEngineImageProvider):
+                    container_image = role.image
                 replica_params.append(
-                    ReplicaParam(provider_cmd, env_vars, stdout, stderr)
+                    ReplicaParam(
+                        provider_cmd,
+                        env_vars,
+                        stdout,
+                        stderr,
+                        cgroup=cgroup,
+                        cgroup_limits=cgroup_limits,
+                        # pyre-ignore [6]: type check already done by runopt.resolve
+                        log_max_bytes=cfg.get("log_max_bytes"),
+                        log_compression=log_compression,
+                        # pyre-ignore [6]: type check already done by runopt.resolve
+                        log_buffer_lines=log_buffer_lines,
+                        # pyre-ignore [6]: type check already done by runopt.resolve
+                        echo_logs=cfg.get("echo_logs"),
+                        container_image=container_image,
+                        container_options=container_options,
+                        forkserver_preload=forkserver_preload,
+                    )
                 )
                 replica_log_dirs.append(replica_log_dir)
 
-        return PopenRequest(app_id, app_log_dir, role_params, role_log_dirs)
+        # released unless the dryrun is scheduled in time (see ``schedule()``)
+        self._ports.expire(app_id, DRYRUN_PORTS_TTL)
+        return PopenRequest(
+            app_id,
+            app_log_dir,
+            role_params,
+            role_log_dirs,
+            cgroup_root=cgroup_root,
+            # pyre-ignore [6]: type check already done by runopt.resolve
+            sample_interval=cfg.get("sample_interval"),
+            role_retries={
+                role.name: (role.retry_policy, role.max_retries) for role in app.roles
+            },
+            # pyre-ignore [6]: type check already done by runopt.resolve
+            restart_backoff=cfg.get("restart_backoff"),
+            # pyre-ignore [6]: type check already done by runopt.resolve
+            log_quota_bytes=cfg.get("log_quota_bytes"),
+            # pyre-ignore [6]: type check already done by runopt.resolve
+            index_logs=cfg.get("index_logs"),
+            rdzv_port=rdzv_port,
+            ports=ports,
+        )
+
+    def _use_local_rdzv(
+        self, role: Role, image_provider: ImageProvider, cfg: RunConfig
+    ) -> bool:
+        """
+        Returns ``True`` if the role should rendezvous through a store hosted
+        by this scheduler (see ``torchx.schedulers.local_rendezvous``).
+        """
+        if not cfg.get("local_rdzv") or not local_rendezvous.needs_rendezvous(role):
+            return False
+        if not local_rendezvous.is_available():
+            log.warning(
+                f"torch is not installed, role: {role.name} is run with its own"
+                " rdzv_backend (an etcd server is needed on localhost)"
+            )
+            return False
+        if not self._on_host_network(image_provider, cfg):
+            log.warning(
+                f"the containers of role: {role.name} cannot reach the rendezvous"
+                " hosted on localhost, use network=host to rendezvous without etcd"
+            )
+            return False
+        return True
+
+    def _on_host_network(self, image_provider: ImageProvider, cfg: RunConfig) -> bool:
+        """
+        Returns ``True`` if the replicas share the host's network (hence its ports).
+        """
+        if isinstance(image_provider, (DockerImageProvider, DockerEngineImageProvider)):
+            return cfg.get("network") == "host"
+        return True
+
+    def _get_container_options(
+        self, role: Role, app_log_dir: str, cfg: RunConfig
+    ) -> ContainerOptions:
+        """
+        Returns the options of the containers of the role's replicas. The app's
+        log dir is bind mounted (at the same path) so that the replicas can
+        write their error files.
+        """
+        try:
+            shm_size = cfg.get("shm_size")
+            mounts = parse_mounts(str(cfg.get("mounts") or ""))
+            options = ContainerOptions(
+                shm_size=parse_bytes(str(shm_size)) if shm_size else None,
+                # pyre-ignore [6]: type check already done by runopt.resolve
+                network=cfg.get("network"),
+                # pyre-ignore [6]: type check already done by runopt.resolve
+                ipc=cfg.get("ipc"),
+                mounts=mounts + [(app_log_dir, app_log_dir, False)],
+                ports=sorted(set(role.port_map.values())),
+            )
+        except ValueError as e:
+            raise InvalidRunConfigException(str(e), cfg, self.run_opts())
+
+        if cfg.get("container_resources"):
+            resource = role.resource
+            if resource.cpu > 0:
+                options.cpus = float(resource.cpu)
+            if resource.memMB > 0:
+                options.memory = resource.memMB * 1024 * 1024
+            if resource.gpu > 0:
+                options.gpus = resource.gpu
+        return options
+
+    def _get_cgroup_root(self, cfg: RunConfig) -> Optional[str]:
+        """
+        Returns the parent cgroup for the replica cgroups
+        or ``None`` if the ``use_cgroups`` run option is not set.
+        """
+        if not cfg.get("use_cgroups"):
+            return None
+
+        if cfg.get("image_type") != "dir":
+            raise InvalidRunConfigException(
+                "use_cgroups is only supported for image_type=dir",
+                cfg,
+                self.run_opts(),
+            )
+        if not is_cgroup2_available():
+            raise InvalidRunConfigException(
+                f"use_cgroups requires a cgroup v2 (unified) hierarchy mounted at {CGROUP2_MOUNT}",
+                cfg,
+                self.run_opts(),
+            )
+        return str(cfg.get("cgroup_root"))
 
     def describe(self, app_id: str) -> Optional[DescribeAppResponse]:
+        with self._lock:
+            return self._describe(app_id)
+
+    def _describe(self, app_id: str) -> Optional[DescribeAppResponse]:
         if app_id not in self._apps:
             return None
 
@@ -620,8 +1991,10 @@ class LocalScheduler(Scheduler):
             failed = False
             for replicas in local_app.role_replicas.values():
                 for r in replicas:
-                    running |= r.is_alive()
-                    failed |= r.failed()
+                    # replicas waiting to be restarted are considered running
+                    restarting = local_app.will_restart(r)
+                    running |= r.is_alive() or restarting
+                    failed |= r.failed() and not restarting
 
             if running:
                 state = AppState.RUNNING
@@ -634,12 +2007,31 @@ class LocalScheduler(Scheduler):
         if is_terminal(local_app.state):
             local_app.close()
 
+        roles_statuses = []
+        for role_name, replicas in local_app.role_replicas.items():
+            replica_statuses = [
+                ReplicaStatus(
+                    id=r.replica_id,
+                    state=ReplicaState.PENDING
+                    if local_app.will_restart(r)
+                    else r.state(),
+                    role=role_name,
+                    hostname="localhost",
+                    resource_usage=r.resource_usage(),
+                    usage=r.usage_history.current() if r.usage_history else None,
+                    peak_usage=r.usage_history.peak() if r.usage_history else None,
+                )
+                for r in replicas
+            ]
+            roles_statuses.append(RoleStatus(role_name, replica_statuses))
+
         resp = DescribeAppResponse()
         resp.app_id = app_id
         resp.structured_error_msg = structured_error_msg
         resp.state = state
-        resp.num_restarts = 0
+        resp.num_restarts = local_app.num_restarts
         resp.ui_url = f"file://{local_app.log_dir}"
+        resp.roles_statuses = roles_statuses
         return resp
 
     def log_iter(
@@ -661,25 +2053,45 @@ class LocalScheduler(Scheduler):
         app = self._apps[app_id]
         log_file = os.path.join(app.log_dir, role_name, str(k), "stderr.log")
 
-        if not os.path.isfile(log_file):
+        if not os.path.isfile(log_file) and not rotated_segments(log_file):
+            replica = app.role_replicas[role_name][k]
+            if replica.stderr_buffer:
+                return LogBufferIterator(app_id, regex or ".*", replica, self)
+
             raise RuntimeError(
                 f"app: {app_id} was not configured to log into a file."
-                f" Did you run it with log_dir set in RunConfig?"
+                f" Did you run it with log_dir set (or capture_logs=True) in RunConfig?"
             )
 
         return LogIterator(app_id, regex or ".*", log_file, self)
 
     def _cancel_existing(self, app_id: str) -> None:
-        # can assume app_id exists
-        local_app = self._apps[app_id]
-        local_app.close()
-        local_app.state = AppState.CANCELLED
+        with self._lock:
+            # can assume app_id exists
+            local_app = self._apps[app_id]
+            # set first so that the SUCCESS file records the final state
+            local_app.state = AppState.CANCELLED
+            local_app.close()
 
     def __del__(self) -> None:
+        self._sampler.stop()
+        self._exit_watcher.stop()
         # terminate all apps
         for (app_id, app) in self._apps.items():
             log.info(f"Terminating app: {app_id}")
             app.terminate()
+        self._log_pump.stop()
+        for console in self._echoes.values():
+            console.stop()
+        # stopped after the apps since the container exits are observed through it
+        if self._container_events:
+            self._container_events.stop()
+        if self._docker:
+            self._docker.close()
+        for server in self._forkservers.values():
+            server.stop()
+        if self._tmp_log_dir:
+            shutil.rmtree(self._tmp_log_dir, ignore_errors=True)
 
 
 class LogIterator:
@@ -692,6 +2104,10 @@ class LogIterator:
         self._log_fp: Optional[TextIO] = None
         self._scheduler: LocalScheduler = scheduler
         self._app_finished: bool = False
+        # index of the next rotated segment (of the log file) to read
+        self._next_segment: int = 1
+        # False while following the (live) log file itself
+        self._reading_segment: bool = False
 
     def _check_finished(self) -> None:
         # either the app (already finished) was evicted from the LRU cache
@@ -707,8 +2123,8 @@ class LogIterator:
         while True:
             self._check_finished()  # check to see if app has finished running
 
-            if os.path.isfile(self._log_file):
-                self._log_fp = open(self._log_file, "r")  # noqa: P201
+            if os.path.isfile(self._log_file) or rotated_segments(self._log_file):
+                self._open_next()
                 break
 
             if self._app_finished:
@@ -720,12 +2136,75 @@ class LogIterator:
             time.sleep(1)
         return self
 
+    def _open_next(self) -> None:
+        """
+        Opens the oldest rotated segment that has not been read yet
+        or the log file itself once all the rotated segments have been read.
+        """
+        while True:
+            try:
+                for index, segment in rotated_segments(self._log_file):
+                    if index >= self._next_segment:
+                        self._log_fp = open_segment(segment)
+                        self._next_segment = index + 1
+                        self._reading_segment = True
+                        return
+
+                self._log_fp = open(self._log_file, "r")  # noqa: P201
+                self._reading_segment = False
+                return
+            except FileNotFoundError:
+                # raced with a rotation or compression of a segment, list again
+                continue
+
+    def _is_rotated(self, log_fp: TextIO) -> bool:
+        """
+        Returns ``True`` if the log file was rotated (either rotated into a segment
+        or the replica was restarted) and a new log file has been created in its place.
+        """
+        try:
+            return os.stat(self._log_file).st_ino != os.fstat(log_fp.fileno()).st_ino
+        except FileNotFoundError:
+            return False  # not re-created yet
+
+    def _is_segment(self, log_fp: TextIO) -> bool:
+        """
+        Returns ``True`` if the (rotated) file ``log_fp`` is reading from became the
+        next rotated segment (as opposed to being moved into an ``attempt_<n>``
+        dir upon a restart of the replica).
+        """
+        stat = os.fstat(log_fp.fileno())
+        if stat.st_nlink == 0:
+            return True  # already compressed (and deleted)
+        try:
+            segment = f"{self._log_file}.{self._next_segment}"
+            return os.stat(segment).st_ino == stat.st_ino
+        except FileNotFoundError:
+            return False
+
     def __next__(self) -> str:
         log_fp = self._log_fp
         assert log_fp is not None
         while True:
             line = log_fp.readline()
             if not line:
+                # the rotated segment has been fully read, move on to the next one
+                if self._reading_segment:
+                    log_fp.close()
+                    self._open_next()
+                    log_fp = none_throws(self._log_fp)
+                    continue
+
+                if self._is_rotated(log_fp):
+                    if self._is_segment(log_fp):
+                        self._next_segment += 1
+                    else:
+                        # replica restarted, its new log file starts from scratch
+                        self._next_segment = 1
+                    # read the remainder (written before the rotation) of the file
+                    self._reading_segment = True
+                    continue
+
                 # we have reached EOF and app finished
                 if self._app_finished:
                     log_fp.close()
@@ -741,6 +2220,60 @@ class LogIterator:
                     return line
 
 
+class LogBufferIterator:
+    """
+    Iterates over (and follows) the stderr lines of a replica captured in memory.
+    Lines dropped from the (bounded) buffer before they are read are skipped.
+    """
+
+    def __init__(
+        self,
+        app_id: str,
+        regex: str,
+        replica: _LocalReplica,
+        scheduler: LocalScheduler,
+    ) -> None:
+        self._app_id: str = app_id
+        self._regex: Pattern[str] = re.compile(regex)
+        self._replica: _LocalReplica = replica
+        self._buffer: LogBuffer = none_throws(replica.stderr_buffer)
+        # number of the next line (in the buffer) to read
+        self._n: int = 0
+        self._scheduler: LocalScheduler = scheduler
+        self._app_finished: bool = False
+
+    def _check_finished(self) -> None:
+        desc = self._scheduler.describe(self._app_id)
+        self._app_finished = not desc or is_terminal(desc.state)
+
+    def __iter__(self) -> "LogBufferIterator":
+        self._check_finished()
+        return self
+
+    def __next__(self) -> str:
+        while True:
+            n, line = self._buffer.get(self._n)
+            if line is not None:
+                self._n = n + 1
+                if re.match(self._regex, line):
+                    return line
+                continue
+
+            # replica restarted, its new buffer starts from scratch
+            buffer = self._replica.stderr_buffer
+            if buffer and buffer is not self._buffer:
+                self._buffer = buffer
+                self._n = 0
+                continue
+
+            # the buffer is drained (hence complete) once the app has finished
+            if self._app_finished:
+                raise StopIteration()
+
+            self._buffer.wait(self._n, timeout=1)
+            self._check_finished()
+
+
 def create_scheduler(session_name: str, **kwargs: Any) -> LocalScheduler:
     return LocalScheduler(
         session_name=session_name,
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Bounded in-memory capture of the replica logs for ``LocalScheduler`` apps
+that are run without a ``log_dir``. The stdout/stderr pipes of the replicas
+are pumped (by the ``LogPump``) into ``LogBuffer`` s from which ``log_iter``
+serves the log lines.
+"""
+
+import logging
+import os
+import threading
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+log: logging.Logger = logging.getLogger(__name__)
+
+
+# number of lines kept per replica stream
+DEFAULT_MAX_LINES: int = 10000
+
+# lines longer than this are split so that the buffer stays bounded
+MAX_LINE_BYTES: int = 64 * 1024
+
+# bytes that a ``ConsoleEcho`` holds for a slow console before dropping the logs
+DEFAULT_ECHO_PENDING_BYTES: int = 1024 * 1024
+
+
+class LogBuffer:
+    """
+    Ring buffer of the last ``max_lines`` lines written to it. Lines are
+    numbered (starting at 0) in the order they are written so that readers
+    can follow the buffer (see ``get()`` and ``wait()``) and tell when
+    lines they have not read yet were dropped.
+    """
+
+    def __init__(self, max_lines: int = DEFAULT_MAX_LINES) -> None:
+        self._lines: Deque[str] = deque(maxlen=max_lines)
+        # number of lines ever written (e.g. the number of the next line)
+        self._num_lines = 0
+        # trailing bytes of the data written so far that do not end with a newline
+        self._partial = b""
+        self._cond = threading.Condition()
+
+    def write(self, data: bytes) -> None:
+        lines = (self._partial + data).split(b"\n")
+        partial = lines.pop()
+        while len(partial) > MAX_LINE_BYTES:
+            lines.append(partial[:MAX_LINE_BYTES])
+            partial = partial[MAX_LINE_BYTES:]
+        self._partial = partial
+        self._append(lines)
+
+    def flush(self) -> None:
+        """
+        Makes the trailing data (not terminated by a newline) available as a line.
+        """
+        if self._partial:
+            lines = [self._partial]
+            self._partial = b""
+            self._append(lines)
+
+    def _append(self, lines: List[bytes]) -> None:
+        if not lines:
+            return
+        with self._cond:
+            for line in lines:
+                self._lines.append(line.decode("utf-8", errors="replace"))
+            self._num_lines += len(lines)
+            self._cond.notify_all()
+
+    def get(self, n: int) -> Tuple[int, Optional[str]]:
+        """
+        Returns ``(m, line)`` where ``line`` is the ``n`` th line (``m == n``)
+        or the oldest line still in the buffer if the ``n`` th line was dropped
+        (``m > n``). ``line`` is ``None`` if no line ``>= n`` was written yet.
+        """
+        with self._cond:
+            first = self._num_lines - len(self._lines)
+            m = max(n, first)
+            if m >= self._num_lines:
+                return m, None
+            return m, self._lines[m - first]
+
+    def wait(self, n: int, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the ``n`` th line is written.
+
+        Returns:
+            ``False`` if timed out
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._num_lines > n, timeout)
+
+    def lines(self) -> List[str]:
+        """
+        Returns the lines currently in the buffer (oldest first).
+        """
+        with self._cond:
+            return list(self._lines)
+
+
+def echo(fd: int, data: bytes) -> None:
+    """
+    Writes ``data`` fully to the (console) file descriptor ``fd``.
+    """
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+
+class ConsoleEcho:
+    """
+    Echoes the captured logs to the (console) file descriptor ``fd`` from a
+    background thread so that a slow console never stalls the ``LogPump``.
+    ``write()`` never blocks nor raises: the logs are dropped while
+    ``max_pending_bytes`` are waiting for the console and echoing stops for
+    good once writing to the console fails (e.g. ``torchx run ... | head``).
+    The logs are still captured (in the ``LogBuffer``) either way.
+    """
+
+    def __init__(
+        self, fd: int, max_pending_bytes: int = DEFAULT_ECHO_PENDING_BYTES
+    ) -> None:
+        self.fd = fd
+        self.max_pending_bytes = max_pending_bytes
+        self._pending: Deque[bytes] = deque()
+        self._pending_bytes = 0
+        self.dropped_bytes = 0
+        self.disabled = False
+        self._stopped = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def write(self, data: bytes) -> None:
+        with self._cond:
+            if self.disabled or self._stopped:
+                return
+            if self._pending_bytes + len(data) > self.max_pending_bytes:
+                if not self.dropped_bytes:
+                    log.warning(
+                        f"console (fd {self.fd}) is too slow, dropping echoed logs"
+                    )
+                self.dropped_bytes += len(data)
+                return
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+            if not self._thread:
+                self._thread = threading.Thread(
+                    target=self._run, name=f"torchx_echo_{self.fd}", daemon=True
+                )
+                self._thread.start()
+            self._cond.notify()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the pending logs are written to the console.
+
+        Returns:
+            ``False`` if timed out
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending_bytes, timeout)
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopped)
+                if not self._pending:
+                    return
+                data = self._pending.popleft()
+            try:
+                echo(self.fd, data)
+            except OSError as e:
+                log.warning(f"failed to echo logs to fd {self.fd}, disabling: {e}")
+                with self._cond:
+                    self.disabled = True
+                    self._pending.clear()
+                    self._pending_bytes = 0
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._pending_bytes -= len(data)
+                self._cond.notify_all()
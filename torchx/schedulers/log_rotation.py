@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Size based rotation (and compression) of the replica log files written by
+``LocalScheduler`` along with disk quota enforcement of the app log dirs.
+
+When rotation is enabled the stdout/stderr of the replicas are pipes that
+a single ``LogPump`` thread copies into ``RotatingLogWriter`` s. Once the log
+file (e.g. ``stderr.log``) grows over ``max_bytes`` it is renamed to
+``stderr.log.<n>`` (``n`` starting at 1, oldest first), compressed
+(``stderr.log.<n>.gz`` or ``stderr.log.<n>.zst``) and a new ``stderr.log``
+is created in its place. The log file is always rotated on a line boundary
+so that no line is split across segments.
+"""
+
+import gzip
+import importlib
+import io
+import json
+import logging
+import os
+import re
+import selectors
+import shutil
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from types import ModuleType
+from typing import BinaryIO, Callable, Dict, List, Optional, TextIO, Tuple
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+# compression codec -> file suffix of the compressed segments
+COMPRESSION_SUFFIXES: Dict[str, str] = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# size of the reads from the replicas' stdout/stderr pipes
+PIPE_READ_SIZE: int = 64 * 1024
+
+# max time (in seconds) to wait for the pipes of an exited replica to be drained
+# (the pipes are held open by any daemonized descendants of the replica)
+DRAIN_TIMEOUT: float = 3
+
+# name of the file that marks an app log dir as finished (see ``_LocalAppDef.close``)
+SUCCESS_FILE = "SUCCESS"
+
+
+def _zstd() -> ModuleType:
+    try:
+        return importlib.import_module("zstandard")
+    except ModuleNotFoundError:
+        raise ValueError(
+            "zstd log compression requires the `zstandard` package."
+            " `pip install zstandard` or use gzip compression"
+        )
+
+
+def check_compression(compression: str) -> None:
+    """
+    Raises:
+        ValueError - if the compression codec is unknown or not available
+    """
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(
+            f"Unknown log compression: {compression}."
+            f" Must be one of: {list(COMPRESSION_SUFFIXES.keys())}"
+        )
+    if compression == "zstd":
+        _zstd()
+
+
+def compress_file(src: str, compression: str) -> str:
+    """
+    Compresses ``src`` into ``src + suffix`` and deletes ``src``. The compressed
+    file appears atomically (written to a temp file first) so that readers
+    never observe a partially written segment.
+
+    Returns:
+        path of the compressed file (``src`` if ``compression="none"``)
+    """
+    suffix = COMPRESSION_SUFFIXES[compression]
+    if not suffix:
+        return src
+
+    dst = src + suffix
+    tmp = dst + ".tmp"
+    with open(src, "rb") as fin, open(tmp, "wb") as f:
+        if compression == "zstd":
+            cctx = _zstd().ZstdCompressor()
+            cctx.copy_stream(fin, f)
+        else:
+            # favor speed, rotated logs compress well regardless
+            with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=1) as gz:
+                shutil.copyfileobj(fin, gz)
+    os.rename(tmp, dst)
+    os.remove(src)
+    return dst
+
+
+_SEGMENT_SUFFIX_RE = r"\.(\d+)(\.gz|\.zst)?$"
+
+
+def rotated_segments(path: str) -> List[Tuple[int, str]]:
+    """
+    Returns the ``(index, segment_path)`` of the rotated segments of the log file
+    ``path`` (oldest first). If a segment is being compressed, the completed one
+    (compressed if present) is returned.
+    """
+    log_dir, name = os.path.split(path)
+    try:
+        files = os.listdir(log_dir)
+    except FileNotFoundError:
+        return []
+
+    pattern = re.compile(re.escape(name) + _SEGMENT_SUFFIX_RE)
+    segments: Dict[int, str] = {}
+    for f in files:
+        m = pattern.match(f)
+        if not m:
+            continue
+        index = int(m.group(1))
+        # prefer the compressed segment (the uncompressed one is about to be deleted)
+        if index not in segments or m.group(2):
+            segments[index] = os.path.join(log_dir, f)
+    return sorted(segments.items())
+
+
+def open_segment(path: str) -> TextIO:
+    """
+    Opens the (possibly compressed) log segment for reading text.
+    """
+    if path.endswith(".gz"):
+        # pyre-ignore [7]: gzip.open in text mode returns a TextIO
+        return gzip.open(path, "rt")
+    elif path.endswith(".zst"):
+        return io.TextIOWrapper(open_segment_bytes(path))
+    else:
+        return open(path, "r")  # noqa: P201
+
+
+def open_segment_bytes(path: str) -> BinaryIO:
+    """
+    Opens the (possibly compressed) log segment for reading (decompressed) bytes.
+    """
+    if path.endswith(".gz"):
+        # pyre-ignore [7]: gzip.open in binary mode returns a BinaryIO
+        return gzip.open(path, "rb")
+    elif path.endswith(".zst"):
+        f = open(path, "rb")  # noqa: P201
+        return _zstd().ZstdDecompressor().stream_reader(f)
+    else:
+        return open(path, "rb")  # noqa: P201
+
+
+class RotatingLogWriter:
+    """
+    Writes (binary) log data to ``path`` rotating the file once it grows over
+    ``max_bytes``. Rotated segments are compressed on ``executor``
+    (inline if not specified).
+
+    Raises:
+        FileExistsError - if ``path`` already exists
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        compression: str = "gzip",
+        executor: Optional[Executor] = None,
+    ) -> None:
+        if os.path.isfile(path):
+            raise FileExistsError(
+                f"log file: {path} already exists,"
+                f" specify a different log_dir, app_name, or remove the file and retry"
+            )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.name = path
+        self._max_bytes = max_bytes
+        self._compression = compression
+        self._executor = executor
+        self._f: BinaryIO = open(path, "wb")  # noqa: P201
+        self._size = 0
+        # True if the data written so far ends with a newline
+        self._line_start = True
+        self._num_segments = 0
+        self._pending: List["Future[str]"] = []
+
+    def write(self, data: bytes) -> None:
+        if self._size + len(data) > self._max_bytes:
+            # rotate on the last line boundary (a line longer than max_bytes is kept whole)
+            i = data.rfind(b"\n") + 1
+            if i > 0 or (self._size > 0 and self._line_start):
+                self._f.write(data[:i])
+                self.rotate()
+                data = data[i:]
+        if data:
+            self._f.write(data)
+            self._size += len(data)
+            self._line_start = data.endswith(b"\n")
+        # make the lines visible to readers (e.g. LogIterator) as they are pumped
+        self._f.flush()
+
+    def rotate(self) -> None:
+        self._f.close()
+        self._num_segments += 1
+        segment = f"{self.name}.{self._num_segments}"
+        os.rename(self.name, segment)
+        self._f = open(self.name, "wb")  # noqa: P201
+        self._size = 0
+        self._line_start = True
+
+        executor = self._executor
+        if executor:
+            self._pending.append(
+                executor.submit(compress_file, segment, self._compression)
+            )
+        else:
+            compress_file(segment, self._compression)
+
+    def close(self) -> None:
+        """
+        Closes the log file and waits for the rotated segments to be compressed.
+        """
+        self._f.close()
+        for future in self._pending:
+            try:
+                future.result()
+            except Exception:
+                log.exception(f"failed to compress a rotated segment of {self.name}")
+        self._pending.clear()
+
+
+class PumpedPipe:
+    """
+    Handle to a pipe registered with a ``LogPump``.
+    """
+
+    def __init__(self, pump: "LogPump", name: str) -> None:
+        self.name = name
+        self._pump = pump
+        self._drained = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the pipe is drained (EOF) and the sink is closed.
+        """
+        return self._drained.wait(timeout)
+
+    def close(self) -> None:
+        """
+        Waits (up to ``DRAIN_TIMEOUT``) for the pipe to be drained, then stops
+        pumping it. Safe to call multiple times.
+        """
+        if not self.wait(DRAIN_TIMEOUT):
+            self._pump.remove(self)
+
+
+class LogPump:
+    """
+    Copies data from (the read ends of) pipes into sinks on a single background
+    thread so that the number of threads does not grow with the number of replicas.
+    The sink is closed once its pipe reaches EOF (or the pipe is removed).
+    """
+
+    def __init__(self) -> None:
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_w, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+        # compresses the rotated segments off the pump thread
+        self.executor: Executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="torchx_log_compress"
+        )
+
+    def add(
+        self,
+        pipe: BinaryIO,
+        write: Callable[[bytes], None],
+        close: Callable[[], None],
+        name: str,
+    ) -> PumpedPipe:
+        pumped = PumpedPipe(self, name)
+        os.set_blocking(pipe.fileno(), False)
+        with self._lock:
+            self._selector.register(
+                pipe.fileno(), selectors.EVENT_READ, (pipe, write, close, pumped)
+            )
+            if not self._thread:
+                self._thread = threading.Thread(
+                    target=self._run, name="torchx_log_pump", daemon=True
+                )
+                self._thread.start()
+        self._wakeup()
+        return pumped
+
+    def remove(self, pumped: PumpedPipe) -> None:
+        """
+        Stops pumping (and closes the sink of) ``pumped`` even if the pipe is not
+        drained (e.g. a daemonized grandchild of the replica holds the pipe open).
+        """
+        with self._lock:
+            for key in list(self._selector.get_map().values()):
+                if key.data and key.data[3] is pumped:
+                    self._close(key)
+                    return
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup()
+        self.executor.shutdown(wait=False)
+
+    def _wakeup(self) -> None:
+        try:
+            os.write(self._wakeup_w, b"\0")
+        except BlockingIOError:
+            pass  # a wakeup is already pending
+
+    def _close(self, key: selectors.SelectorKey) -> None:
+        pipe, _, close, pumped = key.data
+        self._selector.unregister(key.fd)
+        pipe.close()
+        try:
+            close()
+        except Exception:
+            log.exception(f"failed to close log sink: {pumped.name}")
+        pumped._drained.set()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            for key, _ in self._selector.select():
+                if key.fd == self._wakeup_r:
+                    os.read(self._wakeup_r, 4096)
+                    continue
+
+                with self._lock:
+                    if key.fd not in self._selector.get_map():
+                        continue  # removed concurrently
+                    _, write, _, pumped = key.data
+                    try:
+                        data = os.read(key.fd, PIPE_READ_SIZE)
+                    except BlockingIOError:
+                        continue
+                    if not data:
+                        self._close(key)
+                        continue
+                    try:
+                        write(data)
+                    except Exception:
+                        log.exception(f"failed to write to log sink: {pumped.name}")
+                        self._close(key)
+
+
+def dir_size(path: str) -> int:
+    """
+    Returns the total size (in bytes) of the files under ``path``.
+    """
+    size = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                size += os.lstat(os.path.join(root, f)).st_size
+            except FileNotFoundError:
+                pass  # deleted concurrently
+    return size
+
+
+def _finished_at(success_file: str) -> float:
+    """
+    Returns the time the app was closed as recorded in its ``SUCCESS`` file
+    (its mtime if not recorded).
+    """
+    try:
+        with open(success_file, "r") as f:
+            finished_at = json.load(f).get("finished_at")
+        if isinstance(finished_at, (int, float)):
+            return float(finished_at)
+    except (ValueError, AttributeError):
+        pass  # not written by the local scheduler
+    return os.path.getmtime(success_file)
+
+
+def gc_app_log_dirs(session_log_dir: str, quota_bytes: int) -> List[str]:
+    """
+    Deletes the log dirs of the finished apps (those with a ``SUCCESS`` file)
+    under ``session_log_dir`` oldest first until the total size of the session's
+    log dirs is within ``quota_bytes``. The log dirs of the running apps are
+    never deleted hence the quota may still be exceeded.
+
+    Returns:
+        the deleted app log dirs
+    """
+    try:
+        app_dirs = [
+            os.path.join(session_log_dir, d) for d in os.listdir(session_log_dir)
+        ]
+    except FileNotFoundError:
+        return []
+
+    sizes = {}
+    finished = []
+    for app_dir in app_dirs:
+        if not os.path.isdir(app_dir):
+            continue
+        sizes[app_dir] = dir_size(app_dir)
+        success_file = os.path.join(app_dir, SUCCESS_FILE)
+        if os.path.isfile(success_file):
+            finished.append((_finished_at(success_file), app_dir))
+
+    total = sum(sizes.values())
+    deleted = []
+    for _, app_dir in sorted(finished):
+        if total <= quota_bytes:
+            break
+        log.info(
+            f"deleting log dir: {app_dir} ({sizes[app_dir]} bytes)"
+            f" to keep {session_log_dir} within {quota_bytes} bytes"
+        )
+        shutil.rmtree(app_dir, ignore_errors=True)
+        total -= sizes[app_dir]
+        deleted.append(app_dir)
+    return deleted
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Searches the log files that ``LocalScheduler`` writes under
+``<log_dir>/<session_name>/<app_id>/<role_name>/<replica_id>/`` across apps.
+
+The log files are searched in parallel (one file per task) on a process pool.
+Uncompressed log files are memory-mapped and scanned for the longest literal
+that any match of the regex must contain (e.g. ``timeout`` for ``NCCL.*timeout``)
+before the regex is applied to the lines that contain it.
+
+Optionally, a trigram index (the sorted set of the 3-byte substrings) of each
+log file is kept next to the log file (``<log_file>.trigrams``). A log file
+whose index misses any trigram of the literal is skipped without being read.
+``LocalScheduler`` builds the indices once the app finishes (``index_logs`` run option).
+"""
+
+import logging
+import mmap
+import os
+import re
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterable, Iterator, List, Optional, Pattern, Set, Tuple
+
+from torchx.schedulers.log_rotation import open_segment_bytes, rotated_segments
+
+
+try:
+    # pyre-ignore [21]: python 3.11+
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse  # pyre-ignore [21]
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+LOG_FILES = ["stdout.log", "stderr.log"]
+INDEX_SUFFIX = ".trigrams"
+
+# bytes read at a time when building the trigram index
+_INDEX_CHUNK_SIZE: int = 1024 * 1024
+
+
+@dataclass
+class LogMatch:
+    """
+    A log line that matched the search.
+    """
+
+    app_id: str
+    role_name: str
+    replica_id: int
+    # path of the log file (or rotated segment) the line is in
+    path: str
+    # 1-based line number within ``path``
+    line_no: int
+    line: str
+
+
+def required_literal(regex: str) -> Optional[bytes]:
+    """
+    Returns the longest literal that every match of ``regex`` contains
+    (``None`` if there is no such literal or the regex ignores case).
+    """
+    try:
+        parsed = sre_parse.parse(regex)
+    except re.error:
+        return None
+    if parsed.state.flags & re.IGNORECASE:
+        return None
+
+    best = ""
+
+    def walk(items: Iterable[Tuple[object, object]]) -> None:
+        nonlocal best
+        run = ""
+        for op, value in items:
+            if op is sre_parse.LITERAL:
+                # pyre-ignore [6]: value is the code point of the literal
+                run += chr(value)
+                continue
+            best = max(best, run, key=len)
+            run = ""
+            # pyre-ignore [16]: value is (group, add_flags, del_flags, pattern)
+            if op is sre_parse.SUBPATTERN and not value[1] & re.IGNORECASE:
+                walk(value[-1])
+        best = max(best, run, key=len)
+
+    walk(parsed)
+    return best.encode("utf-8") if best else None
+
+
+def _trigrams(data: bytes) -> Set[int]:
+    return {(a << 16) | (b << 8) | c for a, b, c in zip(data, data[1:], data[2:])}
+
+
+def index_path(log_file: str) -> str:
+    return log_file + INDEX_SUFFIX
+
+
+def build_trigram_index(log_file: str) -> str:
+    """
+    Writes the trigram index of the (possibly compressed) ``log_file``
+    (unless an up to date index exists) and returns its path.
+    """
+    index_file = index_path(log_file)
+    if is_index_fresh(log_file):
+        return index_file
+
+    trigrams = set()
+    with open_segment_bytes(log_file) as f:
+        tail = b""
+        while True:
+            chunk = f.read(_INDEX_CHUNK_SIZE)
+            if not chunk:
+                break
+            # overlap the chunks so that the trigrams across chunks are not missed
+            data = tail + chunk
+            trigrams |= _trigrams(data)
+            tail = data[-2:]
+
+    index = array("I", sorted(trigrams))
+    tmp = index_file + ".tmp"
+    with open(tmp, "wb") as f:
+        index.tofile(f)
+    os.rename(tmp, index_file)
+    return index_file
+
+
+def is_index_fresh(log_file: str) -> bool:
+    try:
+        return os.path.getmtime(index_path(log_file)) >= os.path.getmtime(log_file)
+    except FileNotFoundError:
+        return False
+
+
+def may_contain(log_file: str, literal: bytes) -> bool:
+    """
+    Returns ``False`` if the (up to date) trigram index of ``log_file`` proves
+    that the file does not contain ``literal``. Returns ``True`` otherwise
+    (including when there is no index).
+    """
+    if len(literal) < 3 or not is_index_fresh(log_file):
+        return True
+
+    index = array("I")
+    with open(index_path(log_file), "rb") as f:
+        index.frombytes(f.read())
+    for t in _trigrams(literal):
+        i = bisect_left(index, t)
+        if i == len(index) or index[i] != t:
+            return False
+    return True
+
+
+def replica_log_files(replica_log_dir: str) -> List[str]:
+    """
+    Returns the log files (including the rotated segments and the log files of
+    the previous attempts of restarted replicas) under ``replica_log_dir``.
+    """
+    files = []
+    for root, _, names in os.walk(replica_log_dir):
+        for name in LOG_FILES:
+            log_file = os.path.join(root, name)
+            files += [segment for _, segment in rotated_segments(log_file)]
+            if name in names:
+                files.append(log_file)
+    return sorted(files)
+
+
+def find_log_files(
+    session_log_dir: str, app_ids: Optional[List[str]] = None
+) -> List[Tuple[str, str, int, str]]:
+    """
+    Returns the ``(app_id, role_name, replica_id, log_file)`` of all the log files
+    of the apps (all if ``app_ids`` is not specified) under ``session_log_dir``.
+    """
+    files = []
+    if app_ids is None:
+        try:
+            app_ids = sorted(os.listdir(session_log_dir))
+        except FileNotFoundError:
+            return []
+
+    for app_id in app_ids:
+        app_log_dir = os.path.join(session_log_dir, app_id)
+        if not os.path.isdir(app_log_dir):
+            continue
+        for role_name in sorted(os.listdir(app_log_dir)):
+            role_log_dir = os.path.join(app_log_dir, role_name)
+            if not os.path.isdir(role_log_dir):
+                continue
+            for replica_id in sorted(os.listdir(role_log_dir)):
+                if not replica_id.isdigit():
+                    continue
+                replica_log_dir = os.path.join(role_log_dir, replica_id)
+                for log_file in replica_log_files(replica_log_dir):
+                    files.append((app_id, role_name, int(replica_id), log_file))
+    return files
+
+
+def _match_lines(
+    lines: Iterable[Tuple[int, bytes]], pattern: Pattern[bytes]
+) -> Iterator[Tuple[int, str]]:
+    for line_no, line in lines:
+        if pattern.search(line):
+            yield line_no, line.rstrip(b"\r\n").decode("utf-8", errors="replace")
+
+
+def _literal_lines(buf: mmap.mmap, literal: bytes) -> Iterator[Tuple[int, bytes]]:
+    """
+    Returns the ``(line_no, line)`` of the lines in ``buf`` that contain ``literal``.
+    """
+    line_no = 1
+    counted = 0  # offset up to which the newlines were counted
+    pos = buf.find(literal)
+    while pos != -1:
+        start = buf.rfind(b"\n", 0, pos) + 1
+        end = buf.find(b"\n", pos)
+        end = len(buf) if end == -1 else end + 1
+        line_no += buf[counted:start].count(b"\n")
+        counted = start
+        yield line_no, buf[start:end]
+        pos = buf.find(literal, end)
+
+
+def search_file(
+    log_file: str, regex: str, literal: Optional[bytes], use_index: bool = True
+) -> List[Tuple[int, str]]:
+    """
+    Returns the ``(line_no, line)`` of the lines in ``log_file`` that match ``regex``.
+    ``literal`` (see ``required_literal()``) is used to prefilter the lines.
+    """
+    if literal and use_index and not may_contain(log_file, literal):
+        return []
+
+    pattern = re.compile(regex.encode("utf-8"))
+    if log_file.endswith((".gz", ".zst")):
+        with open_segment_bytes(log_file) as f:
+            lines = enumerate(f, start=1)
+            if literal:
+                lines = ((n, line) for n, line in lines if literal in line)
+            return list(_match_lines(lines, pattern))
+
+    with open(log_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []  # empty files cannot be mmapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if literal:
+                lines = _literal_lines(buf, literal)
+            else:
+                lines = enumerate(iter(buf.readline, b""), start=1)
+            return list(_match_lines(lines, pattern))
+
+
+def search_logs(
+    session_log_dir: str,
+    regex: str,
+    app_ids: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    use_index: bool = True,
+) -> Iterator[LogMatch]:
+    """
+    Searches the log files of the apps (all if ``app_ids`` is not specified)
+    under ``session_log_dir`` for the lines that match ``regex`` (``re.search``).
+    Matches are returned as soon as the log file they are in has been searched
+    (matches of the same file are in line order).
+    """
+    literal = required_literal(regex)
+    files = find_log_files(session_log_dir, app_ids)
+    if not files:
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(search_file, log_file, regex, literal, use_index): (
+                app_id,
+                role_name,
+                replica_id,
+                log_file,
+            )
+            for app_id, role_name, replica_id, log_file in files
+        }
+        for future in as_completed(futures):
+            app_id, role_name, replica_id, log_file = futures[future]
+            for line_no, line in future.result():
+                yield LogMatch(app_id, role_name, replica_id, log_file, line_no, line)
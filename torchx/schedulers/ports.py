@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Allocation of the host ports of the apps run on localhost.
+"""
+
+import re
+import socket
+import threading
+import time
+from typing import Dict, Iterable, Set
+
+DEFAULT_HOST: str = "localhost"
+
+# env var (suffixed with the upper-cased port name) that holds an allocated port
+PORT_ENV_PREFIX: str = "TORCHX_PORT_"
+
+
+def free_port(host: str = DEFAULT_HOST) -> int:
+    """
+    Returns a port that is free (at the time of the call) on ``host``.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def port_env_var(name: str) -> str:
+    """
+    Returns the name of the env var that holds the allocated port ``name``
+    (e.g. ``model-download`` -> ``TORCHX_PORT_MODEL_DOWNLOAD``).
+    """
+    return PORT_ENV_PREFIX + re.sub(r"\W", "_", name).upper()
+
+
+class PortAllocator:
+    """
+    Hands out free ports of the host to owners (e.g. apps). A port is not
+    handed out again (to any owner) until its owner releases it, hence
+    concurrent apps do not collide on ports even if the OS reuses
+    an ephemeral port that was free when it was checked.
+
+    The ports of an owner that may never use them (e.g. allocated for a dryrun
+    that may not be scheduled) can be set to ``expire()`` unless ``claim()`` ed.
+
+    .. note:: The ports are checked (not held open), a process outside of this
+              allocator can still bind a port before its owner does.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST) -> None:
+        self.host = host
+        self._lock = threading.Lock()
+        # owner -> ports
+        self._ports: Dict[str, Set[int]] = {}
+        # owner -> time (monotonic) at which its ports are released
+        self._deadlines: Dict[str, float] = {}
+
+    def allocate(self, owner: str) -> int:
+        with self._lock:
+            reserved = self._reserved()
+            while True:
+                port = free_port(self.host)
+                if port not in reserved:
+                    self._ports.setdefault(owner, set()).add(port)
+                    return port
+
+    def expire(self, owner: str, ttl: float) -> None:
+        """
+        Releases the ports of the owner in ``ttl`` seconds unless claimed before.
+        """
+        with self._lock:
+            if owner in self._ports:
+                self._deadlines[owner] = time.monotonic() + ttl
+
+    def claim(self, owner: str, ports: Iterable[int]) -> None:
+        """
+        Keeps ``ports`` reserved for the owner until released (re-reserving
+        them if they already expired).
+        """
+        with self._lock:
+            self._purge()
+            self._deadlines.pop(owner, None)
+            self._ports.setdefault(owner, set()).update(ports)
+
+    def release(self, owner: str) -> None:
+        """
+        Releases all the ports of the owner. Safe to call multiple times.
+        """
+        with self._lock:
+            self._ports.pop(owner, None)
+            self._deadlines.pop(owner, None)
+
+    def reserved(self) -> Set[int]:
+        """
+        Returns the ports currently handed out.
+        """
+        with self._lock:
+            return self._reserved()
+
+    def _reserved(self) -> Set[int]:
+        self._purge()
+        return {port for ports in self._ports.values() for port in ports}
+
+    def _purge(self) -> None:
+        now = time.monotonic()
+        for owner, deadline in list(self._deadlines.items()):
+            if deadline <= now:
+                del self._deadlines[owner]
+                self._ports.pop(owner, None)
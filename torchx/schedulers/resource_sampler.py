@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Samples the resource usage (rss, cpu%, io bytes, threads) of locally running
+process trees by reading ``/proc``. Used by ``LocalScheduler`` when the
+``sample_interval`` run option is set.
+
+A single daemon thread samples all the tracked processes so the overhead
+does not grow with the number of threads as the number of replicas grows.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from torchx.specs.api import ResourceUsage
+
+
+log: logging.Logger = logging.getLogger(__name__)
+
+_CLK_TCK: int = os.sysconf("SC_CLK_TCK")
+_PAGE_SIZE: int = os.sysconf("SC_PAGE_SIZE")
+
+# number of samples kept per replica (e.g. 10min of history for a 5s interval)
+DEFAULT_HISTORY_SIZE: int = 120
+
+
+def _read_stat(pid: int) -> Tuple[int, int, int]:
+    """
+    Returns ``(cpu_ticks, num_threads, rss_bytes)`` of ``pid`` where ``cpu_ticks``
+    includes the cpu time of the already exited (and waited for) children.
+
+    Raises:
+        OSError - if the process does not exist (anymore)
+    """
+    with open(f"/proc/{pid}/stat", "r") as f:
+        stat = f.read()
+    # comm (field 2) may contain spaces, parse from the last closing paren
+    # fields[i] is field number i+3 in proc(5)
+    fields = stat[stat.rindex(")") + 2 :].split()
+    cpu_ticks = sum(int(t) for t in fields[11:15])  # utime stime cutime cstime
+    num_threads = int(fields[17])
+    rss_bytes = int(fields[21]) * _PAGE_SIZE
+    return cpu_ticks, num_threads, rss_bytes
+
+
+def _read_io(pid: int) -> Tuple[int, int]:
+    """
+    Returns ``(read_bytes, write_bytes)`` of ``pid`` or ``(0, 0)`` if not readable.
+    """
+    io = {}
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                io[key] = int(value)
+    except OSError:
+        pass
+    return io.get("read_bytes", 0), io.get("write_bytes", 0)
+
+
+def _children(pid: int) -> List[int]:
+    """
+    Returns the pids of the direct children of ``pid`` (empty if the process is gone).
+    """
+    children = []
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+
+    for tid in tids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children", "r") as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            continue
+    return children
+
+
+def _proc_tree(pid: int) -> List[int]:
+    """
+    Returns ``pid`` and the pids of all its descendants.
+    """
+    tree = []
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        tree.append(p)
+        stack.extend(_children(p))
+    return tree
+
+
+class UsageHistory:
+    """
+    Bounded (ring buffer) history of the usage samples of a single replica
+    along with the per-metric peak since the replica started.
+    """
+
+    def __init__(self, maxlen: int = DEFAULT_HISTORY_SIZE) -> None:
+        self._samples: Deque[ResourceUsage] = deque(maxlen=maxlen)
+        self._peak: Optional[ResourceUsage] = None
+
+    def add(self, sample: ResourceUsage) -> None:
+        self._samples.append(sample)
+        peak = self._peak
+        if not peak:
+            self._peak = sample
+        else:
+            self._peak = ResourceUsage(
+                rss_bytes=max(peak.rss_bytes, sample.rss_bytes),
+                cpu_percent=max(peak.cpu_percent, sample.cpu_percent),
+                io_read_bytes=max(peak.io_read_bytes, sample.io_read_bytes),
+                io_write_bytes=max(peak.io_write_bytes, sample.io_write_bytes),
+                num_threads=max(peak.num_threads, sample.num_threads),
+            )
+
+    def current(self) -> Optional[ResourceUsage]:
+        samples = self._samples
+        return samples[-1] if samples else None
+
+    def peak(self) -> Optional[ResourceUsage]:
+        return self._peak
+
+    def samples(self) -> List[ResourceUsage]:
+        return list(self._samples)
+
+
+class _Tracked:
+    def __init__(self, pid: int, interval: float, history: UsageHistory) -> None:
+        self.pid = pid
+        self.interval = interval
+        self.history = history
+        self.next_due: float = time.monotonic()
+        # (monotonic time, cpu ticks) of the previous sample
+        self.last_cpu: Optional[Tuple[float, int]] = None
+
+
+class ResourceSampler:
+    """
+    Periodically samples the process trees rooted at the tracked pids
+    and appends the samples to their ``UsageHistory``. Each tracked pid
+    has its own sampling interval. A pid is untracked automatically once
+    the process exits.
+    """
+
+    def __init__(self) -> None:
+        self._tracked: Dict[int, _Tracked] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, pid: int, interval: float, history: UsageHistory) -> None:
+        with self._lock:
+            self._tracked[pid] = _Tracked(pid, interval, history)
+            if not self._thread:
+                self._thread = threading.Thread(
+                    target=self._run, name="torchx_resource_sampler", daemon=True
+                )
+                self._thread.start()
+        self._wakeup.set()
+
+    def untrack(self, pid: int) -> None:
+        with self._lock:
+            self._tracked.pop(pid, None)
+
+    def stop(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+
+    def sample(self, tracked: _Tracked) -> bool:
+        """
+        Takes one sample of the tracked process tree.
+
+        Returns:
+            ``False`` if the root process no longer exists
+        """
+        now = time.monotonic()
+        cpu_ticks = 0
+        num_threads = 0
+        rss_bytes = 0
+        io_read_bytes = 0
+        io_write_bytes = 0
+        for i, pid in enumerate(_proc_tree(tracked.pid)):
+            try:
+                ticks, threads, rss = _read_stat(pid)
+            except (OSError, ValueError):
+                if i == 0:
+                    return False  # root process is gone
+                continue  # descendant exited while walking the tree
+            read_bytes, write_bytes = _read_io(pid)
+            cpu_ticks += ticks
+            num_threads += threads
+            rss_bytes += rss
+            io_read_bytes += read_bytes
+            io_write_bytes += write_bytes
+
+        cpu_percent = 0.0
+        if tracked.last_cpu:
+            last_time, last_ticks = tracked.last_cpu
+            elapsed = now - last_time
+            if elapsed > 0:
+                cpu_secs = max(cpu_ticks - last_ticks, 0) / _CLK_TCK
+                cpu_percent = round(100 * cpu_secs / elapsed, 1)
+        tracked.last_cpu = (now, cpu_ticks)
+
+        tracked.history.add(
+            ResourceUsage(
+                rss_bytes=rss_bytes,
+                cpu_percent=cpu_percent,
+                io_read_bytes=io_read_bytes,
+                io_write_bytes=io_write_bytes,
+                num_threads=num_threads,
+            )
+        )
+        return True
+
+    def _run(self) -> None:
+        while not self._stopped:
+            # clear before snapshotting so that a concurrent track() is not missed
+            self._wakeup.clear()
+            with self._lock:
+                tracked = list(self._tracked.values())
+
+            now = time.monotonic()
+            next_due = now + 60
+            for t in tracked:
+                if t.next_due <= now:
+                    if not self.sample(t):
+                        self.untrack(t.pid)
+                        continue
+                    t.next_due = now + t.interval
+                next_due = min(next_due, t.next_due)
+
+            self._wakeup.wait(max(next_due - time.monotonic(), 0))
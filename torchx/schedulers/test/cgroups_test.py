@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join
+
+from torchx.schedulers.cgroups import (
+    Cgroup,
+    is_cgroup2_available,
+    limits_from_resource,
+)
+from torchx.specs.api import NULL_RESOURCE, Resource
+
+
+def _write(path: str, content: str) -> None:
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def _read(path: str) -> str:
+    with open(path, "r") as f:
+        return f.read()
+
+
+class CgroupsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        # a fake (plain directory) cgroup hierarchy
+        self.root = tempfile.mkdtemp(prefix="CgroupsTest_")
+        _write(join(self.root, "cgroup.controllers"), "cpuset cpu io memory pids")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+
+    def test_is_cgroup2_available(self) -> None:
+        self.assertTrue(is_cgroup2_available(self.root))
+        self.assertFalse(is_cgroup2_available(join(self.root, "does_not_exist")))
+
+    def test_limits_from_resource(self) -> None:
+        self.assertEqual({}, limits_from_resource(NULL_RESOURCE))
+        self.assertEqual(
+            {"cpu.max": "200000 100000", "memory.max": str(512 * 1024 * 1024)},
+            limits_from_resource(Resource(cpu=2, gpu=0, memMB=512)),
+        )
+
+    def test_create(self) -> None:
+        cgroup = Cgroup(self.root, join(self.root, "session", "app", "trainer", "0"))
+        cgroup.create({"memory.max": "1024"})
+
+        self.assertEqual(
+            "+cpu +memory", _read(join(self.root, "cgroup.subtree_control"))
+        )
+        self.assertEqual("1024", _read(join(cgroup.path, "memory.max")))
+
+    def test_attach_self(self) -> None:
+        cgroup = Cgroup(self.root, join(self.root, "app", "trainer", "0"))
+        cgroup.create({})
+        _write(join(cgroup.path, "cgroup.procs"), "")
+        cgroup.attach_self()
+        self.assertEqual(str(os.getpid()), _read(join(cgroup.path, "cgroup.procs")))
+
+    def test_stats(self) -> None:
+        cgroup = Cgroup(self.root, join(self.root, "app", "trainer", "0"))
+        cgroup.create({})
+        self.assertEqual({}, cgroup.stats())
+
+        _write(join(cgroup.path, "memory.current"), "1024\n")
+        _write(join(cgroup.path, "memory.peak"), "4096\n")
+        _write(
+            join(cgroup.path, "cpu.stat"),
+            "usage_usec 300\nuser_usec 200\nsystem_usec 100\n"
+            "nr_periods 10\nnr_throttled 2\nthrottled_usec 50\n",
+        )
+        _write(
+            join(cgroup.path, "memory.events"),
+            "low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n",
+        )
+        self.assertEqual(
+            {
+                "memory_current_bytes": 1024,
+                "memory_peak_bytes": 4096,
+                "cpu_usage_usec": 300,
+                "cpu_user_usec": 200,
+                "cpu_system_usec": 100,
+                "cpu_nr_throttled": 2,
+                "cpu_throttled_usec": 50,
+                "oom": 1,
+                "oom_kill": 1,
+            },
+            cgroup.stats(),
+        )
+
+    def test_remove(self) -> None:
+        app_cgroup = join(self.root, "app")
+        cgroup0 = Cgroup(self.root, join(app_cgroup, "trainer", "0"))
+        cgroup1 = Cgroup(self.root, join(app_cgroup, "trainer", "1"))
+        cgroup0.create({})
+        cgroup1.create({})
+
+        cgroup0.remove()
+        self.assertFalse(os.path.exists(cgroup0.path))
+        # sibling still exists so the parents should not be removed
+        self.assertTrue(os.path.isdir(cgroup1.path))
+
+        cgroup1.remove()
+        self.assertFalse(os.path.exists(app_cgroup))
+        self.assertTrue(os.path.isdir(self.root))
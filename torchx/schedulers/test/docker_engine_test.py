@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import json
+import os
+import shutil
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+from os.path import join
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+from pyre_extensions import none_throws
+from torchx.schedulers.docker_engine import (
+    STDERR,
+    STDOUT,
+    ContainerEventWatcher,
+    ContainerProcess,
+    DockerClient,
+    DockerEngineError,
+)
+from torchx.schedulers.local_scheduler import LocalScheduler
+from torchx.specs.api import AppDef, AppState, Role, RunConfig, is_terminal
+
+
+class FakeContainer:
+    def __init__(self, container_id: str, config: Dict[str, Any]) -> None:
+        self.id = container_id
+        self.config = config
+        self.running = False
+        self.exit_code: Optional[int] = None
+        self.frames: List[bytes] = []
+        self.killed = threading.Event()
+
+
+class FakeDockerEngine:
+    """
+    Serves (a tiny subset of) the Docker Engine API on a unix socket.
+    The containers "run" the commands:
+
+    1. ``echo ARGS...``: writes ``ARGS`` to stdout and exits 0
+    2. ``fail ARGS...``: writes ``ARGS`` to stderr and exits 1
+    3. ``sleep``: runs until killed (exits 143)
+    """
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        self.containers: Dict[str, FakeContainer] = {}
+        # configs of all the containers created (including the removed ones)
+        self.created: List[Dict[str, Any]] = []
+        self.events: List[Dict[str, Any]] = []
+        self.requests: List[str] = []
+        self.num_connections = 0
+        self.cond = threading.Condition()
+        self.stopped = False
+        engine = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                with engine.cond:
+                    engine.num_connections += 1
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+            def do_GET(self) -> None:
+                engine.handle(self, "GET")
+
+            def do_POST(self) -> None:
+                engine.handle(self, "POST")
+
+            def do_DELETE(self) -> None:
+                engine.handle(self, "DELETE")
+
+        self.server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _reply(
+        self, handler: BaseHTTPRequestHandler, status: int, body: Any = None
+    ) -> None:
+        data = json.dumps(body).encode() if body is not None else b""
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def _start_stream(self, handler: BaseHTTPRequestHandler) -> None:
+        handler.send_response(200)
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+
+    def _exit(self, container: FakeContainer, exit_code: int) -> None:
+        with self.cond:
+            container.running = False
+            container.exit_code = exit_code
+            self.events.append(
+                {
+                    "status": "die",
+                    "id": container.id,
+                    "Actor": {
+                        "ID": container.id,
+                        "Attributes": {"exitCode": str(exit_code)},
+                    },
+                }
+            )
+            self.cond.notify_all()
+
+    def _run(self, container: FakeContainer) -> None:
+        cmd = container.config["Cmd"]
+        out = " ".join(cmd[1:]).encode() + b"\n"
+        if cmd[0] == "echo":
+            frame = struct.pack(">BxxxL", STDOUT, len(out)) + out
+        elif cmd[0] == "fail":
+            frame = struct.pack(">BxxxL", STDERR, len(out)) + out
+        else:
+            container.killed.wait()
+            self._exit(container, 143)
+            return
+        with self.cond:
+            container.frames.append(frame)
+            self.cond.notify_all()
+        self._exit(container, 0 if cmd[0] == "echo" else 1)
+
+    def handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        url = urlparse(handler.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        path = url.path.split("/")[2:]  # strip the api version
+        length = int(handler.headers.get("Content-Length", 0))
+        body = json.loads(handler.rfile.read(length)) if length else None
+        with self.cond:
+            self.requests.append(f"{method} /{'/'.join(path)}")
+
+        if path == ["_ping"]:
+            self._reply(handler, 200)
+        elif path == ["images", "create"]:
+            self._start_stream(handler)
+            if params["fromImage"] == "missing":
+                handler.wfile.write(b'{"error": "not found"}\n')
+            else:
+                handler.wfile.write(b'{"status": "Downloaded"}\n')
+        elif path == ["containers", "create"]:
+            with self.cond:
+                container_id = f"c{len(self.containers):063d}"
+                self.containers[container_id] = FakeContainer(container_id, body)
+                self.created.append(body)
+            self._reply(handler, 201, {"Id": container_id, "Warnings": []})
+        elif path == ["events"]:
+            self._stream_events(handler)
+        elif path[0] == "containers":
+            container = self.containers.get(path[1])
+            if not container:
+                self._reply(handler, 404, {"message": f"no such container: {path[1]}"})
+            elif path[2:] == ["start"]:
+                container.running = True
+                threading.Thread(target=self._run, args=(container,)).start()
+                self._reply(handler, 204)
+            elif path[2:] == ["kill"]:
+                if not container.running:
+                    self._reply(handler, 409, {"message": "not running"})
+                else:
+                    container.killed.set()
+                    self._reply(handler, 204)
+            elif path[2:] == ["json"]:
+                state = {
+                    "Running": container.running,
+                    "Status": "running" if container.running else "exited",
+                    "ExitCode": container.exit_code or 0,
+                    "Pid": 0,
+                }
+                self._reply(handler, 200, {"Id": container.id, "State": state})
+            elif path[2:] == ["logs"]:
+                self._stream_logs(handler, container)
+            elif method == "DELETE":
+                with self.cond:
+                    del self.containers[container.id]
+                self._reply(handler, 204)
+            else:
+                self._reply(handler, 404, {"message": "not found"})
+        else:
+            self._reply(handler, 404, {"message": "not found"})
+
+    def _stream_logs(
+        self, handler: BaseHTTPRequestHandler, container: FakeContainer
+    ) -> None:
+        self._start_stream(handler)
+        sent = 0
+        with self.cond:
+            while True:
+                for frame in container.frames[sent:]:
+                    handler.wfile.write(frame)
+                sent = len(container.frames)
+                if container.exit_code is not None or self.stopped:
+                    return
+                self.cond.wait(0.1)
+
+    def _stream_events(self, handler: BaseHTTPRequestHandler) -> None:
+        self._start_stream(handler)
+        handler.wfile.flush()
+        sent = len(self.events)
+        with self.cond:
+            while not self.stopped:
+                for event in self.events[sent:]:
+                    handler.wfile.write(json.dumps(event).encode() + b"\n")
+                    handler.wfile.flush()
+                sent = len(self.events)
+                self.cond.wait(0.1)
+
+
+class DockerEngineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix=f"{self.__class__.__name__}_")
+        self.socket_path = join(self.test_dir, "docker.sock")
+        self.engine = FakeDockerEngine(self.socket_path)
+        self.client = DockerClient(self.socket_path, max_connections=2)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.engine.stop()
+        shutil.rmtree(self.test_dir)
+
+    def test_request_pooled(self) -> None:
+        for _ in range(5):
+            self.assertTrue(self.client.ping())
+        # the same keep-alive connection is reused
+        self.assertEqual(1, self.engine.num_connections)
+
+    def test_request_error(self) -> None:
+        with self.assertRaisesRegex(DockerEngineError, "no such container") as cm:
+            self.client.inspect("unknown")
+        self.assertEqual(404, cm.exception.status)
+        # no-op for missing containers
+        self.client.kill("unknown")
+        self.client.remove("unknown")
+
+    def test_ping_no_engine(self) -> None:
+        client = DockerClient(join(self.test_dir, "none.sock"))
+        self.assertFalse(client.ping())
+
+    def test_pull(self) -> None:
+        self.client.pull("pytorch/pytorch:latest")
+        with self.assertRaisesRegex(DockerEngineError, "not found"):
+            self.client.pull("missing")
+
+    def test_create_containers(self) -> None:
+        configs = [{"Image": "foo", "Cmd": ["echo", str(i)]} for i in range(5)]
+        container_ids = self.client.create_containers(configs)
+        self.assertEqual(5, len(set(container_ids)))
+        for container_id, config in zip(container_ids, configs):
+            self.assertEqual(config, self.engine.containers[container_id].config)
+        # created concurrently on at most max_connections connections
+        self.assertLessEqual(self.engine.num_connections, 2)
+
+    def test_logs_and_exit(self) -> None:
+        events = ContainerEventWatcher(self.client, "test_session")
+        events.start()
+        try:
+            procs = []
+            for cmd in [["echo", "hello"], ["fail", "oops"]]:
+                container_id = self.client.create_container({"Cmd": cmd})
+                proc = ContainerProcess(self.client, container_id)
+                events.watch(proc)
+                proc.start()
+                procs.append(proc)
+
+            self.assertEqual(0, procs[0].wait(10))
+            self.assertEqual(1, procs[1].wait(10))
+            self.assertEqual(
+                [(STDOUT, b"hello\n")], list(self.client.logs(procs[0].container_id))
+            )
+            self.assertEqual(
+                [(STDERR, b"oops\n")], list(self.client.logs(procs[1].container_id))
+            )
+        finally:
+            events.stop()
+
+    def test_terminate(self) -> None:
+        events = ContainerEventWatcher(self.client, "test_session")
+        events.start()
+        try:
+            proc = ContainerProcess(
+                self.client, self.client.create_container({"Cmd": ["sleep"]})
+            )
+            exited = threading.Event()
+            proc.add_exit_callback(exited.set)
+            events.watch(proc)
+            proc.start()
+            self.assertIsNone(proc.poll())
+
+            proc.terminate()
+            self.assertEqual(143, proc.wait(10))
+            self.assertTrue(exited.is_set())
+            # no-op once exited
+            proc.terminate()
+        finally:
+            events.stop()
+
+
+class LocalSchedulerDockerApiTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix=f"{self.__class__.__name__}_")
+        socket_path = join(self.test_dir, "docker.sock")
+        self.engine = FakeDockerEngine(socket_path)
+        with patch.dict(os.environ, {"DOCKER_HOST": f"unix://{socket_path}"}):
+            self.scheduler = LocalScheduler(session_name="test_session")
+            self.scheduler._get_docker_client()
+
+    def tearDown(self) -> None:
+        self.scheduler.__del__()
+        self.engine.stop()
+        shutil.rmtree(self.test_dir)
+
+    def wait(self, app_id: str, timeout: float = 30) -> AppState:
+        expiry = time.time() + timeout
+        while time.time() < expiry:
+            desc = none_throws(self.scheduler.describe(app_id))
+            if is_terminal(desc.state):
+                return desc.state
+            time.sleep(0.1)
+        raise TimeoutError(f"timed out waiting for app: {app_id}")
+
+    def test_submit(self) -> None:
+        role = Role("echo", image="test_image").runs("echo", "hello").replicas(2)
+        app = AppDef(name="test_app").of(role)
+        log_dir = join(self.test_dir, "logs")
+        cfg = RunConfig(
+            {"image_type": "docker_api", "log_dir": log_dir, "shm_size": "1g"}
+        )
+
+        dryrun_info = self.scheduler.submit_dryrun(app, cfg)
+        params = dryrun_info.request.role_params["echo"][0]
+        self.assertEqual("test_image", params.container_image)
+        self.assertEqual(["echo", "hello"], params.args)
+
+        app_id = self.scheduler.schedule(dryrun_info)
+        self.assertEqual(AppState.SUCCEEDED, self.wait(app_id))
+        stdout_log = join(log_dir, "test_session", app_id, "echo", "1", "stdout.log")
+        with open(stdout_log, "r") as f:
+            self.assertEqual("hello\n", f.read())
+        # containers were created in a batch, no docker process per replica
+        self.assertEqual(2, len(self.engine.created))
+        self.assertEqual(
+            [("echo", "0"), ("echo", "1")],
+            sorted(
+                (c["Labels"]["torchx.role_name"], c["Labels"]["torchx.replica_id"])
+                for c in self.engine.created
+            ),
+        )
+        app_log_dir = join(log_dir, "test_session", app_id)
+        for config in self.engine.created:
+            self.assertEqual(app_id, config["Labels"]["torchx.app_id"])
+            self.assertEqual(
+                {"ShmSize": 1024**3, "Binds": [f"{app_log_dir}:{app_log_dir}"]},
+                config["HostConfig"],
+            )
+        # the exited containers are removed
+        deadline = time.time() + 10
+        while self.engine.containers and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertEqual({}, self.engine.containers)
+
+    def test_submit_failed(self) -> None:
+        role = Role("fail", image="test_image").runs("fail", "oops")
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, RunConfig({"image_type": "docker_api"}))
+        self.assertEqual(AppState.FAILED, self.wait(app_id))
+
+    def test_cancel(self) -> None:
+        role = Role("sleep", image="test_image").runs("sleep")
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, RunConfig({"image_type": "docker_api"}))
+        self.assertEqual(
+            AppState.RUNNING, none_throws(self.scheduler.describe(app_id)).state
+        )
+        self.scheduler.cancel(app_id)
+        self.assertEqual(
+            AppState.CANCELLED, none_throws(self.scheduler.describe(app_id)).state
+        )
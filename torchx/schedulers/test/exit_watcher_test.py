@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import subprocess
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from torchx.schedulers.exit_watcher import ExitWatcher
+
+
+class ExitWatcherTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.watcher = ExitWatcher()
+
+    def tearDown(self) -> None:
+        self.watcher.stop()
+
+    def _assert_fires_on_exit(self) -> None:
+        exited = threading.Event()
+        proc = subprocess.Popen(["sleep", "0.2"])
+        self.watcher.watch(proc, exited.set)
+        self.assertTrue(exited.wait(timeout=10))
+        self.assertIsNotNone(proc.poll())
+
+    def test_watch(self) -> None:
+        self._assert_fires_on_exit()
+
+    @patch("os.pidfd_open", side_effect=OSError, create=True)
+    def test_watch_polled(self, _) -> None:
+        self._assert_fires_on_exit()
+
+    def test_watch_already_exited(self) -> None:
+        exited = threading.Event()
+        proc = subprocess.Popen(["true"])
+        proc.wait()
+        self.watcher.watch(proc, exited.set)
+        self.assertTrue(exited.wait(timeout=10))
+
+    def test_call_later(self) -> None:
+        calls = []
+        done = threading.Event()
+        start = time.monotonic()
+        self.watcher.call_later(0.2, lambda: calls.append(2) or done.set())
+        self.watcher.call_later(0, lambda: calls.append(1))
+        self.assertTrue(done.wait(timeout=10))
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        self.assertEqual([1, 2], calls)
+
+    def test_callback_error(self) -> None:
+        done = threading.Event()
+
+        def fail() -> None:
+            raise RuntimeError("test")
+
+        self.watcher.call_later(0, fail)
+        self.watcher.call_later(0, done.set)
+        self.assertTrue(done.wait(timeout=10))
+
+    def test_stop_not_started(self) -> None:
+        ExitWatcher().stop()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from typing import IO, List, Optional
+from unittest.mock import patch
+
+from torchx.schedulers import forkserver
+from torchx.schedulers.forkserver import _readline, can_fork, find_python, ForkServer
+
+
+def write_script(test_dir: str, name: str, lines: List[str]) -> str:
+    path = os.path.join(test_dir, name)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+class ForkServerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix=f"{self.__class__.__name__}_")
+        self.server = ForkServer(sys.executable, ["json"])
+        self.env = dict(os.environ)
+
+    def tearDown(self) -> None:
+        self.server.stop()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_can_fork(self) -> None:
+        self.assertTrue(can_fork(["python", "main.py", "--foo"]))
+        self.assertTrue(can_fork(["/usr/bin/python3", "-m", "foo.bar"]))
+        self.assertFalse(can_fork(["python", "-u", "main.py"]))
+        self.assertFalse(can_fork(["python", "-m"]))
+        self.assertFalse(can_fork(["python"]))
+        self.assertFalse(can_fork(["bash", "main.sh"]))
+
+    def test_find_python(self) -> None:
+        self.assertEqual(sys.executable, find_python([sys.executable], self.env))
+        self.assertIsNone(find_python(["no_such_python"], self.env))
+
+    def test_spawn(self) -> None:
+        script = write_script(
+            self.test_dir,
+            "main.py",
+            [
+                "import os, sys",
+                "print(__name__, sys.argv[1:], os.environ['FOO'], os.getcwd())",
+                "print('err', file=sys.stderr)",
+                "sys.exit(int(sys.argv[1]))",
+            ],
+        )
+        proc = self.server.spawn(
+            ["python", script, "3"],
+            {**self.env, "FOO": "bar"},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=self.test_dir,
+        )
+        stdout = proc.stdout.read().decode()  # pyre-ignore [16]
+        stderr = proc.stderr.read().decode()  # pyre-ignore [16]
+        self.assertEqual(3, proc.wait(timeout=30))
+        self.assertEqual(f"__main__ ['3'] bar {self.test_dir}\n", stdout)
+        self.assertEqual("err\n", stderr)
+
+    def test_spawn_module(self) -> None:
+        write_script(self.test_dir, "mod.py", ["import sys", "print(sys.argv)"])
+        out_file = os.path.join(self.test_dir, "out.log")
+        with open(out_file, "w") as out:
+            proc = self.server.spawn(
+                ["python", "-m", "mod", "a"],
+                {**self.env, "PYTHONPATH": self.test_dir},
+                stdout=out.fileno(),
+            )
+            self.assertEqual(0, proc.wait(timeout=30))
+        with open(out_file, "r") as f:
+            self.assertEqual(f"['{self.test_dir}/mod.py', 'a']\n", f.read())
+
+    def test_spawn_exit_immediately(self) -> None:
+        script = write_script(self.test_dir, "main.py", ["import sys", "sys.exit(3)"])
+
+        def slow_readline(fp: Optional[IO[bytes]]) -> Optional[str]:
+            # by now the exit is reported (and buffered) along with the pid
+            time.sleep(0.5)
+            return _readline(fp)
+
+        with patch(f"{forkserver.__name__}._readline", side_effect=slow_readline):
+            proc = self.server.spawn(["python", script], self.env)
+            self.assertEqual(3, proc.wait(timeout=30))
+
+    def test_spawn_exception(self) -> None:
+        script = write_script(self.test_dir, "main.py", ["raise ValueError('foo')"])
+        proc = self.server.spawn(["python", script], self.env, stderr=subprocess.PIPE)
+        stderr = proc.stderr.read().decode()  # pyre-ignore [16]
+        self.assertEqual(1, proc.wait(timeout=30))
+        self.assertIn("ValueError: foo", stderr)
+
+    def test_terminate(self) -> None:
+        script = write_script(
+            self.test_dir, "main.py", ["import time", "time.sleep(60)"]
+        )
+        proc = self.server.spawn(["python", script], self.env)
+        exited = threading.Event()
+        proc.add_exit_callback(exited.set)
+        self.assertIsNone(proc.poll())
+        proc.terminate()
+        self.assertEqual(-15, proc.wait(timeout=30))
+        self.assertTrue(exited.is_set())
+
+    def test_stop_terminates_children(self) -> None:
+        script = write_script(
+            self.test_dir, "main.py", ["import time", "time.sleep(60)"]
+        )
+        proc = self.server.spawn(["python", script], self.env)
+        self.server.stop()
+        self.assertIsNotNone(proc.wait(timeout=30))
+
+    def test_start_failed(self) -> None:
+        server = ForkServer(sys.executable, ["no_such_module"])
+        with self.assertRaises(RuntimeError):
+            server.start()
+        server.stop()
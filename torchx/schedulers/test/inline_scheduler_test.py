@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from typing import List
+
+from pyre_extensions import none_throws
+from torchx.runner.api import Runner
+from torchx.schedulers.inline_scheduler import InlineScheduler, python_args
+from torchx.specs.api import (
+    AppDef,
+    AppState,
+    InvalidRunConfigException,
+    Role,
+    RunConfig,
+    is_terminal,
+    macros,
+)
+
+
+class InlineSchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix=f"{self.__class__.__name__}_")
+        self.write(
+            "main.py",
+            [
+                "import os, sys",
+                "print(sys.argv[1:], os.environ.get('FOO'))",
+                "print('err', sys.argv[1], file=sys.stderr)",
+                "sys.exit(int(os.environ.get('EXIT_CODE', '0')))",
+            ],
+        )
+        self.scheduler = InlineScheduler(session_name="test_session")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def write(self, name: str, lines: List[str]) -> None:
+        with open(os.path.join(self.test_dir, name), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    def wait(self, app_id: str, timeout: float = 30) -> AppState:
+        expiry = time.time() + timeout
+        while time.time() < expiry:
+            state = none_throws(self.scheduler.describe(app_id)).state
+            if is_terminal(state):
+                return state
+            self.scheduler.wait_for_update(app_id, 1)
+        raise TimeoutError(f"app: {app_id} did not finish in {timeout}s")
+
+    def _app(self, *args: str, **env: str) -> AppDef:
+        role = Role("trainer", image=self.test_dir).runs("main.py", *args, **env)
+        return AppDef(name="test_app").of(role.replicas(2))
+
+    def test_python_args(self) -> None:
+        role = Role("r", image="").runs("python", "-m", "foo", "--bar")
+        self.assertEqual(["-m", "foo", "--bar"], python_args(role))
+        role = Role("r", image="").runs("main.py", "--bar")
+        self.assertEqual(["main.py", "--bar"], python_args(role))
+        self.assertIsNone(python_args(Role("r", image="").runs("echo", "foo")))
+
+    def test_submit(self) -> None:
+        app = self._app(macros.replica_id, FOO="bar")
+        app_id = self.scheduler.submit(app, RunConfig())
+        self.assertEqual(AppState.SUCCEEDED, self.wait(app_id))
+
+        for k in range(2):
+            self.assertEqual(
+                [f"['{k}'] bar"], self.scheduler.stdout(app_id, "trainer", k)
+            )
+            self.assertEqual(
+                [f"err {k}"], list(self.scheduler.log_iter(app_id, "trainer", k))
+            )
+        # the env and argv of this process are restored
+        self.assertNotIn("FOO", os.environ)
+        self.assertNotEqual(["0"], sys.argv[1:])
+
+        desc = none_throws(self.scheduler.describe(app_id))
+        self.assertEqual(
+            [AppState.SUCCEEDED] * 2,
+            [r.state for r in desc.roles_statuses[0].replicas],
+        )
+
+    def test_submit_failed(self) -> None:
+        app_id = self.scheduler.submit(self._app("0", EXIT_CODE="3"), RunConfig())
+        self.assertEqual(AppState.FAILED, self.wait(app_id))
+
+        self.write("raises.py", ["raise ValueError('foo')"])
+        role = Role("trainer", image=self.test_dir).runs("raises.py")
+        app_id = self.scheduler.submit(AppDef("test_app").of(role), RunConfig())
+        self.assertEqual(AppState.FAILED, self.wait(app_id))
+        lines = list(self.scheduler.log_iter(app_id, "trainer", regex="ValueError"))
+        self.assertEqual(["ValueError: foo"], lines)
+
+    def test_submit_module(self) -> None:
+        self.write("mod.py", ["import sys", "print(sys.argv[1:])"])
+        role = Role("trainer", image="").runs(
+            "python", "-m", "mod", "foo", PYTHONPATH=self.test_dir
+        )
+        app = AppDef(name="test_app").of(role)
+        sys.path.insert(0, self.test_dir)
+        try:
+            app_id = self.scheduler.submit(app, RunConfig())
+            self.assertEqual(AppState.SUCCEEDED, self.wait(app_id))
+        finally:
+            sys.path.remove(self.test_dir)
+        self.assertEqual(["['foo']"], self.scheduler.stdout(app_id, "trainer"))
+
+    def test_submit_fork(self) -> None:
+        cfg = RunConfig({"mode": "fork", "preload": "json"})
+        app_id = self.scheduler.submit(self._app(macros.replica_id, FOO="baz"), cfg)
+        self.assertEqual(AppState.SUCCEEDED, self.wait(app_id))
+        self.assertEqual(["['1'] baz"], self.scheduler.stdout(app_id, "trainer", 1))
+        self.assertEqual(["err 1"], list(self.scheduler.log_iter(app_id, "trainer", 1)))
+
+        app_id = self.scheduler.submit(self._app("0", EXIT_CODE="3"), cfg)
+        self.assertEqual(AppState.FAILED, self.wait(app_id))
+        self.scheduler.__del__()
+
+    def test_cancel(self) -> None:
+        self.write("sleep.py", ["import time", "time.sleep(60)"])
+        role = Role("trainer", image=self.test_dir).runs("sleep.py")
+        app = AppDef(name="test_app").of(role)
+
+        app_id = self.scheduler.submit(app, RunConfig({"mode": "fork"}))
+        self.scheduler.cancel(app_id)
+        self.assertEqual(AppState.CANCELLED, self.wait(app_id))
+        replica = self.scheduler._apps[app_id].role_replicas["trainer"][0]
+        self.assertIsNotNone(none_throws(replica.proc).wait(timeout=30))
+        self.scheduler.__del__()
+
+    def test_log_iter_tail(self) -> None:
+        self.write(
+            "echo.py",
+            [
+                "import sys, time",
+                "for i in range(3):",
+                "    print(i, file=sys.stderr, flush=True)",
+                "    time.sleep(0.1)",
+            ],
+        )
+        role = Role("trainer", image=self.test_dir).runs("echo.py")
+        app_id = self.scheduler.submit(AppDef("test_app").of(role), RunConfig())
+        lines = self.scheduler.log_iter(app_id, "trainer", should_tail=True)
+        self.assertEqual(["0", "1", "2"], list(lines))
+
+    def test_invalid(self) -> None:
+        role = Role("trainer", image="").runs("echo", "foo")
+        with self.assertRaises(ValueError):
+            self.scheduler.submit_dryrun(AppDef("test_app").of(role), RunConfig())
+        with self.assertRaises(InvalidRunConfigException):
+            self.scheduler.submit_dryrun(self._app(), RunConfig({"mode": "foo"}))
+
+    def test_runner_wait(self) -> None:
+        runner = Runner(
+            name="test_session",
+            schedulers={"default": self.scheduler},
+            wait_interval=10,
+        )
+        start = time.monotonic()
+        for _ in range(10):
+            app_handle = runner.run(self._app("0"))
+            status = none_throws(runner.wait(app_handle))
+            self.assertEqual(AppState.SUCCEEDED, status.state)
+        # notified of the app's completion rather than sleeping wait_interval
+        self.assertLess(time.monotonic() - start, 10)
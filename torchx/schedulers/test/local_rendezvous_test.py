@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import unittest
+
+from torchx.components.base.roles import create_torch_dist_role
+from torchx.schedulers.local_rendezvous import (
+    RendezvousStore,
+    is_available,
+    needs_rendezvous,
+    use_rendezvous,
+)
+from torchx.schedulers.ports import free_port
+from torchx.specs.api import Role, macros
+
+
+class LocalRendezvousTest(unittest.TestCase):
+    def test_needs_rendezvous(self) -> None:
+        self.assertTrue(needs_rendezvous(create_torch_dist_role("trainer", "", "a.py")))
+        self.assertTrue(
+            needs_rendezvous(
+                create_torch_dist_role("trainer", "", "a.py", rdzv_backend="c10d")
+            )
+        )
+        self.assertFalse(
+            needs_rendezvous(
+                create_torch_dist_role(
+                    "trainer", "", "a.py", rdzv_endpoint="etcd.host:2379"
+                )
+            )
+        )
+        self.assertFalse(
+            needs_rendezvous(
+                create_torch_dist_role("trainer", "", "a.py", standalone=True)
+            )
+        )
+        self.assertFalse(needs_rendezvous(Role("trainer", image="").runs("main.py")))
+        self.assertFalse(
+            needs_rendezvous(
+                Role("trainer", image="").runs("python", "-m", "foo.bar", "a.py")
+            )
+        )
+
+    def test_use_rendezvous(self) -> None:
+        role = create_torch_dist_role(
+            "trainer",
+            "",
+            "a.py",
+            args=["--rdzv_backend", "user_arg"],
+            nnodes="2",
+            rdzv_conf="timeout=60,is_host=1",
+        )
+        rdzv_role = use_rendezvous(role, "localhost:1234")
+
+        self.assertEqual(
+            [
+                "-m",
+                "torch.distributed.launch",
+                "--rdzv_backend",
+                "c10d",
+                "--rdzv_endpoint",
+                "localhost:1234",
+                "--rdzv_conf",
+                "timeout=60,is_host=0",
+                "--nnodes",
+                "2",
+                "--rdzv_id",
+                macros.app_id,
+                "--role",
+                "trainer",
+                f"{macros.img_root}/a.py",
+                # the entrypoint's args are left as is
+                "--rdzv_backend",
+                "user_arg",
+            ],
+            rdzv_role.args,
+        )
+        self.assertFalse(needs_rendezvous(rdzv_role))
+        # the role is copied
+        self.assertIn("etcd", role.args)
+
+    def test_use_rendezvous_equals_form(self) -> None:
+        role = Role("trainer", image="").runs(
+            "python",
+            "-m",
+            "torch.distributed.run",
+            "--rdzv_backend=etcd",
+            "--nnodes=2",
+            "a.py",
+        )
+        self.assertEqual(
+            [
+                "-m",
+                "torch.distributed.run",
+                "--rdzv_backend",
+                "c10d",
+                "--rdzv_endpoint",
+                "localhost:1234",
+                "--rdzv_conf",
+                "is_host=0",
+                "--nnodes=2",
+                "a.py",
+            ],
+            use_rendezvous(role, "localhost:1234").args,
+        )
+
+    def test_rendezvous_store(self) -> None:
+        if not is_available():
+            self.skipTest("torch is not installed")
+
+        from torch.distributed import TCPStore
+
+        store = RendezvousStore(free_port())
+        client = TCPStore(
+            store.host, store.port, is_master=False, wait_for_workers=False
+        )
+        client.set("foo", "bar")
+        self.assertEqual(b"bar", client.get("foo"))
+        store.close()
@@ -9,6 +9,7 @@ import json
 import os
 import shutil
 import subprocess
+import sys
 import tempfile
 import time
 import unittest
@@ -18,17 +19,31 @@ from typing import Optional
 from unittest import mock
 from unittest.mock import MagicMock, call, patch
 
+from pyre_extensions import none_throws
 from torchx.components.base.binary_component import binary_component
+from torchx.components.base.roles import create_torch_dist_role
+from torchx.schedulers import local_scheduler
 from torchx.schedulers.api import DescribeAppResponse
+from torchx.schedulers.forkserver import ForkedProcess
 from torchx.schedulers.local_scheduler import (
+    ContainerOptions,
+    DRYRUN_PORTS_TTL,
     DockerImageProvider,
     LocalDirectoryImageProvider,
     LocalScheduler,
     make_unique,
+    parse_bytes,
+    parse_mounts,
 )
+from torchx.schedulers.log_rotation import rotated_segments
+from torchx.schedulers.log_search import is_index_fresh
 from torchx.specs.api import (
     AppDef,
+    NONE,
     AppState,
+    InvalidRunConfigException,
+    Resource,
+    RetryPolicy,
     Role,
     RunConfig,
     is_terminal,
@@ -41,6 +56,11 @@ from .test_util import write_shell_script
 LOCAL_DIR_IMAGE_PROVIDER_FETCH = (
     "torchx.schedulers.local_scheduler.LocalDirectoryImageProvider.fetch"
 )
+DOCKER_IMAGE_PROVIDER_FETCH = (
+    "torchx.schedulers.local_scheduler.DockerImageProvider.fetch"
+)
+RDZV_IS_AVAILABLE = "torchx.schedulers.local_rendezvous.is_available"
+RDZV_STORE = "torchx.schedulers.local_rendezvous.RendezvousStore"
 
 
 class LocalDirImageProviderTest(unittest.TestCase):
@@ -117,9 +137,85 @@ class DockerImageProviderTest(unittest.TestCase):
         )
 
 
+class ContainerOptionsTest(unittest.TestCase):
+    def test_parse_bytes(self) -> None:
+        self.assertEqual(1024, parse_bytes("1024"))
+        self.assertEqual(512 * 1024**2, parse_bytes("512m"))
+        self.assertEqual(8 * 1024**3, parse_bytes("8G"))
+        with self.assertRaises(ValueError):
+            parse_bytes("8gb")
+
+    def test_parse_mounts(self) -> None:
+        self.assertEqual(
+            [("/data", "/data", True), ("/tmp/cache", "/cache", False)],
+            parse_mounts("/data:/data:ro, /tmp/cache:/cache"),
+        )
+        self.assertEqual([], parse_mounts(""))
+        for invalid in ["/data", "data:/data", "/data:/data:rx"]:
+            with self.subTest(mount=invalid):
+                with self.assertRaises(ValueError):
+                    parse_mounts(invalid)
+
+    def test_docker_flags(self) -> None:
+        options = ContainerOptions(
+            shm_size=1024,
+            ipc="host",
+            mounts=[("/data", "/data", True)],
+            ports=[29500],
+            cpus=2.0,
+            memory=1024,
+            gpus=1,
+        )
+        self.assertEqual(
+            [
+                "--shm-size",
+                "1024",
+                "--ipc",
+                "host",
+                "--volume",
+                "/data:/data:ro",
+                "--publish",
+                "29500",
+                "--cpus",
+                "2.0",
+                "--memory",
+                "1024",
+                "--gpus",
+                "1",
+            ],
+            options.docker_flags(),
+        )
+        self.assertEqual(
+            {
+                "ShmSize": 1024,
+                "IpcMode": "host",
+                "Binds": ["/data:/data:ro"],
+                "PortBindings": {"29500/tcp": [{"HostPort": ""}]},
+                "NanoCpus": 2000000000,
+                "Memory": 1024,
+                "DeviceRequests": [
+                    {"Driver": "", "Count": 1, "Capabilities": [["gpu"]]}
+                ],
+            },
+            options.host_config(),
+        )
+
+    def test_host_network(self) -> None:
+        # ports are not published on the host network
+        options = ContainerOptions(network="host", ports=[29500])
+        self.assertEqual(["--network", "host"], options.docker_flags())
+        self.assertEqual({"NetworkMode": "host"}, options.host_config())
+
+
 LOCAL_SCHEDULER_MAKE_UNIQUE = "torchx.schedulers.local_scheduler.make_unique"
 
+LOCAL_SCHEDULER_CGROUP2_AVAILABLE = (
+    "torchx.schedulers.local_scheduler.is_cgroup2_available"
+)
+CGROUP_ATTACH_SELF = "torchx.schedulers.cgroups.Cgroup.attach_self"
+
 ERR_FILE_ENV = "TORCHELASTIC_ERROR_FILE"
+READ_ERROR_FILE = "torchx.schedulers.local_scheduler._read_error_file"
 
 
 class LocalSchedulerTest(unittest.TestCase):
@@ -137,6 +233,17 @@ class LocalSchedulerTest(unittest.TestCase):
             ["for i in $(seq 0 $1); do echo $i 1>&2; sleep $2; done"],
         )
         write_shell_script(self.test_dir, "echo_env_foo.sh", ["echo $FOO 1>&2"])
+        # fails (exit 1) the first time, succeeds once the marker file ($1) exists
+        write_shell_script(
+            self.test_dir,
+            "fail_once.sh",
+            [
+                "echo attempt 1>&2",
+                "if [ -f $1 ]; then exit 0; fi",
+                "touch $1",
+                "exit 1",
+            ],
+        )
         self.scheduler = LocalScheduler(session_name="test_session")
 
     def wait(
@@ -308,6 +415,49 @@ class LocalSchedulerTest(unittest.TestCase):
                             replica_info[std_stream], "hello_world\n"
                         )
 
+    def test_structured_error(self) -> None:
+        write_shell_script(
+            self.test_dir,
+            "write_error.sh",
+            [
+                "sleep $1",
+                f'echo "{{\\"message\\": \\"error_$1\\"}}" > ${ERR_FILE_ENV}',
+                "exit 1",
+            ],
+        )
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("write_error.sh", macros.replica_id)
+            .replicas(2)
+        )
+        app = AppDef(name="test_app").of(role)
+        cfg = RunConfig({"log_dir": self.test_dir})
+
+        with patch(
+            READ_ERROR_FILE, side_effect=local_scheduler._read_error_file
+        ) as read_error_file_mock:
+            app_id = self.scheduler.submit(app, cfg)
+            desc = none_throws(self.wait(app_id))
+            for _ in range(10):
+                desc = none_throws(self.scheduler.describe(app_id))
+
+            # the error files are read once per (exited) replica
+            self.assertEqual(2, read_error_file_mock.call_count)
+
+        # the earliest error is reported
+        self.assertEqual(AppState.FAILED, desc.state)
+        self.assertEqual('{"message": "error_0"}', desc.structured_error_msg)
+        error = none_throws(self.scheduler._apps[app_id].get_structured_error())
+        self.assertEqual({"message": "error_0"}, error.payload)
+
+    def test_structured_error_none(self) -> None:
+        role = Role("role1", image=self.test_dir).runs("fail.sh")
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, RunConfig({"log_dir": self.test_dir}))
+        desc = none_throws(self.wait(app_id))
+        self.assertEqual(AppState.FAILED, desc.state)
+        self.assertEqual(NONE, desc.structured_error_msg)
+
     @patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value="")
     def test_submit_dryrun_without_log_dir_cfg(
         self, img_provider_fetch_mock: mock.Mock
@@ -434,6 +584,156 @@ class LocalSchedulerTest(unittest.TestCase):
         ):
             self.assertEqual(str(i * 2), line)
 
+    def test_log_iterator_rotated(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("echo_range.sh", "99", "0.01")
+            .replicas(1)
+        )
+
+        log_dir = join(self.test_dir, "log")
+        cfg = RunConfig({"log_dir": log_dir, "log_max_bytes": 50})
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, cfg)
+
+        lines = list(self.scheduler.log_iter(app_id, "role1", k=0))
+        self.assertEqual([str(i) for i in range(100)], lines)
+
+        # rotated logs are still readable after the app finished
+        lines = list(self.scheduler.log_iter(app_id, "role1", k=0))
+        self.assertEqual([str(i) for i in range(100)], lines)
+
+        stderr_log = join(
+            log_dir, self.scheduler.session_name, app_id, "role1", "0", "stderr.log"
+        )
+        segments = [s for _, s in rotated_segments(stderr_log)]
+        self.assertGreater(len(segments), 1)
+        for segment in segments:
+            self.assertTrue(segment.endswith(".gz"))
+            self.assertLessEqual(os.path.getsize(segment), 100)
+
+    def test_log_iterator_rotated_restart(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("fail_once.sh", join(self.test_dir, "marker"))
+            .with_retry_policy(RetryPolicy.REPLICA, max_retries=1)
+        )
+        log_dir = join(self.test_dir, "log")
+        cfg = RunConfig(
+            {"log_dir": log_dir, "log_max_bytes": 1, "restart_backoff": 0.0}
+        )
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, cfg)
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.SUCCEEDED, desc.state)
+        self.assertEqual(["attempt"], list(self.scheduler.log_iter(app_id, "role1")))
+
+    def test_submit_invalid_log_compression(self) -> None:
+        role = Role("role1", image=self.test_dir).runs("echo_range.sh", "1", "0")
+        app = AppDef(name="test_app").of(role)
+        with self.assertRaises(InvalidRunConfigException):
+            self.scheduler.submit_dryrun(app, RunConfig({"log_compression": "lz4"}))
+
+    def test_log_quota(self) -> None:
+        role = Role("role1", image=self.test_dir).runs("echo_range.sh", "99", "0")
+        app = AppDef(name="test_app").of(role)
+        log_dir = join(self.test_dir, "log")
+        cfg = RunConfig({"log_dir": log_dir, "log_quota_bytes": 1})
+
+        app_id1 = self.scheduler.submit(app, cfg)
+        self.wait(app_id1)
+        app_id2 = self.scheduler.submit(app, cfg)
+        self.wait(app_id2)
+
+        session_log_dir = join(log_dir, self.scheduler.session_name)
+        # the finished app1 is deleted (and evicted) to make room for app2
+        self.assertEqual([app_id2], os.listdir(session_log_dir))
+        self.assertIsNone(self.scheduler.describe(app_id1))
+
+    def test_index_logs(self) -> None:
+        role = Role("role1", image=self.test_dir).runs("echo_range.sh", "10", "0")
+        app = AppDef(name="test_app").of(role)
+        log_dir = join(self.test_dir, "log")
+        cfg = RunConfig({"log_dir": log_dir, "index_logs": True})
+
+        app_id = self.scheduler.submit(app, cfg)
+        self.wait(app_id)
+
+        log_file = join(
+            log_dir, self.scheduler.session_name, app_id, "role1", "0", "stderr.log"
+        )
+        # the index is built in the background
+        deadline = time.time() + 10
+        while not is_index_fresh(log_file) and time.time() < deadline:
+            time.sleep(0.1)
+        self.assertTrue(is_index_fresh(log_file))
+
+    def test_tmp_log_dir_removed(self) -> None:
+        scheduler = LocalScheduler(session_name="test_session", cache_size=1)
+        role = Role("role1", image=self.test_dir).runs("echo_range.sh", "1", "0")
+        app = AppDef(name="test_app").of(role)
+
+        app_id1 = scheduler.submit(app, RunConfig())
+        self.wait(app_id1, scheduler)
+        tmp_log_dir = none_throws(scheduler._tmp_log_dir)
+        app_log_dir1 = join(tmp_log_dir, "test_session", app_id1)
+        self.assertTrue(os.path.isdir(app_log_dir1))
+
+        # evicts app1
+        app_id2 = scheduler.submit(app, RunConfig())
+        self.wait(app_id2, scheduler)
+        self.assertFalse(os.path.exists(app_log_dir1))
+        self.assertTrue(os.path.isdir(join(tmp_log_dir, "test_session", app_id2)))
+
+        scheduler.__del__()
+        self.assertFalse(os.path.exists(tmp_log_dir))
+
+    def test_log_iterator_captured(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("echo_range.sh", "10", "0.1")
+            .replicas(1)
+        )
+        cfg = RunConfig({"capture_logs": True, "echo_logs": False})
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, cfg)
+
+        lines = list(self.scheduler.log_iter(app_id, "role1", k=0))
+        self.assertEqual([str(i) for i in range(11)], lines)
+
+        lines = list(self.scheduler.log_iter(app_id, "role1", k=0, regex=r"[02468]"))
+        self.assertEqual(["0", "2", "4", "6", "8"], lines)
+
+    def test_log_iterator_captured_bounded(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("echo_range.sh", "10", "0")
+            .replicas(1)
+        )
+        cfg = RunConfig(
+            {"capture_logs": True, "echo_logs": False, "log_buffer_lines": 3}
+        )
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, cfg)
+        self.wait(app_id)
+
+        lines = list(self.scheduler.log_iter(app_id, "role1", k=0))
+        self.assertEqual(["8", "9", "10"], lines)
+
+    @patch("torchx.schedulers.log_buffer.echo")
+    def test_log_iterator_captured_echo(self, echo_mock: MagicMock) -> None:
+        role = Role("role1", image=self.test_dir).runs("echo_stdout.sh", "foo")
+        app = AppDef(name="test_app").of(role)
+        app_id = self.scheduler.submit(app, RunConfig({"capture_logs": True}))
+        self.wait(app_id)
+
+        # echoed in the background
+        self.assertTrue(self.scheduler._echoes[1].flush(timeout=10))
+        echo_mock.assert_called_once_with(1, b"foo\n")
+        replica = self.scheduler._apps[app_id].role_replicas["role1"][0]
+        self.assertEqual(["foo"], none_throws(replica.stdout_buffer).lines())
+
     def test_log_iterator_no_log_dir(self) -> None:
         role = (
             Role("role1", image=self.test_dir)
@@ -447,6 +747,200 @@ class LocalSchedulerTest(unittest.TestCase):
             app_id = self.scheduler.submit(app, RunConfig())
             self.scheduler.log_iter(app_id, "role1", k=0)
 
+    @patch(LOCAL_SCHEDULER_CGROUP2_AVAILABLE, return_value=True)
+    @patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_with_cgroups(
+        self, img_provider_fetch_mock: mock.Mock, cgroup2_available_mock: mock.Mock
+    ) -> None:
+        trainer = Role("trainer", image=self.test_dir).runs("trainer.par").replicas(2)
+        trainer.resource = Resource(cpu=1, gpu=0, memMB=128)
+        app = AppDef(name="test_app").of(trainer)
+        cgroup_root = join(self.test_dir, "cgroup")
+        cfg = RunConfig({"use_cgroups": True, "cgroup_root": cgroup_root})
+        request = self.scheduler.submit_dryrun(app, cfg).request
+
+        self.assertEqual(cgroup_root, request.cgroup_root)
+        for replica_id, replica_param in enumerate(request.role_params["trainer"]):
+            self.assertEqual(
+                join(
+                    cgroup_root,
+                    self.scheduler.session_name,
+                    request.app_id,
+                    "trainer",
+                    str(replica_id),
+                ),
+                replica_param.cgroup,
+            )
+            self.assertEqual(
+                {"cpu.max": "100000 100000", "memory.max": str(128 * 1024 * 1024)},
+                replica_param.cgroup_limits,
+            )
+        # dryrun should NOT create any cgroups
+        self.assertFalse(os.path.exists(cgroup_root))
+
+    def test_submit_dryrun_with_cgroups_invalid(self) -> None:
+        app = AppDef(name="test_app").of(
+            Role("trainer", image=self.test_dir).runs("trainer.par")
+        )
+        with patch(LOCAL_SCHEDULER_CGROUP2_AVAILABLE, return_value=False):
+            with self.assertRaises(InvalidRunConfigException):
+                self.scheduler.submit_dryrun(app, RunConfig({"use_cgroups": True}))
+
+        with patch(LOCAL_SCHEDULER_CGROUP2_AVAILABLE, return_value=True):
+            with self.assertRaises(InvalidRunConfigException):
+                self.scheduler.submit_dryrun(
+                    app, RunConfig({"use_cgroups": True, "image_type": "docker"})
+                )
+
+    @patch(CGROUP_ATTACH_SELF)
+    @patch(LOCAL_SCHEDULER_CGROUP2_AVAILABLE, return_value=True)
+    def test_submit_with_cgroups(
+        self, cgroup2_available_mock: mock.Mock, attach_self_mock: mock.Mock
+    ) -> None:
+        # use a plain directory as a fake cgroup hierarchy
+        cgroup_root = join(self.test_dir, "cgroup")
+        os.makedirs(cgroup_root)
+
+        role = Role("role1", image=self.test_dir).runs("echo_stdout.sh", "hello")
+        role.resource = Resource(cpu=1, gpu=0, memMB=128)
+        app = AppDef(name="test_app").of(role)
+        log_dir = join(self.test_dir, "log")
+        cfg = RunConfig(
+            {"log_dir": log_dir, "use_cgroups": True, "cgroup_root": cgroup_root}
+        )
+        app_id = self.scheduler.submit(app, cfg)
+
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.SUCCEEDED, desc.state)
+
+        replica_cgroup = join(
+            cgroup_root, self.scheduler.session_name, app_id, "role1", "0"
+        )
+        self._assert_file_content(
+            join(replica_cgroup, "memory.max"), str(128 * 1024 * 1024)
+        )
+
+        self.assertEqual(1, len(desc.roles_statuses))
+        replica_status = desc.roles_statuses[0].replicas[0]
+        self.assertEqual(AppState.SUCCEEDED, replica_status.state)
+        self.assertEqual({}, replica_status.resource_usage)
+
+        success_file = join(log_dir, self.scheduler.session_name, app_id, "SUCCESS")
+        with open(success_file, "r") as f:
+            sf_json = json.load(f)
+        self.assertEqual({}, sf_json["roles"]["role1"][0]["resource_usage"])
+
+    def test_submit_with_sample_interval(self) -> None:
+        role = Role("role1", image=self.test_dir).runs("sleep.sh", "1").replicas(2)
+        app = AppDef(name="test_app").of(role)
+        cfg = RunConfig({"log_dir": self.test_dir, "sample_interval": 0.1})
+        app_id = self.scheduler.submit(app, cfg)
+
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.SUCCEEDED, desc.state)
+        replicas = desc.roles_statuses[0].replicas
+        self.assertEqual(2, len(replicas))
+        for replica in replicas:
+            assert replica.usage is not None
+            assert replica.peak_usage is not None
+            self.assertGreater(replica.peak_usage.rss_bytes, 0)
+            self.assertGreaterEqual(replica.peak_usage.num_threads, 1)
+
+    def test_retry_replica(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("fail_once.sh", join(self.test_dir, "marker"))
+            .with_retry_policy(RetryPolicy.REPLICA, max_retries=1)
+        )
+        app = AppDef(name="test_app").of(role)
+        log_dir = join(self.test_dir, "log")
+        cfg = RunConfig({"log_dir": log_dir, "restart_backoff": 0.0})
+        app_id = self.scheduler.submit(app, cfg)
+
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.SUCCEEDED, desc.state)
+        self.assertEqual(1, desc.num_restarts)
+
+        # logs of the failed attempt are rotated
+        replica_log_dir = join(
+            log_dir, self.scheduler.session_name, app_id, "role1", "0"
+        )
+        self._assert_file_content(join(replica_log_dir, "stderr.log"), "attempt\n")
+        self._assert_file_content(
+            join(replica_log_dir, "attempt_0", "stderr.log"), "attempt\n"
+        )
+
+        success_file = join(log_dir, self.scheduler.session_name, app_id, "SUCCESS")
+        with open(success_file, "r") as f:
+            sf_json = json.load(f)
+        self.assertEqual(1, sf_json["num_restarts"])
+        self.assertEqual(1, sf_json["roles"]["role1"][0]["num_restarts"])
+
+    def test_retry_replica_exhausted(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("fail.sh")
+            .replicas(2)
+            .with_retry_policy(RetryPolicy.REPLICA, max_retries=2)
+        )
+        app = AppDef(name="test_app").of(role)
+        cfg = RunConfig({"log_dir": self.test_dir, "restart_backoff": 0.0})
+        app_id = self.scheduler.submit(app, cfg)
+
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.FAILED, desc.state)
+        # each replica is restarted twice
+        self.assertEqual(4, desc.num_restarts)
+
+    def test_retry_application(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("fail_once.sh", join(self.test_dir, f"marker_{macros.replica_id}"))
+            .replicas(2)
+            .with_retry_policy(RetryPolicy.APPLICATION, max_retries=3)
+        )
+        app = AppDef(name="test_app").of(role)
+        cfg = RunConfig({"log_dir": self.test_dir, "restart_backoff": 0.0})
+        app_id = self.scheduler.submit(app, cfg)
+
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.SUCCEEDED, desc.state)
+        self.assertGreaterEqual(desc.num_restarts, 1)
+
+        # the whole app is restarted, hence all replicas have the same restart count
+        local_app = self.scheduler._apps[app_id]
+        replicas = local_app.role_replicas["role1"]
+        for replica in replicas:
+            self.assertEqual(local_app.num_app_restarts, replica.num_restarts)
+
+    def test_retry_cancel_during_backoff(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir)
+            .runs("fail.sh")
+            .with_retry_policy(RetryPolicy.REPLICA, max_retries=1)
+        )
+        app = AppDef(name="test_app").of(role)
+        cfg = RunConfig({"log_dir": self.test_dir, "restart_backoff": 60.0})
+        app_id = self.scheduler.submit(app, cfg)
+
+        local_app = self.scheduler._apps[app_id]
+        local_app.role_replicas["role1"][0].proc.wait()
+        desc = self.scheduler.describe(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.RUNNING, desc.state)
+        self.assertEqual(AppState.PENDING, desc.roles_statuses[0].replicas[0].state)
+
+        self.scheduler.cancel(app_id)
+        desc = self.scheduler.describe(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.CANCELLED, desc.state)
+        self.assertEqual(0, desc.num_restarts)
+
     def test_submit_multiple_roles(self) -> None:
         test_file1 = join(self.test_dir, "test_file_1")
         test_file2 = join(self.test_dir, "test_file_2")
@@ -564,6 +1058,259 @@ class LocalSchedulerTest(unittest.TestCase):
         if not self._has_docker():
             self.skipTest("test requires docker")
 
+    @patch(DOCKER_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_docker_options(self, _: MagicMock) -> None:
+        role = (
+            Role(
+                "trainer",
+                image="pytorch/pytorch:latest",
+                resource=Resource(cpu=2, gpu=0, memMB=1024),
+                port_map={"c10d": 29500},
+            )
+            .runs("main.py")
+            .replicas(2)
+        )
+        app = AppDef(name="test_app").of(role)
+        cfg = RunConfig(
+            {
+                "image_type": "docker",
+                "log_dir": self.test_dir,
+                "shm_size": "8g",
+                "ipc": "host",
+                "mounts": "/data:/data:ro",
+                "container_resources": True,
+            }
+        )
+        request = self.scheduler.submit_dryrun(app, cfg).request
+        app_log_dir = request.log_dir
+        params = request.role_params["trainer"][1]
+        self.assertEqual(
+            ContainerOptions(
+                shm_size=8 * 1024**3,
+                ipc="host",
+                mounts=[("/data", "/data", True), (app_log_dir, app_log_dir, False)],
+                ports=[29500],
+                cpus=2.0,
+                memory=1024 * 1024**2,
+            ),
+            params.container_options,
+        )
+        self.assertEqual(["docker", "run", "-i", "--rm", "--shm-size"], params.args[:5])
+        self.assertIn(f"{app_log_dir}:{app_log_dir}", params.args)
+        self.assertEqual(["pytorch/pytorch:latest", "main.py"], params.args[-2:])
+
+        # not enforced by default
+        cfg = RunConfig({"image_type": "docker"})
+        request = self.scheduler.submit_dryrun(app, cfg).request
+        params = request.role_params["trainer"][0]
+        self.assertIsNone(none_throws(params.container_options).cpus)
+
+        # not containers
+        with patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value=""):
+            request = self.scheduler.submit_dryrun(app, RunConfig()).request
+        self.assertIsNone(request.role_params["trainer"][0].container_options)
+
+    @patch(DOCKER_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_docker_options_invalid(self, _: MagicMock) -> None:
+        role = Role("trainer", image="pytorch/pytorch:latest").runs("main.py")
+        app = AppDef(name="test_app").of(role)
+        for invalid in [{"shm_size": "8gb"}, {"mounts": "data:/data"}]:
+            with self.subTest(cfg=invalid):
+                cfg = RunConfig({"image_type": "docker", **invalid})
+                with self.assertRaises(InvalidRunConfigException):
+                    self.scheduler.submit_dryrun(app, cfg)
+
+    @patch(RDZV_IS_AVAILABLE, return_value=True)
+    @patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_local_rdzv(self, *_: MagicMock) -> None:
+        trainer = create_torch_dist_role(
+            "trainer", "", "a.py", num_replicas=2, port_map={}
+        )
+        reader = create_torch_dist_role("reader", "", "b.py", port_map={})
+        app = AppDef(name="test_app").of(trainer, reader)
+
+        request = self.scheduler.submit_dryrun(app, RunConfig()).request
+        endpoint = f"localhost:{request.rdzv_port}"
+        # a single rendezvous store is hosted for all the roles of the app
+        for params in [*request.role_params["trainer"], *request.role_params["reader"]]:
+            self.assertIn(endpoint, params.args)
+            self.assertNotIn("etcd", params.args)
+            self.assertEqual(endpoint, params.env["TORCHX_RDZV_ENDPOINT"])
+
+        request = self.scheduler.submit_dryrun(
+            app, RunConfig({"local_rdzv": False})
+        ).request
+        self.assertIsNone(request.rdzv_port)
+        self.assertIn("etcd", request.role_params["trainer"][0].args)
+
+        # the containers (not on the host's network) cannot reach the store
+        with patch(DOCKER_IMAGE_PROVIDER_FETCH, return_value=""):
+            request = self.scheduler.submit_dryrun(
+                app, RunConfig({"image_type": "docker"})
+            ).request
+        self.assertIsNone(request.rdzv_port)
+
+    @patch(RDZV_IS_AVAILABLE, return_value=False)
+    @patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_local_rdzv_no_torch(self, *_: MagicMock) -> None:
+        role = create_torch_dist_role("trainer", "", "a.py", port_map={})
+        app = AppDef(name="test_app").of(role)
+        request = self.scheduler.submit_dryrun(app, RunConfig()).request
+        self.assertIsNone(request.rdzv_port)
+        self.assertIn("etcd", request.role_params["trainer"][0].args)
+
+    @patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_allocate_ports(self, _: MagicMock) -> None:
+        role = (
+            Role("server", image="", port_map={"http": 8080, "grpc": 8081})
+            .runs("server.py", "--port", macros.port("http"))
+            .replicas(2)
+        )
+        app = AppDef(name="test_app").of(role)
+        request = self.scheduler.submit_dryrun(app, RunConfig()).request
+
+        ports = set()
+        for params in request.role_params["server"]:
+            http_port = params.env["TORCHX_PORT_HTTP"]
+            self.assertEqual(["server.py", "--port", http_port], params.args)
+            ports.update([int(http_port), int(params.env["TORCHX_PORT_GRPC"])])
+        # each port of each replica is allocated a different free port
+        self.assertEqual(4, len(ports))
+
+        request = self.scheduler.submit_dryrun(
+            app, RunConfig({"allocate_ports": False})
+        ).request
+        params = request.role_params["server"][1]
+        self.assertEqual(["server.py", "--port", "8080"], params.args)
+        self.assertEqual("8081", params.env["TORCHX_PORT_GRPC"])
+
+        # the containers (not on the host's network) do not share ports
+        with patch(DOCKER_IMAGE_PROVIDER_FETCH, return_value=""):
+            request = self.scheduler.submit_dryrun(
+                app, RunConfig({"image_type": "docker"})
+            ).request
+        params = request.role_params["server"][1]
+        self.assertEqual("8080", params.env["TORCHX_PORT_HTTP"])
+
+    @patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_ports_expire(self, _: MagicMock) -> None:
+        role = Role("server", image="", port_map={"http": 8080}).runs("server.py")
+        app = AppDef(name="test_app").of(role)
+        request = self.scheduler.submit_dryrun(app, RunConfig()).request
+        self.assertEqual(1, len(request.ports))
+        self.assertEqual(set(request.ports), self.scheduler._ports.reserved())
+
+        # released if the dryrun is not scheduled
+        with patch(
+            "torchx.schedulers.ports.time.monotonic",
+            return_value=time.monotonic() + DRYRUN_PORTS_TTL,
+        ):
+            self.assertEqual(set(), self.scheduler._ports.reserved())
+
+    def test_allocate_ports_released(self) -> None:
+        role = (
+            Role("role1", image=self.test_dir, port_map={"http": 8080})
+            .runs("echo_stderr.sh", macros.port("http"))
+            .replicas(2)
+        )
+        app = AppDef(name="test_app").of(role)
+        cfg = RunConfig({"log_dir": self.test_dir})
+        app_id = self.scheduler.submit(app, cfg)
+        ports = self.scheduler._ports.reserved()
+        self.assertEqual(2, len(ports))
+        self.wait(app_id)
+
+        echoed = {
+            int(line)
+            for replica_id in range(2)
+            for line in self.scheduler.log_iter(app_id, "role1", k=replica_id)
+        }
+        self.assertEqual(ports, echoed)
+        # the ports are released once the app finishes
+        self.assertEqual(set(), self.scheduler._ports.reserved())
+
+    def _python_app(self, script: str, *args: str) -> AppDef:
+        os.symlink(sys.executable, join(self.test_dir, "python"))
+        with open(join(self.test_dir, "main.py"), "w") as f:
+            f.write(script)
+        role = Role("role1", image=self.test_dir).runs(
+            "python", join(macros.img_root, "main.py"), *args
+        )
+        return AppDef(name="test_app").of(role.replicas(2))
+
+    def test_submit_forkserver(self) -> None:
+        app = self._python_app(
+            "import os, sys\n"
+            "print(sys.argv[1], file=sys.stderr)\n"
+            "sys.exit(int(os.environ['TORCHX_EXIT_CODE']))\n",
+            macros.replica_id,
+        )
+        app.roles[0].env["TORCHX_EXIT_CODE"] = "3"
+        cfg = RunConfig(
+            {"log_dir": self.test_dir, "forkserver": True, "forkserver_preload": "json"}
+        )
+        app_id = self.scheduler.submit(app, cfg)
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.FAILED, desc.state)
+
+        local_app = self.scheduler._apps[app_id]
+        for replica_id, replica in enumerate(local_app.role_replicas["role1"]):
+            self.assertIsInstance(replica.proc, ForkedProcess)
+            self.assertEqual(3, replica.proc.returncode)
+            lines = list(self.scheduler.log_iter(app_id, "role1", k=replica_id))
+            self.assertEqual([str(replica_id)], lines)
+        self.assertEqual(1, len(self.scheduler._forkservers))
+
+    def test_submit_forkserver_restart(self) -> None:
+        marker = join(self.test_dir, "marker")
+        app = self._python_app(
+            "import os, sys\n"
+            "if not os.path.exists(sys.argv[1]):\n"
+            "    open(sys.argv[1], 'w').close()\n"
+            "    sys.exit(1)\n",
+            marker,
+        )
+        app.roles[0].num_replicas = 1
+        app.roles[0].max_retries = 1
+        cfg = RunConfig(
+            {"log_dir": self.test_dir, "forkserver": True, "restart_backoff": 0.1}
+        )
+        app_id = self.scheduler.submit(app, cfg)
+        desc = self.wait(app_id)
+        assert desc is not None
+        self.assertEqual(AppState.SUCCEEDED, desc.state)
+        self.assertEqual(1, self.scheduler._apps[app_id].num_restarts)
+
+    @patch(LOCAL_DIR_IMAGE_PROVIDER_FETCH, return_value="")
+    def test_submit_dryrun_forkserver(self, _: MagicMock) -> None:
+        role = Role("role1", image="").runs("python", "main.py")
+        shell_role = Role("role2", image="").runs("main.sh")
+        app = AppDef(name="test_app").of(role, shell_role)
+
+        cfg = RunConfig({"forkserver": True, "forkserver_preload": "torch, numpy"})
+        request = self.scheduler.submit_dryrun(app, cfg).request
+        self.assertEqual(
+            ["torch", "numpy"], request.role_params["role1"][0].forkserver_preload
+        )
+        self.assertIsNone(request.role_params["role2"][0].forkserver_preload)
+
+        request = self.scheduler.submit_dryrun(app, RunConfig()).request
+        self.assertIsNone(request.role_params["role1"][0].forkserver_preload)
+
+    @patch(RDZV_STORE)
+    def test_schedule_local_rdzv(self, store_cls: MagicMock) -> None:
+        role = Role("role1", image=self.test_dir).runs("echo_range.sh", "1", "0")
+        app = AppDef(name="test_app").of(role)
+        dryrun_info = self.scheduler.submit_dryrun(app, RunConfig())
+        dryrun_info.request.rdzv_port = 1234
+
+        app_id = self.scheduler.schedule(dryrun_info)
+        store_cls.assert_called_once_with(1234)
+        self.wait(app_id)
+        # the store is shut down once the app finishes
+        store_cls.return_value.close.assert_called_once()
+
     def test_docker_submit(self) -> None:
         self._skip_unless_docker()
 
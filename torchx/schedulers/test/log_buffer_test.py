@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import threading
+import unittest
+import unittest.mock as mock
+from unittest.mock import patch
+
+from torchx.schedulers.log_buffer import ConsoleEcho, LogBuffer, echo
+
+
+class LogBufferTest(unittest.TestCase):
+    def test_write(self) -> None:
+        buffer = LogBuffer()
+        buffer.write(b"foo\nba")
+        self.assertEqual(["foo"], buffer.lines())
+        buffer.write(b"r\n\nbaz")
+        self.assertEqual(["foo", "bar", ""], buffer.lines())
+        buffer.flush()
+        self.assertEqual(["foo", "bar", "", "baz"], buffer.lines())
+        buffer.flush()  # noop
+        self.assertEqual(["foo", "bar", "", "baz"], buffer.lines())
+
+    def test_write_invalid_utf8(self) -> None:
+        buffer = LogBuffer()
+        buffer.write(b"\xff\n")
+        self.assertEqual(["�"], buffer.lines())
+
+    @patch("torchx.schedulers.log_buffer.MAX_LINE_BYTES", 4)
+    def test_write_long_line(self) -> None:
+        buffer = LogBuffer()
+        buffer.write(b"0123456789")
+        self.assertEqual(["0123", "4567"], buffer.lines())
+        buffer.flush()
+        self.assertEqual(["0123", "4567", "89"], buffer.lines())
+
+    def test_get(self) -> None:
+        buffer = LogBuffer(max_lines=2)
+        self.assertEqual((0, None), buffer.get(0))
+
+        buffer.write(b"0\n1\n")
+        self.assertEqual((0, "0"), buffer.get(0))
+        self.assertEqual((1, "1"), buffer.get(1))
+        self.assertEqual((2, None), buffer.get(2))
+
+        buffer.write(b"2\n3\n")
+        # lines 0 and 1 were dropped
+        self.assertEqual((2, "2"), buffer.get(0))
+        self.assertEqual((3, "3"), buffer.get(3))
+        self.assertEqual(["2", "3"], buffer.lines())
+
+    def test_wait(self) -> None:
+        buffer = LogBuffer()
+        self.assertFalse(buffer.wait(0, timeout=0.01))
+
+        t = threading.Timer(0.1, buffer.write, args=(b"foo\n",))
+        t.start()
+        self.assertTrue(buffer.wait(0, timeout=10))
+        t.join()
+        self.assertFalse(buffer.wait(1, timeout=0.01))
+
+    def test_echo(self) -> None:
+        r, w = os.pipe()
+        echo(w, b"foobar")
+        os.close(w)
+        with os.fdopen(r, "rb") as f:
+            self.assertEqual(b"foobar", f.read())
+
+    def test_console_echo(self) -> None:
+        r, w = os.pipe()
+        console = ConsoleEcho(w)
+        console.write(b"foo")
+        console.write(b"bar")
+        self.assertTrue(console.flush(timeout=10))
+        console.stop()
+        os.close(w)
+        with os.fdopen(r, "rb") as f:
+            self.assertEqual(b"foobar", f.read())
+
+    def test_console_echo_broken(self) -> None:
+        r, w = os.pipe()
+        os.close(r)
+        console = ConsoleEcho(w)
+        # EPIPE (SIGPIPE is ignored by python) disables the echo, never raises
+        console.write(b"foo")
+        self.assertTrue(console.flush(timeout=10))
+        self.assertTrue(console.disabled)
+        console.write(b"bar")
+        console.stop()
+        os.close(w)
+
+    def test_console_echo_slow(self) -> None:
+        r, w = os.pipe()
+        console = ConsoleEcho(w, max_pending_bytes=8)
+        with mock.patch("torchx.schedulers.log_buffer.echo") as echo_mock:
+            blocked = threading.Event()
+            echo_mock.side_effect = lambda fd, data: blocked.wait(10)
+            console.write(b"foo")
+            console.write(b"barbaz")  # dropped
+            self.assertEqual(6, console.dropped_bytes)
+            blocked.set()
+            self.assertTrue(console.flush(timeout=10))
+        console.stop()
+        os.close(r)
+        os.close(w)
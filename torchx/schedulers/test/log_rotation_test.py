@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from os.path import join
+from typing import List
+
+from torchx.schedulers.log_rotation import (
+    LogPump,
+    RotatingLogWriter,
+    check_compression,
+    gc_app_log_dirs,
+    open_segment,
+    rotated_segments,
+)
+
+
+HAS_ZSTD: bool = importlib.util.find_spec("zstandard") is not None
+
+
+def _write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class LogRotationTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix=f"{self.__class__.__name__}_")
+        self.log_file = join(self.test_dir, "stderr.log")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def _read_all(self) -> List[str]:
+        lines = []
+        for _, segment in rotated_segments(self.log_file):
+            with open_segment(segment) as f:
+                lines += f.read().splitlines()
+        with open(self.log_file, "r") as f:
+            lines += f.read().splitlines()
+        return lines
+
+    def _assert_rotated(self, compression: str, suffix: str) -> None:
+        writer = RotatingLogWriter(self.log_file, max_bytes=10, compression=compression)
+        for i in range(10):
+            writer.write(f"line{i}\n".encode())
+        writer.close()
+
+        segments = rotated_segments(self.log_file)
+        self.assertEqual(list(range(1, 6)), [i for i, _ in segments])
+        for _, segment in segments:
+            self.assertTrue(segment.endswith(suffix), segment)
+        self.assertEqual([f"line{i}" for i in range(10)], self._read_all())
+
+    def test_rotate_gzip(self) -> None:
+        self._assert_rotated("gzip", ".gz")
+
+    def test_rotate_none(self) -> None:
+        self._assert_rotated("none", "")
+
+    @unittest.skipUnless(HAS_ZSTD, "zstandard is not installed")
+    def test_rotate_zstd(self) -> None:
+        self._assert_rotated("zstd", ".zst")
+
+    def test_rotate_on_line_boundary(self) -> None:
+        writer = RotatingLogWriter(self.log_file, max_bytes=8, compression="none")
+        writer.write(b"abc")
+        writer.write(b"defghijk")  # no newline, line is kept whole
+        writer.write(b"l\nmn")
+        writer.write(b"o\n")
+        writer.close()
+
+        self.assertEqual(["abcdefghijkl", "mno"], self._read_all())
+        self.assertEqual(1, len(rotated_segments(self.log_file)))
+
+    def test_writer_file_exists(self) -> None:
+        _write(self.log_file, "")
+        with self.assertRaises(FileExistsError):
+            RotatingLogWriter(self.log_file, max_bytes=10)
+
+    def test_rotated_segments_prefers_compressed(self) -> None:
+        _write(f"{self.log_file}.2", "")
+        _write(f"{self.log_file}.1", "")
+        _write(f"{self.log_file}.1.gz", "")
+        _write(f"{self.log_file}.2.gz.tmp", "")
+        _write(join(self.test_dir, "stdout.log.1"), "")
+        self.assertEqual(
+            [(1, f"{self.log_file}.1.gz"), (2, f"{self.log_file}.2")],
+            rotated_segments(self.log_file),
+        )
+        self.assertEqual([], rotated_segments(join(self.test_dir, "foo", "bar.log")))
+
+    def test_check_compression(self) -> None:
+        check_compression("none")
+        check_compression("gzip")
+        with self.assertRaises(ValueError):
+            check_compression("lz4")
+
+    def test_log_pump(self) -> None:
+        pump = LogPump()
+        r, w = os.pipe()
+        writer = RotatingLogWriter(
+            self.log_file, max_bytes=10, compression="gzip", executor=pump.executor
+        )
+        pumped = pump.add(os.fdopen(r, "rb"), writer.write, writer.close, "test")
+        with os.fdopen(w, "wb") as f:
+            for i in range(10):
+                f.write(f"line{i}\n".encode())
+                f.flush()
+
+        self.assertTrue(pumped.wait(timeout=10))
+        pump.stop()
+        self.assertEqual([f"line{i}" for i in range(10)], self._read_all())
+
+    def test_log_pump_remove(self) -> None:
+        pump = LogPump()
+        r, w = os.pipe()
+        writer = RotatingLogWriter(self.log_file, max_bytes=10)
+        pumped = pump.add(os.fdopen(r, "rb"), writer.write, writer.close, "test")
+        # the write end is never closed
+        pump.remove(pumped)
+        self.assertTrue(pumped.wait(timeout=0))
+        pumped.close()  # noop
+        pump.stop()
+        os.close(w)
+
+    def test_gc_app_log_dirs(self) -> None:
+        session_dir = join(self.test_dir, "session")
+        for app_id in ["app1", "app2", "app3"]:
+            _write(join(session_dir, app_id, "role", "0", "stderr.log"), "x" * 100)
+            _write(join(session_dir, app_id, "SUCCESS"), "")
+            # make sure the apps have different finish times
+            time.sleep(0.01)
+        # running (no SUCCESS file)
+        _write(join(session_dir, "app0", "role", "0", "stderr.log"), "x" * 100)
+
+        self.assertEqual([], gc_app_log_dirs(session_dir, quota_bytes=400))
+        self.assertEqual(
+            [join(session_dir, "app1"), join(session_dir, "app2")],
+            gc_app_log_dirs(session_dir, quota_bytes=250),
+        )
+        # running apps are never deleted
+        self.assertEqual(
+            [join(session_dir, "app3")], gc_app_log_dirs(session_dir, quota_bytes=0)
+        )
+        self.assertEqual(["app0"], os.listdir(session_dir))
+        self.assertEqual([], gc_app_log_dirs(join(self.test_dir, "none"), 0))
+
+    def test_gc_app_log_dirs_finished_at(self) -> None:
+        session_dir = join(self.test_dir, "session")
+        for app_id, finished_at in [("old", 1000), ("new", 2000)]:
+            _write(join(session_dir, app_id, "role", "0", "stderr.log"), "x" * 100)
+            _write(
+                join(session_dir, app_id, "SUCCESS"),
+                json.dumps({"app_id": app_id, "finished_at": finished_at}),
+            )
+        # the SUCCESS file of the old app is touched after the new one
+        os.utime(join(session_dir, "new", "SUCCESS"), (3000, 3000))
+        os.utime(join(session_dir, "old", "SUCCESS"), (4000, 4000))
+
+        self.assertEqual(
+            [join(session_dir, "old")], gc_app_log_dirs(session_dir, quota_bytes=150)
+        )
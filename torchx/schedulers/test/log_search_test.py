@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import shutil
+import tempfile
+import unittest
+from os.path import join
+from typing import List, Tuple
+
+from torchx.schedulers.log_rotation import compress_file
+from torchx.schedulers.log_search import (
+    build_trigram_index,
+    find_log_files,
+    index_path,
+    may_contain,
+    required_literal,
+    search_file,
+    search_logs,
+)
+
+
+def _write(path: str, content: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(content)
+
+
+class LogSearchTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix=f"{self.__class__.__name__}_")
+        self.session_log_dir = join(self.test_dir, "session")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.test_dir)
+
+    def _replica_dir(self, app_id: str, role_name: str, replica_id: int) -> str:
+        return join(self.session_log_dir, app_id, role_name, str(replica_id))
+
+    def test_required_literal(self) -> None:
+        self.assertEqual(b"timeout", required_literal("NCCL.*timeout"))
+        self.assertEqual(b"ERROR", required_literal("^ERROR"))
+        self.assertEqual(b"watchdog", required_literal("(watchdog) \\d+"))
+        self.assertIsNone(required_literal("a|b"))
+        self.assertIsNone(required_literal("(?i)foo"))
+        self.assertIsNone(required_literal("\\d+"))
+        self.assertIsNone(required_literal("("))
+
+    def test_trigram_index(self) -> None:
+        log_file = join(self.test_dir, "stderr.log")
+        _write(log_file, "NCCL watchdog timeout\nfoo\n")
+
+        # no index -> cannot rule out
+        self.assertTrue(may_contain(log_file, b"missing"))
+
+        self.assertEqual(index_path(log_file), build_trigram_index(log_file))
+        self.assertTrue(os.path.isfile(index_path(log_file)))
+        self.assertTrue(may_contain(log_file, b"watchdog"))
+        self.assertTrue(may_contain(log_file, b"out\nfoo"))
+        self.assertFalse(may_contain(log_file, b"missing"))
+        # too short to look up
+        self.assertTrue(may_contain(log_file, b"zz"))
+
+        # stale index -> cannot rule out
+        _write(log_file, "missing\n")
+        os.utime(index_path(log_file), (0, 0))
+        self.assertTrue(may_contain(log_file, b"missing"))
+
+    def test_find_log_files(self) -> None:
+        replica_dir = self._replica_dir("app_1", "trainer", 0)
+        _write(join(replica_dir, "stderr.log"), "a\n")
+        _write(join(replica_dir, "stdout.log"), "b\n")
+        _write(join(replica_dir, "stderr.log.1"), "c\n")
+        compress_file(join(replica_dir, "stderr.log.1"), "gzip")
+        _write(join(replica_dir, "attempt_0", "stderr.log"), "d\n")
+        _write(join(replica_dir, "error.json"), "{}")
+        _write(join(self._replica_dir("app_2", "master", 0), "stdout.log"), "e\n")
+
+        self.assertEqual(
+            [
+                ("app_1", "trainer", 0, join(replica_dir, "attempt_0", "stderr.log")),
+                ("app_1", "trainer", 0, join(replica_dir, "stderr.log")),
+                ("app_1", "trainer", 0, join(replica_dir, "stderr.log.1.gz")),
+                ("app_1", "trainer", 0, join(replica_dir, "stdout.log")),
+                (
+                    "app_2",
+                    "master",
+                    0,
+                    join(self._replica_dir("app_2", "master", 0), "stdout.log"),
+                ),
+            ],
+            find_log_files(self.session_log_dir),
+        )
+        self.assertEqual(
+            ["app_2"], [f[0] for f in find_log_files(self.session_log_dir, ["app_2"])]
+        )
+        self.assertEqual([], find_log_files(join(self.test_dir, "nonexistent")))
+
+    def test_search_file(self) -> None:
+        log_file = join(self.test_dir, "stderr.log")
+        _write(log_file, "foo\nNCCL timeout 1\nbar\ntimeout\nNCCL timeout 2")
+        expected = [(2, "NCCL timeout 1"), (5, "NCCL timeout 2")]
+
+        literal = required_literal("NCCL.*timeout")
+        self.assertEqual(expected, search_file(log_file, "NCCL.*timeout", literal))
+        self.assertEqual(expected, search_file(log_file, "NCCL.*timeout", None))
+
+        compress_file(log_file, "gzip")
+        self.assertEqual(
+            expected, search_file(log_file + ".gz", "NCCL.*timeout", literal)
+        )
+
+        empty_file = join(self.test_dir, "stdout.log")
+        _write(empty_file, "")
+        self.assertEqual([], search_file(empty_file, "foo", b"foo"))
+
+    def test_search_file_indexed(self) -> None:
+        log_file = join(self.test_dir, "stderr.log")
+        _write(log_file, "foo\n")
+        build_trigram_index(log_file)
+        # the index rules out the file without it being read
+        os.utime(log_file, (0, 0))
+        with open(log_file, "a") as f:
+            f.write("bar\n")
+        os.utime(log_file, (0, 0))
+        self.assertEqual([], search_file(log_file, "bar", b"bar"))
+        self.assertEqual([(2, "bar")], search_file(log_file, "bar", b"bar", False))
+
+    def test_search_logs(self) -> None:
+        for app_id in ["app_1", "app_2"]:
+            for replica_id in range(2):
+                _write(
+                    join(
+                        self._replica_dir(app_id, "trainer", replica_id), "stderr.log"
+                    ),
+                    f"start\n{app_id} {replica_id} error\nend\n",
+                )
+
+        def search(*args: object, **kwargs: object) -> List[Tuple[str, int, int, str]]:
+            return sorted(
+                (m.app_id, m.replica_id, m.line_no, m.line)
+                # pyre-ignore [6]
+                for m in search_logs(self.session_log_dir, *args, **kwargs)
+            )
+
+        self.assertEqual(
+            [
+                ("app_1", 0, 2, "app_1 0 error"),
+                ("app_1", 1, 2, "app_1 1 error"),
+                ("app_2", 0, 2, "app_2 0 error"),
+                ("app_2", 1, 2, "app_2 1 error"),
+            ],
+            search("error$", max_workers=2),
+        )
+        self.assertEqual(
+            [("app_2", 1, 2, "app_2 1 error")],
+            search("1 err", app_ids=["app_2"], max_workers=1),
+        )
+        self.assertEqual([], search("nomatch", max_workers=1))
+        self.assertEqual([], list(search_logs(join(self.test_dir, "none"), "foo")))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import socket
+import unittest
+from unittest.mock import MagicMock, patch
+
+from torchx.schedulers.ports import PortAllocator, free_port, port_env_var
+
+
+class PortsTest(unittest.TestCase):
+    def test_free_port(self) -> None:
+        port = free_port()
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.bind(("localhost", port))
+
+    def test_port_env_var(self) -> None:
+        self.assertEqual("TORCHX_PORT_HTTP", port_env_var("http"))
+        self.assertEqual("TORCHX_PORT_MODEL_DOWNLOAD", port_env_var("model-download"))
+
+    @patch("torchx.schedulers.ports.free_port")
+    def test_allocate_skips_reserved(self, free_port_mock: MagicMock) -> None:
+        # the OS hands out the same ephemeral port again
+        free_port_mock.side_effect = [1000, 1000, 1000, 1001]
+        allocator = PortAllocator()
+        self.assertEqual(1000, allocator.allocate("app1"))
+        self.assertEqual(1001, allocator.allocate("app2"))
+        self.assertEqual({1000, 1001}, allocator.reserved())
+
+    def test_release(self) -> None:
+        allocator = PortAllocator()
+        ports = {allocator.allocate("app1") for _ in range(3)}
+        port2 = allocator.allocate("app2")
+        self.assertEqual(3, len(ports))
+        self.assertNotIn(port2, ports)
+
+        allocator.release("app1")
+        allocator.release("app1")
+        self.assertEqual({port2}, allocator.reserved())
+
+    @patch("torchx.schedulers.ports.time.monotonic")
+    def test_expire(self, monotonic_mock: MagicMock) -> None:
+        monotonic_mock.return_value = 100.0
+        allocator = PortAllocator()
+        port1 = allocator.allocate("dryrun1")
+        port2 = allocator.allocate("dryrun2")
+        allocator.expire("dryrun1", 10)
+        allocator.expire("dryrun2", 10)
+        allocator.claim("dryrun2", [port2])
+        self.assertEqual({port1, port2}, allocator.reserved())
+
+        # the unclaimed ports are released once expired
+        monotonic_mock.return_value = 110.0
+        self.assertEqual({port2}, allocator.reserved())
+        # claiming expired ports reserves them again
+        allocator.claim("dryrun1", [port1])
+        monotonic_mock.return_value = 200.0
+        self.assertEqual({port1, port2}, allocator.reserved())
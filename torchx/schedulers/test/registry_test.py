@@ -10,6 +10,7 @@ from typing import Any, Dict, Optional
 from unittest.mock import MagicMock, patch
 
 from torchx.schedulers import get_schedulers
+from torchx.schedulers.inline_scheduler import InlineScheduler
 from torchx.schedulers.local_scheduler import LocalScheduler
 
 
@@ -29,6 +30,7 @@ class SchedulersTest(unittest.TestCase):
         schedulers = get_schedulers(session_name="test_session")
         self.assertTrue(isinstance(schedulers["local"], LocalScheduler))
         self.assertTrue(isinstance(schedulers["default"], LocalScheduler))
+        self.assertTrue(isinstance(schedulers["inline"], InlineScheduler))
 
         self.assertEquals("test_session", schedulers["local"].session_name)
         self.assertEquals("test_session", schedulers["default"].session_name)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import subprocess
+import time
+import unittest
+
+from torchx.schedulers.resource_sampler import (
+    ResourceSampler,
+    UsageHistory,
+    _Tracked,
+    _proc_tree,
+)
+from torchx.specs.api import ResourceUsage
+
+
+class UsageHistoryTest(unittest.TestCase):
+    def test_empty(self) -> None:
+        history = UsageHistory()
+        self.assertIsNone(history.current())
+        self.assertIsNone(history.peak())
+        self.assertEqual([], history.samples())
+
+    def test_ring_buffer_and_peak(self) -> None:
+        history = UsageHistory(maxlen=2)
+        s0 = ResourceUsage(rss_bytes=10, cpu_percent=90.0, num_threads=1)
+        s1 = ResourceUsage(rss_bytes=30, cpu_percent=10.0, num_threads=2)
+        s2 = ResourceUsage(rss_bytes=20, cpu_percent=50.0, num_threads=1)
+        for s in [s0, s1, s2]:
+            history.add(s)
+
+        self.assertEqual(s2, history.current())
+        self.assertEqual([s1, s2], history.samples())
+        self.assertEqual(
+            ResourceUsage(rss_bytes=30, cpu_percent=90.0, num_threads=2),
+            history.peak(),
+        )
+
+
+class ResourceSamplerTest(unittest.TestCase):
+    def test_proc_tree(self) -> None:
+        proc = subprocess.Popen(["/bin/sh", "-c", "sleep 10 & wait"])
+        try:
+            # give the shell a chance to fork the child
+            for _ in range(50):
+                tree = _proc_tree(proc.pid)
+                if len(tree) > 1:
+                    break
+                time.sleep(0.1)
+            self.assertEqual(proc.pid, tree[0])
+            self.assertEqual(2, len(tree))
+        finally:
+            proc.kill()
+            proc.wait()
+
+    def test_sample(self) -> None:
+        sampler = ResourceSampler()
+        history = UsageHistory()
+        tracked = _Tracked(os.getpid(), interval=1, history=history)
+        self.assertTrue(sampler.sample(tracked))
+        self.assertTrue(sampler.sample(tracked))
+
+        usage = history.current()
+        assert usage is not None
+        self.assertGreater(usage.rss_bytes, 0)
+        self.assertGreaterEqual(usage.num_threads, 1)
+        self.assertEqual(2, len(history.samples()))
+
+    def test_sample_exited(self) -> None:
+        proc = subprocess.Popen(["true"])
+        proc.wait()
+        tracked = _Tracked(proc.pid, interval=1, history=UsageHistory())
+        self.assertFalse(ResourceSampler().sample(tracked))
+
+    def test_track(self) -> None:
+        sampler = ResourceSampler()
+        proc = subprocess.Popen(["sleep", "1"])
+        history = UsageHistory()
+        try:
+            sampler.track(proc.pid, 0.1, history)
+            proc.wait()
+            # the exited process is untracked automatically
+            for _ in range(50):
+                if proc.pid not in sampler._tracked:
+                    break
+                time.sleep(0.1)
+            self.assertNotIn(proc.pid, sampler._tracked)
+            self.assertGreater(len(history.samples()), 1)
+        finally:
+            sampler.stop()
@@ -10,6 +10,7 @@ import argparse
 import copy
 import inspect
 import json
+import re
 from dataclasses import asdict, dataclass, field
 from enum import Enum
 from string import Template
@@ -22,6 +23,7 @@ from typing import (
     List,
     Mapping,
     Optional,
+    Pattern,
     Tuple,
     Type,
     TypeVar,
@@ -105,6 +107,9 @@ class macros:
                         as the one it is replacing. For instance if node 1 failed and
                         was replaced by the scheduler the replacing node will also
                         have ``replica_id=1``.
+    5. ``port:<name>`` - (use ``macros.port(name)``) the port of the role's
+                         ``port_map[name]``. Schedulers that allocate the ports
+                         (e.g. ``local``) substitute the port allocated to the replica.
 
     Example:
 
@@ -122,6 +127,13 @@ class macros:
     app_id = "${app_id}"
     replica_id = "${replica_id}"
 
+    @staticmethod
+    def port(name: str) -> str:
+        """
+        Returns the macro of the port ``name`` in the role's ``port_map``.
+        """
+        return f"${{port:{name}}}"
+
     @dataclass
     class Values:
         img_root: str
@@ -134,8 +146,12 @@ class macros:
             apply applies the values to a copy the specified role and returns it.
             """
             role = copy.deepcopy(role)
-            role.args = [self.substitute(arg) for arg in role.args]
-            role.env = {key: self.substitute(arg) for key, arg in role.env.items()}
+            ports = role.port_map
+            role.args = [self.substitute(_sub_ports(arg, ports)) for arg in role.args]
+            role.env = {
+                key: self.substitute(_sub_ports(arg, ports))
+                for key, arg in role.env.items()
+            }
             return role
 
         def substitute(self, arg: str) -> str:
@@ -145,6 +161,19 @@ class macros:
             return Template(arg).safe_substitute(**asdict(self))
 
 
+_PORT_MACRO: Pattern[str] = re.compile(r"\$\{port:([^}]+)\}")
+
+
+def _sub_ports(arg: str, ports: Dict[str, int]) -> str:
+    """
+    Substitutes the ``${port:<name>}`` macros in ``arg`` with the ``ports``
+    (the macros of the unknown ports are left as is).
+    """
+    return _PORT_MACRO.sub(
+        lambda m: str(ports[m.group(1)]) if m.group(1) in ports else m.group(0), arg
+    )
+
+
 class RetryPolicy(str, Enum):
     """
     Defines the retry policy for the ``Roles`` in the ``AppDef``.
@@ -363,6 +392,28 @@ def is_terminal(state: AppState) -> bool:
 ReplicaState = AppState
 
 
+@dataclass
+class ResourceUsage:
+    """
+    A point-in-time sample of the resources used by a replica
+    (including all of its child processes).
+
+    Args:
+        rss_bytes: resident set size
+        cpu_percent: cpu utilization since the previous sample
+            (100% == one fully utilized core)
+        io_read_bytes: cumulative bytes read from storage
+        io_write_bytes: cumulative bytes written to storage
+        num_threads: number of threads
+    """
+
+    rss_bytes: int = 0
+    cpu_percent: float = 0.0
+    io_read_bytes: int = 0
+    io_write_bytes: int = 0
+    num_threads: int = 0
+
+
 @dataclass
 class ReplicaStatus:
     """
@@ -374,6 +425,11 @@ class ReplicaStatus:
         role: The role name
         hostname: The hostname where the replica is running
         structured_error_msg: Error message if any, None if job succeeded.
+        resource_usage: Scheduler reported resource accounting counters
+            (e.g. ``memory_peak_bytes``, ``cpu_usage_usec``, ``oom_kill``).
+            Empty if the scheduler does not do resource accounting.
+        usage: Most recent resource usage sample, None if not sampled.
+        peak_usage: Per-metric peak of the resource usage samples, None if not sampled.
     """
 
     id: int
@@ -381,6 +437,9 @@ class ReplicaStatus:
     role: str
     hostname: str
     structured_error_msg: str = NONE
+    resource_usage: Dict[str, int] = field(default_factory=dict)
+    usage: Optional[ResourceUsage] = None
+    peak_usage: Optional[ResourceUsage] = None
 
 
 @dataclass
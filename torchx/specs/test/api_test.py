@@ -368,6 +368,18 @@ class MacrosTest(unittest.TestCase):
         self.assertEqual(newrole.args, ["img_root"])
         self.assertEqual(newrole.env, {"FOO": "app_id"})
 
+    def test_apply_ports(self) -> None:
+        role = Role(name="test", image="test_image", port_map={"http": 8080}).runs(
+            "foo.py",
+            f"--port={macros.port('http')}",
+            macros.port("unknown"),
+            HTTP_PORT=macros.port("http"),
+        )
+        v = macros.Values(img_root="img_root", app_id="app_id", replica_id="0")
+        newrole = v.apply(role)
+        self.assertEqual(newrole.args, ["--port=8080", "${port:unknown}"])
+        self.assertEqual(newrole.env, {"HTTP_PORT": "8080"})
+
 
 def get_dummy_application(role: str) -> AppDef:
     trainer = Role(role, "test_image").runs("main_script.py", "--train").replicas(2)
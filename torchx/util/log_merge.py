@@ -0,0 +1,186 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Merges the log lines of several (e.g. per-replica) log iterators into a
+single stream ordered by the timestamps of the lines.
+"""
+
+import heapq
+import itertools
+import math
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from queue import Empty, Queue
+from typing import (
+    Callable,
+    Deque,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+
+K = TypeVar("K")
+
+# max number of lines read ahead (and buffered) per source
+DEFAULT_LOOKAHEAD: int = 128
+
+# max time (in seconds) to wait for a source that has no lines buffered
+# before emitting the lines of the other sources
+DEFAULT_MAX_DELAY: float = 1.0
+
+# ISO 8601 (2021-06-01T12:00:00.123) or python logging (2021-06-01 12:00:00,123)
+_ISO_TIMESTAMP: Pattern[str] = re.compile(
+    r"^\W{0,2}(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:[.,](\d{1,6}))?"
+)
+# glog (I0601 12:00:00.123456)
+_GLOG_TIMESTAMP: Pattern[str] = re.compile(
+    r"^[IWEF](\d{2})(\d{2}) (\d{2}:\d{2}:\d{2})(?:\.(\d{1,6}))?"
+)
+
+
+def _fraction(digits: Optional[str]) -> float:
+    return int(digits) / 10 ** len(digits) if digits else 0.0
+
+
+def parse_timestamp(line: str) -> Optional[float]:
+    """
+    Returns the timestamp (seconds since epoch, local time) that the line
+    starts with or ``None`` if the line does not start with a timestamp.
+    Recognizes ISO 8601, python ``logging`` (default format) and glog timestamps.
+    """
+    m = _ISO_TIMESTAMP.match(line)
+    try:
+        if m:
+            date, hms, frac = m.groups()
+            ts = datetime.strptime(f"{date} {hms}", "%Y-%m-%d %H:%M:%S")
+            return ts.timestamp() + _fraction(frac)
+
+        m = _GLOG_TIMESTAMP.match(line)
+        if m:
+            month, day, hms, frac = m.groups()
+            # glog does not log the year
+            year = datetime.now().year
+            ts = datetime.strptime(f"{year}-{month}-{day} {hms}", "%Y-%m-%d %H:%M:%S")
+            return ts.timestamp() + _fraction(frac)
+    except ValueError:
+        pass  # looks like but is not a valid timestamp
+    return None
+
+
+class _Error:
+    def __init__(self, e: Exception) -> None:
+        self.e = e
+
+
+_EOF = object()
+
+
+def merge_logs(
+    sources: Sequence[Tuple[K, Iterable[str]]],
+    timestamp_fn: Callable[[str], Optional[float]] = parse_timestamp,
+    lookahead: int = DEFAULT_LOOKAHEAD,
+    max_delay: float = DEFAULT_MAX_DELAY,
+) -> Iterator[Tuple[K, str]]:
+    """
+    Returns the ``(key, line)`` of the lines of all the ``(key, lines)`` sources
+    ordered by the timestamp of the lines (k-way heap merge). Lines without a
+    timestamp (e.g. stack traces) take the timestamp of the previous line of
+    the same source so that they stay with the line they belong to. Ties are
+    broken by the order of the sources.
+
+    Each source is read on its own thread (the sources may block, e.g. when
+    following the logs of a running app) at most ``lookahead`` lines ahead of
+    the merged output, hence the memory is bounded by ``O(len(sources) * lookahead)``
+    regardless of the size of the logs. A line is emitted once every other
+    (not exhausted) source has a line buffered or has been idle (no line buffered)
+    for ``max_delay`` seconds. Hence lines written by a source after being
+    idle for more than ``max_delay`` may be emitted out of order.
+
+    Exceptions raised by the sources are re-raised by the returned iterator.
+    """
+    # (source index, line | _EOF | _Error)
+    lines: "Queue[Tuple[int, object]]" = Queue()
+    slots = [threading.Semaphore(lookahead) for _ in sources]
+
+    def read(i: int, source: Iterable[str]) -> None:
+        try:
+            for line in source:
+                slots[i].acquire()
+                lines.put((i, line))
+            lines.put((i, _EOF))
+        except Exception as e:
+            lines.put((i, _Error(e)))
+
+    for i, (_, source) in enumerate(sources):
+        threading.Thread(
+            target=read, args=(i, source), name=f"torchx_log_merge_{i}", daemon=True
+        ).start()
+
+    buffered: List[Deque[Tuple[float, str]]] = [deque() for _ in sources]
+    last_ts = [-math.inf] * len(sources)
+    exhausted: Set[int] = set()
+    # time at which a (not exhausted) source ran out of buffered lines
+    idle_since = {i: time.monotonic() for i in range(len(sources))}
+    # (timestamp, source index, seq, line) of the first buffered line of each source
+    heads: List[Tuple[float, int, int, str]] = []
+    seq = itertools.count()
+
+    def buffer(i: int, item: object) -> None:
+        if item is _EOF:
+            exhausted.add(i)
+            idle_since.pop(i, None)
+            return
+        if isinstance(item, _Error):
+            raise item.e
+
+        line = str(item)
+        ts = timestamp_fn(line)
+        if ts is not None:
+            last_ts[i] = ts
+        buffered[i].append((last_ts[i], line))
+        if len(buffered[i]) == 1:
+            idle_since.pop(i, None)
+            heapq.heappush(heads, (last_ts[i], i, next(seq), line))
+
+    while heads or idle_since:
+        # drain what has been read so far without blocking
+        try:
+            while True:
+                buffer(*lines.get_nowait())
+        except Empty:
+            pass
+
+        now = time.monotonic()
+        waited = [now - since for since in idle_since.values()]
+        if heads and all(w >= max_delay for w in waited):
+            _, i, _, line = heapq.heappop(heads)
+            buffered[i].popleft()
+            slots[i].release()
+            if buffered[i]:
+                ts, next_line = buffered[i][0]
+                heapq.heappush(heads, (ts, i, next(seq), next_line))
+            elif i not in exhausted:
+                idle_since[i] = time.monotonic()
+            yield sources[i][0], line
+        else:
+            timeout = None
+            if heads:
+                timeout = max(max_delay - min(waited), 0)
+            try:
+                buffer(*lines.get(timeout=timeout))
+            except Empty:
+                pass
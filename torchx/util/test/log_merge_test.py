@@ -0,0 +1,93 @@
+# Copyright (c) Facebook, Inc. and its affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import time
+import unittest
+from datetime import datetime
+from typing import Iterator, List
+
+from torchx.util.log_merge import merge_logs, parse_timestamp
+
+
+def _ts(s: str) -> float:
+    return datetime.strptime(s, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+class LogMergeTest(unittest.TestCase):
+    def test_parse_timestamp(self) -> None:
+        ts = _ts("2021-06-01 12:00:00")
+        self.assertEqual(ts, parse_timestamp("2021-06-01 12:00:00 foo"))
+        self.assertEqual(ts + 0.5, parse_timestamp("2021-06-01T12:00:00.5Z foo"))
+        self.assertEqual(ts + 0.123, parse_timestamp("2021-06-01 12:00:00,123 INFO"))
+        self.assertEqual(ts + 0.25, parse_timestamp("[2021-06-01 12:00:00.250] foo"))
+
+        year = datetime.now().year
+        self.assertEqual(
+            _ts(f"{year}-06-01 12:00:00") + 0.000123,
+            parse_timestamp("I0601 12:00:00.000123  1234 foo.cpp:10] bar"),
+        )
+
+        self.assertIsNone(parse_timestamp("foo 2021-06-01 12:00:00"))
+        self.assertIsNone(parse_timestamp("2021-13-01 12:00:00 invalid month"))
+        self.assertIsNone(parse_timestamp(""))
+
+    def test_merge(self) -> None:
+        a = ["00:00:01 a1", "00:00:03 a3", "  a3 continued", "00:00:05 a5"]
+        b = ["00:00:02 b2", "00:00:03 b3", "00:00:04 b4"]
+        c = []
+
+        def ts_fn(line: str) -> float:
+            return float(line[6:8]) if line[0] != " " else None
+
+        merged = list(merge_logs([("a", a), ("b", b), ("c", c)], ts_fn))
+        self.assertEqual(
+            [
+                ("a", "00:00:01 a1"),
+                ("b", "00:00:02 b2"),
+                # ties are broken by the order of the sources
+                ("a", "00:00:03 a3"),
+                ("a", "  a3 continued"),
+                ("b", "00:00:03 b3"),
+                ("b", "00:00:04 b4"),
+                ("a", "00:00:05 a5"),
+            ],
+            merged,
+        )
+
+    def test_merge_no_sources(self) -> None:
+        self.assertEqual([], list(merge_logs([])))
+
+    def test_merge_lookahead(self) -> None:
+        read: List[int] = []
+
+        def lines() -> Iterator[str]:
+            for i in range(100):
+                read.append(i)
+                yield f"2021-06-01 12:00:{i % 60:02d} {i}"
+
+        merged = merge_logs([("a", lines())], lookahead=2)
+        next(merged)
+        time.sleep(0.1)
+        # one line emitted, at most `lookahead` buffered (+1 waiting for a slot)
+        self.assertLessEqual(len(read), 4)
+        self.assertEqual(99, len(list(merged)))
+
+    def test_merge_idle_source(self) -> None:
+        def idle() -> Iterator[str]:
+            time.sleep(60)
+            yield "never"
+
+        merged = merge_logs([("idle", idle()), ("a", ["foo", "bar"])], max_delay=0.1)
+        self.assertEqual(("a", "foo"), next(merged))
+        self.assertEqual(("a", "bar"), next(merged))
+
+    def test_merge_error(self) -> None:
+        def fail() -> Iterator[str]:
+            yield "foo"
+            raise RuntimeError("test")
+
+        with self.assertRaises(RuntimeError):
+            list(merge_logs([("a", fail())]))